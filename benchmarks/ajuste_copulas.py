@@ -0,0 +1,80 @@
+# Benchmark del ajuste de cópulas: por lotes contra pareja por pareja
+#
+# Ajusta por MV todas las familias candidatas a las parejas de res/copulas
+# (las mismas de "3_analisis_copulas.py seleccion") de dos maneras:
+#   - lote:   una llamada a ajustar_lote con todas las parejas
+#   - bucle:  una llamada por pareja, como el ciclo anterior de fit_copulas
+# y verifica que ambas den la misma log-verosimilitud. Termina con código 1
+# si el lote no es más rápido que el bucle.
+#
+#   python benchmarks/ajuste_copulas.py --repeticiones 3
+
+import argparse
+import importlib.util
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+if __name__ == "__main__":
+    sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from src.config import RES_DIR
+from src.data.limpieza_datos import cargar_datos
+from src.modelos.ajuste_copula import CANDIDATAS, ajustar_lote
+from src.modelos.bondad_copula import pseudo_observaciones
+
+RAIZ = Path(__file__).resolve().parents[1]
+
+
+def cargar_muestras() -> list:
+    # El script de análisis empieza con un dígito: se carga por ruta
+    ruta = RAIZ / "src" / "scripts" / "3_analisis_copulas.py"
+    spec = importlib.util.spec_from_file_location("analisis_copulas", ruta)
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    pares = mod.pares_res_copulas(cargar_datos(), RES_DIR / "copulas")
+    return [pseudo_observaciones(np.column_stack([p["x"], p["y"]])) for p in pares]
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Ajuste de cópulas por lotes vs por pareja"
+    )
+    parser.add_argument("--repeticiones", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    muestras = cargar_muestras()
+    ajustar_lote(muestras[:1])  # tablas de tau y arranque de scipy fuera de la medición
+
+    t_lote, t_bucle = [], []
+    for _ in range(args.repeticiones):
+        t0 = time.perf_counter()
+        lote = ajustar_lote(muestras)
+        t_lote.append(time.perf_counter() - t0)
+
+        t0 = time.perf_counter()
+        bucle = pd.concat([ajustar_lote([m], ids=[i]) for i, m in enumerate(muestras)])
+        t_bucle.append(time.perf_counter() - t0)
+
+    clave = ["id", "familia"]
+    dif = np.abs(
+        lote.sort_values(clave)["loglik"].to_numpy()
+        - bucle.sort_values(clave)["loglik"].to_numpy()
+    )
+    m_lote, m_bucle = np.median(t_lote), np.median(t_bucle)
+    print(f"{len(muestras)} parejas x {len(CANDIDATAS)} familias")
+    print(f"lote:  {m_lote:.3f} s")
+    print(f"bucle: {m_bucle:.3f} s  ({m_bucle / m_lote:.1f}x)")
+    print(f"máxima diferencia de log-verosimilitud: {dif.max():.2e}")
+
+    if m_lote >= m_bucle:
+        print("REGRESIÓN: el ajuste por lotes no es más rápido que el bucle por pareja")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
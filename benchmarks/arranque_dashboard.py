@@ -0,0 +1,99 @@
+# Benchmark de arranque en frío del dashboard
+#
+# Importa src/dashboard/app.py.py en procesos nuevos (como un worker de
+# gunicorn al iniciar) y compara la mediana contra la referencia guardada en
+# arranque_dashboard.json. Termina con código 1 si la mediana supera la
+# referencia por más de la tolerancia.
+#
+#   python benchmarks/arranque_dashboard.py                # comparar
+#   python benchmarks/arranque_dashboard.py --actualizar   # guardar nueva referencia
+#
+# La caché de artefactos se construye antes de medir: lo que se mide es el
+# arranque de un worker con la caché ya generada fuera de línea.
+
+import argparse
+import json
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parents[1]
+APP = RAIZ / "src" / "dashboard" / "app.py.py"
+REFERENCIA = Path(__file__).with_suffix(".json")
+
+# Sin referencia guardada se usa este presupuesto (segundos); antes de la
+# caché de artefactos el arranque tomaba ~3.3 s, con ella ~1.3 s
+PRESUPUESTO_S = 2.0
+
+CODIGO = (
+    "import time; t = time.perf_counter(); import runpy; "
+    f"runpy.run_path({str(APP)!r}, run_name='app'); "
+    "print(time.perf_counter() - t)"
+)
+
+
+def medir(repeticiones: int) -> list:
+    tiempos = []
+    for _ in range(repeticiones):
+        out = subprocess.run(
+            [sys.executable, "-c", CODIGO],
+            cwd=RAIZ,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        tiempos.append(float(out.stdout.strip().splitlines()[-1]))
+    return tiempos
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Benchmark de arranque en frío del dashboard"
+    )
+    parser.add_argument("--repeticiones", type=int, default=5)
+    parser.add_argument(
+        "--tolerancia",
+        type=float,
+        default=0.25,
+        help="aumento relativo permitido sobre la referencia",
+    )
+    parser.add_argument("--actualizar", action="store_true")
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, str(RAIZ))
+    from src.dashboard.artefactos import asegurar_cache
+
+    asegurar_cache()
+
+    t0 = time.perf_counter()
+    tiempos = sorted(medir(args.repeticiones))
+    mediana = tiempos[len(tiempos) // 2]
+    print(
+        f"import en frío: mediana {mediana:.3f} s "
+        f"(min {tiempos[0]:.3f}, max {tiempos[-1]:.3f}; {time.perf_counter() - t0:.1f} s en total)"
+    )
+
+    if args.actualizar:
+        REFERENCIA.write_text(
+            json.dumps({"mediana_s": round(mediana, 4)}, indent=2) + "\n"
+        )
+        print(f"Referencia guardada en {REFERENCIA}")
+        return 0
+
+    if REFERENCIA.exists():
+        ref = json.loads(REFERENCIA.read_text())["mediana_s"]
+        limite = ref * (1.0 + args.tolerancia)
+        print(f"referencia {ref:.3f} s, límite {limite:.3f} s")
+    else:
+        limite = PRESUPUESTO_S
+        print(f"sin referencia, presupuesto {limite:.3f} s")
+
+    if mediana > limite:
+        print("REGRESIÓN: el arranque del dashboard es más lento que el límite")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
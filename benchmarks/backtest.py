@@ -0,0 +1,125 @@
+# Costo del backtesting con origen móvil frente a un ajuste completo
+#
+# Un ajuste completo es lo que hace el pool con todos los años: umbral y GPD
+# de cada dimensión, tau de Kendall por evento, nu por verosimilitud
+# compuesta en toda la malla y VaR de todas las parejas con --n-sims
+# simulaciones. backtest_var (src/modelos/backtest.py) recorre todos los
+# orígenes reajustando solo lo que cambia; aquí se mide cuántos ajustes
+# completos cuesta. Termina con código 1 si la razón supera --maximo.
+#
+#   python benchmarks/backtest.py
+#   python benchmarks/backtest.py --n-sims 20000 --maximo 4
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+if __name__ == "__main__":
+    sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from src.data.limpieza_datos import cargar_datos
+from src.modelos.backtest import MarginalIncremental, backtest_var
+from src.modelos.pares import TIPOS_PAR
+from src.modelos.simulacion_conjunta import (
+    Combinacion,
+    PoolConjunto,
+    correlacion_desde_tau,
+    estimar_nu,
+    matriz_tau,
+    tabla_conjunta,
+)
+
+ALPHAS = (0.95, 0.99)
+
+
+def ajuste_completo(df, n_sims: int, semilla: int = 0) -> None:
+    tabla = tabla_conjunta(df)
+    dims = [(str(c), str(v)) for c, v in tabla.columns]
+    marginales = []
+    for col, val in dims:
+        m = MarginalIncremental()
+        m.agregar(df.loc[df[col].astype(str) == val, "total"].to_numpy(dtype=float))
+        marginales.append(m.marginal)
+    T, N = matriz_tau(tabla)
+    R = correlacion_desde_tau(T)
+    nu, _ = estimar_nu(tabla, R, N)
+    activas = [j for j, m in enumerate(marginales) if m is not None]
+    pool = PoolConjunto(
+        [dims[j] for j in activas],
+        R[np.ix_(activas, activas)],
+        nu,
+        [marginales[j] for j in activas],
+    )
+    combs = [
+        Combinacion((d1, d2), np.array([pool.indice[d1], pool.indice[d2]]), np.ones(2))
+        for col1, col2 in TIPOS_PAR
+        for d1 in pool.dimensiones
+        if d1[0] == col1
+        for d2 in pool.dimensiones
+        if d2[0] == col2
+    ]
+    pool.riesgo(combs, n_sims=n_sims, alphas=ALPHAS, random_state=semilla)
+
+
+def medir(f, repeticiones: int) -> float:
+    tiempos = []
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        f()
+        tiempos.append(time.perf_counter() - t0)
+    return sorted(tiempos)[len(tiempos) // 2]
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Backtesting por orígenes vs. ajuste completo"
+    )
+    parser.add_argument("--n-sims", type=int, default=50_000)
+    parser.add_argument("--min-anos", type=int, default=5)
+    parser.add_argument("--repeticiones", type=int, default=3)
+    parser.add_argument(
+        "--maximo",
+        type=float,
+        default=5.0,
+        help="razón máxima tiempo(backtest) / tiempo(ajuste completo)",
+    )
+    args = parser.parse_args(argv)
+
+    df = cargar_datos()
+    completo = medir(lambda: ajuste_completo(df, args.n_sims), args.repeticiones)
+    res = {}
+
+    def correr():
+        res.update(
+            backtest_var(
+                df,
+                alphas=ALPHAS,
+                min_anos=args.min_anos,
+                n_sims=args.n_sims,
+                random_state=0,
+            )
+        )
+
+    backtest = medir(correr, args.repeticiones)
+    n_origenes = len(res["origenes"])
+    razon = backtest / completo
+    print(f"ajuste completo: {completo:.3f} s")
+    print(
+        f"backtest, {n_origenes} orígenes: {backtest:.3f} s "
+        f"({razon:.1f} ajustes completos; {n_origenes} si se reajustara todo en cada origen)"
+    )
+    print(res["origenes"].to_string(index=False))
+
+    if razon > args.maximo:
+        print(
+            f"REGRESIÓN: el backtest cuesta {razon:.1f} ajustes completos (> {args.maximo:g})"
+        )
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,160 @@
+# Benchmark de los cuerpos KDE: binning lineal + FFT contra la suma directa
+#
+# Para cada cuerpo de res/kde (mismos datos x <= u_opt y mismo núcleo):
+#   - ancho por dejar-uno-fuera sobre los datos agrupados contra el mismo
+#     criterio con la matriz n x n de distancias (misma malla de anchos) y
+#     cuánta log-verosimilitud exacta se pierde con el ancho agrupado;
+#   - CDF de la malla contra la CDF exacta del núcleo sumada dato por dato;
+#   - cuantiles de la tabla contra bisección sobre la CDF exacta, que deben
+#     quedar dentro de cota_error.
+# Además mide reajustar todos los cuerpos (ancho incluido) e invertir
+# --uniformes uniformes, que deben tomar menos de --limite segundos cada uno,
+# y lo compara con la inversión anterior (np.interp sobre cumsum(f) / sum(f)).
+# Termina con código 1 si algo de lo anterior falla.
+#
+#   python benchmarks/kde.py --uniformes 5000000
+
+import argparse
+import glob
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+if __name__ == "__main__":
+    sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from src.config import RES_DIR
+from src.data.limpieza_datos import cargar_datos
+from src.modelos.kde import (
+    KDEBinado,
+    ancho_referencia,
+    log_verosimilitud_loo,
+    obtener_nucleo,
+)
+
+
+def cuerpos_kde(df):
+    out = []
+    for ruta in sorted(glob.glob(str(RES_DIR / "kde" / "*_body_KDE-*.csv"))):
+        meta = pd.read_csv(ruta, nrows=1).iloc[0]
+        loc = str(meta["location"])
+        col = next(
+            c for c in ("provincia", "categoria", "sector") if (df[c] == loc).any()
+        )
+        x = df.loc[df[col] == loc, "total"].to_numpy(dtype=float)
+        out.append(
+            (
+                loc,
+                str(meta["kernel"]),
+                float(meta["u_opt"]),
+                x[x <= float(meta["u_opt"])],
+                ruta,
+            )
+        )
+    return out
+
+
+def loo_directo(x, nucleo, anchos):
+    nuc = obtener_nucleo(nucleo)
+    d = x[:, None] - x[None, :]
+    out = np.empty(len(anchos))
+    for i, h in enumerate(anchos):
+        K = nuc.pdf(d / h) / h
+        np.fill_diagonal(K, 0.0)
+        out[i] = np.log(np.maximum(K.sum(axis=1) / (x.size - 1), 1e-300)).sum()
+    return out
+
+
+def cuantil_directo(x, nucleo, h, u, p, iteraciones=60):
+    nuc = obtener_nucleo(nucleo)
+    masa = nuc.cdf((u - x) / h).mean()
+    lo = np.full(p.size, x.min() - nuc.radio * h)
+    hi = np.full(p.size, u)
+    for _ in range(iteraciones):
+        mid = 0.5 * (lo + hi)
+        abajo = nuc.cdf((mid[:, None] - x[None, :]) / h).mean(axis=1) / masa < p
+        lo, hi = np.where(abajo, mid, lo), np.where(abajo, hi, mid)
+    return 0.5 * (lo + hi)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        description="KDE por binning + FFT vs suma directa"
+    )
+    parser.add_argument("--uniformes", type=int, default=5_000_000)
+    parser.add_argument(
+        "--limite",
+        type=float,
+        default=1.0,
+        help="segundos máximos para reajustar todo y para invertir los uniformes",
+    )
+    args = parser.parse_args(argv)
+
+    df = cargar_datos()
+    cuerpos = cuerpos_kde(df)
+
+    t0 = time.perf_counter()
+    ajustes = [
+        KDEBinado.ajustar(x, nucleo).truncar(u) for _, nucleo, u, x, _ in cuerpos
+    ]
+    t_ajuste = time.perf_counter() - t0
+
+    fallas = []
+    p = np.concatenate(
+        [
+            np.linspace(1e-6, 1e-3, 20),
+            np.linspace(0.001, 0.999, 200),
+            1.0 - np.linspace(1e-6, 1e-3, 20),
+        ]
+    )
+    for (loc, nucleo, u, x, _), kde in zip(cuerpos, ajustes):
+        anchos = ancho_referencia(x) * np.logspace(-1.0, 1.0, 121)
+        ld = loo_directo(x, nucleo, anchos)
+        h_dir = anchos[np.argmax(ld)]
+        # Cuánto pierde el criterio exacto con el ancho elegido sobre los bins
+        perdida = ld.max() - ld[np.argmax(log_verosimilitud_loo(x, nucleo, anchos))]
+        xs = np.linspace(x.min(), u, 400)
+        nuc = obtener_nucleo(nucleo)
+        F_dir = (
+            nuc.cdf((xs[:, None] - x[None, :]) / kde.ancho).mean(axis=1)
+            / nuc.cdf((u - x) / kde.ancho).mean()
+        )
+        err_F = np.abs(kde.cdf(xs) - F_dir).max()
+        err_q = np.abs(kde.ppf(p) - cuantil_directo(x, nucleo, kde.ancho, u, p)).max()
+        print(
+            f"{loc:20s} {nucleo:12s} n = {x.size:5d}  h = {kde.ancho:.4f} "
+            f"(directo {h_dir:.4f}, pérdida de verosimilitud {perdida:.2f})  "
+            f"error CDF {err_F:.1e}  error cuantil {err_q:.1e} <= {kde.cota_error:.1e}"
+        )
+        if err_q > kde.cota_error or err_F > 1e-4:
+            fallas.append(loc)
+
+    U = np.random.default_rng(0).uniform(size=args.uniformes)
+    kde = ajustes[0]
+    t0 = time.perf_counter()
+    kde.ppf(U)
+    t_inv = time.perf_counter() - t0
+
+    tabla = pd.read_csv(cuerpos[0][4])
+    xs, fs = tabla["x"].to_numpy(), tabla["f"].to_numpy()
+    t0 = time.perf_counter()
+    np.interp(U, np.cumsum(fs) / np.sum(fs), xs)
+    t_antes = time.perf_counter() - t0
+
+    print(f"reajuste de {len(cuerpos)} cuerpos (con ancho): {t_ajuste:.3f} s")
+    print(
+        f"inversión de {args.uniformes} uniformes: {t_inv:.3f} s "
+        f"(np.interp sobre la malla guardada: {t_antes:.3f} s)"
+    )
+
+    if fallas or t_ajuste > args.limite or t_inv > args.limite:
+        print(f"REGRESIÓN: {fallas or 'demasiado lento'}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
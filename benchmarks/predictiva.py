@@ -0,0 +1,119 @@
+# Benchmark del VaR/TVaR predictivo: motor por lotes con números aleatorios
+# comunes contra un ciclo que arma una MarginalHibrida por draw
+#
+# Para algunas parejas de res/copulas/seleccion_mv.csv se simula una vez la
+# cópula y se calculan VaR/TVaR de cada draw del posterior con riesgo_par. La
+# referencia recorre --draws-ingenuo draws con MarginalHibrida.ppf + var_cvar
+# sobre los mismos uniformes (su tiempo se escala a todos los draws) y debe
+# dar los mismos valores. También se reporta cuánto cuesta frente a una
+# corrida puntual como la de pool/pares (--n-sims-puntual simulaciones, una
+# sola marginal por ubicación). Termina con código 1 si los valores no
+# coinciden o si el motor no es más rápido que la referencia.
+#
+#   python benchmarks/predictiva.py --parejas 4 --n-draws 1000
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+if __name__ == "__main__":
+    sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from src.config import RES_DIR
+from src.data.limpieza_datos import cargar_datos
+from src.modelos.familias_copula import obtener_familia
+from src.modelos.marginales import MarginalHibrida
+from src.modelos.predictiva import COLUMNA_DIMENSION, MarginalPosterior, riesgo_par
+from src.modelos.riesgo import var_cvar
+
+ALPHAS = (0.95, 0.99)
+
+
+def _marginal(df, dimension, location, n_draws, semilla):
+    vals = df.loc[df[COLUMNA_DIMENSION[dimension]] == location, "total"].to_numpy(
+        dtype=float
+    )
+    return MarginalPosterior.desde_posterior(
+        vals, dimension, location, n_draws=n_draws, random_state=semilla
+    )
+
+
+def _draw(m, d):
+    tail = {"model": m.model, "u": m.u, "p_u": m.p_u, "params": tuple(m.draws[d])}
+    return MarginalHibrida(m.cuerpo, tail)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        description="VaR/TVaR predictivo: por lotes vs por draw"
+    )
+    parser.add_argument("--parejas", type=int, default=4)
+    parser.add_argument("--n-draws", type=int, default=1000)
+    parser.add_argument("--n-sims", type=int, default=50_000)
+    parser.add_argument("--n-sims-puntual", type=int, default=200_000)
+    parser.add_argument("--draws-ingenuo", type=int, default=100)
+    args = parser.parse_args(argv)
+
+    df = cargar_datos()
+    seleccion = pd.read_csv(RES_DIR / "copulas" / "seleccion_mv.csv").head(args.parejas)
+
+    t_lote = t_ingenuo = t_puntual = 0.0
+    dif = 0.0
+    for i, fila in enumerate(seleccion.itertuples(index=False)):
+        mA = _marginal(df, fila.tipoA, fila.varA, args.n_draws, 2 * i)
+        mB = _marginal(df, fila.tipoB, fila.varB, args.n_draws, 2 * i + 1)
+        fam = obtener_familia(fila.familia)
+        par = (fila.par, fila.par2) if fam.n_params > 1 else (fila.par,)
+        U = fam.simular(args.n_sims, par, np.random.default_rng(i))
+
+        t0 = time.perf_counter()
+        _, VaR, TVaR = riesgo_par(mA, mB, U, ALPHAS, detalle=True)
+        t_lote += time.perf_counter() - t0
+
+        draws = np.linspace(
+            0, min(mA.n_draws, mB.n_draws) - 1, args.draws_ingenuo
+        ).astype(int)
+        t0 = time.perf_counter()
+        for d in draws:
+            S = _draw(mA, d).ppf(U[:, 0]) + _draw(mB, d).ppf(U[:, 1])
+            for j, a in enumerate(ALPHAS):
+                q, tv = var_cvar(S, a)
+                dif = max(
+                    dif, abs(q - VaR[d, j]) / abs(q), abs(tv - TVaR[d, j]) / abs(tv)
+                )
+        t_ingenuo += (time.perf_counter() - t0) * VaR.shape[0] / draws.size
+
+        t0 = time.perf_counter()
+        Up = fam.simular(args.n_sims_puntual, par, np.random.default_rng(i))
+        S = mA.puntual().ppf(Up[:, 0]) + mB.puntual().ppf(Up[:, 1])
+        for a in ALPHAS:
+            var_cvar(S, a)
+        t_puntual += time.perf_counter() - t0
+
+    print(
+        f"{len(seleccion)} parejas, {args.n_draws} draws x {args.n_sims} simulaciones"
+    )
+    print(
+        f"por lotes: {t_lote:.3f} s  ({t_lote / t_puntual:.1f}x una corrida puntual "
+        f"de {args.n_sims_puntual} simulaciones: {t_puntual:.3f} s)"
+    )
+    print(
+        f"por draw:  {t_ingenuo:.3f} s  ({t_ingenuo / t_lote:.1f}x, escalado desde "
+        f"{args.draws_ingenuo} draws)"
+    )
+    print(f"máxima diferencia relativa en VaR/TVaR: {dif:.2e}")
+
+    if dif > 1e-12 or t_lote >= t_ingenuo:
+        print(
+            "REGRESIÓN: el motor por lotes no coincide con la referencia o no es más rápido"
+        )
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
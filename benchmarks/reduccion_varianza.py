@@ -0,0 +1,177 @@
+# Reducción de varianza del VaR / CVaR simulados por modo de muestreo
+#
+# Para la pareja provincia-sector con más observaciones se fuerza en turno la
+# cópula t y la Gumbel ajustadas, y se estima VaR / CVaR de S = X1 + X2 con
+# --replicas semillas:
+#   "mc" con --n-sims simulaciones (la referencia) y
+#   "sobol", "antitetico" e "importancia" con --n-sims / --reduccion.
+# Por modo y alpha se reporta media, error estándar entre réplicas y la
+# eficiencia var_mc * n_mc / (var * n): cuántas veces menos simulaciones
+# hacen falta para el mismo error estándar. Con "importancia" se agrega el
+# tamaño de muestra efectivo medio de los pesos.
+#
+# Termina con código 1 si la eficiencia de "importancia" en el VaR al 99% de
+# la t queda por debajo de --minimo.
+#
+#   python benchmarks/reduccion_varianza.py
+#   python benchmarks/reduccion_varianza.py --n-sims 100000 --replicas 20
+
+import argparse
+import sys
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+if __name__ == "__main__":
+    sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from src.data.limpieza_datos import cargar_datos
+from src.modelos.muestreo import MODOS
+from src.modelos.pares import (
+    CARPETAS,
+    fit_copulas,
+    simulate_copula,
+    simulate_copula_pesos,
+    simulate_joint_losses,
+    U_variable,
+)
+from src.modelos.riesgo import tamano_efectivo, var_cvar
+
+ALPHAS = (0.99, 0.995)
+
+
+def pareja_mayor(df) -> tuple:
+    n = df.groupby(["provincia", "sector"], observed=True).size()
+    return n.idxmax()
+
+
+def estimar(
+    fit: Dict, marginales: tuple, modo: str, n: int, semilla: int
+) -> Dict[str, float]:
+    if modo == "mc":
+        U, pesos = simulate_copula(fit, n_sims=n, random_state=semilla), None
+    else:
+        U, pesos = simulate_copula_pesos(fit, n_sims=n, random_state=semilla, modo=modo)
+    S = simulate_joint_losses(U, *marginales)[2]
+    out = {}
+    for a in ALPHAS:
+        out[f"VaR_{a}"], out[f"CVaR_{a}"] = var_cvar(S, a, pesos=pesos)
+    if pesos is not None:
+        out["n_efectivo"] = tamano_efectivo(pesos)
+    return out
+
+
+def comparar(
+    fit: Dict, marginales: tuple, n_sims: int, reduccion: float, replicas: int
+) -> pd.DataFrame:
+    filas: List[Dict] = []
+    var_mc: Dict[str, float] = {}
+    for modo in MODOS:
+        n = n_sims if modo == "mc" else max(int(n_sims / reduccion), 2)
+        res = pd.DataFrame(
+            [estimar(fit, marginales, modo, n, 1000 * r + 1) for r in range(replicas)]
+        )
+        for medida in [c for c in res.columns if c != "n_efectivo"]:
+            v = float(res[medida].var(ddof=1))
+            if modo == "mc":
+                var_mc[medida] = v
+            filas.append(
+                {
+                    "modo": modo,
+                    "n": n,
+                    "medida": medida,
+                    "media": float(res[medida].mean()),
+                    "ee": float(np.sqrt(v)),
+                    "eficiencia": var_mc[medida] * n_sims / (v * n)
+                    if v > 0
+                    else np.inf,
+                    "n_efectivo": float(res["n_efectivo"].mean())
+                    if "n_efectivo" in res
+                    else np.nan,
+                }
+            )
+    return pd.DataFrame(filas)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Eficiencia de los modos de muestreo en VaR/CVaR"
+    )
+    parser.add_argument(
+        "--n-sims", type=int, default=200_000, help="simulaciones de la referencia mc"
+    )
+    parser.add_argument(
+        "--reduccion",
+        type=float,
+        default=10.0,
+        help="los demás modos usan n-sims / reduccion",
+    )
+    parser.add_argument("--replicas", type=int, default=30)
+    parser.add_argument(
+        "--minimo",
+        type=float,
+        default=5.0,
+        help="eficiencia mínima de importancia en VaR_0.99 de la t",
+    )
+    args = parser.parse_args(argv)
+
+    df = cargar_datos()
+    prov, sector = pareja_mayor(df)
+    par = df[(df["provincia"] == prov) & (df["sector"] == sector)]["total"]
+    U1, body1, tail1, _, _ = U_variable(par, prov, CARPETAS["provincia"])
+    U2, body2, tail2, _, _ = U_variable(par, sector, CARPETAS["sector"])
+    fit = fit_copulas(U1, U2)
+    marginales = (body1, tail1, body2, tail2)
+    print(
+        f"pareja {prov} - {sector}: t(rho={fit['t']['R'][0, 1]:.3f}, nu={fit['t']['nu']:.2f}), "
+        f"Gumbel(theta={fit['gumbel']['theta']:.2f}); ganadora {fit['winner']}"
+    )
+
+    eficiencia_t = np.nan
+    for familia in ("t-student", "gumbel"):
+        tabla = comparar(
+            {**fit, "winner": familia},
+            marginales,
+            args.n_sims,
+            args.reduccion,
+            args.replicas,
+        )
+        print(f"\n{familia}, {args.replicas} réplicas")
+        with pd.option_context(
+            "display.width",
+            200,
+            "display.max_rows",
+            None,
+            "display.float_format",
+            "{:.4g}".format,
+        ):
+            print(
+                tabla.pivot(
+                    index=["modo", "n"], columns="medida", values=["ee", "eficiencia"]
+                ).to_string()
+            )
+            print(
+                tabla.pivot(index="modo", columns="medida", values="media").to_string()
+            )
+        if familia == "t-student":
+            fila = tabla[
+                (tabla["modo"] == "importancia") & (tabla["medida"] == "VaR_0.99")
+            ].iloc[0]
+            eficiencia_t = fila["eficiencia"]
+            print(
+                f"tamaño efectivo medio (importancia): {fila['n_efectivo']:.0f} de {fila['n']}"
+            )
+
+    if not eficiencia_t >= args.minimo:
+        print(
+            f"REGRESIÓN: eficiencia de importancia en VaR_0.99 (t) {eficiencia_t:.1f} "
+            f"< {args.minimo:g}"
+        )
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,98 @@
+# Benchmark del almacén de simulaciones: consultar U/X guardados en disco
+# contra volver a simular el pool conjunto
+#
+# Se guarda una vez el pool (--n-sims simulaciones) y para --consultas
+# parejas al azar se pide VaR/CVaR a alphas nuevos y el CVaR condicional
+# (Y | X >= VaR_X). La referencia vuelve a simular el pool con la misma
+# semilla y calcula lo mismo en memoria con var_cvar; los valores deben
+# coincidir. Termina con código 1 si no coinciden o si consultar el disco no
+# es más rápido que re-simular.
+#
+#   python benchmarks/simulaciones.py --n-sims 200000 --consultas 20
+
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+if __name__ == "__main__":
+    sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from src.data.limpieza_datos import cargar_datos
+from src.modelos.almacen_simulaciones import guardar_simulaciones
+from src.modelos.riesgo import var_cvar
+from src.modelos.simulacion_conjunta import PoolConjunto
+
+ALPHAS = (0.9, 0.975, 0.995)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Consultas sobre simulaciones guardadas vs re-simular"
+    )
+    parser.add_argument("--n-sims", type=int, default=200_000)
+    parser.add_argument("--consultas", type=int, default=20)
+    parser.add_argument("--semilla", type=int, default=123)
+    args = parser.parse_args(argv)
+
+    df = cargar_datos()
+    pool = PoolConjunto.desde_datos(df, nu=5.0)
+    rng = np.random.default_rng(0)
+    parejas = [
+        tuple(rng.choice(len(pool.dimensiones), 2, replace=False))
+        for _ in range(args.consultas)
+    ]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        t0 = time.perf_counter()
+        sims = guardar_simulaciones(
+            pool, Path(tmp) / "pool", n_sims=args.n_sims, random_state=args.semilla
+        )
+        t_guardar = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        disco = []
+        for i, j in parejas:
+            dims = [pool.dimensiones[i], pool.dimensiones[j]]
+            res = sims.var_cvar(dims, ALPHAS)
+            cond = sims.cvar_condicional(dims[1], dims[0], ALPHAS)
+            disco.append([v for a in ALPHAS for v in (*res[a], cond[a])])
+        t_disco = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        memoria = []
+        for i, j in parejas:
+            X = pool.simular(args.n_sims, np.random.default_rng(args.semilla))
+            fila = []
+            for a in ALPHAS:
+                fila.extend(var_cvar(X[:, i] + X[:, j], a))
+                fila.append(X[X[:, i] >= np.quantile(X[:, i], a), j].mean())
+            memoria.append(fila)
+        t_memoria = time.perf_counter() - t0
+
+    dif = np.max(
+        np.abs(np.array(disco) - np.array(memoria)) / np.abs(np.array(memoria))
+    )
+    print(
+        f"{len(pool.dimensiones)} dimensiones x {args.n_sims} simulaciones "
+        f"(guardar: {t_guardar:.3f} s)"
+    )
+    print(f"{args.consultas} consultas sobre disco: {t_disco:.3f} s")
+    print(
+        f"re-simulando cada vez:        {t_memoria:.3f} s  ({t_memoria / t_disco:.1f}x)"
+    )
+    print(f"máxima diferencia relativa: {dif:.2e}")
+
+    if dif > 1e-12 or t_disco >= t_memoria:
+        print(
+            "REGRESIÓN: las consultas no coinciden o no son más rápidas que re-simular"
+        )
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,70 @@
+# Generador de eventos sintéticos para los benchmarks
+#
+# Multiplica el tamaño de los datos limpios por un factor remuestreando
+# eventos completos (todas sus filas juntas), así que se conserva la mezcla
+# conjunta de provincia / cantón / categoría / sector y el número de filas
+# por evento. Cada copia de un evento recibe coordenadas desplazadas (para
+# que cuente como evento distinto en el cubo del dashboard) y un ruido
+# multiplicativo en la pérdida, de modo que las series no queden con empates
+# exactos que no existen en los datos reales.
+
+from __future__ import annotations
+
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+
+from src.dashboard.cubo import CLAVE_EVENTO
+from src.data.limpieza_datos import COLUMNAS, COLUMNAS_CATEGORICAS, UMBRAL_LOG
+
+# Desviación estándar del ruido en log(pérdida)
+RUIDO_LOG = 0.05
+
+
+def generar_eventos(df: pd.DataFrame, factor: float, semilla: int = 0) -> pd.DataFrame:
+    """
+    factor veces los eventos de df (cargar_datos(None)), remuestreados con
+    reemplazo. Devuelve las mismas columnas que df.
+    """
+    rng = np.random.default_rng(semilla)
+    evento = (
+        df.groupby(CLAVE_EVENTO, dropna=False, sort=False, observed=True)
+        .ngroup()
+        .to_numpy()
+    )
+    n_eventos = int(evento.max()) + 1
+    elegidos = rng.integers(0, n_eventos, size=int(round(factor * n_eventos)))
+
+    # Filas de cada evento elegido, en el orden de los eventos
+    orden = np.argsort(evento, kind="stable")
+    inicio = np.searchsorted(evento[orden], np.arange(n_eventos + 1))
+    largo = np.diff(inicio)[elegidos]
+    copia = np.repeat(np.arange(elegidos.size), largo)
+    filas = orden[
+        np.repeat(inicio[elegidos], largo)
+        + np.arange(largo.sum())
+        - np.repeat(np.cumsum(largo) - largo, largo)
+    ]
+
+    out = df.iloc[filas].reset_index(drop=True)
+    desplazamiento = 1e-7 * copia
+    out["latitud"] = out["latitud"].to_numpy() + desplazamiento
+    out["longitud"] = out["longitud"].to_numpy() + desplazamiento
+    total_log = out["total_log"].to_numpy() + RUIDO_LOG * rng.standard_normal(len(out))
+    out["total_log"] = total_log
+    out["total"] = np.where(out["total"].to_numpy() > 0, np.exp(total_log), 0.0)
+    return out
+
+
+def escalas(df: pd.DataFrame) -> Dict[str, pd.DataFrame]:
+    """
+    Las vistas de cargar_datos sobre un frame completo: "log" (scripts y
+    pipeline de parejas) y "colones" con total > 0 (artefactos del dashboard).
+    """
+    log = df[df["total_log"] > UMBRAL_LOG].reset_index(drop=True)
+    log["total"] = log["total_log"]
+    for col in COLUMNAS_CATEGORICAS:
+        log[col] = log[col].cat.remove_unused_categories()
+    colones = df[df["total"] > 0].reset_index(drop=True)
+    return {"log": log[list(COLUMNAS)], "colones": colones[list(COLUMNAS)]}
@@ -0,0 +1,299 @@
+# Suite de rendimiento del pipeline de riesgo y del dashboard
+#
+# Mide cada etapa con datos sintéticos de 1x, 10x y 100x el tamaño de los
+# datos limpios (sintetico.py remuestrea eventos completos y conserva la
+# mezcla provincia / categoría / sector):
+#   transformaciones   U_variable (marginal híbrida + ECDF si falla el KS)
+#   ajuste_copula      fit_copulas (MV de Gumbel y t)
+#   simulate_copula    --n-sims uniformes de la cópula ganadora
+#   inversion          simulate_joint_losses (cuantiles híbridos)
+#   var_cvar           VaR/CVaR de S a los alphas del pipeline
+#   pipeline           dependencia_y_riesgo completo con --n-sims
+#   update_graphs      consultas del cubo + valores y parches de las figuras
+#                      (sin dash instalado solo se mide el cubo: "cubo_consultar")
+# La pareja es la provincia-sector con más observaciones en los datos reales.
+#
+# Cada corrida se agrega como una línea JSON a --historial (fecha, commit,
+# máquina, versiones y mediana por etapa y factor). La referencia de cada
+# medición es la mediana de las últimas --ventana corridas sin regresiones en
+# la misma máquina y con los mismos --n-sims; termina con código 1 si alguna
+# etapa supera su referencia en más de --umbral (relativo).
+#
+# Después de un cambio que vuelve más lenta una etapa a propósito, --aceptar
+# guarda la corrida como nueva línea base: desde ahí la referencia solo usa
+# esa corrida y las siguientes, y la suite no queda fallando para siempre.
+#
+#   python benchmarks/suite.py
+#   python benchmarks/suite.py --factores 1 10 --umbral 0.5 --no-guardar
+#   python benchmarks/suite.py --aceptar
+
+import argparse
+import datetime as dt
+import json
+import platform
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+if __name__ == "__main__":
+    sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from sintetico import escalas, generar_eventos
+from src.dashboard.cubo import CuboAgregado
+from src.data.limpieza_datos import cargar_datos
+from src.modelos.pares import (
+    CARPETAS,
+    dependencia_y_riesgo,
+    fit_copulas,
+    simulate_copula,
+    simulate_joint_losses,
+    U_variable,
+)
+from src.modelos.riesgo import var_cvar
+
+RAIZ = Path(__file__).resolve().parents[1]
+
+HISTORIAL = Path(__file__).with_name("historial.jsonl")
+ALPHAS = (0.95, 0.99)
+N_CONSULTAS = 20
+
+
+def medir(f: Callable[[], object], repeticiones: int) -> Dict[str, float]:
+    tiempos = []
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        f()
+        tiempos.append(time.perf_counter() - t0)
+    tiempos.sort()
+    return {"mediana_s": tiempos[len(tiempos) // 2], "min_s": tiempos[0]}
+
+
+def pareja_mayor(df) -> tuple:
+    n = df.groupby(["provincia", "sector"], observed=True).size()
+    return n.idxmax()
+
+
+def callback_dashboard() -> Optional[Callable]:
+    """valores_figuras + parches_figuras de la app, si dash está instalado."""
+    try:
+        import runpy
+
+        app = runpy.run_path(
+            str(RAIZ / "src" / "dashboard" / "app.py.py"), run_name="app"
+        )
+    except ImportError:
+        return None
+    return lambda agg: app["parches_figuras"](app["valores_figuras"](agg))
+
+
+def selecciones(cubo: CuboAgregado, n: int, semilla: int = 0) -> List[tuple]:
+    """Selecciones de filtros al azar, como las que haría un usuario."""
+    rng = np.random.default_rng(semilla)
+
+    def elegir(vals):
+        return list(rng.choice(vals, rng.integers(1, len(vals) + 1), replace=False))
+
+    out = []
+    for _ in range(n):
+        a, b = sorted(rng.choice(cubo.anos, 2))
+        out.append(
+            (
+                [int(a), int(b)],
+                elegir(cubo.provincias),
+                elegir(cubo.categorias),
+                elegir(cubo.sectores),
+            )
+        )
+    return out
+
+
+def etapas(
+    df_log, df_colones, prov: str, sector: str, n_sims: int, figuras
+) -> Dict[str, Callable]:
+    par = df_log[(df_log["provincia"] == prov) & (df_log["sector"] == sector)]["total"]
+    U1, body1, tail1, _, _ = U_variable(par, prov, CARPETAS["provincia"])
+    U2, body2, tail2, _, _ = U_variable(par, sector, CARPETAS["sector"])
+    fit = fit_copulas(U1, U2)
+    U_sim = simulate_copula(fit, n_sims=n_sims, random_state=0)
+    S = simulate_joint_losses(U_sim, body1, tail1, body2, tail2)[2]
+    cubo = CuboAgregado(df_colones)
+    sels = selecciones(cubo, N_CONSULTAS)
+
+    def transformaciones():
+        U_variable(par, prov, CARPETAS["provincia"])
+        U_variable(par, sector, CARPETAS["sector"])
+
+    def consultas():
+        for sel in sels:
+            agg = cubo.consultar(*sel)
+            if figuras is not None:
+                figuras(agg)
+
+    return {
+        "transformaciones": transformaciones,
+        "ajuste_copula": lambda: fit_copulas(U1, U2),
+        "simulate_copula": lambda: simulate_copula(fit, n_sims=n_sims, random_state=0),
+        "inversion": lambda: simulate_joint_losses(U_sim, body1, tail1, body2, tail2),
+        "var_cvar": lambda: [var_cvar(S, a) for a in ALPHAS],
+        "pipeline": lambda: dependencia_y_riesgo(
+            df_log,
+            "provincia",
+            prov,
+            CARPETAS["provincia"],
+            "sector",
+            sector,
+            CARPETAS["sector"],
+            n_sims=n_sims,
+            alphas=ALPHAS,
+            random_state=0,
+        ),
+        "update_graphs" if figuras is not None else "cubo_consultar": consultas,
+    }
+
+
+def commit_actual() -> Optional[str]:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=RAIZ,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return out.stdout.strip()
+
+
+def leer_historial(ruta: Path) -> List[Dict]:
+    if not ruta.exists():
+        return []
+    with open(ruta, encoding="utf-8") as f:
+        return [json.loads(linea) for linea in f if linea.strip()]
+
+
+def referencias(
+    historial: List[Dict], maquina: str, n_sims: int, ventana: int
+) -> Dict[tuple, float]:
+    """
+    Mediana de las últimas `ventana` corridas comparables por (etapa, factor),
+    desde la última línea base aceptada (inclusive) y sin las corridas con
+    regresiones que no se aceptaron.
+    """
+    comparables = [
+        reg
+        for reg in historial
+        if reg["maquina"] == maquina and reg["n_sims"] == n_sims
+    ]
+    bases = [i for i, reg in enumerate(comparables) if reg.get("linea_base")]
+    if bases:
+        comparables = comparables[bases[-1] :]
+    previos: Dict[tuple, List[float]] = {}
+    for reg in comparables:
+        if reg["regresiones"] and not reg.get("linea_base"):
+            continue
+        for r in reg["resultados"]:
+            previos.setdefault((r["etapa"], r["factor"]), []).append(r["mediana_s"])
+    return {k: float(np.median(v[-ventana:])) for k, v in previos.items()}
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Suite de rendimiento a 1x, 10x y 100x los datos"
+    )
+    parser.add_argument("--factores", type=float, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--n-sims", type=int, default=200_000)
+    parser.add_argument("--repeticiones", type=int, default=3)
+    parser.add_argument(
+        "--umbral",
+        type=float,
+        default=0.25,
+        help="aumento relativo permitido sobre la referencia",
+    )
+    parser.add_argument(
+        "--minimo",
+        type=float,
+        default=0.005,
+        help="diferencias absolutas menores (s) no cuentan como regresión",
+    )
+    parser.add_argument("--ventana", type=int, default=5)
+    parser.add_argument("--historial", default=str(HISTORIAL))
+    parser.add_argument("--no-guardar", action="store_true")
+    parser.add_argument(
+        "--aceptar",
+        action="store_true",
+        help="guardar esta corrida como nueva línea base aunque tenga regresiones",
+    )
+    args = parser.parse_args(argv)
+    if args.aceptar and args.no_guardar:
+        parser.error("--aceptar necesita guardar la corrida (sin --no-guardar)")
+
+    completo = cargar_datos(None)
+    prov, sector = pareja_mayor(cargar_datos())
+    figuras = callback_dashboard()
+    print(
+        f"pareja {prov} - {sector}, {args.n_sims} simulaciones"
+        + ("" if figuras is not None else " (sin dash: solo consultas del cubo)")
+    )
+
+    ruta = Path(args.historial)
+    maquina = platform.node()
+    ref = referencias(leer_historial(ruta), maquina, args.n_sims, args.ventana)
+
+    resultados, regresiones = [], []
+    for factor in args.factores:
+        vistas = escalas(generar_eventos(completo, factor))
+        print(f"\n{factor:g}x: {len(vistas['log'])} filas")
+        for etapa, f in etapas(
+            vistas["log"], vistas["colones"], prov, sector, args.n_sims, figuras
+        ).items():
+            m = medir(f, args.repeticiones)
+            resultados.append({"etapa": etapa, "factor": factor, **m})
+            base = ref.get((etapa, factor))
+            linea = f"  {etapa:18s} {m['mediana_s']:8.4f} s"
+            if base is not None:
+                linea += (
+                    f"  (referencia {base:.4f} s, {m['mediana_s'] / base - 1:+.0%})"
+                )
+                if (
+                    m["mediana_s"] > base * (1 + args.umbral)
+                    and m["mediana_s"] - base > args.minimo
+                ):
+                    regresiones.append(f"{etapa} {factor:g}x")
+                    linea += "  REGRESIÓN"
+            print(linea)
+
+    if not args.no_guardar:
+        reg = {
+            "fecha": dt.datetime.now(dt.timezone.utc).isoformat(timespec="seconds"),
+            "commit": commit_actual(),
+            "maquina": maquina,
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "n_sims": args.n_sims,
+            "repeticiones": args.repeticiones,
+            "resultados": resultados,
+            "regresiones": regresiones,
+            "linea_base": args.aceptar,
+        }
+        with open(ruta, "a", encoding="utf-8") as f:
+            f.write(json.dumps(reg, ensure_ascii=False) + "\n")
+        print(
+            f"\nCorrida agregada a {ruta}"
+            + (" como nueva línea base" if args.aceptar else "")
+        )
+
+    if regresiones and not args.aceptar:
+        print(
+            f"REGRESIÓN (> {args.umbral:.0%} sobre la referencia): {', '.join(regresiones)}"
+        )
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,120 @@
+# Benchmark de la selección de umbral: sumas acumuladas + Newton con arranque
+# en el umbral vecino contra la versión directa de encontrar_umbral_optimo
+#
+# La versión directa recorre la malla filtrando los datos por cada umbral
+# (MRL con una media por umbral) y ajusta la GPD con scipy.stats.genpareto.fit
+# desde cero en cada uno. Para las provincias se compara cuánto tarda cada
+# una y que den las mismas curvas: MRL y p-valor de Anderson-Darling por
+# umbral (este último con la tolerancia del optimizador de scipy), y se
+# reportan los u_opt que cambien. Termina con código 1 si la versión nueva
+# no es más rápida o si las curvas no coinciden.
+#
+#   python benchmarks/umbral.py --min-excesos 25
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+from scipy import stats
+
+if __name__ == "__main__":
+    sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from src.data.limpieza_datos import cargar_datos
+from src.modelos.umbral import (
+    anderson_darling,
+    cdf_gpd,
+    malla_umbrales,
+    seleccionar_umbral,
+    umbrales_estables,
+    varianza_local,
+)
+
+
+def umbral_directo(datos, min_excesos=50, u_min=0.7, u_max=0.99, puntos=250):
+    xs = np.sort(np.asarray(datos, dtype=float))
+    u_seq = malla_umbrales(xs, u_min, u_max, puntos)
+    mrl = np.array(
+        [np.mean(xs[xs > u] - u) if np.any(xs > u) else np.nan for u in u_seq]
+    )
+    var_loc = varianza_local(mrl)
+    p_ad = np.full(u_seq.size, np.nan)
+    for i, u in enumerate(u_seq):
+        y = xs[xs > u] - u
+        if y.size >= max(min_excesos, 2):
+            xi, _, sigma = stats.genpareto.fit(y, floc=0)
+            if xi < -1.0:
+                # Sin MLE: mismo borde uniforme que ajustar_gpd
+                xi, sigma = -1.0, y.max()
+            p_ad[i] = anderson_darling(cdf_gpd(y, xi, sigma))[1]
+    estables = umbrales_estables(mrl, var_loc, p_ad)
+    j = (
+        estables[np.argmax(p_ad[estables])]
+        if estables.size
+        else int(np.nanargmin(var_loc))
+    )
+    return float(u_seq[j]), mrl, p_ad
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Selección de umbral: rápida vs directa"
+    )
+    parser.add_argument("--min-excesos", type=int, default=25)
+    parser.add_argument(
+        "--tolerancia-p",
+        type=float,
+        default=1e-3,
+        help="diferencia máxima aceptada en los p-valores de Anderson-Darling",
+    )
+    args = parser.parse_args(argv)
+
+    df = cargar_datos()
+    series = {
+        p: g["total"].to_numpy(dtype=float)
+        for p, g in df.groupby("provincia", observed=True)
+    }
+
+    t0 = time.perf_counter()
+    rapido = {
+        p: seleccionar_umbral(x, min_excesos=args.min_excesos, detalle=True)
+        for p, x in series.items()
+    }
+    t_rapido = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    directo = {
+        p: umbral_directo(x, min_excesos=args.min_excesos) for p, x in series.items()
+    }
+    t_directo = time.perf_counter() - t0
+
+    dif_mrl = max(
+        np.nanmax(np.abs(rapido[p]["tabla"]["mrl"].to_numpy() - directo[p][1]))
+        for p in series
+    )
+    dif_p = max(
+        np.nanmax(np.abs(rapido[p]["tabla"]["p_ad"].to_numpy() - directo[p][2]))
+        for p in series
+    )
+    print(f"{len(series)} provincias, 250 umbrales cada una")
+    print(f"rápido:  {t_rapido:.3f} s")
+    print(f"directo: {t_directo:.3f} s  ({t_directo / t_rapido:.1f}x)")
+    print(f"máxima diferencia en MRL: {dif_mrl:.2e}, en p-valor AD: {dif_p:.2e}")
+    for p in series:
+        if rapido[p]["u_opt"] != directo[p][0]:
+            print(
+                f"  {p}: u_opt {rapido[p]['u_opt']:.4f} (rápido) vs {directo[p][0]:.4f} (directo)"
+            )
+
+    if t_rapido >= t_directo or dif_mrl > 1e-9 or dif_p > args.tolerancia_p:
+        print(
+            "REGRESIÓN: la selección rápida no es más rápida o sus curvas no coinciden"
+        )
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1 +1,38 @@
 # Configuraciones globales (ej. rutas, parámetros)
+
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parents[1]
+DATA_DIR = RAIZ / "data"
+RES_DIR = RAIZ / "res"
+
+# Libro original y su versión limpia y tipada (ver src/data/limpieza_datos.py)
+RUTA_DATOS_CRUDOS = DATA_DIR / "raw" / "datos_crudos.xlsx"
+RUTA_DATOS = DATA_DIR / "clean" / "datos.npz"
+
+# Carpetas de res/ con marginales ajustadas ({nombre}_{body|tail}_{modelo}.csv)
+DIMENSIONES_MARGINALES = ("provincias", "categorias", "sectores", "cantones", "kde")
+RUTA_ALMACEN_MARGINALES = RES_DIR / "marginales.npz"
+
+# Posterior de las marginales paramétricas (ver src/modelos/mcmc.py)
+RUTA_POSTERIOR_MCMC = RES_DIR / "mcmc" / "posterior.npz"
+
+# Simulaciones del pool conjunto guardadas en disco (ver src/modelos/almacen_simulaciones.py)
+RUTA_SIMULACIONES = RES_DIR / "simulaciones"
+
+# Umbrales de cola u_opt / p_u por ubicación (ver src/modelos/umbral.py)
+RUTA_UMBRALES = RES_DIR / "umbrales.csv"
+
+# Caché de artefactos precalculados del dashboard (ver src/dashboard/artefactos.py)
+RUTA_CACHE_DASHBOARD = RES_DIR / "cache_dashboard"
+
+# Galería de figuras del dashboard (ver src/dashboard/galeria.py): manifiesto
+# de res/figures y caché en disco de miniaturas y figuras dibujadas bajo demanda
+DIR_FIGURAS = RES_DIR / "figures"
+RUTA_MANIFIESTO_FIGURAS = DIR_FIGURAS / "manifiesto.json"
+RUTA_CACHE_FIGURAS = RES_DIR / "cache_figuras"
+MAX_MB_CACHE_FIGURAS = 200
+
+# Estado del pipeline por etapas (ver src/pipeline.py): clave de contenido de
+# cada etapa y salidas intermedias (una por pareja de cópulas)
+RUTA_PIPELINE = RES_DIR / "pipeline"
@@ -1,111 +1,145 @@
 import dash
 import dash_bootstrap_components as dbc
-from dash import dcc, html
-import pandas as pd
+from dash import dcc, html, Patch
 import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
-import json
-from scipy.stats import lognorm
 import os
-PRIMARY = "#005DA4"   
-SECONDARY = "#00A37A" 
-ACCENT = "#F39C12"    
+import sys
+from functools import lru_cache
+from dash.dependencies import Input, Output, State
+
+# La app se corre como script (python src/dashboard/app.py.py): la raíz del
+# repositorio va en sys.path antes de importar src
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+from src import traza
+from src.dashboard.artefactos import ArtefactosDashboard
+from src.dashboard.galeria import Galeria
+from src.dashboard.metricas import registrar_metricas
+from src.dashboard.montecarlo import MonteCarloFiltrado
+from src.dashboard.geometria import cargar_geojson
+
+PRIMARY = "#005DA4"
+SECONDARY = "#00A37A"
+ACCENT = "#F39C12"
 BACKGROUND = "#f7f7f7"
 
-CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
-os.chdir(CURRENT_DIR)
-df = pd.read_csv(r"../../data/clean/datos_limpios.csv")
-FIG_DIR = os.path.join(CURRENT_DIR, "assets", "figuras")
-fig_files = []
-if os.path.exists(FIG_DIR):
-    for fname in os.listdir(FIG_DIR):
-        if fname.lower().endswith((".png", ".jpg", ".jpeg")):
-            fig_files.append(fname)
-
-fig_meta = []
-for fname in fig_files:
-    name, ext = os.path.splitext(fname)
-    parts = name.split("_")
-    tipo = parts[0]  
-    detalle = "_".join(parts[1:]) if len(parts) > 1 else ""
-    fig_meta.append({"file": fname, "tipo": tipo, "detalle": detalle})
-fig_df = pd.DataFrame(fig_meta)
-if not fig_df.empty:
-    all_tipos_fig = sorted(fig_df["tipo"].unique())
-else:
-    all_tipos_fig = []
-df = df[df["total"] > 0]
-with open(
-    r"../../data/provincias.json",
-    "r",
-) as f:
-    geojson = json.load(f)
-prov_year = df.groupby(["ano", "provincia"])["total"].sum().reset_index()
-prov_pivot = prov_year.pivot(index="ano", columns="provincia", values="total").fillna(0)
-prov_corr = prov_pivot.corr()
-fig_copula = px.imshow(
-    prov_corr,
-    text_auto=".2f",
-    aspect="auto",
-    color_continuous_scale=px.colors.diverging.RdBu,
-    color_continuous_midpoint=0,
-    labels={"x": "Provincia", "y": "Provincia"},
-)
-fig_copula.update_layout(
-    title="Correlación de pérdidas entre provincias",
-    margin={"t": 50, "b": 0},
-    coloraxis_colorbar_title="Correlación",
-)
-fig_copula.update_xaxes(
-    side="bottom"
-)  
-losses = np.sort(df["total"].values)  
-n = len(losses)
-exceed_prob = [(n - i) / n for i in range(n)]  # P(X > losses[i])
-fig_tail = go.Figure()
-fig_tail.add_trace(
-    go.Scatter(x=losses, y=exceed_prob, mode="markers", marker_size=4, name="Datos")
-)
-fig_tail.update_xaxes(type="log", title_text="Pérdida (colones)")
-fig_tail.update_yaxes(type="log", title_text="P(X > x)")
-fig_tail.update_layout(title="Función de excedencia de pérdidas (escala log-log)")
-year_totals = df.groupby("ano")["total"].sum().values
-shape, loc, scale = lognorm.fit(year_totals, floc=0)
-sims = lognorm.rvs(shape, loc=loc, scale=scale, size=10000, random_state=0)
-cutoff = np.quantile(sims, 0.999)
-sims_plot = sims[sims <= cutoff]
-fig_mc = px.histogram(
-    sims_plot,
-    nbins=50,
-    labels={"value": "Pérdida anual simulada (colones)", "count": "Frecuencia"},
-)
-fig_mc.update_layout(
-    title="Distribución simulada de pérdidas anuales", showlegend=False
-)
-fig_mc.update_xaxes(title_text="Pérdida anual (colones)")
-fig_mc.update_yaxes(title_text="Frecuencia")
-p95 = np.percentile(sims, 95)
-fig_mc.add_vline(
-    x=p95,
-    line_dash="dash",
-    line_color="red",
-    annotation_text="Percentil 95",
-    annotation_position="top right",
-)
-mean_loss = sims.mean()
-perc95 = np.percentile(sims, 95)
-perc99 = np.percentile(sims, 99)
-mean_loss_b = mean_loss / 1e9  # valor en mil millones
-perc95_b = perc95 / 1e9  # valor en mil millones
-perc99_b = perc99 / 1e9  # valor en mil millones
+# Artefactos precalculados (python src/dashboard/artefactos.py); cada pestaña
+# carga los suyos la primera vez que se abre
+artefactos = ArtefactosDashboard()
+filtros = artefactos.filtros()
+
+# Galería de figuras: manifiesto de res/figures (python src/dashboard/galeria.py),
+# miniaturas y figuras faltantes se generan bajo demanda en una caché acotada
+galeria = Galeria()
+
+# Monte Carlo de pérdidas anuales por selección de filtros: se simula en un
+# hilo de fondo y los resultados quedan en una caché LRU por selección
+montecarlo = MonteCarloFiltrado(artefactos.cubo())
+
+
+@lru_cache(maxsize=1)
+def figura_copula():
+    prov_corr = artefactos.correlacion()
+    fig_copula = px.imshow(
+        prov_corr,
+        text_auto=".2f",
+        aspect="auto",
+        color_continuous_scale=px.colors.diverging.RdBu,
+        color_continuous_midpoint=0,
+        labels={"x": "Provincia", "y": "Provincia"},
+    )
+    fig_copula.update_layout(
+        title="Correlación de pérdidas entre provincias",
+        margin={"t": 50, "b": 0},
+        coloraxis_colorbar_title="Correlación",
+    )
+    fig_copula.update_xaxes(side="bottom")
+    return fig_copula
+
+
+@lru_cache(maxsize=1)
+def figura_cola():
+    losses, exceed_prob = artefactos.excedencia()
+    fig_tail = go.Figure()
+    fig_tail.add_trace(
+        go.Scatter(x=losses, y=exceed_prob, mode="markers", marker_size=4, name="Datos")
+    )
+    fig_tail.update_xaxes(type="log", title_text="Pérdida (colones)")
+    fig_tail.update_yaxes(type="log", title_text="P(X > x)")
+    fig_tail.update_layout(title="Función de excedencia de pérdidas (escala log-log)")
+    return fig_tail
+
+
+def figura_mc(estado):
+    """Histograma y texto de la pestaña Monte Carlo con el avance de un trabajo."""
+    fig_mc = go.Figure()
+    fig_mc.update_layout(
+        title="Distribución simulada de pérdidas anuales", showlegend=False
+    )
+    fig_mc.update_xaxes(title_text="Pérdida anual (colones)")
+    fig_mc.update_yaxes(title_text="Frecuencia")
+    if estado["mensaje"]:
+        return fig_mc, [html.B("Nota: "), estado["mensaje"]]
+    if estado["n"] == 0:
+        return fig_mc, html.I("Calculando la simulación para la selección...")
+
+    bordes = estado["bordes"]
+    fig_mc.add_trace(
+        go.Bar(
+            x=(bordes[:-1] + bordes[1:]) / 2,
+            y=estado["conteos"],
+            width=np.diff(bordes),
+            marker_line_width=0,
+        )
+    )
+    fig_mc.update_layout(bargap=0)
+    fig_mc.add_vline(
+        x=estado["p95"],
+        line_dash="dash",
+        line_color="red",
+        annotation_text="Percentil 95",
+        annotation_position="top right",
+    )
+    mean_loss_b = estado["media"] / 1e9  # valor en mil millones
+    perc95_b = estado["p95"] / 1e9  # valor en mil millones
+    perc99_b = estado["p99"] / 1e9  # valor en mil millones
+    texto = [
+        "La pérdida anual esperada es aproximadamente ",
+        html.B(f"{mean_loss_b:.0f} mil millones"),
+        " de colones. El percentil 95 (escenario de 1 en 20 años) es alrededor de ",
+        html.B(f"{perc95_b:.0f} mil millones"),
+        ", y el percentil 99 (1 en 100 años) cerca de ",
+        html.B(f"{perc99_b:.0f} mil millones"),
+        " de colones (≈",
+        f"{estado['p99'] / 1e12:.2f}",
+        " billones). ",
+        html.Span(
+            f"Modelo ajustado con {estado['n_anos']} años con pérdidas; "
+            f"{estado['n']:,} de {estado['n_sims']:,} simulaciones"
+            + (
+                "."
+                if estado["terminado"]
+                else " (la estimación se actualiza mientras avanza)."
+            ),
+            style={"color": "gray"},
+        ),
+    ]
+    return fig_mc, texto
+
+
 external_stylesheets = [dbc.themes.FLATLY]
 app = dash.Dash(__name__, external_stylesheets=external_stylesheets)
 app.title = "Dashboard Pérdidas CR"
-all_provinces = sorted(df["provincia"].unique())
-all_categories = sorted(df["categoria"].unique())
-all_years = sorted(df["ano"].unique())
-all_sectors = sorted(df["sector"].unique())
+server = app.server
+galeria.registrar_rutas(server)
+# Histogramas de latencia de los callbacks en /metricas (solo desde localhost);
+# con GRUPO2_TRAZA=<archivo> cada callback queda además como tramo (src/traza.py)
+registrar_metricas(server)
+all_provinces = filtros["provincias"]
+all_categories = filtros["categorias"]
+all_years = filtros["anos"]
+all_sectors = filtros["sectores"]
 
 navbar = dbc.Navbar(
     dbc.Container(
@@ -114,12 +148,25 @@ navbar = dbc.Navbar(
             html.A(
                 dbc.Row(
                     [
-                        dbc.Col(html.Img(src=app.get_asset_url("ucr_logo.png"), height="45px")),
+                        dbc.Col(
+                            html.Img(
+                                src=app.get_asset_url("ucr_logo.png"), height="45px"
+                            )
+                        ),
                         dbc.Col(
                             html.Div(
                                 [
-                                    html.Div("Universidad de Costa Rica", style={"fontWeight": "bold", "fontSize": "18px"}),
-                                    html.Div("Proyecto Estadística · Grupo 2", style={"fontSize": "13px"}),
+                                    html.Div(
+                                        "Universidad de Costa Rica",
+                                        style={
+                                            "fontWeight": "bold",
+                                            "fontSize": "18px",
+                                        },
+                                    ),
+                                    html.Div(
+                                        "Proyecto Estadística · Grupo 2",
+                                        style={"fontSize": "13px"},
+                                    ),
                                 ]
                             ),
                             className="ms-2",
@@ -140,25 +187,21 @@ navbar = dbc.Navbar(
 )
 app.layout = html.Div(
     [
-        navbar, 
-
+        navbar,
         dbc.Container(
             [
                 html.H1(
                     "Dependencia espacial y severidad extrema de pérdidas económicas por desastres naturales en Costa Rica",
-                    className="mt-4 mb-2"
+                    className="mt-4 mb-2",
                 ),
-
                 html.P(
                     "Este tablero interactivo presenta información histórica sobre las pérdidas económicas causadas por desastres naturales en Costa Rica.",
-                    className="text-muted"
+                    className="text-muted",
                 ),
-
                 dbc.Card(
                     dbc.CardBody(
                         [
                             html.H4("Filtros", className="card-title"),
-
                             html.Br(),
                             html.Label("Años:", className="fw-bold"),
                             dcc.RangeSlider(
@@ -169,18 +212,21 @@ app.layout = html.Div(
                                 marks={int(y): str(int(y)) for y in all_years},
                                 step=None,
                             ),
-
                             html.Br(),
-
                             html.Div(
                                 [
                                     # provincias
                                     html.Div(
                                         [
-                                            html.Label("Provincias:", className="fw-bold"),
+                                            html.Label(
+                                                "Provincias:", className="fw-bold"
+                                            ),
                                             dcc.Dropdown(
                                                 id="prov-filter",
-                                                options=[{"label": p, "value": p} for p in all_provinces],
+                                                options=[
+                                                    {"label": p, "value": p}
+                                                    for p in all_provinces
+                                                ],
                                                 value=all_provinces,
                                                 multi=True,
                                             ),
@@ -190,10 +236,15 @@ app.layout = html.Div(
                                     # categorias
                                     html.Div(
                                         [
-                                            html.Label("Categorías:", className="fw-bold"),
+                                            html.Label(
+                                                "Categorías:", className="fw-bold"
+                                            ),
                                             dcc.Dropdown(
                                                 id="cat-filter",
-                                                options=[{"label": c, "value": c} for c in all_categories],
+                                                options=[
+                                                    {"label": c, "value": c}
+                                                    for c in all_categories
+                                                ],
                                                 value=all_categories,
                                                 multi=True,
                                             ),
@@ -203,10 +254,16 @@ app.layout = html.Div(
                                     # sector
                                     html.Div(
                                         [
-                                            html.Label("Tipo de daño (sector):", className="fw-bold"),
+                                            html.Label(
+                                                "Tipo de daño (sector):",
+                                                className="fw-bold",
+                                            ),
                                             dcc.Dropdown(
                                                 id="sector-filter",
-                                                options=[{"label": s, "value": s} for s in all_sectors],
+                                                options=[
+                                                    {"label": s, "value": s}
+                                                    for s in all_sectors
+                                                ],
                                                 value=all_sectors,
                                                 multi=True,
                                             ),
@@ -223,204 +280,216 @@ app.layout = html.Div(
                 dbc.Card(
                     dbc.CardBody(
                         dcc.Tabs(
-                            [
-                dcc.Tab(
-                    label="Mapa Interactivo",
-                    children=[
-                        html.H3("Pérdidas Totales por Provincia"),
-                        html.P(
-                            "Mapa de Costa Rica que muestra las pérdidas económicas totales acumuladas por provincia en el período seleccionado. El color más oscuro indica mayores pérdidas. Pase el cursor sobre una provincia para ver el monto exacto."
-                        ),
-                        html.Div(
-                            [
-                                dcc.Graph(
-                                    id="map-graph",
-                                    style={
-                                        "flex": "1 1 60%",
-                                        "minWidth": "300px",
-                                        "height": "450px",
-                                    },
+                            id="tabs",
+                            value="mapa",
+                            children=[
+                                dcc.Tab(
+                                    label="Mapa Interactivo",
+                                    value="mapa",
+                                    children=[
+                                        html.H3("Pérdidas Totales por Provincia"),
+                                        html.P(
+                                            "Mapa de Costa Rica que muestra las pérdidas económicas totales acumuladas por provincia en el período seleccionado. El color más oscuro indica mayores pérdidas. Pase el cursor sobre una provincia para ver el monto exacto."
+                                        ),
+                                        html.Div(
+                                            [
+                                                dcc.Graph(
+                                                    id="map-graph",
+                                                    style={
+                                                        "flex": "1 1 60%",
+                                                        "minWidth": "300px",
+                                                        "height": "450px",
+                                                    },
+                                                ),
+                                                dcc.Graph(
+                                                    id="freq-graph",
+                                                    style={
+                                                        "flex": "1 1 35%",
+                                                        "minWidth": "300px",
+                                                        "height": "450px",
+                                                    },
+                                                ),
+                                            ],
+                                            style={
+                                                "display": "flex",
+                                                "flexWrap": "wrap",
+                                                "justifyContent": "space-around",
+                                            },
+                                        ),
+                                    ],
                                 ),
-                                dcc.Graph(
-                                    id="freq-graph",
-                                    style={
-                                        "flex": "1 1 35%",
-                                        "minWidth": "300px",
-                                        "height": "450px",
-                                    },
+                                dcc.Tab(
+                                    label="Pérdidas por Año",
+                                    value="anual",
+                                    children=[
+                                        html.H3("Tendencia de Pérdidas por Año"),
+                                        html.P(
+                                            "Gráfico de barras de las pérdidas totales por año. Permite observar la tendencia temporal y detectar años con desastres particularmente costosos. También se incluye una línea (eje derecho) que muestra el número de eventos ocurridos cada año para visualizar la frecuencia de desastres."
+                                        ),
+                                        dcc.Graph(id="year-graph"),
+                                    ],
                                 ),
-                            ],
-                            style={
-                                "display": "flex",
-                                "flexWrap": "wrap",
-                                "justifyContent": "space-around",
-                            },
-                        ),
-                    ],
-                ),
-                dcc.Tab(
-                    label="Pérdidas por Año",
-                    children=[
-                        html.H3("Tendencia de Pérdidas por Año"),
-                        html.P(
-                            "Gráfico de barras de las pérdidas totales por año. Permite observar la tendencia temporal y detectar años con desastres particularmente costosos. También se incluye una línea (eje derecho) que muestra el número de eventos ocurridos cada año para visualizar la frecuencia de desastres."
-                        ),
-                        dcc.Graph(id="year-graph"),
-                    ],
-                ),
-                dcc.Tab(
-                    label="Pérdidas por Tipología",
-                    children=[
-                        html.H3("Pérdidas por Categoría de Daño"),
-                        html.P(
-                            "Pérdidas económicas totales acumuladas según la categoría de daño o tipología (Infraestructura, Social, Hídrico, Productivo u Otros). Este gráfico permite identificar qué tipos de daños han generado las mayores pérdidas en el período seleccionado."
-                        ),
-                        dcc.Graph(id="cat-graph"),
-                    ],
-                ),
-            
-                dcc.Tab(
-                    label="Inferencia",
-                    children=[
-                        html.H3("Resultados Inferenciales"),
-                        html.P(
-                            [
-                                "Mediante pruebas estadísticas se encontró que existen diferencias significativas en las pérdidas según la categoría de daño. Por ejemplo, las pérdidas en la categoría ",
-                                html.B("Infraestructura"),
-                                " tienden a ser mayores en promedio que en otras categorías, mientras que ",
-                                html.B("Social"),
-                                " presenta montos medios más bajos. También se observaron diferencias en la variabilidad: ciertas categorías muestran una dispersión de pérdidas más amplia (eventos muy extremos ocasionales).",
-                            ]
-                        ),
-                        html.P(
-                            [
-                                "El análisis de valores extremos (EVT) reveló que la distribución de pérdidas tiene ",
-                                html.B("cola pesada"),
-                                ". Esto significa que, aunque la mayoría de eventos tienen pérdidas moderadas, existe una probabilidad no despreciable de pérdidas extremadamente altas. Un caso ilustrativo es un evento en ",
-                                html.B("2009 (Alajuela)"),
-                                " con pérdidas ~2×10^11 colones, muy por encima del resto. Ajustando una distribución Pareto a los datos de cola, se estimó un parámetro de forma (~0.6) mayor que 0, lo que confirma la presencia de colas gruesas en la distribución de pérdidas.",
-                            ]
-                        ),
-                        html.P(
-                            "La siguiente gráfica muestra la fracción de eventos que exceden cierto monto de pérdida, en escala log-log. La porción aproximadamente lineal en el extremo derecho sugiere un comportamiento tipo Pareto en la cola de la distribución de pérdidas (es decir, una disminución lenta de la probabilidad para eventos de gran magnitud)."
-                        ),
-                        dcc.Graph(figure=fig_tail, id="tail-graph"),
-                    ],
-                ),
-                dcc.Tab(
-                    label="Modelos (simulación Monte Carlo)",
-                    children=[
-                        html.H3("Simulación Monte Carlo de Pérdidas Anuales"),
-                        html.P(
-                            [
-                                "Utilizando los datos históricos agregados por año, se calibró un modelo probabilístico para las pérdidas anuales totales y se realizaron simulaciones Monte Carlo para estimar escenarios futuros de pérdidas. ",
-                                html.B("Nota:"),
-                                " Esta simulación se basa en el conjunto completo de datos históricos (no se filtra por la selección del usuario).",
-                            ]
-                        ),
-                        html.P(
-                            "El histograma a continuación muestra la distribución simulada de las pérdidas anuales. La línea roja marca el percentil 95, es decir, un nivel de pérdidas que se alcanzaría o superaría aproximadamente 1 vez cada 20 años según el modelo."
-                        ),
-                        dcc.Graph(figure=fig_mc, id="mc-graph"),
-                        html.P(
-                            [
-                                "La pérdida anual esperada es aproximadamente ",
-                                html.B(f"{mean_loss_b:.0f} mil millones"),
-                                " de colones. El percentil 95 (escenario de 1 en 20 años) es alrededor de ",
-                                html.B(f"{perc95_b:.0f} mil millones"),
-                                ", y el percentil 99 (1 en 100 años) cerca de ",
-                                html.B(f"{perc99_b:.0f} mil millones"),
-                                " de colones (≈",
-                                f"{perc99 / 1e12:.2f}",
-                                " billones).",
-                            ]
-                        ),
-                    ],
-                ),
-                dcc.Tab(
-                    label="Cópulas",
-                    children=[
-                        html.H3("Dependencia entre Provincias (Análisis con Cópulas)"),
-                        html.P(
-                            "Se evaluó cómo las pérdidas por desastres se distribuyen simultáneamente entre provincias, para entender si ocurren eventos que afectan a múltiples regiones a la vez. La matriz de correlación presentada a continuación resume la relación entre las pérdidas anuales de cada par de provincias."
-                        ),
-                        html.P(
-                            [
-                                "Los colores ",
-                                html.B("rojizos"),
-                                " indican correlaciones positivas altas (pérdidas elevadas que suelen ocurrir juntas en esas provincias), mientras que los ",
-                                html.B("azulados"),
-                                " indican correlaciones negativas o bajas (cuando una provincia sufre pérdidas altas, la otra tiende a no sufrirlas simultáneamente). Se destacan, por ejemplo, pares con alta dependencia: ",
-                                html.B("San José-Puntarenas"),
-                                " y ",
-                                html.B("Heredia-Limón"),
-                                ", lo que sugiere eventos climáticos que impactan a ambas provincias a la vez.",
-                            ]
-                        ),
-                        dcc.Graph(figure=fig_copula, id="copula-graph"),
-                        html.P(
-                            [
-                                "Para modelar este tipo de riesgo multivariante, se utilizaron ",
-                                html.B("cópulas"),
-                                " (e.g., cópula t-Student) que permiten simular escenarios de pérdidas conjuntas coherentes con las dependencias observadas, mejorando la estimación de riesgos extremos simultáneos en múltiples regiones.",
-                            ]
-                        ),
-                    ],
-                ),
-                dcc.Tab(
-                    label="Figuras EVT / Colas",
-                    children=[
-                        html.H3("Figuras pre-generadas (colas, umbrales, histogramas)"),
-                        html.P(
-                            "Seleccione el tipo de figura y el detalle (provincia, categoría o total) para visualizar las gráficas generadas en el análisis de colas y umbrales."
-                        ),
-                        html.Div(
-                            [
-                                html.Label("Tipo de figura:"),
-                                dcc.Dropdown(
-                                    id="fig-tipo",
-                                    options=[
-                                        {"label": t.capitalize(), "value": t}
-                                        for t in all_tipos_fig
+                                dcc.Tab(
+                                    label="Pérdidas por Tipología",
+                                    value="tipologia",
+                                    children=[
+                                        html.H3("Pérdidas por Categoría de Daño"),
+                                        html.P(
+                                            "Pérdidas económicas totales acumuladas según la categoría de daño o tipología (Infraestructura, Social, Hídrico, Productivo u Otros). Este gráfico permite identificar qué tipos de daños han generado las mayores pérdidas en el período seleccionado."
+                                        ),
+                                        dcc.Graph(id="cat-graph"),
+                                    ],
+                                ),
+                                dcc.Tab(
+                                    label="Inferencia",
+                                    value="inferencia",
+                                    children=[
+                                        html.H3("Resultados Inferenciales"),
+                                        html.P(
+                                            [
+                                                "Mediante pruebas estadísticas se encontró que existen diferencias significativas en las pérdidas según la categoría de daño. Por ejemplo, las pérdidas en la categoría ",
+                                                html.B("Infraestructura"),
+                                                " tienden a ser mayores en promedio que en otras categorías, mientras que ",
+                                                html.B("Social"),
+                                                " presenta montos medios más bajos. También se observaron diferencias en la variabilidad: ciertas categorías muestran una dispersión de pérdidas más amplia (eventos muy extremos ocasionales).",
+                                            ]
+                                        ),
+                                        html.P(
+                                            [
+                                                "El análisis de valores extremos (EVT) reveló que la distribución de pérdidas tiene ",
+                                                html.B("cola pesada"),
+                                                ". Esto significa que, aunque la mayoría de eventos tienen pérdidas moderadas, existe una probabilidad no despreciable de pérdidas extremadamente altas. Un caso ilustrativo es un evento en ",
+                                                html.B("2009 (Alajuela)"),
+                                                " con pérdidas ~2×10^11 colones, muy por encima del resto. Ajustando una distribución Pareto a los datos de cola, se estimó un parámetro de forma (~0.6) mayor que 0, lo que confirma la presencia de colas gruesas en la distribución de pérdidas.",
+                                            ]
+                                        ),
+                                        html.P(
+                                            "La siguiente gráfica muestra la fracción de eventos que exceden cierto monto de pérdida, en escala log-log. La porción aproximadamente lineal en el extremo derecho sugiere un comportamiento tipo Pareto en la cola de la distribución de pérdidas (es decir, una disminución lenta de la probabilidad para eventos de gran magnitud)."
+                                        ),
+                                        dcc.Graph(id="tail-graph"),
+                                    ],
+                                ),
+                                dcc.Tab(
+                                    label="Modelos (simulación Monte Carlo)",
+                                    value="montecarlo",
+                                    children=[
+                                        html.H3(
+                                            "Simulación Monte Carlo de Pérdidas Anuales"
+                                        ),
+                                        html.P(
+                                            [
+                                                "Utilizando los datos históricos agregados por año, se calibró un modelo probabilístico para las pérdidas anuales totales y se realizaron simulaciones Monte Carlo para estimar escenarios futuros de pérdidas. ",
+                                                html.B("Nota:"),
+                                                " El modelo se ajusta con las pérdidas de los años, provincias, categorías y sectores seleccionados en los filtros.",
+                                            ]
+                                        ),
+                                        html.P(
+                                            "El histograma a continuación muestra la distribución simulada de las pérdidas anuales. La línea roja marca el percentil 95, es decir, un nivel de pérdidas que se alcanzaría o superaría aproximadamente 1 vez cada 20 años según el modelo."
+                                        ),
+                                        dcc.Graph(id="mc-graph"),
+                                        html.P(id="mc-texto"),
+                                        # Consulta el avance de la simulación en curso
+                                        dcc.Interval(
+                                            id="mc-intervalo",
+                                            interval=300,
+                                            disabled=True,
+                                        ),
                                     ],
-                                    value=all_tipos_fig[0] if all_tipos_fig else None,
-                                    clearable=False,
-                                    placeholder="Seleccione tipo de figura",
                                 ),
-                                html.Br(),
-                                html.Label("Detalle (provincia / total / categoría):"),
-                                dcc.Dropdown(
-                                    id="fig-detalle",
-                                    options=[],  
-                                    value=None,
-                                    placeholder="Seleccione qué quiere ver ",
+                                dcc.Tab(
+                                    label="Cópulas",
+                                    value="copulas",
+                                    children=[
+                                        html.H3(
+                                            "Dependencia entre Provincias (Análisis con Cópulas)"
+                                        ),
+                                        html.P(
+                                            "Se evaluó cómo las pérdidas por desastres se distribuyen simultáneamente entre provincias, para entender si ocurren eventos que afectan a múltiples regiones a la vez. La matriz de correlación presentada a continuación resume la relación entre las pérdidas anuales de cada par de provincias."
+                                        ),
+                                        html.P(
+                                            [
+                                                "Los colores ",
+                                                html.B("rojizos"),
+                                                " indican correlaciones positivas altas (pérdidas elevadas que suelen ocurrir juntas en esas provincias), mientras que los ",
+                                                html.B("azulados"),
+                                                " indican correlaciones negativas o bajas (cuando una provincia sufre pérdidas altas, la otra tiende a no sufrirlas simultáneamente). Se destacan, por ejemplo, pares con alta dependencia: ",
+                                                html.B("San José-Puntarenas"),
+                                                " y ",
+                                                html.B("Heredia-Limón"),
+                                                ", lo que sugiere eventos climáticos que impactan a ambas provincias a la vez.",
+                                            ]
+                                        ),
+                                        dcc.Graph(id="copula-graph"),
+                                        html.P(
+                                            [
+                                                "Para modelar este tipo de riesgo multivariante, se utilizaron ",
+                                                html.B("cópulas"),
+                                                " (e.g., cópula t-Student) que permiten simular escenarios de pérdidas conjuntas coherentes con las dependencias observadas, mejorando la estimación de riesgos extremos simultáneos en múltiples regiones.",
+                                            ]
+                                        ),
+                                    ],
+                                ),
+                                dcc.Tab(
+                                    label="Figuras EVT / Colas",
+                                    value="figuras",
+                                    children=[
+                                        html.H3(
+                                            "Figuras pre-generadas (colas, umbrales, histogramas)"
+                                        ),
+                                        html.P(
+                                            "Seleccione el tipo de figura y el detalle (provincia, categoría o total) para visualizar las gráficas generadas en el análisis de colas y umbrales."
+                                        ),
+                                        html.Div(
+                                            [
+                                                html.Label("Tipo de figura:"),
+                                                dcc.Dropdown(
+                                                    id="fig-tipo",
+                                                    options=[],
+                                                    value=None,
+                                                    clearable=False,
+                                                    placeholder="Seleccione tipo de figura",
+                                                ),
+                                                html.Br(),
+                                                html.Label(
+                                                    "Detalle (provincia / total / categoría):"
+                                                ),
+                                                dcc.Dropdown(
+                                                    id="fig-detalle",
+                                                    options=[],
+                                                    value=None,
+                                                    placeholder="Seleccione qué quiere ver ",
+                                                ),
+                                            ],
+                                            style={
+                                                "background-color": "#F9F9F9",
+                                                "border": "1px solid #CCC",
+                                                "padding": "10px",
+                                                "border-radius": "5px",
+                                                "margin-bottom": "20px",
+                                                "maxWidth": "600px",
+                                            },
+                                        ),
+                                        html.Div(
+                                            id="fig-container",
+                                            style={
+                                                "textAlign": "center",
+                                                "marginTop": "20px",
+                                            },
+                                        ),
+                                    ],
                                 ),
                             ],
-                            style={
-                                "background-color": "#F9F9F9",
-                                "border": "1px solid #CCC",
-                                "padding": "10px",
-                                "border-radius": "5px",
-                                "margin-bottom": "20px",
-                                "maxWidth": "600px",
-                            },
-                        ),
-                        html.Div(
-                            id="fig-container",
-                            style={"textAlign": "center", "marginTop": "20px"},
-                        ),
-                    ],
-                ),
-            ]
                         )
                     ),
-                    className="shadow-sm"
+                    className="shadow-sm",
                 ),
-
                 html.Hr(),
                 html.Div(
                     [
-                        html.Div("Desarrollado por Grupo 2 – Estadística UCR", className="fw-bold"),
+                        html.Div(
+                            "Desarrollado por Grupo 2 – Estadística UCR",
+                            className="fw-bold",
+                        ),
                         html.Div(
                             "Autores: Jose Andrey Prado Rojas, Joseph Romero , Dixon Montero , Holmar Rivera.",
                             className="text-muted",
@@ -441,18 +510,15 @@ app.layout = html.Div(
 )
 
 
-
-
 color_map = {
     "INFRAESTRUCTURA": PRIMARY,
     "PRODUCTIVO": SECONDARY,
-    "SOCIAL": "#2980B9",  
-    "HÍDRICO": "#16A085", 
-    "OTROS": "#7F8C8D",    
+    "SOCIAL": "#2980B9",
+    "HÍDRICO": "#16A085",
+    "OTROS": "#7F8C8D",
 }
 
 
-
 @app.callback(
     [
         dash.dependencies.Output("map-graph", "figure"),
@@ -464,68 +530,111 @@ color_map = {
         dash.dependencies.Input("year-range", "value"),
         dash.dependencies.Input("prov-filter", "value"),
         dash.dependencies.Input("cat-filter", "value"),
-        dash.dependencies.Input("sector-filter", "value"), 
+        dash.dependencies.Input("sector-filter", "value"),
     ],
 )
-def update_graphs(year_range, selected_provs, selected_cats, selected_sectors): 
-
-    start_year, end_year = year_range
-    dff = df[
-        (df["ano"] >= start_year)
-        & (df["ano"] <= end_year)
-        & (df["provincia"].isin(selected_provs))
-        & (df["categoria"].isin(selected_cats))
-        & (df["sector"].isin(selected_sectors))   
-    ]
+@traza.trazado("callback.update_graphs")
+def update_graphs(year_range, selected_provs, selected_cats, selected_sectors):
+
+    with traza.tramo("cubo.consultar"):
+        agg = artefactos.cubo().consultar(
+            year_range, selected_provs, selected_cats, selected_sectors
+        )
+    with traza.tramo("valores_figuras"):
+        valores = valores_figuras(agg)
+
+    # La primera llamada (carga de la página) envía las figuras completas, con
+    # la geometría del mapa; después solo cambian valores, así que se envían
+    # parches con los datos de cada traza
+    if dash.callback_context.triggered_id is None:
+        with traza.tramo("construir_figuras"):
+            return construir_figuras(valores)
+    with traza.tramo("parches_figuras"):
+        return parches_figuras(valores)
 
-    if dff.empty:
-        fig_empty = go.Figure()
-        fig_empty.update_xaxes(showgrid=False, visible=False)
-        fig_empty.update_yaxes(showgrid=False, visible=False)
-        fig_empty.add_annotation(
-            text="No hay datos para la selección realizada",
-            xref="paper",
-            yref="paper",
-            showarrow=False,
-            font_size=14,
-            x=0.5,
-            y=0.5,
+
+def valores_figuras(agg):
+    """Datos que cambian con los filtros (listas para las trazas)."""
+    if agg is None:
+        vacio = {"x": [], "y": []}
+        return {
+            "mapa": {"locations": [], "z": []},
+            "perdidas_ano": vacio,
+            "eventos_ano": vacio,
+            "sector": {"x": [], "y": [], "colores": []},
+            "frecuencia": vacio,
+            "anotaciones": [ANOTACION_VACIA],
+        }
+    yearly = agg["por_ano"]
+    events_by_year = agg["eventos_por_ano"]
+    cat_sum = agg["por_sector"]
+    events_by_prov = agg["eventos_por_provincia"]
+    return {
+        "mapa": {
+            "locations": agg["por_provincia"]["provincia"].tolist(),
+            "z": agg["por_provincia"]["total"].tolist(),
+        },
+        "perdidas_ano": {"x": yearly["ano"].tolist(), "y": yearly["total"].tolist()},
+        "eventos_ano": {
+            "x": events_by_year.index.tolist(),
+            "y": events_by_year.values.tolist(),
+        },
+        "sector": {
+            "x": cat_sum["sector"].tolist(),
+            "y": cat_sum["total"].tolist(),
+            "colores": [color_map.get(s, PRIMARY) for s in cat_sum["sector"]],
+        },
+        "frecuencia": {
+            "x": events_by_prov["count"].tolist(),
+            "y": events_by_prov["provincia"].tolist(),
+        },
+        "anotaciones": [],
+    }
+
+
+ANOTACION_VACIA = dict(
+    text="No hay datos para la selección realizada",
+    xref="paper",
+    yref="paper",
+    showarrow=False,
+    font_size=14,
+    x=0.5,
+    y=0.5,
+)
+
+
+def construir_figuras(v):
+    # Cada figura tiene siempre las mismas trazas para que los parches apliquen
+    fig_map = go.Figure(
+        go.Choropleth(
+            geojson=cargar_geojson(),
+            featureidkey="properties.name",
+            locations=v["mapa"]["locations"],
+            z=v["mapa"]["z"],
+            coloraxis="coloraxis",
+            hovertemplate="Provincia=%{location}<br>Pérdidas (colones)=%{z}<extra></extra>",
         )
-        return fig_empty, fig_empty, fig_empty, fig_empty
-
-    prov_data = dff.groupby("provincia", as_index=False)["total"].sum()
-    fig_map = px.choropleth(
-        prov_data,
-        geojson=geojson,
-        locations="provincia",
-        featureidkey="properties.name",
-        color="total",
-        color_continuous_scale="Blues",
-        labels={"provincia": "Provincia", "total": "Pérdidas (colones)"},
     )
     fig_map.update_geos(fitbounds="locations", visible=False)
+    fig_map.update_layout(coloraxis=dict(colorscale="Blues"))
     fig_map.update_coloraxes(colorbar_title="Colones", colorbar_tickformat=",.0f")
-    fig_map.update_layout(margin={"r": 0, "t": 0, "l": 0, "b": 0})
-    yearly = dff.groupby("ano", as_index=False)["total"].sum().sort_values("ano")
-    unique_events = dff.drop_duplicates(
-        subset=["ano", "provincia", "canton", "latitud", "longitud"]
-    )
-    events_by_year = (
-        unique_events.groupby("ano").size().reindex(yearly["ano"], fill_value=0)
+    fig_map.update_layout(
+        margin={"r": 0, "t": 0, "l": 0, "b": 0}, annotations=v["anotaciones"]
     )
+
     fig_year = go.Figure()
     fig_year.add_trace(
         go.Bar(
-            x=yearly["ano"],
-            y=yearly["total"],
+            x=v["perdidas_ano"]["x"],
+            y=v["perdidas_ano"]["y"],
             name="Pérdidas (colones)",
             marker_color=PRIMARY,
         )
     )
     fig_year.add_trace(
         go.Scatter(
-            x=events_by_year.index,
-            y=events_by_year.values,
+            x=v["eventos_ano"]["x"],
+            y=v["eventos_ano"]["y"],
             mode="lines+markers",
             name="Número de eventos",
             marker_color=SECONDARY,
@@ -538,84 +647,180 @@ def update_graphs(year_range, selected_provs, selected_cats, selected_sectors):
         yaxis=dict(title="Pérdidas (colones)", tickformat=",.0f"),
         yaxis2=dict(title="Número de eventos", overlaying="y", side="right"),
         legend=dict(y=1.15, x=0.01),
+        annotations=v["anotaciones"],
     )
-    cat_sum = (
-        dff.groupby("sector", as_index=False)["total"]
-        .sum()
-        .sort_values("total", ascending=False)
-    )
-    fig_cat = px.bar(
-        cat_sum,
-        x="sector",
-        y="total",
-        labels={"sector": "Tipo de daño (sector)", "total": "Pérdidas (colones)"},
-        color="sector",
-        color_discrete_map=color_map,
+    fig_cat = go.Figure(
+        go.Bar(
+            x=v["sector"]["x"],
+            y=v["sector"]["y"],
+            marker_color=v["sector"]["colores"],
+            hovertemplate="Tipo de daño (sector)=%{x}<br>Pérdidas (colones)=%{y}<extra></extra>",
+        )
     )
-    fig_cat.update_layout(showlegend=False)
+    fig_cat.update_layout(showlegend=False, annotations=v["anotaciones"])
+    fig_cat.update_xaxes(title_text="Tipo de daño (sector)")
     fig_cat.update_yaxes(title_text="Pérdidas (colones)", tickformat=",.0f")
-    events_by_prov = unique_events["provincia"].value_counts().reset_index()
-    events_by_prov.columns = ["provincia", "count"]
-    events_by_prov = events_by_prov.sort_values("count", ascending=False)
-    fig_freq = px.bar(
-        events_by_prov,
-        x="count",
-        y="provincia",
-        orientation="h",
-        labels={"count": "Número de eventos", "provincia": "Provincia"},
+    fig_freq = go.Figure(
+        go.Bar(
+            x=v["frecuencia"]["x"],
+            y=v["frecuencia"]["y"],
+            orientation="h",
+            hovertemplate="Número de eventos=%{x}<br>Provincia=%{y}<extra></extra>",
+        )
+    )
+    fig_freq.update_xaxes(title_text="Número de eventos")
+    fig_freq.update_yaxes(title_text="Provincia")
+    fig_freq.update_layout(
+        margin={"l": 100, "r": 30, "b": 30, "t": 30}, annotations=v["anotaciones"]
     )
-    fig_freq.update_layout(margin={"l": 100, "r": 30, "b": 30, "t": 30})
     return fig_map, fig_year, fig_cat, fig_freq
-from dash.dependencies import Input, Output, State
+
+
+def parches_figuras(v):
+    p_map = Patch()
+    p_map["data"][0]["locations"] = v["mapa"]["locations"]
+    p_map["data"][0]["z"] = v["mapa"]["z"]
+    p_map["layout"]["annotations"] = v["anotaciones"]
+
+    p_year = Patch()
+    p_year["data"][0]["x"] = v["perdidas_ano"]["x"]
+    p_year["data"][0]["y"] = v["perdidas_ano"]["y"]
+    p_year["data"][1]["x"] = v["eventos_ano"]["x"]
+    p_year["data"][1]["y"] = v["eventos_ano"]["y"]
+    p_year["layout"]["annotations"] = v["anotaciones"]
+
+    p_cat = Patch()
+    p_cat["data"][0]["x"] = v["sector"]["x"]
+    p_cat["data"][0]["y"] = v["sector"]["y"]
+    p_cat["data"][0]["marker"]["color"] = v["sector"]["colores"]
+    p_cat["layout"]["annotations"] = v["anotaciones"]
+
+    p_freq = Patch()
+    p_freq["data"][0]["x"] = v["frecuencia"]["x"]
+    p_freq["data"][0]["y"] = v["frecuencia"]["y"]
+    p_freq["layout"]["annotations"] = v["anotaciones"]
+    return p_map, p_year, p_cat, p_freq
+
+
+# Pestañas estáticas: se llenan la primera vez que se abren
+@app.callback(Output("tail-graph", "figure"), Input("tabs", "value"))
+@traza.trazado("callback.cargar_tab_inferencia")
+def cargar_tab_inferencia(tab):
+    if tab != "inferencia":
+        return dash.no_update
+    return figura_cola()
+
+
+@app.callback(
+    [
+        Output("mc-graph", "figure"),
+        Output("mc-texto", "children"),
+        Output("mc-intervalo", "disabled"),
+    ],
+    [
+        Input("tabs", "value"),
+        Input("year-range", "value"),
+        Input("prov-filter", "value"),
+        Input("cat-filter", "value"),
+        Input("sector-filter", "value"),
+        Input("mc-intervalo", "n_intervals"),
+    ],
+)
+@traza.trazado("callback.cargar_tab_montecarlo")
+def cargar_tab_montecarlo(
+    tab, year_range, selected_provs, selected_cats, selected_sectors, _
+):
+    # Solo se simula con la pestaña abierta; cambiar los filtros pone en cola
+    # la selección nueva y el intervalo sigue el avance hasta que termina
+    if tab != "montecarlo":
+        return dash.no_update, dash.no_update, True
+    estado = montecarlo.solicitar(
+        year_range, selected_provs, selected_cats, selected_sectors
+    )
+    fig_mc, texto = figura_mc(estado)
+    return fig_mc, texto, estado["terminado"]
+
+
+@app.callback(Output("copula-graph", "figure"), Input("tabs", "value"))
+@traza.trazado("callback.cargar_tab_copulas")
+def cargar_tab_copulas(tab):
+    if tab != "copulas":
+        return dash.no_update
+    return figura_copula()
+
+
+@app.callback(
+    [Output("fig-tipo", "options"), Output("fig-tipo", "value")],
+    Input("tabs", "value"),
+    State("fig-tipo", "options"),
+)
+@traza.trazado("callback.cargar_tab_figuras")
+def cargar_tab_figuras(tab, opciones_actuales):
+    # Solo la primera vez, para no perder la selección al volver a la pestaña
+    if tab != "figuras" or opciones_actuales:
+        return dash.no_update, dash.no_update
+    all_tipos_fig = galeria.tipos()
+    opciones = [{"label": t.capitalize(), "value": t} for t in all_tipos_fig]
+    return opciones, all_tipos_fig[0] if all_tipos_fig else None
+
+
 @app.callback(
-    [Output("fig-detalle", "options"),
-     Output("fig-detalle", "value")],
+    [Output("fig-detalle", "options"), Output("fig-detalle", "value")],
     Input("fig-tipo", "value"),
 )
+@traza.trazado("callback.actualizar_detalle_figuras")
 def actualizar_detalle_figuras(tipo_seleccionado):
-    if not tipo_seleccionado or fig_df.empty:
+    if not tipo_seleccionado:
         return [], None
-    sub = fig_df[fig_df["tipo"] == tipo_seleccionado]
-    opciones = []
-    for _, row in sub.iterrows():
-        if row["detalle"]:
-            etiqueta = row["detalle"].replace("_", " ").title()
-        else:
-            etiqueta = row["file"]
-        opciones.append({"label": etiqueta, "value": row["file"]})
+    opciones = galeria.opciones(tipo_seleccionado)
     valor_defecto = opciones[0]["value"] if opciones else None
     return opciones, valor_defecto
 
+
 @app.callback(
     Output("fig-container", "children"),
-    [Input("fig-detalle", "value"),
-     Input("fig-tipo", "value")],
+    [Input("fig-detalle", "value"), Input("fig-tipo", "value")],
 )
-def mostrar_figura_archivo(archivo_seleccionado, tipo_seleccionado):
-    if not archivo_seleccionado:
+@traza.trazado("callback.mostrar_figura_archivo")
+def mostrar_figura_archivo(id_figura, tipo_seleccionado):
+    if not id_figura:
         return html.P(
             "Seleccione un tipo de figura y un detalle para visualizar la imagen.",
             style={"fontStyle": "italic"},
         )
-    img_src = app.get_asset_url(f"figuras/{archivo_seleccionado}")
-    titulo = f"Figura: {tipo_seleccionado} – {archivo_seleccionado}"
+    titulo = f"Figura: {tipo_seleccionado} – {id_figura}"
 
+    # Primero la miniatura; la imagen completa solo si se abre el enlace
     return html.Div(
         [
-            html.Img(
-                src=img_src,
-                style={
-                    "maxWidth": "100%",
-                    "height": "auto",
-                    "border": "1px solid #CCC",
-                    "borderRadius": "5px",
-                },
+            html.A(
+                html.Img(
+                    src=galeria.url(id_figura, "miniatura"),
+                    style={
+                        "maxWidth": "100%",
+                        "height": "auto",
+                        "border": "1px solid #CCC",
+                        "borderRadius": "5px",
+                    },
+                ),
+                href=galeria.url(id_figura, "completa"),
+                target="_blank",
             ),
             html.P(
-                titulo,
+                [
+                    titulo,
+                    " · ",
+                    html.A(
+                        "Ver imagen completa",
+                        href=galeria.url(id_figura, "completa"),
+                        target="_blank",
+                    ),
+                ],
                 style={"marginTop": "10px", "fontStyle": "italic", "color": "gray"},
             ),
         ]
     )
+
+
 if __name__ == "__main__":
     app.run(debug=False)
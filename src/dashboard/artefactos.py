@@ -0,0 +1,180 @@
+# Artefactos precalculados del dashboard
+#
+# Todo lo que las pestañas estáticas necesitan (opciones de filtros, cubo de
+# agregados, correlación entre provincias y curva de excedencia) se calcula
+# fuera de línea y se guarda en un .npz dentro de RUTA_CACHE_DASHBOARD. La
+# simulación Monte Carlo depende de los filtros y se hace en la app
+# (src/dashboard/montecarlo.py). El nombre del archivo lleva la versión de los
+# artefactos y un hash de data/clean/datos.npz, así que un cambio en los datos o
+# en VERSION genera una caché nueva. La app abre el .npz al arrancar (sin
+# leerlo) y cada arreglo se carga la primera vez que se pide.
+#
+# Construir la caché fuera de línea:
+#   python src/dashboard/artefactos.py
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import threading
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+
+if __name__ == "__main__":
+    sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from src.config import RUTA_CACHE_DASHBOARD, RUTA_DATOS, RUTA_DATOS_CRUDOS
+from src.dashboard.cubo import CuboAgregado
+from src.data.limpieza_datos import cargar_datos, ingerir
+
+# Subir cuando cambie la forma de calcular algún artefacto
+VERSION = 2
+
+
+def hash_datos(ruta: Path | str = RUTA_DATOS) -> str:
+    h = hashlib.sha1()
+    with open(ruta, "rb") as f:
+        for bloque in iter(lambda: f.read(1 << 20), b""):
+            h.update(bloque)
+    return h.hexdigest()[:16]
+
+
+def ruta_cache(
+    ruta_datos: Path | str = RUTA_DATOS, carpeta: Path | str = RUTA_CACHE_DASHBOARD
+) -> Path:
+    return Path(carpeta) / f"v{VERSION}-{hash_datos(ruta_datos)}.npz"
+
+
+# ============================================================
+# Construcción (fuera de línea)
+# ============================================================
+
+
+def construir_artefactos(ruta_datos: Path | str = RUTA_DATOS) -> Dict[str, np.ndarray]:
+    """Calcula todos los artefactos a partir de los datos limpios (en colones)."""
+    df = cargar_datos("colones", ruta_datos)
+    df = df[df["total"] > 0]
+    arr: Dict[str, np.ndarray] = {}
+
+    # Cubo de agregados para update_graphs
+    for k, v in CuboAgregado(df).a_arreglos().items():
+        arr[f"cubo::{k}"] = v
+
+    # Correlación de pérdidas anuales entre provincias
+    prov_year = (
+        df.groupby(["ano", "provincia"], observed=True)["total"].sum().reset_index()
+    )
+    prov_pivot = prov_year.pivot(
+        index="ano", columns="provincia", values="total"
+    ).fillna(0)
+    prov_corr = prov_pivot.corr()
+    arr["correlacion::matriz"] = prov_corr.to_numpy()
+    arr["correlacion::provincias"] = np.array(prov_corr.columns, dtype=str)
+
+    # Curva de excedencia: pérdidas ordenadas (P(X > x) se arma al cargar)
+    arr["excedencia::perdidas"] = np.sort(df["total"].to_numpy(dtype=float))
+    return arr
+
+
+def guardar_artefactos(arr: Dict[str, np.ndarray], ruta: Path | str) -> None:
+    ruta = Path(ruta)
+    ruta.parent.mkdir(parents=True, exist_ok=True)
+    # Escritura atómica para que otro worker no lea un archivo a medias
+    fd, tmp = tempfile.mkstemp(dir=ruta.parent, suffix=".npz")
+    os.close(fd)
+    try:
+        np.savez(tmp, __meta__=np.array(json.dumps({"version": VERSION})), **arr)
+        os.replace(tmp, ruta)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def asegurar_cache(
+    ruta_datos: Path | str = RUTA_DATOS, carpeta: Path | str = RUTA_CACHE_DASHBOARD
+) -> Path:
+    """Ruta de la caché vigente; la construye si no existe."""
+    # La clave es el hash de datos.npz: primero se regenera si cambió el libro
+    if Path(ruta_datos) == RUTA_DATOS and RUTA_DATOS_CRUDOS.exists():
+        ingerir(RUTA_DATOS_CRUDOS, ruta_datos)
+    ruta = ruta_cache(ruta_datos, carpeta)
+    if not ruta.exists():
+        guardar_artefactos(construir_artefactos(ruta_datos), ruta)
+    return ruta
+
+
+# ============================================================
+# Carga perezosa (dashboard)
+# ============================================================
+
+
+class ArtefactosDashboard:
+    """
+    Acceso perezoso a la caché. Abrir el .npz solo lee el índice del zip;
+    cada artefacto se lee la primera vez que se pide y queda en memoria.
+    """
+
+    def __init__(
+        self,
+        ruta_datos: Path | str = RUTA_DATOS,
+        carpeta: Path | str = RUTA_CACHE_DASHBOARD,
+    ):
+        self.ruta = asegurar_cache(ruta_datos, carpeta)
+        self._npz = np.load(self.ruta, allow_pickle=False)
+        # El zip comparte un solo descriptor; los callbacks pueden correr en hilos
+        self._lock = threading.Lock()
+
+    def _arreglo(self, clave: str) -> np.ndarray:
+        with self._lock:
+            return self._npz[clave]
+
+    def _leer(self, prefijo: str) -> Dict[str, np.ndarray]:
+        n = len(prefijo) + 2
+        return {
+            k[n:]: self._arreglo(k)
+            for k in self._npz.files
+            if k.startswith(prefijo + "::")
+        }
+
+    def filtros(self) -> Dict[str, list]:
+        """Valores de los filtros (sin construir el cubo)."""
+        return {
+            "anos": [int(v) for v in self._arreglo("cubo::anos")],
+            "provincias": [str(v) for v in self._arreglo("cubo::provincias")],
+            "categorias": [str(v) for v in self._arreglo("cubo::categorias")],
+            "sectores": [str(v) for v in self._arreglo("cubo::sectores")],
+        }
+
+    @lru_cache(maxsize=None)
+    def cubo(self) -> CuboAgregado:
+        return CuboAgregado.desde_arreglos(self._leer("cubo"))
+
+    @lru_cache(maxsize=None)
+    def correlacion(self) -> pd.DataFrame:
+        a = self._leer("correlacion")
+        provs = [str(v) for v in a["provincias"]]
+        return pd.DataFrame(
+            a["matriz"],
+            index=pd.Index(provs, name="provincia"),
+            columns=pd.Index(provs, name="provincia"),
+        )
+
+    @lru_cache(maxsize=None)
+    def excedencia(self):
+        losses = self._arreglo("excedencia::perdidas")
+        n = len(losses)
+        exceed_prob = (n - np.arange(n)) / n  # P(X > losses[i])
+        return losses, exceed_prob
+
+
+if __name__ == "__main__":
+    ruta = ruta_cache()
+    guardar_artefactos(construir_artefactos(), ruta)
+    print(f"Artefactos guardados en {ruta}")
@@ -0,0 +1,187 @@
+# Cubo de agregados para los filtros del dashboard
+#
+# Se construye una vez al iniciar la app: provincia, categoría, sector y año
+# se codifican como enteros y los totales quedan en un arreglo denso
+# (año x provincia x categoría x sector). Cada callback responde con
+# reducciones sobre ese arreglo, así que su costo no depende del número de
+# filas del histórico.
+
+from __future__ import annotations
+
+from typing import Dict, Iterable, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+# Un "evento" para los conteos es una fila única de estas columnas (igual
+# que el drop_duplicates que hacía update_graphs)
+CLAVE_EVENTO = ["ano", "provincia", "canton", "latitud", "longitud"]
+
+
+class CuboAgregado:
+    """
+    Agregados de pérdidas por (año, provincia, categoría, sector).
+
+    - total[y, p, c, s]: suma de `total`
+    - filas[y, p, c, s]: número de filas (para saber qué grupos existen)
+    - eventos[y, p, k]: eventos distintos cuyo conjunto de combinaciones
+      (categoría, sector) es el patrón k de `patrones` (k x C*S booleano)
+
+    Un evento cuenta bajo un filtro si alguna de sus combinaciones
+    (categoría, sector) está seleccionada, así que los conteos de eventos
+    distintos son exactos sin volver a las filas originales.
+    """
+
+    def __init__(self, df: pd.DataFrame, col_total: str = "total"):
+        self.anos = np.array(sorted(df["ano"].unique()))
+        self.provincias = sorted(df["provincia"].unique())
+        self.categorias = sorted(df["categoria"].unique())
+        self.sectores = sorted(df["sector"].unique())
+
+        y = np.searchsorted(self.anos, df["ano"].to_numpy())
+        p = pd.Categorical(df["provincia"], categories=self.provincias).codes
+        c = pd.Categorical(df["categoria"], categories=self.categorias).codes
+        s = pd.Categorical(df["sector"], categories=self.sectores).codes
+        forma = (
+            len(self.anos),
+            len(self.provincias),
+            len(self.categorias),
+            len(self.sectores),
+        )
+        plano = np.ravel_multi_index((y, p, c, s), forma)
+        n_celdas = int(np.prod(forma))
+
+        totales = df[col_total].to_numpy(dtype=float)
+        self.total = np.bincount(plano, weights=totales, minlength=n_celdas).reshape(
+            forma
+        )
+        self.filas = np.bincount(plano, minlength=n_celdas).reshape(forma)
+
+        # Patrón de combinaciones (categoría, sector) de cada evento
+        n_cs = forma[2] * forma[3]
+        evento = (
+            df.groupby(CLAVE_EVENTO, dropna=False, sort=False, observed=True)
+            .ngroup()
+            .to_numpy()
+        )
+        n_eventos = int(evento.max()) + 1 if evento.size else 0
+        marcas = np.zeros((n_eventos, n_cs), dtype=bool)
+        marcas[evento, c * forma[3] + s] = True
+        self.patrones, patron_evento = np.unique(marcas, axis=0, return_inverse=True)
+        patron_evento = patron_evento.ravel()
+
+        y_ev = np.zeros(n_eventos, dtype=np.int64)
+        p_ev = np.zeros(n_eventos, dtype=np.int64)
+        y_ev[evento] = y
+        p_ev[evento] = p
+        forma_ev = (forma[0], forma[1], len(self.patrones))
+        plano_ev = np.ravel_multi_index((y_ev, p_ev, patron_evento), forma_ev)
+        self.eventos = np.bincount(plano_ev, minlength=int(np.prod(forma_ev))).reshape(
+            forma_ev
+        )
+
+    def a_arreglos(self) -> Dict[str, np.ndarray]:
+        """Arreglos del cubo (para guardarlo en la caché de artefactos)."""
+        return {
+            "anos": self.anos,
+            "provincias": np.array(self.provincias, dtype=str),
+            "categorias": np.array(self.categorias, dtype=str),
+            "sectores": np.array(self.sectores, dtype=str),
+            "total": self.total,
+            "filas": self.filas,
+            "patrones": self.patrones,
+            "eventos": self.eventos,
+        }
+
+    @classmethod
+    def desde_arreglos(cls, arr: Dict[str, np.ndarray]) -> "CuboAgregado":
+        cubo = cls.__new__(cls)
+        cubo.anos = np.asarray(arr["anos"])
+        cubo.provincias = [str(v) for v in arr["provincias"]]
+        cubo.categorias = [str(v) for v in arr["categorias"]]
+        cubo.sectores = [str(v) for v in arr["sectores"]]
+        for k in ("total", "filas", "patrones", "eventos"):
+            setattr(cubo, k, np.asarray(arr[k]))
+        return cubo
+
+    @staticmethod
+    def _mascara(vocabulario: Sequence, seleccion: Optional[Iterable]) -> np.ndarray:
+        sel = set(seleccion or [])
+        return np.array([v in sel for v in vocabulario], dtype=bool)
+
+    def consultar(
+        self,
+        year_range: Sequence[int],
+        provincias: Optional[Iterable[str]],
+        categorias: Optional[Iterable[str]],
+        sectores: Optional[Iterable[str]],
+    ) -> Optional[Dict[str, pd.DataFrame]]:
+        """
+        Agregados para la selección de los filtros, o None si no hay filas.
+
+        Devuelve las mismas tablas que calculaba update_graphs con groupby:
+        por_provincia, por_ano, eventos_por_ano, por_sector y
+        eventos_por_provincia.
+        """
+        inicio, fin = year_range
+        m_y = (self.anos >= inicio) & (self.anos <= fin)
+        m_p = self._mascara(self.provincias, provincias)
+        m_c = self._mascara(self.categorias, categorias)
+        m_s = self._mascara(self.sectores, sectores)
+
+        total = self.total[np.ix_(m_y, m_p, m_c, m_s)]
+        filas = self.filas[np.ix_(m_y, m_p, m_c, m_s)]
+        if filas.sum() == 0:
+            return None
+
+        anos = self.anos[m_y]
+        provs = np.array(self.provincias, dtype=object)[m_p]
+        secs = np.array(self.sectores, dtype=object)[m_s]
+
+        # Patrones de eventos con al menos una combinación seleccionada
+        sel_cs = np.outer(m_c, m_s).ravel()
+        activo = self.patrones[:, sel_cs].any(axis=1)
+        eventos = self.eventos[np.ix_(m_y, m_p, activo)].sum(axis=2)
+
+        filas_p = filas.sum(axis=(0, 2, 3)) > 0
+        por_provincia = pd.DataFrame(
+            {
+                "provincia": provs[filas_p],
+                "total": total.sum(axis=(0, 2, 3))[filas_p],
+            }
+        )
+
+        filas_y = filas.sum(axis=(1, 2, 3)) > 0
+        por_ano = pd.DataFrame(
+            {
+                "ano": anos[filas_y],
+                "total": total.sum(axis=(1, 2, 3))[filas_y],
+            }
+        )
+        eventos_por_ano = pd.Series(
+            eventos.sum(axis=1)[filas_y], index=pd.Index(anos[filas_y], name="ano")
+        )
+
+        filas_s = filas.sum(axis=(0, 1, 2)) > 0
+        por_sector = pd.DataFrame(
+            {
+                "sector": secs[filas_s],
+                "total": total.sum(axis=(0, 1, 2))[filas_s],
+            }
+        ).sort_values("total", ascending=False, kind="stable")
+
+        ev_p = eventos.sum(axis=0)
+        eventos_por_provincia = pd.DataFrame(
+            {
+                "provincia": provs[ev_p > 0],
+                "count": ev_p[ev_p > 0],
+            }
+        ).sort_values("count", ascending=False, kind="stable")
+
+        return {
+            "por_provincia": por_provincia,
+            "por_ano": por_ano,
+            "eventos_por_ano": eventos_por_ano,
+            "por_sector": por_sector,
+            "eventos_por_provincia": eventos_por_provincia,
+        }
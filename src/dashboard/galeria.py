@@ -0,0 +1,521 @@
+# Galería de figuras del dashboard
+#
+# Antes la pestaña de figuras recorría una copia de las imágenes dentro de
+# assets/ y enviaba cada PNG completo. Ahora un manifiesto JSON (construido
+# fuera de línea) indexa las figuras de res/figures y las que se pueden
+# dibujar a partir de las marginales del almacén aunque no exista el PNG.
+# La pestaña muestra primero una miniatura y la imagen completa se pide
+# aparte. Las miniaturas y las figuras dibujadas bajo demanda se guardan en
+# una caché en disco de tamaño acotado (se borran primero las menos usadas).
+# Las 12 figuras cuerpo_* de assets/figuras no son idénticas a las de
+# res/figures con el mismo nombre, así que se conservan ahí como referencia.
+#
+# Construir el manifiesto:
+#   python src/dashboard/galeria.py
+#
+# Rutas que se registran en el servidor Flask del dashboard:
+#   /galeria/miniatura/<id>   miniatura PNG
+#   /galeria/completa/<id>    imagen completa
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import mimetypes
+import os
+import sys
+import tempfile
+import threading
+from functools import lru_cache
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+from urllib.parse import quote
+
+import numpy as np
+import pandas as pd
+
+if __name__ == "__main__":
+    sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from src.config import (
+    DIR_FIGURAS,
+    MAX_MB_CACHE_FIGURAS,
+    RUTA_CACHE_FIGURAS,
+    RUTA_MANIFIESTO_FIGURAS,
+)
+from src.data.limpieza_datos import cargar_datos
+
+# Subir cuando cambie el formato del manifiesto o la forma de dibujar
+VERSION = 1
+
+EXTENSIONES = (".png", ".jpg", ".jpeg")
+
+PREFIJO_URL = "/galeria"
+TAMANOS = ("miniatura", "completa")
+INTENTOS_SERVIR = 3  # si la caché desaloja el archivo mientras se envía
+ANCHO_MINIATURA = 320
+DPI_COMPLETA = 100
+
+# Dimensiones del almacén que se pueden dibujar y su columna en los datos
+COLUMNAS = {
+    "provincias": "provincia",
+    "categorias": "categoria",
+    "sectores": "sector",
+    "cantones": "canton",
+}
+ETIQUETAS = {
+    "provincias": "Provincia",
+    "categorias": "Categoría",
+    "sectores": "Sector",
+    "cantones": "Cantón",
+}
+
+# clase de figura -> (prefijo del archivo, necesita la cola ajustada)
+CLASES = {
+    "cola": ("cola_", True),
+    "cuerpo": ("cuerpo_", False),
+    "histograma_cola": ("histograma_cola_", False),
+    "umbral": ("umbral_optimo_MRL_", False),
+}
+
+
+def _tipo_detalle(id_figura: str):
+    # Misma convención que usaba el dashboard: tipo = primer token del nombre
+    partes = id_figura.split("_")
+    return partes[0], "_".join(partes[1:])
+
+
+# ============================================================
+# Manifiesto (fuera de línea)
+# ============================================================
+
+
+def construir_manifiesto(dir_figuras: Path | str = DIR_FIGURAS, almacen=None) -> Dict:
+    """
+    Índice de figuras: las de dir_figuras más las que se pueden dibujar desde
+    las marginales del almacén. Cada entrada tiene id, tipo, detalle y
+    `archivo` (relativo a dir_figuras) o `render` (clase, dimensión, nombre).
+    """
+    dir_figuras = Path(dir_figuras)
+    figuras: Dict[str, Dict] = {}
+    if dir_figuras.exists():
+        for f in sorted(dir_figuras.iterdir()):
+            if f.suffix.lower() not in EXTENSIONES:
+                continue
+            tipo, detalle = _tipo_detalle(f.stem)
+            figuras[f.stem] = {
+                "id": f.stem,
+                "tipo": tipo,
+                "detalle": detalle,
+                "archivo": f.name,
+                "render": None,
+            }
+
+    if almacen is None:
+        from src.modelos.almacen import obtener_almacen
+
+        almacen = obtener_almacen()
+    tabla = almacen.tabla()
+    tabla = tabla[tabla["dimension"].isin(list(COLUMNAS))]
+    for (dimension, nombre), grupo in tabla.groupby(["dimension", "nombre"], sort=True):
+        tiene_cola = (grupo["componente"] == "tail").any()
+        for clase, (prefijo, necesita_cola) in CLASES.items():
+            id_figura = prefijo + str(nombre)
+            if id_figura in figuras or (necesita_cola and not tiene_cola):
+                continue
+            tipo, detalle = _tipo_detalle(id_figura)
+            figuras[id_figura] = {
+                "id": id_figura,
+                "tipo": tipo,
+                "detalle": detalle,
+                "archivo": None,
+                "render": {
+                    "clase": clase,
+                    "dimension": str(dimension),
+                    "nombre": str(nombre),
+                },
+            }
+
+    return {
+        "version": VERSION,
+        "figuras": sorted(figuras.values(), key=lambda e: e["id"]),
+    }
+
+
+def guardar_manifiesto(
+    manifiesto: Dict, ruta: Path | str = RUTA_MANIFIESTO_FIGURAS
+) -> None:
+    ruta = Path(ruta)
+    ruta.parent.mkdir(parents=True, exist_ok=True)
+    texto = json.dumps(manifiesto, ensure_ascii=False, indent=1) + "\n"
+    ruta.write_text(texto, encoding="utf-8")
+
+
+# ============================================================
+# Dibujo bajo demanda
+# ============================================================
+
+
+@lru_cache(maxsize=1)
+def _datos_log() -> pd.DataFrame:
+    return cargar_datos("log")
+
+
+def _valores(dimension: str, nombre: str) -> np.ndarray:
+    df = _datos_log()
+    x = df.loc[df[COLUMNAS[dimension]] == nombre, "total"].to_numpy(dtype=float)
+    return x[np.isfinite(x)]
+
+
+def _pdf_cuerpo(cuerpo: Dict, x: np.ndarray) -> Optional[np.ndarray]:
+    """Densidad del cuerpo en x (KDE en malla o paramétrica), sin truncar."""
+    if cuerpo["tipo"] == "KDE":
+        return np.interp(x, cuerpo["x_grid"], cuerpo["dens"], left=0.0, right=0.0)
+    from scipy import stats
+
+    p1, p2 = cuerpo["params"][:2]
+    modelo = cuerpo["model"].lower()
+    if modelo == "weibull":
+        return stats.weibull_min.pdf(x, p1, scale=p2)
+    if modelo == "gamma":
+        return stats.gamma.pdf(x, p1, scale=p2)
+    if modelo == "fisk":
+        return stats.fisk.pdf(x, p1, scale=p2)
+    if modelo.startswith("lognormal") or modelo.startswith("ln"):
+        return stats.lognorm.pdf(x, p2, scale=np.exp(p1))
+    return None
+
+
+def _dibujar_cola(ax, x: np.ndarray, cola: Dict, titulo: str) -> None:
+    from src.modelos.marginales import F_exc
+
+    exc = x[x > cola["u"]] - cola["u"]
+    if exc.size:
+        ax.hist(
+            exc, bins="auto", density=True, alpha=0.5, color="#005DA4", label="Excesos"
+        )
+        y = np.linspace(0.0, exc.max() * 1.05, 400)
+        # Densidad como derivada numérica de la CDF de los excesos
+        ax.plot(
+            y,
+            np.gradient(F_exc(y, cola["model"], cola["params"]), y),
+            color="#F39C12",
+            lw=2,
+            label=f"{cola['model']} ajustada",
+        )
+        ax.legend()
+    ax.set_title(f"Cola | {titulo}")
+    ax.set_xlabel("Exceso sobre u (log)")
+    ax.set_ylabel("Densidad")
+
+
+def _dibujar_cuerpo(ax, x: np.ndarray, cuerpo: Dict, titulo: str) -> None:
+    u = cuerpo["u"]
+    base = x[x <= u]
+    if base.size:
+        ax.hist(
+            base, bins="auto", density=True, alpha=0.5, color="#00A37A", label="Cuerpo"
+        )
+        grilla = np.linspace(base.min(), u, 400)
+        f = _pdf_cuerpo(cuerpo, grilla)
+        if f is not None and np.trapezoid(f, grilla) > 0:
+            # Densidad truncada a (-inf, u] para compararla con el histograma
+            ax.plot(
+                grilla,
+                f / np.trapezoid(f, grilla),
+                color="#F39C12",
+                lw=2,
+                label=f"{cuerpo['model']} ajustado",
+            )
+        ax.legend()
+    ax.set_title(f"Cuerpo | {titulo}")
+    ax.set_xlabel("Pérdida Total (log)")
+    ax.set_ylabel("Densidad")
+
+
+def _dibujar_histograma_cola(ax, x: np.ndarray, marginal: Dict, titulo: str) -> None:
+    cola = x[x > marginal["u"]]
+    if cola.size:
+        ax.hist(cola, bins="auto", color="#005DA4", edgecolor="white")
+    pct = 100.0 * cola.size / max(x.size, 1)
+    ax.set_title(f"Cola (> u) | {titulo} | N = {cola.size} ({pct:.1f}%)")
+    ax.set_xlabel("Pérdida Total (log)")
+    ax.set_ylabel("Frecuencia")
+
+
+def vida_media_residual(x: np.ndarray, umbrales: np.ndarray) -> np.ndarray:
+    """e(u) = E[X - u | X > u] para cada umbral, con sumas acumuladas."""
+    s = np.sort(x)
+    suma_cola = np.concatenate([np.cumsum(s[::-1])[::-1], [0.0]])
+    k = np.searchsorted(s, umbrales, side="right")
+    n_cola = s.size - k
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(n_cola > 0, (suma_cola[k] - umbrales * n_cola) / n_cola, np.nan)
+
+
+def _dibujar_umbral(ax, x: np.ndarray, marginal: Dict, titulo: str) -> None:
+    if x.size:
+        umbrales = np.unique(np.quantile(x, np.linspace(0.5, 0.98, 100)))
+        ax.plot(umbrales, vida_media_residual(x, umbrales), color="#005DA4", marker=".")
+    ax.axvline(
+        marginal["u"], color="#F39C12", ls="--", label=f"u = {marginal['u']:.2f}"
+    )
+    ax.legend()
+    ax.set_title(f"Umbral óptimo (MRL) | {titulo}")
+    ax.set_xlabel("Umbral u (log)")
+    ax.set_ylabel("Media de excesos e(u)")
+
+
+_DIBUJOS: Dict[str, Callable] = {
+    "cola": _dibujar_cola,
+    "cuerpo": _dibujar_cuerpo,
+    "histograma_cola": _dibujar_histograma_cola,
+    "umbral": _dibujar_umbral,
+}
+
+
+def dibujar_figura(render: Dict, destino: Path | str, dpi: int = DPI_COMPLETA) -> None:
+    """Dibuja una entrada `render` del manifiesto con las marginales del almacén."""
+    # matplotlib solo se importa si hace falta dibujar algo
+    import matplotlib
+
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    from src.modelos.almacen import obtener_almacen
+
+    dimension, nombre, clase = render["dimension"], render["nombre"], render["clase"]
+    almacen = obtener_almacen()
+    marginal = (
+        almacen.cola(dimension, nombre)
+        if clase == "cola"
+        else almacen.cuerpo(dimension, nombre)
+    )
+    titulo = f"{ETIQUETAS[dimension]}: {nombre}"
+
+    fig, ax = plt.subplots(figsize=(9, 4))
+    try:
+        _DIBUJOS[clase](ax, _valores(dimension, nombre), marginal, titulo)
+        fig.tight_layout()
+        fig.savefig(destino, dpi=dpi, format="png")
+    finally:
+        plt.close(fig)
+
+
+def miniatura(
+    origen: Path | str, destino: Path | str, ancho: int = ANCHO_MINIATURA
+) -> None:
+    import matplotlib
+
+    matplotlib.use("Agg")
+    import matplotlib.image as mpimg
+
+    alto_px, ancho_px = mpimg.imread(origen).shape[:2]
+    escala = min(1.0, ancho / ancho_px)
+    mpimg.thumbnail(str(origen), str(destino), scale=escala)
+
+
+# ============================================================
+# Caché en disco acotada
+# ============================================================
+
+
+class CacheFiguras:
+    """
+    Carpeta de PNG con tamaño máximo. La fecha de modificación hace de marca
+    de uso (se actualiza en cada acierto) y al pasar el límite se borran los
+    archivos más viejos. Las escrituras son atómicas, así que varios workers
+    pueden compartir la carpeta.
+    """
+
+    def __init__(
+        self,
+        carpeta: Path | str = RUTA_CACHE_FIGURAS,
+        max_bytes: int = MAX_MB_CACHE_FIGURAS * 1024 * 1024,
+    ):
+        self.carpeta = Path(carpeta)
+        self.max_bytes = int(max_bytes)
+        self._lock = threading.Lock()
+        self._bytes: Optional[int] = None  # total estimado; se mide la primera vez
+
+    def ruta(self, clave: str) -> Path:
+        return self.carpeta / (
+            hashlib.sha1(clave.encode("utf-8")).hexdigest()[:20] + ".png"
+        )
+
+    def _archivos(self) -> List[os.DirEntry]:
+        if not self.carpeta.exists():
+            return []
+        # Los temporales empiezan con "." y no cuentan hasta quedar escritos
+        return [
+            e
+            for e in os.scandir(self.carpeta)
+            if e.is_file() and e.name.endswith(".png") and not e.name.startswith(".")
+        ]
+
+    def tamano_total(self) -> int:
+        total = 0
+        for e in self._archivos():
+            try:
+                total += e.stat().st_size
+            except FileNotFoundError:
+                pass
+        return total
+
+    def obtener(self, clave: str, generar: Callable[[Path], None]) -> Path:
+        """Ruta del archivo de `clave`; si no está, lo crea con generar(ruta_tmp)."""
+        ruta = self.ruta(clave)
+        try:
+            os.utime(ruta)
+            return ruta
+        except FileNotFoundError:
+            pass
+
+        self.carpeta.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.carpeta, prefix=".", suffix=".png")
+        os.close(fd)
+        try:
+            generar(Path(tmp))
+            os.replace(tmp, ruta)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+        with self._lock:
+            if self._bytes is None:
+                self._bytes = self.tamano_total()
+            else:
+                self._bytes += ruta.stat().st_size
+            if self._bytes > self.max_bytes:
+                self._bytes = self._desalojar(conservar=ruta)
+        return ruta
+
+    def _desalojar(self, conservar: Path) -> int:
+        # Otros workers también escriben: se vuelve a medir la carpeta
+        entradas = []
+        for e in self._archivos():
+            try:
+                st = e.stat()
+            except FileNotFoundError:
+                continue
+            entradas.append((st.st_mtime, st.st_size, e.path))
+        total = sum(t for _, t, _ in entradas)
+        for _, tam, path in sorted(entradas):
+            if total <= self.max_bytes:
+                break
+            if Path(path) == conservar:
+                continue
+            try:
+                os.remove(path)
+                total -= tam
+            except FileNotFoundError:
+                pass
+        return total
+
+
+# ============================================================
+# Galería (dashboard)
+# ============================================================
+
+
+class Galeria:
+    """Manifiesto cargado una vez, opciones por tipo y archivos por tamaño."""
+
+    def __init__(
+        self,
+        ruta_manifiesto: Path | str = RUTA_MANIFIESTO_FIGURAS,
+        dir_figuras: Path | str = DIR_FIGURAS,
+        cache: Optional[CacheFiguras] = None,
+    ):
+        self.ruta_manifiesto = Path(ruta_manifiesto)
+        self.dir_figuras = Path(dir_figuras)
+        self.cache = cache if cache is not None else CacheFiguras()
+
+    @lru_cache(maxsize=None)
+    def _indice(self) -> Dict:
+        if self.ruta_manifiesto.exists():
+            manifiesto = json.loads(self.ruta_manifiesto.read_text(encoding="utf-8"))
+        else:
+            manifiesto = construir_manifiesto(self.dir_figuras)
+        entradas = {e["id"]: e for e in manifiesto["figuras"]}
+        opciones: Dict[str, List[Dict]] = {}
+        for e in manifiesto["figuras"]:
+            etiqueta = (
+                e["detalle"].replace("_", " ").title() if e["detalle"] else e["id"]
+            )
+            opciones.setdefault(e["tipo"], []).append(
+                {"label": etiqueta, "value": e["id"]}
+            )
+        return {"entradas": entradas, "opciones": opciones}
+
+    def tipos(self) -> List[str]:
+        return sorted(self._indice()["opciones"])
+
+    def opciones(self, tipo: str) -> List[Dict]:
+        return self._indice()["opciones"].get(tipo, [])
+
+    def entrada(self, id_figura: str) -> Dict:
+        return self._indice()["entradas"][id_figura]
+
+    def url(self, id_figura: str, tamano: str = "miniatura") -> str:
+        return f"{PREFIJO_URL}/{tamano}/{quote(id_figura)}"
+
+    def ruta(self, id_figura: str, tamano: str = "miniatura") -> Path:
+        """Archivo a servir; dibuja o reduce la figura si no está en caché."""
+        e = self.entrada(id_figura)
+        clave = f"v{VERSION}/{tamano}/{id_figura}"
+
+        if e["archivo"] is not None:
+            origen = self.dir_figuras / e["archivo"]
+            if tamano == "completa":
+                return origen
+            return self.cache.obtener(clave, lambda tmp: miniatura(origen, tmp))
+
+        if tamano == "completa":
+            return self.cache.obtener(
+                clave, lambda tmp: dibujar_figura(e["render"], tmp)
+            )
+        completa = self.ruta(id_figura, "completa")
+        return self.cache.obtener(clave, lambda tmp: miniatura(completa, tmp))
+
+    def registrar_rutas(self, server) -> None:
+        """Agrega las rutas de la galería al servidor Flask de la app."""
+        from flask import abort, send_file
+
+        @server.route(f"{PREFIJO_URL}/<tamano>/<path:id_figura>")
+        def servir_figura(tamano, id_figura):
+            if tamano not in TAMANOS:
+                abort(404)
+            # Otro worker puede desalojar el archivo entre ruta() y send_file;
+            # en ese caso se vuelve a pedir y la caché lo regenera.
+            for intento in range(INTENTOS_SERVIR):
+                try:
+                    ruta = self.ruta(id_figura, tamano)
+                    tipo = mimetypes.guess_type(ruta.name)[0] or "image/png"
+                    return send_file(ruta, mimetype=tipo, max_age=3600)
+                except KeyError:
+                    abort(404)
+                except FileNotFoundError:
+                    if intento == INTENTOS_SERVIR - 1:
+                        raise
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Construye el manifiesto de la galería de figuras"
+    )
+    parser.add_argument("--figuras", type=Path, default=DIR_FIGURAS)
+    parser.add_argument("--salida", type=Path, default=RUTA_MANIFIESTO_FIGURAS)
+    args = parser.parse_args(argv)
+
+    manifiesto = construir_manifiesto(args.figuras)
+    guardar_manifiesto(manifiesto, args.salida)
+    n_render = sum(e["render"] is not None for e in manifiesto["figuras"])
+    print(
+        f"{len(manifiesto['figuras'])} figuras ({n_render} se dibujan bajo demanda) "
+        f"-> {args.salida}"
+    )
+
+
+if __name__ == "__main__":
+    main()
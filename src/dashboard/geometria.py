@@ -0,0 +1,192 @@
+# Simplificación y cuantización de los polígonos del mapa
+#
+# Los GeoJSON de data/ tienen mucho más detalle del que se ve en un mapa de
+# provincias. Aquí cada anillo se simplifica con Douglas-Peucker (tolerancia
+# en grados) y las coordenadas se redondean a una malla fija (cuantización),
+# eliminando los vértices repetidos que quedan. El resultado se escribe en
+# data/geo/ y es lo que envía el dashboard.
+#
+#   python src/dashboard/geometria.py --tolerancia 0.002 --decimales 4
+
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+if __name__ == "__main__":
+    sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from src.config import DATA_DIR
+
+DIR_GEO = DATA_DIR / "geo"
+ARCHIVOS = ("provincias.json", "cr.json")
+
+# 0.002° ~ 200 m; 4 decimales ~ 11 m
+TOLERANCIA = 0.002
+DECIMALES = 4
+
+
+def ruta_simplificada(nombre: str) -> Path:
+    return DIR_GEO / nombre.replace(".json", "_simplificado.json")
+
+
+def douglas_peucker(puntos: np.ndarray, tolerancia: float) -> np.ndarray:
+    """Índices booleanos de los puntos que se conservan en una polilínea."""
+    n = len(puntos)
+    conservar = np.zeros(n, dtype=bool)
+    conservar[0] = conservar[-1] = True
+    pila = [(0, n - 1)]
+    while pila:
+        i, j = pila.pop()
+        if j <= i + 1:
+            continue
+        a, b = puntos[i], puntos[j]
+        seg = b - a
+        largo = np.hypot(*seg)
+        medio = puntos[i + 1 : j] - a
+        if largo == 0.0:
+            d = np.hypot(medio[:, 0], medio[:, 1])
+        else:
+            d = np.abs(seg[0] * medio[:, 1] - seg[1] * medio[:, 0]) / largo
+        k = int(np.argmax(d))
+        if d[k] > tolerancia:
+            m = i + 1 + k
+            conservar[m] = True
+            pila.append((i, m))
+            pila.append((m, j))
+    return conservar
+
+
+def simplificar_anillo(
+    anillo: List, tolerancia: float, decimales: int
+) -> Optional[List]:
+    """Anillo cerrado simplificado y cuantizado; None si colapsa."""
+    pts = np.asarray(anillo, dtype=float)[:, :2]
+    if len(pts) > 1 and np.array_equal(pts[0], pts[-1]):
+        pts = pts[:-1]
+    if len(pts) < 3:
+        return None
+
+    # Se parte el anillo en el punto más lejano al inicial para que ningún
+    # tramo de Douglas-Peucker tenga extremos iguales
+    lejos = int(np.argmax(np.hypot(*(pts - pts[0]).T)))
+    ida = douglas_peucker(pts[: lejos + 1], tolerancia)
+    vuelta = douglas_peucker(np.vstack([pts[lejos:], pts[:1]]), tolerancia)[:-1]
+    pts = pts[np.concatenate([ida[:-1], vuelta])]
+
+    pts = np.round(pts, decimales)
+    repetido = np.r_[False, np.all(pts[1:] == pts[:-1], axis=1)]
+    pts = pts[~repetido]
+    if len(pts) > 1 and np.array_equal(pts[0], pts[-1]):
+        pts = pts[:-1]
+    if len(pts) < 3:
+        return None
+    return np.vstack([pts, pts[:1]]).tolist()
+
+
+def _simplificar_poligono(
+    anillos: List, tolerancia: float, decimales: int
+) -> Optional[List]:
+    exterior = simplificar_anillo(anillos[0], tolerancia, decimales)
+    if exterior is None:
+        return None
+    huecos = [simplificar_anillo(h, tolerancia, decimales) for h in anillos[1:]]
+    return [exterior] + [h for h in huecos if h is not None]
+
+
+def simplificar_geometria(geom: Dict, tolerancia: float, decimales: int) -> Dict:
+    if geom["type"] == "Polygon":
+        poligonos = [geom["coordinates"]]
+    elif geom["type"] == "MultiPolygon":
+        poligonos = geom["coordinates"]
+    else:
+        return geom
+
+    salida = [
+        p
+        for p in (_simplificar_poligono(p, tolerancia, decimales) for p in poligonos)
+        if p is not None
+    ]
+    if not salida:
+        # Todo colapsó (islas muy pequeñas): conservar el polígono más grande solo cuantizado
+        mayor = max(poligonos, key=lambda p: len(p[0]))
+        salida = [_simplificar_poligono(mayor, 0.0, decimales)]
+
+    if geom["type"] == "Polygon":
+        return {"type": "Polygon", "coordinates": salida[0]}
+    return {"type": "MultiPolygon", "coordinates": salida}
+
+
+def simplificar_geojson(
+    geojson: Dict, tolerancia: float = TOLERANCIA, decimales: int = DECIMALES
+) -> Dict:
+    features = []
+    for ft in geojson["features"]:
+        features.append(
+            {
+                **ft,
+                "geometry": simplificar_geometria(
+                    ft["geometry"], tolerancia, decimales
+                ),
+            }
+        )
+    return {**geojson, "features": features}
+
+
+def contar_vertices(geojson: Dict) -> int:
+    total = 0
+    for ft in geojson["features"]:
+        g = ft["geometry"]
+        poligonos = [g["coordinates"]] if g["type"] == "Polygon" else g["coordinates"]
+        total += sum(len(anillo) for p in poligonos for anillo in p)
+    return total
+
+
+@lru_cache(maxsize=None)
+def cargar_geojson(nombre: str = "provincias.json") -> Dict:
+    """Versión simplificada si existe (data/geo/), si no la original."""
+    ruta = ruta_simplificada(nombre)
+    if not ruta.exists():
+        ruta = DATA_DIR / nombre
+    with open(ruta, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Simplifica los GeoJSON del mapa")
+    parser.add_argument(
+        "--tolerancia",
+        type=float,
+        default=TOLERANCIA,
+        help="tolerancia de Douglas-Peucker en grados",
+    )
+    parser.add_argument(
+        "--decimales",
+        type=int,
+        default=DECIMALES,
+        help="decimales de las coordenadas (cuantización)",
+    )
+    args = parser.parse_args(argv)
+
+    DIR_GEO.mkdir(parents=True, exist_ok=True)
+    for nombre in ARCHIVOS:
+        with open(DATA_DIR / nombre, "r", encoding="utf-8") as f:
+            original = json.load(f)
+        simple = simplificar_geojson(original, args.tolerancia, args.decimales)
+        destino = ruta_simplificada(nombre)
+        texto = json.dumps(simple, ensure_ascii=False, separators=(",", ":"))
+        destino.write_text(texto + "\n", encoding="utf-8")
+        print(
+            f"{nombre}: {contar_vertices(original)} -> {contar_vertices(simple)} vértices, "
+            f"{(DATA_DIR / nombre).stat().st_size / 1024:.0f} KB -> {len(texto.encode()) / 1024:.0f} KB"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+# Métricas de latencia de los callbacks del dashboard
+#
+# Cada solicitud a /_dash-update-component se mide entre los hooks
+# before_request / after_request de Flask, así que el tiempo incluye el
+# callback y la serialización de las figuras a JSON. Las latencias se
+# acumulan en un histograma por callback (identificado por sus salidas) y se
+# exponen en formato de texto de Prometheus en /metricas, solo para
+# solicitudes desde la misma máquina. Si las trazas están activas
+# (src/traza.py) cada solicitud queda además como un tramo "dash.solicitud".
+
+from __future__ import annotations
+
+import bisect
+import threading
+import time
+from typing import Dict, List, Optional, Sequence
+
+from src import traza
+
+RUTA_METRICAS = "/metricas"
+RUTA_CALLBACKS = "/_dash-update-component"
+
+# Límites superiores de los buckets (segundos)
+BUCKETS_S = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+LOCALES = ("127.0.0.1", "::1")
+
+
+class HistogramaLatencias:
+    """Conteos acumulados por bucket, suma y total de cada callback."""
+
+    def __init__(self, buckets: Sequence[float] = BUCKETS_S):
+        self.buckets = tuple(buckets)
+        self._conteos: Dict[str, List[int]] = {}
+        self._sumas: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def observar(self, callback: str, segundos: float) -> None:
+        i = bisect.bisect_left(self.buckets, segundos)
+        with self._lock:
+            conteos = self._conteos.setdefault(callback, [0] * (len(self.buckets) + 1))
+            conteos[i] += 1
+            self._sumas[callback] = self._sumas.get(callback, 0.0) + segundos
+
+    def texto(self, nombre: str = "dash_callback_latencia_segundos") -> str:
+        """Histograma en formato de exposición de Prometheus."""
+        lineas = [
+            f"# HELP {nombre} Latencia de los callbacks del dashboard (incluye serialización).",
+            f"# TYPE {nombre} histogram",
+        ]
+        with self._lock:
+            for cb in sorted(self._conteos):
+                etiqueta = cb.replace("\\", "\\\\").replace('"', '\\"')
+                acumulado = 0
+                for limite, c in zip(self.buckets + (float("inf"),), self._conteos[cb]):
+                    acumulado += c
+                    le = "+Inf" if limite == float("inf") else f"{limite:g}"
+                    lineas.append(
+                        f'{nombre}_bucket{{callback="{etiqueta}",le="{le}"}} {acumulado}'
+                    )
+                lineas.append(
+                    f'{nombre}_sum{{callback="{etiqueta}"}} {self._sumas[cb]:.6f}'
+                )
+                lineas.append(f'{nombre}_count{{callback="{etiqueta}"}} {acumulado}')
+        return "\n".join(lineas) + "\n"
+
+
+def registrar_metricas(
+    server, histograma: Optional[HistogramaLatencias] = None
+) -> HistogramaLatencias:
+    """Agrega los hooks de medición y la ruta /metricas al servidor Flask de la app."""
+    from flask import Response, abort, g, request
+
+    histograma = histograma or HistogramaLatencias()
+
+    @server.before_request
+    def _inicio_solicitud():
+        if request.path == RUTA_CALLBACKS:
+            g.inicio_callback = time.perf_counter()
+            # Los tramos del callback quedan como hijos de este
+            g.tramo_callback = traza.tramo("dash.solicitud").__enter__()
+
+    @server.after_request
+    def _fin_solicitud(respuesta):
+        inicio = g.pop("inicio_callback", None)
+        if inicio is not None:
+            cuerpo = request.get_json(silent=True) or {}
+            callback = str(cuerpo.get("output", "desconocido"))
+            histograma.observar(callback, time.perf_counter() - inicio)
+            g.tramo_callback.anotar(
+                callback=callback, bytes=respuesta.calculate_content_length()
+            )
+        return respuesta
+
+    @server.teardown_request
+    def _cerrar_tramo(error=None):
+        tramo = g.pop("tramo_callback", None)
+        if tramo is not None:
+            tramo.__exit__(None if error is None else type(error), error, None)
+
+    @server.route(RUTA_METRICAS)
+    def metricas():
+        if request.remote_addr not in LOCALES:
+            abort(404)
+        return Response(histograma.texto(), mimetype="text/plain; version=0.0.4")
+
+    return histograma
@@ -0,0 +1,252 @@
+# Monte Carlo de pérdidas anuales según los filtros del dashboard
+#
+# Antes la pestaña de modelos usaba un solo ajuste lognormal sobre los
+# totales anuales de todo el país, con 10 000 simulaciones hechas al
+# construir los artefactos, y no respondía a los filtros. Ahora, para cada
+# selección (años, provincias, categorías, sectores) los totales anuales salen
+# del cubo de agregados, se ajusta la lognormal con loc = 0 (el mismo MLE
+# cerrado que lognorm.fit(..., floc=0)) y se simula por lotes en un hilo de
+# fondo. Cada lote actualiza el histograma y la estimación de la media, P95 y
+# P99; la pestaña la consulta con un dcc.Interval mientras el trabajo avanza.
+# Mientras faltan lotes los percentiles se interpolan en el histograma
+# acumulado (sin recorrer todas las simulaciones en cada lote); el último lote
+# los calcula exactos con np.percentile.
+#
+# Los trabajos (terminados o en curso) quedan en una caché LRU cuya clave es
+# la selección normalizada a las celdas del cubo que cubre, así que repetir
+# una selección (o una equivalente) responde sin volver a simular. Todas las
+# selecciones usan los mismos lotes de normales (SeedSequence(SEMILLA_MC)),
+# de modo que las diferencias entre selecciones no son ruido de simulación.
+# Al pedir una selección nueva se cancelan los trabajos que no han terminado
+# (la pestaña solo consulta la última), para que el hilo no se quede
+# simulando selecciones que ya nadie mira.
+
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Optional, Sequence, Tuple
+
+import numpy as np
+
+from src.dashboard.cubo import CuboAgregado
+
+N_SIMS_MC = 1_000_000
+TAMANO_LOTE_MC = 50_000
+SEMILLA_MC = 0
+N_BINS_MC = 50
+# Selecciones con resultado guardado (los trabajos terminados solo guardan
+# el histograma y el resumen, unos pocos cientos de bytes)
+MAX_ENTRADAS_MC = 128
+
+Clave = Tuple[Tuple[int, ...], Tuple[str, ...], Tuple[str, ...], Tuple[str, ...]]
+
+
+def ajustar_lognormal(totales: np.ndarray) -> Tuple[float, float]:
+    """(mu, sigma) de log(totales): el MLE de lognorm.fit(totales, floc=0)."""
+    logs = np.log(np.asarray(totales, dtype=float))
+    mu = float(logs.mean())
+    return mu, float(np.sqrt(np.mean((logs - mu) ** 2)))
+
+
+def percentiles_histograma(
+    bordes: np.ndarray,
+    conteos: np.ndarray,
+    n_bajo: int,
+    n: int,
+    q: Sequence[float],
+) -> np.ndarray:
+    """
+    Percentiles q (en %) interpolados en la distribución acumulada del
+    histograma; n_bajo son los valores bajo bordes[0] y n el total. Los que
+    caen por encima del último borde quedan en bordes[-1].
+    """
+    acumulado = n_bajo + np.r_[0, np.cumsum(conteos)]
+    return np.interp(np.asarray(q, dtype=float) / 100 * n, acumulado, bordes)
+
+
+class TrabajoMonteCarlo:
+    """
+    Simulación por lotes de las pérdidas anuales de una selección. estado()
+    devuelve una copia del avance que se puede leer desde otro hilo mientras
+    correr() sigue agregando lotes.
+    """
+
+    def __init__(
+        self,
+        totales: np.ndarray,
+        n_sims: int = N_SIMS_MC,
+        tamano_lote: int = TAMANO_LOTE_MC,
+        semilla: int = SEMILLA_MC,
+        n_bins: int = N_BINS_MC,
+    ):
+        self.totales = np.asarray(totales, dtype=float)
+        self.n_sims = int(n_sims)
+        self.tamano_lote = int(tamano_lote)
+        self.semilla = semilla
+        self.n_bins = n_bins
+        self.cancelado = False
+        self._lock = threading.Lock()
+        self._estado: Dict = {
+            "n": 0,
+            "n_sims": self.n_sims,
+            "n_anos": int(self.totales.size),
+            "terminado": False,
+            "mensaje": None,
+        }
+        if self.totales.size < 2:
+            self._estado.update(
+                terminado=True,
+                mensaje=(
+                    "La selección tiene menos de dos años con pérdidas; no alcanza para "
+                    "ajustar el modelo de pérdidas anuales."
+                ),
+            )
+
+    def estado(self) -> Dict:
+        with self._lock:
+            return dict(self._estado)
+
+    def correr(self) -> None:
+        if self._estado["terminado"]:
+            return
+        mu, sigma = ajustar_lognormal(self.totales)
+        n_lotes = -(-self.n_sims // self.tamano_lote)
+        sims = np.empty(self.n_sims)
+        bordes = conteos = None
+        n = n_bajo = 0
+        suma = 0.0
+        for i, semilla in enumerate(
+            np.random.SeedSequence(self.semilla).spawn(n_lotes)
+        ):
+            if self.cancelado:
+                return
+            m = min(self.tamano_lote, self.n_sims - n)
+            lote = sims[n : n + m]
+            lote[:] = np.exp(
+                mu + sigma * np.random.default_rng(semilla).standard_normal(m)
+            )
+            if bordes is None:
+                # Como antes, el histograma se corta en el cuantil 0.999 (del primer lote)
+                bordes = np.linspace(
+                    lote.min(), np.quantile(lote, 0.999), self.n_bins + 1
+                )
+                conteos = np.zeros(self.n_bins, dtype=np.int64)
+            conteos += np.histogram(lote, bins=bordes)[0]
+            n_bajo += int(np.count_nonzero(lote < bordes[0]))
+            suma += float(lote.sum())
+            n += m
+            if n >= self.n_sims:
+                p95, p99 = np.percentile(sims, [95, 99])
+            else:
+                p95, p99 = percentiles_histograma(bordes, conteos, n_bajo, n, [95, 99])
+            with self._lock:
+                self._estado.update(
+                    n=n,
+                    mu=mu,
+                    sigma=sigma,
+                    media=suma / n,
+                    p95=float(p95),
+                    p99=float(p99),
+                    bordes=bordes,
+                    conteos=conteos.copy(),
+                    terminado=n >= self.n_sims,
+                )
+
+
+class MonteCarloFiltrado:
+    """
+    Trabajos de Monte Carlo por selección de filtros, en un hilo de fondo y
+    con caché LRU. Uso desde un callback:
+
+        mc = MonteCarloFiltrado(artefactos.cubo())
+        estado = mc.solicitar(year_range, provs, cats, sectores)
+        # estado["terminado"] es False mientras faltan lotes
+    """
+
+    def __init__(
+        self,
+        cubo: CuboAgregado,
+        n_sims: int = N_SIMS_MC,
+        tamano_lote: int = TAMANO_LOTE_MC,
+        max_entradas: int = MAX_ENTRADAS_MC,
+        max_hilos: int = 1,
+    ):
+        self.cubo = cubo
+        self.n_sims = n_sims
+        self.tamano_lote = tamano_lote
+        self.max_entradas = max_entradas
+        self._trabajos: "OrderedDict[Clave, TrabajoMonteCarlo]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._ejecutor = ThreadPoolExecutor(
+            max_workers=max_hilos, thread_name_prefix="montecarlo"
+        )
+
+    def _mascaras(
+        self,
+        year_range: Sequence[int],
+        provincias: Optional[Iterable[str]],
+        categorias: Optional[Iterable[str]],
+        sectores: Optional[Iterable[str]],
+    ):
+        cubo = self.cubo
+        inicio, fin = year_range
+        return (
+            (cubo.anos >= inicio) & (cubo.anos <= fin),
+            cubo._mascara(cubo.provincias, provincias),
+            cubo._mascara(cubo.categorias, categorias),
+            cubo._mascara(cubo.sectores, sectores),
+        )
+
+    def clave(self, year_range, provincias, categorias, sectores) -> Clave:
+        """Selección normalizada: años y valores del cubo que quedan incluidos."""
+        m_y, m_p, m_c, m_s = self._mascaras(
+            year_range, provincias, categorias, sectores
+        )
+        cubo = self.cubo
+        return (
+            tuple(int(a) for a in cubo.anos[m_y]),
+            tuple(v for v, m in zip(cubo.provincias, m_p) if m),
+            tuple(v for v, m in zip(cubo.categorias, m_c) if m),
+            tuple(v for v, m in zip(cubo.sectores, m_s) if m),
+        )
+
+    def totales_anuales(
+        self, year_range, provincias, categorias, sectores
+    ) -> np.ndarray:
+        """Pérdida total de cada año de la selección con pérdidas positivas."""
+        mascaras = self._mascaras(year_range, provincias, categorias, sectores)
+        totales = self.cubo.total[np.ix_(*mascaras)].sum(axis=(1, 2, 3))
+        return totales[totales > 0]
+
+    def solicitar(self, year_range, provincias, categorias, sectores) -> Dict:
+        """
+        Estado del trabajo de la selección. La primera vez lo pone en cola y
+        devuelve el estado inicial; las siguientes devuelven el avance o el
+        resultado guardado.
+        """
+        clave = self.clave(year_range, provincias, categorias, sectores)
+        with self._lock:
+            trabajo = self._trabajos.get(clave)
+            if trabajo is not None:
+                self._trabajos.move_to_end(clave)
+                return trabajo.estado()
+            trabajo = TrabajoMonteCarlo(
+                self.totales_anuales(year_range, provincias, categorias, sectores),
+                n_sims=self.n_sims,
+                tamano_lote=self.tamano_lote,
+            )
+            # Con un solo hilo los trabajos de selecciones anteriores se
+            # acumularían en la cola; se cancelan y salen de la caché para
+            # que, si se vuelven a pedir, arranquen de nuevo
+            for otra, viejo in list(self._trabajos.items()):
+                if not viejo.estado()["terminado"]:
+                    viejo.cancelado = True
+                    del self._trabajos[otra]
+            self._trabajos[clave] = trabajo
+            while len(self._trabajos) > self.max_entradas:
+                _, viejo = self._trabajos.popitem(last=False)
+                viejo.cancelado = True
+        self._ejecutor.submit(trabajo.correr)
+        return trabajo.estado()
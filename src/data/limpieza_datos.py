@@ -1 +1,355 @@
 # Funciones para carga y limpieza de datos
+#
+# Ingesta única de la base de pérdidas: data/raw/datos_crudos.xlsx se lee una
+# sola vez, se valida el esquema y se guarda en un archivo columnar tipado
+# (data/clean/datos.npz):
+#   - evento, categoria, provincia, canton, sector y tipologia (normalizada)
+#     como códigos enteros más la lista de categorías (provincia en el orden
+#     de ORDEN_PROVINCIAS);
+#   - latitud/longitud en float (sin las comas sueltas del libro);
+#   - la pérdida en colones (total) y en escala log (total_log, NaN si <= 0).
+# La cabecera __indice__ guarda el sha1 del libro y la versión del formato;
+# si ninguno cambió, ingerir() no vuelve a abrir el libro.
+#
+# La limpieza es la de notebooks/0_analisis_exploratorio.ipynb (tipologías
+# agrupadas en sectores, sin eventos antrópicos) y la escala log la de
+# notebooks/0_5_ajuste_de_datos.ipynb (total > 0 y log(total) > UMBRAL_LOG).
+# Todo el proyecto lee los datos con cargar_datos(), que devuelve las mismas
+# filas y columnas que datos_limpios.csv (escala="colones") o
+# datos_limpios_log.csv (escala="log").
+#
+#   python src/data/limpieza_datos.py [--forzar]
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+if __name__ == "__main__":
+    sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from src.config import RUTA_DATOS, RUTA_DATOS_CRUDOS
+
+# Subir cuando cambie la limpieza o el formato del archivo
+VERSION_FORMATO = 1
+
+# Columnas del libro (en orden) y su nombre limpio
+COLUMNAS_CRUDAS = {
+    "AÑO": "ano",
+    "EVENTO": "evento",
+    "CATEGORÍA": "categoria",
+    "DECRETO": "decreto",
+    "PROVINCIA": "provincia",
+    "CANTÓN": "canton",
+    "Latitud": "latitud",
+    "Longitud": "longitud",
+    "Tipología": "tipologia",
+    "TOTAL POR TIPOLOGÍA": "total",
+}
+
+COLUMNAS_CATEGORICAS = (
+    "evento",
+    "categoria",
+    "provincia",
+    "canton",
+    "sector",
+    "tipologia",
+)
+COLUMNAS = (
+    "ano",
+    "evento",
+    "categoria",
+    "provincia",
+    "canton",
+    "latitud",
+    "longitud",
+    "total",
+    "sector",
+)
+
+ORDEN_PROVINCIAS = [
+    "San José",
+    "Alajuela",
+    "Cartago",
+    "Heredia",
+    "Guanacaste",
+    "Puntarenas",
+    "Limón",
+]
+CATEGORIAS_EXCLUIDAS = ("Antrópico", "Antropogénico")
+
+MAPA_SECTORES = {
+    # INFRAESTRUCTURA
+    "CARRETERAS": "INFRAESTRUCTURA",
+    "PUENTES": "INFRAESTRUCTURA",
+    "ALCANTARILLAS Y VADOS": "INFRAESTRUCTURA",
+    "EDIFICIOS PUBLICOS": "INFRAESTRUCTURA",
+    "CENTROS EDUCATIVOS": "INFRAESTRUCTURA",
+    "SISTEMAS DE INFOCOMUNICACION": "INFRAESTRUCTURA",
+    "FERROVIAS": "INFRAESTRUCTURA",
+    "AERODROMOS": "INFRAESTRUCTURA",
+    "OBRAS DIVERSAS": "INFRAESTRUCTURA",
+    # ENERGIA
+    "SISTEMAS ELECTRICOS": "ENERGÍA",
+    "ENERGIA POLIDUCTO": "ENERGÍA",
+    "ENERGIA (POLIDUCTO)": "ENERGÍA",
+    # HIDRICO
+    "RIOS Y QUEBRADAS": "HÍDRICO",
+    "SISTEMAS DE AGUA": "HÍDRICO",
+    "SISTEMAS DE RIEGO": "HÍDRICO",
+    "OBRAS CORRECTIVAS": "HÍDRICO",
+    # SOCIAL
+    "SOCIAL": "SOCIAL",
+    "VIVIENDA": "SOCIAL",
+    "PRIMER IMPACTO": "SOCIAL",
+    # PRODUCTIVO
+    "AGROPECUARIO": "PRODUCTIVO",
+    "ACTIVIDAD EMPRESARIAL": "PRODUCTIVO",
+    # OTROS
+    "AMBIENTE": "OTROS",
+    "DIVERSAS": "OTROS",
+}
+
+# Pérdidas de log(total) <= 12 (menos de ~160 mil colones) no entran en la
+# escala log: son montos simbólicos que deforman el cuerpo de las marginales
+UMBRAL_LOG = 12.0
+
+# Caja que contiene a Costa Rica (con la Isla del Coco) para validar coordenadas
+LIMITES_LATITUD = (5.0, 11.5)
+LIMITES_LONGITUD = (-87.5, -82.5)
+
+
+def sha1_archivo(ruta: Path | str) -> str:
+    h = hashlib.sha1()
+    with open(ruta, "rb") as f:
+        for bloque in iter(lambda: f.read(1 << 20), b""):
+            h.update(bloque)
+    return h.hexdigest()
+
+
+def _numero(s: pd.Series) -> pd.Series:
+    # Algunas coordenadas vienen como texto con comas de más ("8.8198793,")
+    return pd.to_numeric(
+        s.astype(str).str.replace(",", "", regex=False), errors="coerce"
+    )
+
+
+def limpiar(crudo: pd.DataFrame) -> pd.DataFrame:
+    """
+    Limpia el libro tal como sale de pd.read_excel y valida el esquema.
+
+    Devuelve una fila por registro con las columnas de COLUMNAS más tipologia
+    y total_log.
+    Lanza ValueError con todos los problemas encontrados si el libro no tiene
+    las columnas esperadas o si quedan valores fuera de rango.
+    """
+    encabezado = [str(c).strip() for c in crudo.columns]
+    if encabezado != list(COLUMNAS_CRUDAS):
+        raise ValueError(
+            f"Columnas inesperadas en el libro: {encabezado} "
+            f"(se esperaban {list(COLUMNAS_CRUDAS)})"
+        )
+
+    df = crudo.dropna().copy()
+    df.columns = list(COLUMNAS_CRUDAS.values())
+    df = df.drop(columns=["decreto"])
+    df = df[~df["categoria"].isin(CATEGORIAS_EXCLUIDAS)]
+
+    df["tipologia"] = (
+        df["tipologia"].str.strip().str.upper().str.replace(r"\s+", " ", regex=True)
+    )
+    df["sector"] = df["tipologia"].map(MAPA_SECTORES).fillna("OTROS")
+
+    for col in ("latitud", "longitud", "total"):
+        df[col] = _numero(df[col])
+    for col in COLUMNAS_CATEGORICAS:
+        df[col] = df[col].astype(str).str.strip()
+
+    problemas: List[str] = []
+    for col in ("latitud", "longitud", "total"):
+        n = int(df[col].isna().sum())
+        if n:
+            problemas.append(f"{n} valores no numéricos en {col}")
+    if not pd.api.types.is_integer_dtype(df["ano"]):
+        problemas.append(f"ano no es entero ({df['ano'].dtype})")
+    fuera = sorted(set(df["provincia"]) - set(ORDEN_PROVINCIAS))
+    if fuera:
+        problemas.append(f"provincias desconocidas: {fuera}")
+    for col, (lo, hi) in (("latitud", LIMITES_LATITUD), ("longitud", LIMITES_LONGITUD)):
+        n = int((~df[col].between(lo, hi) & df[col].notna()).sum())
+        if n:
+            problemas.append(f"{n} valores de {col} fuera de [{lo}, {hi}]")
+    n = int((df["total"] < 0).sum())
+    if n:
+        problemas.append(f"{n} pérdidas negativas")
+    if problemas:
+        raise ValueError(
+            "Esquema inválido en el libro de datos: " + "; ".join(problemas)
+        )
+
+    df = df[list(COLUMNAS) + ["tipologia"]]
+    total = df["total"].to_numpy(dtype=float)
+    with np.errstate(divide="ignore"):
+        df["total_log"] = np.where(total > 0, np.log(total), np.nan)
+    return df
+
+
+# ============================================================
+# Archivo columnar
+# ============================================================
+
+
+def _categorias(df: pd.DataFrame, col: str) -> List[str]:
+    if col == "provincia":
+        return list(ORDEN_PROVINCIAS)
+    return sorted(df[col].unique())
+
+
+def guardar_datos(df: pd.DataFrame, ruta: Path | str, sha1_origen: str) -> None:
+    """Escribe df (salida de limpiar) en ruta de forma atómica."""
+    ruta = Path(ruta)
+    ruta.parent.mkdir(parents=True, exist_ok=True)
+    arreglos: Dict[str, np.ndarray] = {
+        "ano": df["ano"].to_numpy(dtype=np.int16),
+        "latitud": df["latitud"].to_numpy(dtype=float),
+        "longitud": df["longitud"].to_numpy(dtype=float),
+        "total": df["total"].to_numpy(dtype=float),
+        "total_log": df["total_log"].to_numpy(dtype=float),
+    }
+    categorias = {}
+    for col in COLUMNAS_CATEGORICAS:
+        categorias[col] = _categorias(df, col)
+        arreglos[col] = pd.Categorical(
+            df[col], categories=categorias[col]
+        ).codes.astype(np.int16)
+    cabecera = {
+        "version": VERSION_FORMATO,
+        "sha1_origen": sha1_origen,
+        "filas": int(len(df)),
+        "columnas": list(COLUMNAS) + ["tipologia", "total_log"],
+        "categorias": categorias,
+        "umbral_log": UMBRAL_LOG,
+    }
+    tmp = ruta.with_name(ruta.name + ".tmp")
+    with open(tmp, "wb") as f:
+        np.savez_compressed(
+            f, __indice__=np.array(json.dumps(cabecera, ensure_ascii=False)), **arreglos
+        )
+    os.replace(tmp, ruta)
+
+
+def leer_cabecera(ruta: Path | str = RUTA_DATOS) -> Optional[Dict]:
+    """Cabecera del archivo de datos, o None si no existe o no se puede leer."""
+    try:
+        with np.load(ruta) as npz:
+            return json.loads(str(npz["__indice__"]))
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def ingerir(
+    origen: Path | str = RUTA_DATOS_CRUDOS,
+    destino: Path | str = RUTA_DATOS,
+    forzar: bool = False,
+) -> bool:
+    """
+    Lee, limpia y guarda el libro de origen en destino.
+
+    Se salta (y devuelve False) si destino ya fue generado con la misma
+    versión del formato a partir de un libro con el mismo sha1.
+    """
+    sha1 = sha1_archivo(origen)
+    cab = None if forzar else leer_cabecera(destino)
+    if (
+        cab is not None
+        and cab.get("version") == VERSION_FORMATO
+        and cab.get("sha1_origen") == sha1
+    ):
+        return False
+    guardar_datos(limpiar(pd.read_excel(origen)), destino, sha1)
+    return True
+
+
+def cargar_datos(
+    escala: Optional[str] = "log",
+    ruta: Path | str = RUTA_DATOS,
+    origen: Optional[Path | str] = RUTA_DATOS_CRUDOS,
+) -> pd.DataFrame:
+    """
+    DataFrame con los datos limpios; las columnas de texto son categóricas.
+
+    escala="log":     total = log(pérdida), solo filas con log(total) > UMBRAL_LOG
+                      (las de datos_limpios_log.csv).
+    escala="colones": total en colones, todas las filas (las de datos_limpios.csv).
+    escala=None:      todas las filas, con total, total_log y tipologia.
+
+    Si origen existe y cambió desde la última ingesta, el archivo se regenera
+    antes de leerlo; con origen=None se lee lo que haya en ruta.
+    """
+    if escala not in ("log", "colones", None):
+        raise ValueError(
+            f"escala desconocida: {escala!r} (usar 'log', 'colones' o None)"
+        )
+    if origen is not None and Path(origen).exists():
+        ingerir(origen, ruta)
+
+    with np.load(ruta) as npz:
+        cab = json.loads(str(npz["__indice__"]))
+        columnas = {}
+        for col in cab["columnas"]:
+            if col in cab["categorias"]:
+                columnas[col] = pd.Categorical.from_codes(
+                    npz[col],
+                    categories=cab["categorias"][col],
+                    ordered=col == "provincia",
+                )
+            elif col == "ano":
+                columnas[col] = npz[col].astype(np.int64)
+            else:
+                columnas[col] = npz[col]
+    df = pd.DataFrame(columnas)
+
+    if escala is None:
+        return df
+    if escala == "log":
+        df = df[df["total_log"] > cab["umbral_log"]].reset_index(drop=True)
+        df["total"] = df["total_log"]
+        # Sin categorías vacías: groupby(observed=False) no debe ver grupos sin filas
+        for col in COLUMNAS_CATEGORICAS:
+            df[col] = df[col].cat.remove_unused_categories()
+    return df[list(COLUMNAS)]
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Ingesta de datos_crudos.xlsx a datos.npz"
+    )
+    parser.add_argument("--origen", default=str(RUTA_DATOS_CRUDOS))
+    parser.add_argument("--destino", default=str(RUTA_DATOS))
+    parser.add_argument(
+        "--forzar",
+        action="store_true",
+        help="regenerar aunque el libro no haya cambiado",
+    )
+    args = parser.parse_args(argv)
+
+    if ingerir(args.origen, args.destino, forzar=args.forzar):
+        cab = leer_cabecera(args.destino)
+        print(
+            f"{cab['filas']} filas -> {args.destino} (sha1 {cab['sha1_origen'][:12]})"
+        )
+    else:
+        print(f"{args.destino} al día con {args.origen}; no se vuelve a leer")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
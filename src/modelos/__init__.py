@@ -0,0 +1 @@
+# Modelos de marginales, cópulas y medidas de riesgo usados por los notebooks y scripts
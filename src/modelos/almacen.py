@@ -0,0 +1,387 @@
+# Almacén compilado de marginales ajustadas (cuerpo y cola)
+#
+# Todas las marginales de res/{provincias,categorias,sectores,cantones,kde}
+# se compilan en un único archivo indexado (res/marginales.npz) que se abre
+# una vez por proceso. Las consultas por (dimensión, nombre) se sirven desde
+# un cache LRU acotado; cada entrada guarda la firma (tamaño, mtime, sha1)
+# del CSV de origen y se vuelve a leer si ese archivo cambia.
+
+from __future__ import annotations
+
+import glob
+import hashlib
+import io
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src.config import DIMENSIONES_MARGINALES, RES_DIR, RUTA_ALMACEN_MARGINALES
+
+VERSION_FORMATO = 1
+
+_PATRON_ARCHIVO = re.compile(
+    r"^(?P<nombre>.+)_(?P<componente>body|tail)_(?P<modelo>.+?)(?:_kde)?\.csv$"
+)
+
+
+def _sha1(datos: bytes) -> str:
+    return hashlib.sha1(datos).hexdigest()
+
+
+def _columnas_param(columnas: List[str], model: str) -> List[str]:
+    # Igual que cargar_tail_params_provincia: primero "<modelo>_param*",
+    # si no hay, cualquier columna con "param"; orden por el número final.
+    cols = [c for c in columnas if c.lower().startswith(model.lower() + "_param")]
+    if not cols:
+        cols = [c for c in columnas if "param" in c.lower()]
+    return sorted(cols, key=lambda s: int("".join(filter(str.isdigit, s)) or 0))
+
+
+def parsear_marginal_csv(datos: bytes, ruta: str) -> Tuple[Dict, Dict[str, np.ndarray]]:
+    """
+    Lee el contenido de un CSV de marginal y devuelve (metadatos, arreglos).
+
+    Los CSV paramétricos son cadenas MCMC; como en cargar_cola, los
+    parámetros se toman de la primera fila. Los CSV KDE guardan la malla
+    (x, f) completa.
+    """
+    encabezado = datos.split(b"\n", 1)[0].decode("utf-8").strip().split(",")
+    es_kde = "x" in encabezado and "f" in encabezado
+    dfp = pd.read_csv(io.BytesIO(datos), nrows=None if es_kde else 1)
+    if dfp.empty:
+        raise ValueError(f"CSV de marginal vacío: {ruta}")
+
+    m = _PATRON_ARCHIVO.match(os.path.basename(ruta))
+    model = str(dfp.loc[0, "model_name"]).strip()
+    meta = {
+        "nombre": m.group("nombre") if m else str(dfp.loc[0, "location"]),
+        "componente": (
+            m.group("componente") if m else str(dfp.loc[0, "model_type"]).strip()
+        ),
+        "model": model,
+        "u": float(dfp.loc[0, "u_opt"]),
+        "p_u": float(dfp.loc[0, "p_u"]),
+        "location": str(dfp.loc[0, "location"]) if "location" in dfp.columns else None,
+    }
+    arreglos: Dict[str, np.ndarray] = {}
+
+    if es_kde:
+        meta["tipo"] = "KDE"
+        meta["params"] = [str(dfp.loc[0, "kernel"]), float(dfp.loc[0, "bandwidth"])]
+        arreglos["x"] = dfp["x"].to_numpy(dtype=float)
+        arreglos["f"] = dfp["f"].to_numpy(dtype=float)
+    else:
+        meta["tipo"] = "parametrico"
+        cols = _columnas_param(list(dfp.columns), model)
+        meta["params"] = [float(dfp.loc[0, c]) for c in cols]
+
+    return meta, arreglos
+
+
+class AlmacenMarginales:
+    """
+    Índice de marginales ajustadas con cache acotado.
+
+    Uso típico (una instancia por proceso vía obtener_almacen()):
+
+        alm = obtener_almacen()
+        tail = alm.cola("provincias", "Alajuela")
+        body = alm.cuerpo("kde", "Limón")
+    """
+
+    def __init__(
+        self,
+        ruta: Path | str = RUTA_ALMACEN_MARGINALES,
+        raiz: Path | str = RES_DIR,
+        dimensiones: Tuple[str, ...] = DIMENSIONES_MARGINALES,
+        max_cache: int = 128,
+    ):
+        self.ruta = Path(ruta)
+        self.raiz = Path(raiz)
+        self.dimensiones = tuple(dimensiones)
+        self.max_cache = int(max_cache)
+        self._indice: Dict[str, Dict] = {}
+        self._arreglos: Dict[str, np.ndarray] = {}
+        self._cache: "OrderedDict[str, Tuple[Tuple[int, int], Dict]]" = OrderedDict()
+        self._lock = threading.RLock()
+        self._abierto = False
+        self._sucio = False
+
+    # ------------------------------------------------------------
+    # Construcción y persistencia
+    # ------------------------------------------------------------
+    def abrir(self) -> "AlmacenMarginales":
+        with self._lock:
+            if self._abierto:
+                return self
+            if self.ruta.exists():
+                try:
+                    self._cargar_artefacto()
+                except (OSError, ValueError, KeyError):
+                    self.construir()
+            else:
+                self.construir()
+            self._abierto = True
+            return self
+
+    def construir(self) -> "AlmacenMarginales":
+        """Recompila el artefacto a partir de todos los CSV de las dimensiones."""
+        with self._lock:
+            self._indice.clear()
+            self._arreglos.clear()
+            self._cache.clear()
+            for dim in self.dimensiones:
+                for ruta in sorted(glob.glob(str(self.raiz / dim / "*.csv"))):
+                    self._registrar(ruta, dim)
+            self._sucio = True
+            self.guardar()
+            self._abierto = True
+            return self
+
+    def guardar(self) -> None:
+        with self._lock:
+            if not self._sucio:
+                return
+            cabecera = {"version": VERSION_FORMATO, "entradas": self._indice}
+            tmp = self.ruta.with_name(self.ruta.name + ".tmp")
+            with open(tmp, "wb") as f:
+                np.savez(
+                    f,
+                    __indice__=np.array(json.dumps(cabecera, ensure_ascii=False)),
+                    **self._arreglos,
+                )
+            os.replace(tmp, self.ruta)
+            self._sucio = False
+
+    def _cargar_artefacto(self) -> None:
+        with np.load(self.ruta, allow_pickle=False) as npz:
+            cabecera = json.loads(str(npz["__indice__"]))
+            if cabecera.get("version") != VERSION_FORMATO:
+                raise ValueError("Versión de almacén de marginales desactualizada")
+            self._indice = cabecera["entradas"]
+            self._arreglos = {k: npz[k] for k in npz.files if k != "__indice__"}
+
+    def _clave(self, ruta: str) -> str:
+        return Path(ruta).resolve().relative_to(self.raiz.resolve()).as_posix()
+
+    def _registrar(self, ruta: str, dimension: Optional[str]) -> Dict:
+        with open(ruta, "rb") as f:
+            datos = f.read()
+        meta, arreglos = parsear_marginal_csv(datos, ruta)
+        st = os.stat(ruta)
+        clave = self._clave(ruta)
+        meta.update(
+            {
+                "dimension": dimension,
+                "fuente": clave,
+                "tamano": st.st_size,
+                "mtime_ns": st.st_mtime_ns,
+                "sha1": _sha1(datos),
+                "arreglos": sorted(arreglos),
+            }
+        )
+        for k in [k for k in self._arreglos if k.startswith(f"{clave}::")]:
+            del self._arreglos[k]
+        for nombre, arr in arreglos.items():
+            self._arreglos[f"{clave}::{nombre}"] = arr
+        self._indice[clave] = meta
+        self._cache.pop(clave, None)
+        self._sucio = True
+        return meta
+
+    # ------------------------------------------------------------
+    # Validación contra los CSV de origen
+    # ------------------------------------------------------------
+    def _vigente(self, meta: Dict) -> bool:
+        ruta = self.raiz / meta["fuente"]
+        st = os.stat(ruta)
+        if (st.st_size, st.st_mtime_ns) == (meta["tamano"], meta["mtime_ns"]):
+            return True
+        if st.st_size != meta["tamano"]:
+            return False
+        # Mismo tamaño, distinto mtime (p. ej. tras un checkout): comparar contenido
+        with open(ruta, "rb") as f:
+            if _sha1(f.read()) != meta["sha1"]:
+                return False
+        meta["mtime_ns"] = st.st_mtime_ns
+        self._sucio = True
+        return True
+
+    def _entrada(self, clave: str) -> Dict:
+        meta = self._indice[clave]
+        ruta = self.raiz / meta["fuente"]
+        if not ruta.exists():
+            del self._indice[clave]
+            self._cache.pop(clave, None)
+            self._sucio = True
+            raise FileNotFoundError(f"La marginal {ruta} ya no existe")
+        firma = (os.stat(ruta).st_size, os.stat(ruta).st_mtime_ns)
+        en_cache = self._cache.get(clave)
+        if en_cache is not None and en_cache[0] == firma:
+            self._cache.move_to_end(clave)
+            return en_cache[1]
+
+        if not self._vigente(meta):
+            meta = self._registrar(str(ruta), meta["dimension"])
+        resultado = self._armar(clave, meta)
+        self._cache[clave] = ((meta["tamano"], meta["mtime_ns"]), resultado)
+        while len(self._cache) > self.max_cache:
+            self._cache.popitem(last=False)
+        return resultado
+
+    def _armar(self, clave: str, meta: Dict) -> Dict:
+        out = {
+            "tipo": meta["tipo"],
+            "model": meta["model"],
+            "u": meta["u"],
+            "p_u": meta["p_u"],
+            "params": tuple(meta["params"]),
+            "location": meta["location"],
+        }
+        if meta["tipo"] == "KDE":
+            x = self._arreglos[f"{clave}::x"]
+            f = self._arreglos[f"{clave}::f"]
+            x.flags.writeable = False
+            f.flags.writeable = False
+            out["x_grid"] = x
+            out["dens"] = f
+        return out
+
+    # ------------------------------------------------------------
+    # Consultas
+    # ------------------------------------------------------------
+    def buscar(
+        self,
+        dimension: str,
+        nombre: str,
+        componente: str = "tail",
+        modelo: Optional[str] = None,
+    ) -> Dict:
+        """
+        Marginal de `nombre` en `dimension` ('provincias', 'categorias', ...).
+        Si hay varios modelos para el mismo componente se devuelve el primero
+        en orden alfabético, salvo que se indique `modelo`.
+        """
+        with self._lock:
+            self.abrir()
+            claves = self._candidatos(dimension, nombre, componente, modelo)
+            if not claves:
+                # Puede haber CSV nuevos desde que se compiló el artefacto
+                self._rescanear(dimension)
+                claves = self._candidatos(dimension, nombre, componente, modelo)
+            if not claves:
+                raise FileNotFoundError(
+                    f"No se encontró {componente} para {nombre} en {self.raiz / dimension}"
+                )
+            resultado = self._entrada(claves[0])
+            self.guardar()
+            return dict(resultado)
+
+    def cola(self, dimension: str, nombre: str, modelo: Optional[str] = None) -> Dict:
+        return self.buscar(dimension, nombre, "tail", modelo)
+
+    def cuerpo(self, dimension: str, nombre: str, modelo: Optional[str] = None) -> Dict:
+        return self.buscar(dimension, nombre, "body", modelo)
+
+    def leer_archivo(self, ruta: str) -> Dict:
+        """Lee un CSV de marginal arbitrario pasando por el mismo cache."""
+        with self._lock:
+            self.abrir()
+            try:
+                clave = self._clave(ruta)
+            except ValueError:
+                clave = None
+            if clave is None or clave not in self._indice:
+                dim = self.dimension_de(os.path.dirname(ruta))
+                if clave is None:
+                    # Fuera de res/: sin persistir en el artefacto
+                    with open(ruta, "rb") as f:
+                        meta, arreglos = parsear_marginal_csv(f.read(), ruta)
+                    out = {
+                        k: meta[k] for k in ("tipo", "model", "u", "p_u", "location")
+                    }
+                    out["params"] = tuple(meta["params"])
+                    if arreglos:
+                        out["x_grid"], out["dens"] = arreglos["x"], arreglos["f"]
+                    return out
+                self._registrar(ruta, dim)
+            resultado = self._entrada(clave)
+            self.guardar()
+            return dict(resultado)
+
+    def _candidatos(self, dimension, nombre, componente, modelo) -> List[str]:
+        return sorted(
+            k
+            for k, m in self._indice.items()
+            if m["dimension"] == dimension
+            and m["nombre"] == nombre
+            and m["componente"] == componente
+            and (modelo is None or m["model"].lower() == modelo.lower())
+        )
+
+    def _rescanear(self, dimension: str) -> None:
+        for ruta in sorted(glob.glob(str(self.raiz / dimension / "*.csv"))):
+            if self._clave(ruta) not in self._indice:
+                self._registrar(
+                    ruta, dimension if dimension in self.dimensiones else None
+                )
+
+    def dimension_de(self, carpeta: str) -> Optional[str]:
+        """'../res/provincias' -> 'provincias' si la carpeta está indexada."""
+        p = Path(carpeta).resolve()
+        if p.parent == self.raiz.resolve() and p.name in self.dimensiones:
+            return p.name
+        return None
+
+    def tabla(self) -> pd.DataFrame:
+        """Resumen del índice (una fila por CSV de origen)."""
+        with self._lock:
+            self.abrir()
+            cols = [
+                "dimension",
+                "nombre",
+                "componente",
+                "model",
+                "tipo",
+                "u",
+                "p_u",
+                "params",
+                "fuente",
+            ]
+            return pd.DataFrame(
+                [{c: m[c] for c in cols} for m in self._indice.values()], columns=cols
+            )
+
+
+_ALMACEN: Optional[AlmacenMarginales] = None
+
+
+def obtener_almacen() -> AlmacenMarginales:
+    """Instancia única del almacén por proceso (se abre en el primer uso)."""
+    global _ALMACEN
+    if _ALMACEN is None:
+        _ALMACEN = AlmacenMarginales().abrir()
+    return _ALMACEN
+
+
+def cargar_cola(nombre: str, carpeta: str) -> Dict:
+    """
+    Reemplazo de cargar_cola / cargar_tail_params_provincia de los notebooks:
+    devuelve {"model", "u", "p_u", "params", ...} de "{nombre}_tail_*.csv".
+    """
+    alm = obtener_almacen()
+    dim = alm.dimension_de(carpeta)
+    if dim is not None:
+        return alm.cola(dim, str(nombre))
+
+    files = sorted(glob.glob(os.path.join(carpeta, f"{nombre}_tail_*.csv")))
+    if not files:
+        raise FileNotFoundError(f"No se encontró tail para {nombre} en {carpeta}")
+    return alm.leer_archivo(files[0])
@@ -0,0 +1,297 @@
+# Almacén en disco de las simulaciones del pool conjunto
+#
+# PoolConjunto.riesgo reduce las simulaciones a VaR/CVaR y las descarta; aquí
+# U (uniformes de la t-cópula) y X (pérdidas, X[:, j] = F_j^-1(U[:, j])) se
+# guardan como .npy en orden Fortran dentro de una carpeta:
+#
+#   <carpeta>/meta.json   versión, semilla, cópula (nu, R), marginales,
+#                         dimensiones, n_sims y tamaño de bloque
+#   <carpeta>/U.npy       n_sims x d
+#   <carpeta>/X.npy       n_sims x d
+#
+# Los arreglos se escriben por bloques con el mismo flujo de números
+# aleatorios que PoolConjunto.riesgo (mismo random_state y tamano_bloque ->
+# mismas simulaciones) y se abren con mmap_mode="r". Cada columna queda
+# contigua en disco, así que una consulta solo lee las columnas que usa y
+# las recorre por bloques de filas: cuantiles y CVaR de cualquier suma
+# ponderada de columnas (RiesgoStreaming, exacto mientras la cola quepa en
+# su buffer) y medias de cola condicionales como CVaR_cond de
+# notebooks/copulas_en_R.qmd, sin volver a simular.
+
+from __future__ import annotations
+
+import json
+import os
+import shutil
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+from numpy.lib.format import open_memmap
+
+from src.config import RUTA_SIMULACIONES
+from src.modelos.riesgo import RiesgoStreaming
+from src.modelos.simulacion_conjunta import Combinacion, PoolConjunto, simular_t_copula
+
+VERSION_FORMATO = 1
+
+# Filas por bloque al recorrer los arreglos en disco
+BLOQUE_LECTURA = 262_144
+
+# Una dimensión se indica como (columna, valor) o como "columna:valor"
+Dimension = Union[Tuple[str, str], str]
+
+
+def _dimension(d: Dimension) -> Tuple[str, str]:
+    if isinstance(d, str):
+        col, _, val = d.partition(":")
+        return col, val
+    return tuple(str(x) for x in d)
+
+
+def _describir_marginal(dim: Tuple[str, str], marg) -> Dict:
+    return {
+        "columna": dim[0],
+        "valor": dim[1],
+        "model": marg.model,
+        "u": marg.u,
+        "p_u": marg.p_u,
+        "params": list(marg.params),
+        "n_cuerpo": marg.n_cuerpo,
+    }
+
+
+def guardar_simulaciones(
+    pool: PoolConjunto,
+    carpeta: Path | str = RUTA_SIMULACIONES / "pool",
+    n_sims: int = 200_000,
+    random_state: Optional[int] = None,
+    tamano_bloque: Optional[int] = None,
+    info: Optional[Dict] = None,
+) -> "AlmacenSimulaciones":
+    """
+    Simula el pool y escribe U y X en carpeta sin tener las n_sims filas en
+    memoria (más allá de un bloque). Se escribe en <carpeta>.tmp y se
+    renombra al final, así que una carpeta existente nunca queda a medias.
+    """
+    carpeta = Path(carpeta)
+    tmp = carpeta.with_name(carpeta.name + ".tmp")
+    if tmp.exists():
+        shutil.rmtree(tmp)
+    tmp.mkdir(parents=True)
+
+    d = len(pool.dimensiones)
+    U = open_memmap(
+        tmp / "U.npy",
+        mode="w+",
+        dtype=np.float64,
+        shape=(n_sims, d),
+        fortran_order=True,
+    )
+    X = open_memmap(
+        tmp / "X.npy",
+        mode="w+",
+        dtype=np.float64,
+        shape=(n_sims, d),
+        fortran_order=True,
+    )
+    rng = np.random.default_rng(random_state)
+    paso = n_sims if tamano_bloque is None else int(tamano_bloque)
+    for inicio in range(0, n_sims, paso):
+        fin = min(inicio + paso, n_sims)
+        u = simular_t_copula(pool.R, pool.nu, fin - inicio, rng)
+        U[inicio:fin] = u
+        for j, marg in enumerate(pool.marginales):
+            X[inicio:fin, j] = marg.ppf(u[:, j])
+    U.flush()
+    X.flush()
+    del U, X
+
+    meta = {
+        "version": VERSION_FORMATO,
+        "n_sims": int(n_sims),
+        "semilla": random_state,
+        "tamano_bloque": tamano_bloque,
+        "copula": {"familia": "t", "nu": pool.nu, "R": pool.R.tolist()},
+        "dimensiones": [list(dim) for dim in pool.dimensiones],
+        "marginales": [
+            _describir_marginal(dim, m)
+            for dim, m in zip(pool.dimensiones, pool.marginales)
+        ],
+        **(info or {}),
+    }
+    with open(tmp / "meta.json", "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=1)
+
+    if carpeta.exists():
+        shutil.rmtree(carpeta)
+    os.replace(tmp, carpeta)
+    return AlmacenSimulaciones(carpeta)
+
+
+class AlmacenSimulaciones:
+    """
+    Simulaciones guardadas por guardar_simulaciones, abiertas en modo solo
+    lectura con memory-mapping. Uso típico:
+
+        sims = AlmacenSimulaciones("res/simulaciones/pool")
+        sims.var_cvar(["provincia:Alajuela", "sector:SOCIAL"], (0.95, 0.995))
+        sims.cvar_condicional("sector:SOCIAL", "provincia:Alajuela", (0.99,))
+    """
+
+    def __init__(self, carpeta: Path | str = RUTA_SIMULACIONES / "pool"):
+        self.carpeta = Path(carpeta)
+        with open(self.carpeta / "meta.json", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        if self.meta.get("version") != VERSION_FORMATO:
+            raise ValueError(
+                f"Versión de simulaciones desactualizada en {self.carpeta}"
+            )
+        self.U = np.load(self.carpeta / "U.npy", mmap_mode="r")
+        self.X = np.load(self.carpeta / "X.npy", mmap_mode="r")
+        forma = (self.meta["n_sims"], len(self.meta["dimensiones"]))
+        if self.U.shape != forma or self.X.shape != forma:
+            raise ValueError(
+                f"Arreglos de {self.carpeta} con forma {self.X.shape}, "
+                f"se esperaba {forma}"
+            )
+        self.dimensiones = [tuple(dim) for dim in self.meta["dimensiones"]]
+        self.indice = {dim: j for j, dim in enumerate(self.dimensiones)}
+
+    @property
+    def n_sims(self) -> int:
+        return int(self.meta["n_sims"])
+
+    def __repr__(self) -> str:
+        return (
+            f"AlmacenSimulaciones({str(self.carpeta)!r}, n_sims={self.n_sims}, "
+            f"d={len(self.dimensiones)})"
+        )
+
+    # ------------------------------------------------------------
+    # Lectura por bloques
+    # ------------------------------------------------------------
+    def columnas(self, dims: Union[Dimension, Sequence[Dimension]]) -> np.ndarray:
+        """Índices de columna de una dimensión o de una lista de dimensiones."""
+        if isinstance(dims, str) or (
+            isinstance(dims, tuple)
+            and len(dims) == 2
+            and all(isinstance(x, str) for x in dims)
+        ):
+            dims = [dims]
+        try:
+            return np.array([self.indice[_dimension(d)] for d in dims], dtype=int)
+        except KeyError as e:
+            raise KeyError(f"Dimensión {e.args[0]} no está en {self.carpeta}") from None
+
+    def _bloques(
+        self,
+        columnas: np.ndarray,
+        pesos: np.ndarray,
+        fuente: str = "X",
+        bloque: int = BLOQUE_LECTURA,
+    ):
+        A = self.X if fuente == "X" else self.U
+        for inicio in range(0, self.n_sims, bloque):
+            fin = min(inicio + bloque, self.n_sims)
+            # Una lectura contigua por columna (orden Fortran)
+            yield np.column_stack([A[inicio:fin, j] for j in columnas]) @ pesos
+
+    def _combinacion(self, dims, pesos) -> Tuple[np.ndarray, np.ndarray]:
+        cols = self.columnas(dims)
+        w = np.ones(cols.size) if pesos is None else np.asarray(pesos, dtype=float)
+        if w.shape != cols.shape:
+            raise ValueError(f"{w.size} pesos para {cols.size} dimensiones")
+        return cols, w
+
+    def suma(self, dims, pesos=None, fuente: str = "X") -> np.ndarray:
+        """S = sum_k pesos_k * X[:, dims_k] en memoria (n_sims valores)."""
+        cols, w = self._combinacion(dims, pesos)
+        return np.concatenate(list(self._bloques(cols, w, fuente)))
+
+    # ------------------------------------------------------------
+    # Consultas
+    # ------------------------------------------------------------
+    def estimador(
+        self,
+        dims,
+        alphas: Sequence[float] = (0.95, 0.99),
+        pesos=None,
+        metodo: str = "lineal",
+        max_buffer: int = 1_000_000,
+    ) -> RiesgoStreaming:
+        """RiesgoStreaming con la suma de dims acumulada bloque a bloque."""
+        cols, w = self._combinacion(dims, pesos)
+        est = RiesgoStreaming(alphas, metodo=metodo, max_buffer=max_buffer)
+        for S in self._bloques(cols, w):
+            est.agregar(S)
+        return est
+
+    def var_cvar(
+        self,
+        dims,
+        alphas: Sequence[float] = (0.95, 0.99),
+        pesos=None,
+        metodo: str = "lineal",
+    ) -> Dict[float, Tuple[float, float]]:
+        """VaR/CVaR de la suma ponderada de dims para cada alpha."""
+        return self.estimador(dims, alphas, pesos, metodo).resultado()
+
+    def cuantiles(
+        self, dims, alphas: Sequence[float], pesos=None, metodo: str = "lineal"
+    ) -> np.ndarray:
+        res = self.var_cvar(dims, alphas, pesos, metodo)
+        return np.array([res[float(a)][0] for a in alphas])
+
+    def cvar_condicional(
+        self,
+        objetivo,
+        condicion,
+        alphas: Sequence[float] = (0.95, 0.99),
+        pesos_objetivo=None,
+        pesos_condicion=None,
+        metodo: str = "lineal",
+    ) -> Dict[float, float]:
+        """
+        E[Y | C >= VaR_alpha(C)] con Y = suma de objetivo y C = suma de
+        condicion (CVaR_cond de copulas_en_R.qmd con Y | X >= VaR_X).
+        """
+        q = self.cuantiles(condicion, alphas, pesos_condicion, metodo)
+        cols_c, w_c = self._combinacion(condicion, pesos_condicion)
+        cols_y, w_y = self._combinacion(objetivo, pesos_objetivo)
+        suma = np.zeros(q.size)
+        cuenta = np.zeros(q.size, dtype=np.int64)
+        for C, Y in zip(self._bloques(cols_c, w_c), self._bloques(cols_y, w_y)):
+            en_cola = C[:, None] >= q[None, :]
+            suma += Y @ en_cola
+            cuenta += en_cola.sum(axis=0)
+        return {
+            float(a): float(s / c) if c > 0 else np.nan
+            for a, s, c in zip(alphas, suma, cuenta)
+        }
+
+    def riesgo(
+        self,
+        combinaciones: Sequence[Combinacion],
+        alphas: Sequence[float] = (0.95, 0.99),
+        max_buffer: int = 1_000_000,
+    ) -> Dict[Tuple, Dict[float, Tuple[float, float]]]:
+        """
+        Igual que PoolConjunto.riesgo, pero sobre las simulaciones guardadas:
+        una sola pasada por bloques para todas las combinaciones.
+        """
+        est = {
+            c.clave: RiesgoStreaming(alphas, metodo=c.metodo, max_buffer=max_buffer)
+            for c in combinaciones
+        }
+        for inicio in range(0, self.n_sims, BLOQUE_LECTURA):
+            fin = min(inicio + BLOQUE_LECTURA, self.n_sims)
+            X = np.asarray(self.X[inicio:fin])
+            for c in combinaciones:
+                est[c.clave].agregar(X[:, c.columnas] @ c.pesos)
+        return {clave: e.resultado() for clave, e in est.items()}
+
+
+def listar_simulaciones(raiz: Path | str = RUTA_SIMULACIONES) -> List[Path]:
+    """Carpetas de raiz con un meta.json (simulaciones guardadas)."""
+    return sorted(p.parent for p in Path(raiz).glob("*/meta.json"))
@@ -0,0 +1,461 @@
+# Backtesting del VaR con origen móvil por año
+#
+# Las tablas de riesgo (pool_*.csv) se ajustan una sola vez con todos los
+# años. Aquí se recorre el eje `ano`: en cada origen t el modelo se ajusta
+# solo con los años <= t y el VaR se compara con lo observado en el año
+# siguiente con datos.
+#
+#   marginales   una pérdida por registro de la dimensión (provincia,
+#                categoría o sector), como las marginales del pool
+#   parejas      X_1 + X_2 por evento, en los eventos con pérdida en ambas
+#                dimensiones, con X la pérdida media por registro de cada
+#                dimensión en el evento (la escala de las marginales; la suma
+#                por evento de tabla_conjunta solo se usa para tau)
+#
+# El modelo es el del pool (src/modelos/simulacion_conjunta.py): marginal
+# híbrida por dimensión, tau de Kendall por evento -> R, t-cópula con nu por
+# verosimilitud compuesta. Entre orígenes solo se reajusta lo que cambió:
+#   - la muestra ordenada de cada dimensión recibe los registros del año
+#     nuevo por inserción (sin reordenar) y solo las dimensiones con datos
+#     nuevos se reajustan;
+#   - el umbral se vuelve a seleccionar (seleccionar_umbral) solo cuando la
+#     muestra creció más de `crecimiento_umbral` desde la última selección;
+#     mientras tanto se conserva la fracción de excesos p_u y la GPD de los
+#     excesos se reajusta arrancando en el theta del origen anterior;
+#   - tau se acumula con TauIncremental (solo pares con eventos nuevos);
+#   - nu se busca en la malla solo alrededor del nu anterior;
+#   - las normales y uniformes de la t-cópula se generan una vez y se
+#     reutilizan en todos los orígenes (números aleatorios comunes), y la
+#     CDF t_nu se tabula una vez por nu;
+#   - solo se simulan las parejas con eventos en el año de prueba (el VaR
+#     marginal es el cuantil exacto de la marginal híbrida).
+# La cola de cada dimensión es una GPD sobre el umbral (ajustar_gpd), no el
+# modelo elegido en res/<carpeta>, que se ajustó con todos los años.
+#
+# Con las violaciones de cada dimensión y pareja, en orden de tiempo:
+#   Kupiec (cobertura incondicional), Christoffersen (independencia) y la
+#   prueba conjunta de cobertura condicional.
+#
+#   res = backtest_var(df, alphas=(0.95, 0.99))
+#   res["resumen"], res["detalle"], res["origenes"]
+
+from __future__ import annotations
+
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from scipy.special import chdtri, stdtr, xlogy
+from scipy.stats import chi2
+
+from src import traza
+from src.modelos.dependencia import TauIncremental
+from src.modelos.marginales import MarginalHibrida
+from src.modelos.pares import TIPOS_PAR
+from src.modelos.simulacion_conjunta import (
+    COLUMNAS,
+    MALLA_NU,
+    Combinacion,
+    correlacion_desde_tau,
+    estimar_nu,
+    evaluar_combinaciones,
+    tabla_conjunta,
+)
+from src.modelos.umbral import ajustar_gpd, seleccionar_umbral
+
+
+# ============================================================
+# Pruebas de cobertura
+# ============================================================
+
+
+def prueba_kupiec(violaciones: int, n: int, alpha: float) -> Tuple[float, float]:
+    """(LR_uc, p-valor) de Kupiec: proporción de violaciones = 1 - alpha."""
+    if n == 0:
+        return np.nan, np.nan
+    p = 1.0 - alpha
+    x = float(violaciones)
+    pi = x / n
+    lr = -2.0 * (
+        xlogy(n - x, 1.0 - p) + xlogy(x, p) - xlogy(n - x, 1.0 - pi) - xlogy(x, pi)
+    )
+    lr = float(lr) if lr > 0 else 0.0
+    return lr, float(chi2.sf(lr, 1))
+
+
+def prueba_christoffersen(violaciones: np.ndarray) -> Tuple[float, float]:
+    """
+    (LR_ind, p-valor) de Christoffersen: la probabilidad de violación no
+    depende de si hubo violación en la observación anterior (cadena de Markov
+    de primer orden contra independencia).
+    """
+    v = np.asarray(violaciones, dtype=bool)
+    if v.size < 2:
+        return np.nan, np.nan
+    antes, despues = v[:-1], v[1:]
+    n00 = float(np.sum(~antes & ~despues))
+    n01 = float(np.sum(~antes & despues))
+    n10 = float(np.sum(antes & ~despues))
+    n11 = float(np.sum(antes & despues))
+    pi01 = n01 / (n00 + n01) if n00 + n01 > 0 else 0.0
+    pi11 = n11 / (n10 + n11) if n10 + n11 > 0 else 0.0
+    pi = (n01 + n11) / (n00 + n01 + n10 + n11)
+    l0 = xlogy(n00 + n10, 1.0 - pi) + xlogy(n01 + n11, pi)
+    l1 = (
+        xlogy(n00, 1.0 - pi01)
+        + xlogy(n01, pi01)
+        + xlogy(n10, 1.0 - pi11)
+        + xlogy(n11, pi11)
+    )
+    lr = float(-2.0 * (l0 - l1))
+    lr = lr if lr > 0 else 0.0
+    return lr, float(chi2.sf(lr, 1))
+
+
+def pruebas_cobertura(violaciones: np.ndarray, alpha: float) -> Dict[str, float]:
+    """Kupiec, Christoffersen y cobertura condicional (LR_cc = LR_uc + LR_ind, chi2(2))."""
+    v = np.asarray(violaciones, dtype=bool)
+    lr_uc, p_uc = prueba_kupiec(int(v.sum()), v.size, alpha)
+    lr_ind, p_ind = prueba_christoffersen(v)
+    lr_cc = lr_uc + lr_ind
+    return {
+        "n": int(v.size),
+        "violaciones": int(v.sum()),
+        "esperadas": (1.0 - alpha) * v.size,
+        "tasa": float(v.mean()) if v.size else np.nan,
+        "LR_uc": lr_uc,
+        "p_uc": p_uc,
+        "LR_ind": lr_ind,
+        "p_ind": p_ind,
+        "LR_cc": lr_cc,
+        "p_cc": float(chi2.sf(lr_cc, 2)) if np.isfinite(lr_cc) else np.nan,
+    }
+
+
+# ============================================================
+# Marginal con reajuste incremental
+# ============================================================
+
+
+class MarginalIncremental:
+    """
+    Muestra ordenada de una dimensión y su marginal híbrida (cuerpo empírico
+    + GPD sobre el umbral), reajustada al agregar observaciones.
+    """
+
+    def __init__(
+        self, crecimiento_umbral: float = 0.5, min_datos: int = 30, **opciones_umbral
+    ):
+        self.crecimiento_umbral = crecimiento_umbral
+        self.min_datos = min_datos
+        self.opciones_umbral = opciones_umbral
+        self.ordenados = np.empty(0)
+        self.p_u: Optional[float] = None
+        self.n_seleccion = 0
+        self.theta: Optional[float] = None
+        self.marginal: Optional[MarginalHibrida] = None
+        self.selecciones = 0
+        self.ajustes = 0
+
+    def agregar(self, valores) -> bool:
+        """Inserta los valores nuevos y reajusta; False si no había nada nuevo."""
+        v = np.sort(np.asarray(valores, dtype=float))
+        v = v[np.isfinite(v)]
+        if v.size == 0:
+            return False
+        self.ordenados = np.insert(
+            self.ordenados, np.searchsorted(self.ordenados, v), v
+        )
+        self._ajustar()
+        return True
+
+    def _ajustar(self) -> None:
+        xs = self.ordenados
+        n = xs.size
+        if n < self.min_datos:
+            return
+        if self.p_u is None or n >= (1.0 + self.crecimiento_umbral) * self.n_seleccion:
+            sel = seleccionar_umbral(xs, **self.opciones_umbral)
+            u, self.p_u, self.n_seleccion = sel["u_opt"], sel["p_u"], n
+            self.selecciones += 1
+        else:
+            u = float(np.quantile(xs, 1.0 - self.p_u))
+        y = xs[np.searchsorted(xs, u, side="right") :] - u
+        if y.size < 2:
+            self.marginal = None
+            return
+        xi, sigma, self.theta, _ = ajustar_gpd(y, self.theta)
+        tail = {"model": "GPD", "u": float(u), "p_u": y.size / n, "params": (sigma, xi)}
+        self.marginal = MarginalHibrida(xs[: n - y.size], tail)
+        self.ajustes += 1
+
+    def var(self, alphas: Sequence[float]) -> np.ndarray:
+        if self.marginal is None:
+            return np.full(len(alphas), np.nan)
+        return np.asarray(self.marginal.ppf(np.asarray(alphas, float)), float)
+
+
+# Tabla de la CDF t_nu en una malla uniforme en asinh(x): error de la
+# interpolación lineal < 1e-7, muy por debajo del error de Monte Carlo
+PUNTOS_TABLA_T = 40_001
+X_MAX_TABLA_T = 1e6
+
+
+def _cdf_t_tabulada(nu: float, cache: Dict[float, Tuple[np.ndarray, np.ndarray]]):
+    """t_nu(x) por interpolación en una tabla que se calcula una vez por nu."""
+    if nu not in cache:
+        s = np.linspace(
+            -np.arcsinh(X_MAX_TABLA_T), np.arcsinh(X_MAX_TABLA_T), PUNTOS_TABLA_T
+        )
+        x = np.sinh(s)
+        cache[nu] = (x, stdtr(nu, x))
+    x, F = cache[nu]
+    return lambda z: np.interp(z, x, F)
+
+
+def _nu_vecino(
+    tabla: pd.DataFrame,
+    R: np.ndarray,
+    N: np.ndarray,
+    nu: Optional[float],
+    min_n: int,
+    malla: Sequence[float] = MALLA_NU,
+) -> float:
+    """
+    Máximo local de la verosimilitud compuesta de nu en la malla, subiendo
+    desde el nu del origen anterior (sin él, la malla completa).
+    """
+    malla = list(malla)
+    if nu is None or nu not in malla:
+        return estimar_nu(tabla, R, N, min_n=min_n, malla=malla)[0]
+    ll: Dict[int, float] = {}
+
+    def evaluar(k):
+        if k not in ll:
+            ll[k] = float(estimar_nu(tabla, R, N, min_n=min_n, malla=(malla[k],))[1][0])
+        return ll[k]
+
+    k = malla.index(nu)
+    while True:
+        vecinos = [j for j in (k - 1, k + 1) if 0 <= j < len(malla)]
+        mejor = max(vecinos, key=evaluar, default=k)
+        if evaluar(mejor) <= evaluar(k):
+            return float(malla[k])
+        k = mejor
+
+
+# ============================================================
+# Recorrido por orígenes
+# ============================================================
+
+
+def backtest_var(
+    df: pd.DataFrame,
+    alphas: Sequence[float] = (0.95, 0.99),
+    min_anos: int = 5,
+    n_sims: int = 50_000,
+    random_state=None,
+    columnas: Sequence[str] = COLUMNAS,
+    min_n: int = 20,
+    crecimiento_umbral: float = 0.5,
+    col_total: str = "total",
+) -> Dict[str, pd.DataFrame]:
+    """
+    VaR con origen móvil: el primer origen es el min_anos-ésimo año con
+    datos y el último el penúltimo. Devuelve
+      "detalle":  VaR de cada origen, dimensión o pareja y alpha, con las
+                  observaciones y violaciones del año de prueba;
+      "resumen":  violaciones y pruebas de Kupiec / Christoffersen por
+                  dimensión o pareja y alpha, sobre todos los años de prueba;
+      "origenes": nu, selecciones de umbral y reajustes de cada origen.
+    """
+    alphas = tuple(float(a) for a in alphas)
+    df = df.dropna(subset=["ano", col_total]).sort_values("ano", kind="stable")
+    tabla = tabla_conjunta(df, columnas, col_total)
+    dims = [(str(c), str(v)) for c, v in tabla.columns]
+    d = len(dims)
+    anos_tabla = tabla.index.get_level_values("ano").to_numpy()
+    X_eventos = tabla.to_numpy(dtype=float)
+    medias = pd.concat(
+        {
+            col: df.groupby(["ano", "evento", col], observed=True)[col_total]
+            .mean()
+            .unstack(col)
+            for col in columnas
+        },
+        axis=1,
+        names=["columna", "valor"],
+    )
+    medias = medias.reindex(index=tabla.index, columns=tabla.columns).to_numpy(
+        dtype=float
+    )
+    anos = np.unique(df["ano"].to_numpy())
+    if anos.size <= min_anos:
+        raise ValueError(f"Se necesitan más de {min_anos} años con datos")
+
+    # Registros por dimensión y año, en orden de tiempo
+    registros = {
+        dim: {
+            a: g[col_total].to_numpy(dtype=float)
+            for a, g in df[df[dim[0]].astype(str) == dim[1]].groupby("ano", sort=True)
+        }
+        for dim in dims
+    }
+
+    parejas = [
+        (i, j)
+        for col1, col2 in TIPOS_PAR
+        if col1 in columnas and col2 in columnas
+        for i, d1 in enumerate(dims)
+        if d1[0] == col1
+        for j, d2 in enumerate(dims)
+        if d2[0] == col2
+    ]
+
+    marginales = [
+        MarginalIncremental(crecimiento_umbral=crecimiento_umbral) for _ in dims
+    ]
+    tau = TauIncremental(d, excluir_ceros=True)
+
+    # Números aleatorios comunes a todos los orígenes
+    rng = np.random.default_rng(random_state)
+    Z = rng.standard_normal((n_sims, d))
+    u_chi = rng.random(n_sims)
+    tablas_t: Dict[float, Tuple[np.ndarray, np.ndarray]] = {}
+
+    detalle: List[Dict] = []
+    origenes: List[Dict] = []
+    violaciones: Dict[Tuple, List[np.ndarray]] = {}
+    nu = None
+    for k in range(min_anos - 1, anos.size - 1):
+        origen, prueba = anos[k], anos[k + 1]
+        nuevos = anos[: k + 1] if k == min_anos - 1 else anos[k : k + 1]
+        with traza.tramo("backtest.origen", origen=int(origen)) as tr:
+            with traza.tramo("backtest.marginales"):
+                reajustadas = 0
+                for dim, marg in zip(dims, marginales):
+                    vals = [registros[dim][a] for a in nuevos if a in registros[dim]]
+                    if vals and marg.agregar(np.concatenate(vals)):
+                        reajustadas += 1
+            with traza.tramo("backtest.copula"):
+                tau.agregar(X_eventos[np.isin(anos_tabla, nuevos)])
+                T, N = tau.tau(min_pares=min_n)
+                T = np.nan_to_num(T, nan=0.0)
+                R = correlacion_desde_tau(T)
+                nu = _nu_vecino(tabla[anos_tabla <= origen], R, N, nu, min_n)
+
+            var_dim = np.array([m.var(alphas) for m in marginales])  # (d, alphas)
+            activas = [j for j, m in enumerate(marginales) if m.marginal is not None]
+            # Solo se simulan las parejas con eventos en el año de prueba
+            M_prueba = medias[anos_tabla == prueba]
+            observadas = np.isfinite(M_prueba)
+            en_prueba = [
+                (i, j)
+                for i, j in parejas
+                if i in activas
+                and j in activas
+                and (observadas[:, i] & observadas[:, j]).any()
+            ]
+            var_par: Dict[Tuple[int, int], np.ndarray] = {}
+            if en_prueba:
+                with traza.tramo(
+                    "backtest.simulacion", n=n_sims, parejas=len(en_prueba)
+                ):
+                    L = np.linalg.cholesky(R + 1e-12 * np.eye(d))
+                    w = np.sqrt(chdtri(nu, 1.0 - u_chi) / nu)
+                    cdf_t = _cdf_t_tabulada(nu, tablas_t)
+                    X = np.full((n_sims, d), np.nan)
+                    for j in sorted({k for par in en_prueba for k in par}):
+                        z = Z[:, : j + 1] @ L[j, : j + 1]
+                        X[:, j] = marginales[j].marginal.ppf(
+                            np.clip(cdf_t(z / w), 1e-12, 1.0 - 1e-12)
+                        )
+                    combs = [
+                        Combinacion((i, j), np.array([i, j]), np.ones(2))
+                        for i, j in en_prueba
+                    ]
+                    res = evaluar_combinaciones(X, combs, alphas)
+                    var_par = {
+                        c.clave: np.array([res[c.clave][a][0] for a in alphas])
+                        for c in combs
+                    }
+            tr.anotar(reajustadas=reajustadas, nu=nu)
+
+        # Año de prueba
+        for j, dim in enumerate(dims):
+            obs = registros[dim].get(prueba)
+            if obs is None or not np.isfinite(var_dim[j]).all():
+                continue
+            for a, q in zip(alphas, var_dim[j]):
+                v = obs > q
+                violaciones.setdefault(("marginal",) + dim + ("", "", a), []).append(v)
+                detalle.append(
+                    {
+                        "tipo": "marginal",
+                        "col1": dim[0],
+                        "val1": dim[1],
+                        "col2": "",
+                        "val2": "",
+                        "origen": int(origen),
+                        "ano_prueba": int(prueba),
+                        "alpha": a,
+                        "VaR": float(q),
+                        "n": int(v.size),
+                        "violaciones": int(v.sum()),
+                    }
+                )
+        for (i, j), qs in var_par.items():
+            ambos = observadas[:, i] & observadas[:, j]
+            S = M_prueba[ambos, i] + M_prueba[ambos, j]
+            for a, q in zip(alphas, qs):
+                v = S > q
+                clave = ("par",) + dims[i] + dims[j] + (a,)
+                violaciones.setdefault(clave, []).append(v)
+                detalle.append(
+                    {
+                        "tipo": "par",
+                        "col1": dims[i][0],
+                        "val1": dims[i][1],
+                        "col2": dims[j][0],
+                        "val2": dims[j][1],
+                        "origen": int(origen),
+                        "ano_prueba": int(prueba),
+                        "alpha": a,
+                        "VaR": float(q),
+                        "n": int(v.size),
+                        "violaciones": int(v.sum()),
+                    }
+                )
+
+        origenes.append(
+            {
+                "origen": int(origen),
+                "ano_prueba": int(prueba),
+                "nu": float(nu),
+                "eventos": int(np.sum(anos_tabla <= origen)),
+                "dimensiones": len(activas),
+                "reajustadas": reajustadas,
+                "selecciones_umbral": sum(m.selecciones for m in marginales),
+            }
+        )
+
+    resumen = pd.DataFrame(
+        [
+            {
+                "tipo": c[0],
+                "col1": c[1],
+                "val1": c[2],
+                "col2": c[3],
+                "val2": c[4],
+                "alpha": c[5],
+                "anos_prueba": len(v),
+                **pruebas_cobertura(np.concatenate(v), c[5]),
+            }
+            for c, v in violaciones.items()
+        ]
+    )
+    return {
+        "resumen": resumen,
+        "detalle": pd.DataFrame(detalle),
+        "origenes": pd.DataFrame(origenes),
+    }
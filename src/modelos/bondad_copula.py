@@ -0,0 +1,250 @@
+# Cópula empírica y prueba de bondad de ajuste por bootstrap paramétrico
+#
+# La cópula empírica C_n(a, b) = #{i : u_i <= a, v_i <= b} / n se evalúa sin
+# recorrer todos los puntos por cada consulta:
+#   - en una malla, con un histograma 2D y sumas acumuladas (O(n + malla));
+#   - en puntos arbitrarios (p. ej. las mismas observaciones), contando
+#     dominancias con ordenamientos por niveles (O(n log^2 n), vectorizado).
+#
+# La prueba de bondad sigue a Genest, Rémillard y Beaudoin (2009):
+#   S_n = sum_i (C_n(U_i) - C_theta(U_i))^2          (Cramér-von Mises)
+#   T_n = sqrt(n) max_i |C_n(U_i) - C_theta(U_i)|    (Kolmogorov-Smirnov)
+# con U_i las pseudo-observaciones (rangos / (n + 1)) y theta estimado por
+# inversión de tau. El p-valor sale de un bootstrap paramétrico: simular n
+# puntos de C_theta, volver a estimar y recalcular el estadístico. Cada
+# réplica tiene su semilla hija, así que el resultado no depende de cuántos
+# procesos se usen.
+
+from __future__ import annotations
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+from scipy.stats import kendalltau, rankdata
+
+from src.modelos.familias_copula import FamiliaCopula, obtener_familia
+
+
+# ============================================================
+# Cópula empírica
+# ============================================================
+
+
+def pseudo_observaciones(x, rng: Optional[np.random.Generator] = None) -> np.ndarray:
+    """
+    Rangos / (n + 1) por columna. Los empates llevan rango promedio, o se
+    rompen al azar si se pasa rng (como pobs(ties.method = "random") en R).
+    """
+    x = np.asarray(x, dtype=float)
+    if rng is None:
+        return rankdata(x, method="average", axis=0) / (x.shape[0] + 1.0)
+    # Orden por valor y, dentro de cada empate, por una clave aleatoria
+    azar = rng.random(x.shape)
+    rangos = np.empty(x.shape)
+    for j in range(x.shape[1]):
+        orden = np.lexsort((azar[:, j], x[:, j]))
+        rangos[orden, j] = np.arange(1, x.shape[0] + 1)
+    return rangos / (x.shape[0] + 1.0)
+
+
+def contar_dominados(px, py, qx, qy) -> np.ndarray:
+    """
+    Para cada consulta (qx_j, qy_j), número de puntos con px <= qx_j y
+    py <= qy_j.
+
+    Puntos y consultas se ordenan juntos por x (puntos antes en empates) y se
+    cuentan, nivel por nivel, los puntos de la mitad izquierda de cada bloque
+    con rango en y menor al de cada consulta de la mitad derecha.
+    """
+    px, py = np.asarray(px, float).ravel(), np.asarray(py, float).ravel()
+    qx, qy = np.asarray(qx, float).ravel(), np.asarray(qy, float).ravel()
+    n, m = px.size, qx.size
+    N = n + m
+    if n == 0 or m == 0:
+        return np.zeros(m, dtype=np.int64)
+
+    es_q = np.r_[np.zeros(n, dtype=bool), np.ones(m, dtype=bool)]
+    orden = np.lexsort((es_q, np.r_[px, qx]))
+    y = np.r_[py, qy][orden]
+    es_q = es_q[orden]
+    ry = np.empty(N, dtype=np.int64)
+    ry[np.lexsort((es_q, y))] = np.arange(N)
+
+    pos = np.arange(N)
+    cuenta = np.zeros(N, dtype=np.int64)
+    ancho = 1
+    while ancho < N:
+        bloque = pos // (2 * ancho)
+        derecha = (pos // ancho) % 2 == 1
+        o = np.argsort(bloque * N + ry, kind="stable")
+        acum = np.cumsum(~derecha[o] & ~es_q[o])
+        b = bloque[o]
+        inicio = np.searchsorted(b, b, side="left")
+        previo = np.where(inicio > 0, acum[inicio - 1], 0)
+        recibe = derecha[o] & es_q[o]
+        cuenta[o[recibe]] += (acum - previo)[recibe]
+        ancho *= 2
+
+    res = np.empty(m, dtype=np.int64)
+    res[orden[es_q] - n] = cuenta[es_q]
+    return res
+
+
+def copula_empirica(u, v, a=None, b=None) -> np.ndarray:
+    """C_n en los puntos (a, b); por defecto en las mismas observaciones."""
+    u = np.asarray(u, float)
+    v = np.asarray(v, float)
+    if a is None:
+        a, b = u, v
+    return contar_dominados(u, v, a, b) / u.size
+
+
+def copula_empirica_malla(u, v, grid_u, grid_v) -> np.ndarray:
+    """C_n en la malla grid_u x grid_v (mismo resultado que empirical_cdf_2d)."""
+    u = np.asarray(u, float)
+    v = np.asarray(v, float)
+    grid_u = np.asarray(grid_u, float)
+    grid_v = np.asarray(grid_v, float)
+    # Primer nodo de la malla >= cada punto; los que quedan fuera no cuentan
+    i = np.searchsorted(grid_u, u, side="left")
+    j = np.searchsorted(grid_v, v, side="left")
+    dentro = (i < grid_u.size) & (j < grid_v.size)
+    conteos = np.zeros((grid_u.size, grid_v.size))
+    np.add.at(conteos, (i[dentro], j[dentro]), 1.0)
+    return conteos.cumsum(axis=0).cumsum(axis=1) / u.size
+
+
+# ============================================================
+# Prueba de bondad de ajuste
+# ============================================================
+
+
+def estadisticos_bondad(U: np.ndarray, familia: FamiliaCopula, par) -> Dict[str, float]:
+    """CvM (S_n) y KS (T_n) entre C_n y C_par en las pseudo-observaciones U."""
+    u, v = U[:, 0], U[:, 1]
+    d = copula_empirica(u, v) - familia.cdf(u, v, par)
+    return {
+        "cvm": float(np.sum(d * d)),
+        "ks": float(np.sqrt(u.size) * np.max(np.abs(d))),
+    }
+
+
+def ajustar_familia(U: np.ndarray, familia: FamiliaCopula):
+    tau = kendalltau(U[:, 0], U[:, 1])[0]
+    tau = float(tau) if np.isfinite(tau) else 0.0
+    return familia.ajustar(U[:, 0], U[:, 1], tau)
+
+
+def _replicas_bootstrap(nombre: str, par, n: int, semillas: Sequence) -> np.ndarray:
+    # Una fila (cvm, ks) por réplica; se ejecuta en los procesos hijos
+    familia = obtener_familia(nombre)
+    out = np.empty((len(semillas), 2))
+    for r, semilla in enumerate(semillas):
+        rng = np.random.default_rng(semilla)
+        U = pseudo_observaciones(familia.simular(n, par, rng))
+        est = estadisticos_bondad(U, familia, ajustar_familia(U, familia))
+        out[r] = est["cvm"], est["ks"]
+    return out
+
+
+def prueba_bondad(
+    x,
+    y,
+    familia: str,
+    n_boot: int = 1000,
+    random_state=None,
+    n_workers: int = 1,
+    executor=None,
+) -> Dict:
+    """
+    Bondad de ajuste de la familia `familia` (nombre corto de VineCopula)
+    para la muestra (x, y) en cualquier escala (solo se usan los rangos).
+    Los empates de la muestra (p. ej. eventos sin pérdida en una de las dos
+    variables) se rompen al azar: las réplicas del bootstrap son continuas y
+    con rangos promedio la prueba rechazaría solo por los empates.
+
+    Devuelve el parámetro estimado, S_n, T_n y sus p-valores
+    (1 + #{réplicas >= observado}) / (n_boot + 1). Con n_workers > 1 las
+    réplicas se reparten en procesos; también se puede pasar un `executor`
+    ya creado para reutilizarlo entre parejas.
+    """
+    fam = obtener_familia(familia)
+    if not isinstance(random_state, np.random.SeedSequence):
+        random_state = np.random.SeedSequence(random_state)
+    semilla_empates, *semillas = random_state.spawn(n_boot + 1)
+
+    x = np.asarray(x, float)
+    y = np.asarray(y, float)
+    ok = np.isfinite(x) & np.isfinite(y)
+    U = pseudo_observaciones(
+        np.column_stack([x[ok], y[ok]]), rng=np.random.default_rng(semilla_empates)
+    )
+    n = U.shape[0]
+
+    par = ajustar_familia(U, fam)
+    obs = estadisticos_bondad(U, fam, par)
+
+    n_trozos = max(1, min(n_boot, 4 * max(1, n_workers)))
+    trozos = [s for s in np.array_split(np.arange(n_boot), n_trozos) if s.size]
+    args = [(fam.nombre, par, n, [semillas[i] for i in t]) for t in trozos]
+
+    if executor is not None:
+        partes = list(executor.map(_replicas_bootstrap, *zip(*args)))
+    elif n_workers > 1:
+        with ProcessPoolExecutor(max_workers=n_workers) as ex:
+            partes = list(ex.map(_replicas_bootstrap, *zip(*args)))
+    else:
+        partes = [_replicas_bootstrap(*a) for a in args]
+    boot = np.vstack(partes)
+
+    return {
+        "familia": fam.nombre,
+        "par": [float(p) for p in par],
+        "tau": float(fam.tau(par)),
+        "n": int(n),
+        "n_boot": int(n_boot),
+        "cvm": obs["cvm"],
+        "p_cvm": float((1 + np.sum(boot[:, 0] >= obs["cvm"])) / (n_boot + 1)),
+        "ks": obs["ks"],
+        "p_ks": float((1 + np.sum(boot[:, 1] >= obs["ks"])) / (n_boot + 1)),
+    }
+
+
+def bondad_pares(
+    pares: Sequence[Dict],
+    n_boot: int = 1000,
+    semilla: int = 123,
+    n_workers: Optional[int] = None,
+    verbose: bool = False,
+) -> list:
+    """
+    prueba_bondad para varias parejas, cada una como dict con x, y, familia
+    (y cualquier otra clave, que se copia al resultado). Un solo pool de
+    procesos se reutiliza para todas; cada pareja usa una semilla hija.
+    """
+    n_workers = n_workers or os.cpu_count() or 1
+    semillas = np.random.SeedSequence(semilla).spawn(len(pares))
+    resultados = []
+    ex = ProcessPoolExecutor(max_workers=n_workers) if n_workers > 1 else None
+    try:
+        for par, s in zip(pares, semillas):
+            res = prueba_bondad(
+                par["x"],
+                par["y"],
+                par["familia"],
+                n_boot=n_boot,
+                random_state=s,
+                executor=ex,
+            )
+            extra = {k: v for k, v in par.items() if k not in ("x", "y", "familia")}
+            resultados.append({**extra, **res})
+            if verbose:
+                print(
+                    f"{extra} {res['familia']}: p_cvm={res['p_cvm']:.3f} p_ks={res['p_ks']:.3f}"
+                )
+    finally:
+        if ex is not None:
+            ex.shutdown()
+    return resultados
@@ -0,0 +1,619 @@
+# Matrices de dependencia por pares: tau de Kendall, correlación y lambda
+#
+# Reemplaza los ciclos dobles de corr_from_tau_pairwise, corr_from_tau y
+# lambda_matrix (notebooks/3_dependencias_tve.ipynb), que llamaban a
+# scipy.stats.kendalltau pareja por pareja. Aquí todas las parejas se
+# resuelven juntas:
+#
+#   - cada pareja (i, j) usa sus observaciones completas (ambas finitas);
+#   - tau-b de Kendall con el algoritmo de Knight (O(n log n) por pareja):
+#     se ordena por (x, y) y los pares discordantes son las inversiones de
+#     y, que se cuentan bit a bit sobre los rangos de y para todas las
+#     parejas a la vez (segmentos de un solo arreglo);
+#   - rho = sin(pi tau / 2) y la matriz de correlación definida positiva
+#     más cercana (Higham, 2002);
+#   - lambda de cola superior implícita (t con nu fijo o Gumbel).
+#
+#   res = matrices_dependencia(U)          # U: DataFrame con NaN
+#   res["n"], res["tau"], res["R"], res["lambda"]
+#
+# Además, lambda de cola superior empírica (sin suponer familia) sobre los
+# rangos de pseudo_u_empirica, para todas las parejas a la vez:
+#   "cfg"      Capéraà-Fougères-Genest (Frahm, Junker y Schmidt, 2005)
+#   "secante"  2 - (1 - C_n(t, t)) / (1 - t) con 1 - t = k / n, k = sqrt(n)
+# con intervalos por bootstrap de bloques móviles sobre los años (filas) y
+# las réplicas repartidas en procesos. Una pareja es significativa si el
+# límite inferior supera lo que da el estimador con independencia y el
+# mismo n (con pocos años ninguno de los dos sale en 0):
+#
+#   res = lambda_empirica(maximos_anuales, estimador="cfg", n_boot=2000, n_workers=4)
+#   res["lambda"], res["inf"], res["sup"], res["significativa"]
+
+from __future__ import annotations
+
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+from scipy.special import stdtr
+from scipy.stats import kendalltau, rankdata
+
+
+# ============================================================
+# tau de Kendall por segmentos
+# ============================================================
+
+
+def _empates(grupo: np.ndarray, *claves: np.ndarray, n_grupos: int) -> np.ndarray:
+    """sum t (t - 1) / 2 por grupo sobre las corridas de valores iguales (ya ordenados)."""
+    if grupo.size == 0:
+        return np.zeros(n_grupos)
+    cambio = np.r_[True, grupo[1:] != grupo[:-1]]
+    for c in claves:
+        cambio |= np.r_[True, c[1:] != c[:-1]]
+    inicio = np.flatnonzero(cambio)
+    t = np.diff(np.r_[inicio, grupo.size]).astype(float)
+    return np.bincount(grupo[inicio], weights=t * (t - 1.0) / 2.0, minlength=n_grupos)
+
+
+def _rangos_en_grupo(grupo: np.ndarray, valores: np.ndarray) -> tuple:
+    """Orden por (grupo, valor) y rango denso del valor dentro de su grupo (0, 1, ...)."""
+    orden = np.lexsort((valores, grupo))
+    g, v = grupo[orden], valores[orden]
+    nuevo_grupo = np.r_[True, g[1:] != g[:-1]]
+    distinto = nuevo_grupo | np.r_[True, v[1:] != v[:-1]]
+    cuenta = np.cumsum(distinto)
+    base = np.maximum.accumulate(np.where(nuevo_grupo, cuenta, 0))
+    rangos = np.empty(grupo.size, dtype=np.int64)
+    rangos[orden] = cuenta - base
+    return orden, rangos
+
+
+def _inversiones(grupo: np.ndarray, yr: np.ndarray, n_grupos: int) -> np.ndarray:
+    """
+    Número de pares (a, b) del mismo grupo con a antes que b e y_a > y_b,
+    para un arreglo ya ordenado por grupo.
+
+    Se recorren los bits del rango de y de mayor a menor (como un radix sort
+    MSD): en cada cubeta (grupo y bits ya vistos) un elemento con bit 0
+    forma inversión con cada elemento anterior con bit 1, y luego la cubeta
+    se parte de forma estable en ceros y unos. Cada nivel es O(n) con sumas
+    acumuladas, sin ordenar.
+    """
+    inv = np.zeros(n_grupos)
+    if yr.size == 0:
+        return inv
+    y = yr.copy()
+    g = grupo.copy()
+    cubeta = g.astype(np.int64)
+    idx = np.arange(y.size)
+    for bit in range(int(y.max()).bit_length() - 1, -1, -1):
+        uno = ((y >> bit) & 1).astype(np.int64)
+        inicio_cubeta = np.r_[True, cubeta[1:] != cubeta[:-1]]
+        inicio = np.maximum.accumulate(np.where(inicio_cubeta, idx, 0))
+        acum = np.cumsum(uno)
+        antes = np.where(inicio > 0, acum[inicio - 1], 0)
+        unos_previos = acum - uno - antes
+        inv += np.bincount(
+            g, weights=np.where(uno == 0, unos_previos, 0), minlength=n_grupos
+        )
+
+        # Partición estable: ceros y luego unos dentro de cada cubeta
+        fin = np.r_[np.flatnonzero(inicio_cubeta)[1:], y.size]
+        fin_de = fin[np.cumsum(inicio_cubeta) - 1]
+        unos_cubeta = acum[fin_de - 1] - antes
+        ceros_cubeta = (fin_de - inicio) - unos_cubeta
+        nueva = np.where(
+            uno == 1,
+            inicio + ceros_cubeta + unos_previos,
+            inicio + (idx - inicio) - unos_previos,
+        )
+        y[nueva], g[nueva], cubeta[nueva] = y.copy(), g.copy(), cubeta * 2 + uno
+    return inv
+
+
+def tau_segmentos(
+    grupo: np.ndarray, x: np.ndarray, y: np.ndarray, n_grupos: int
+) -> np.ndarray:
+    """
+    tau-b de Kendall de cada grupo (como scipy.stats.kendalltau) en una sola
+    pasada; NaN si el grupo tiene menos de 2 datos o una variable constante.
+    """
+    grupo = np.asarray(grupo, dtype=np.int64)
+    n = np.bincount(grupo, minlength=n_grupos).astype(float)
+    orden_x, xr = _rangos_en_grupo(grupo, np.asarray(x, float))
+    orden_y, yr = _rangos_en_grupo(grupo, np.asarray(y, float))
+
+    # Orden por (grupo, x, y) con una sola clave entera
+    M = int(max(xr.max(), yr.max())) + 1 if grupo.size else 1
+    orden = np.argsort((grupo * M + xr) * M + yr, kind="stable")
+    g, xs, ys = grupo[orden], xr[orden], yr[orden]
+
+    n0 = n * (n - 1.0) / 2.0
+    n1 = _empates(g, xs, n_grupos=n_grupos)
+    n3 = _empates(g, xs, ys, n_grupos=n_grupos)
+    n2 = _empates(grupo[orden_y], yr[orden_y], n_grupos=n_grupos)
+
+    discordantes = _inversiones(g, ys, n_grupos)
+    # concordantes - discordantes = n0 - n1 - n2 + n3 - 2 D
+    S = n0 - n1 - n2 + n3 - 2.0 * discordantes
+    den = np.sqrt((n0 - n1) * (n0 - n2))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(den > 0, S / den, np.nan)
+
+
+# Por encima de este número de filas se usa kendalltau pareja por pareja
+N_OBS_SEGMENTOS = 500
+
+
+def tau_por_pares(X, min_pares: int = 3, excluir_ceros: bool = False) -> tuple:
+    """
+    tau de Kendall de todas las parejas de columnas de X (n x d) con las
+    observaciones completas de cada pareja. Con excluir_ceros también se
+    quitan las filas donde ambas columnas valen 0 (como par_por_evento).
+
+    Devuelve (tau, n): matrices d x d; tau queda en NaN si la pareja tiene
+    menos de min_pares observaciones.
+
+    Con muchas observaciones por pareja (n_obs > N_OBS_SEGMENTOS) sale más
+    barato llamar a kendalltau (Knight compilado) pareja por pareja que
+    vectorizar: el costo ya lo domina el ordenamiento y no la sobrecarga de
+    Python. Las máscaras y conteos se siguen calculando en bloque.
+    """
+    X = np.asarray(X, dtype=float)
+    n_obs, d = X.shape
+    idx_i, idx_j = np.triu_indices(d, k=1)
+    ok = np.isfinite(X)
+    N = ok.T.astype(float) @ ok.astype(float)
+
+    tau = np.full((d, d), np.nan)
+    np.fill_diagonal(tau, 1.0)
+    if idx_i.size == 0:
+        return tau, N.astype(int)
+
+    # Parejas en lotes para acotar la memoria (lote x n_obs elementos)
+    lote = max(1, 4_000_000 // max(n_obs, 1))
+    for a in range(0, idx_i.size, lote):
+        i, j = idx_i[a : a + lote], idx_j[a : a + lote]
+        xi, xj = X[:, i].T, X[:, j].T  # (p, n_obs)
+        m = ok[:, i].T & ok[:, j].T
+        if excluir_ceros:
+            m &= (xi != 0) | (xj != 0)
+        cuenta = m.sum(axis=1)
+        if n_obs > N_OBS_SEGMENTOS:
+            t = np.array(
+                [
+                    kendalltau(xi[k, m[k]], xj[k, m[k]])[0]
+                    if cuenta[k] >= 2
+                    else np.nan
+                    for k in range(i.size)
+                ]
+            )
+        else:
+            p_idx, fila = np.nonzero(m)
+            t = tau_segmentos(p_idx, xi[p_idx, fila], xj[p_idx, fila], n_grupos=i.size)
+        t = np.where(cuenta >= min_pares, t, np.nan)
+        tau[i, j] = tau[j, i] = t
+        N[i, j] = N[j, i] = cuenta
+    return tau, N.astype(int)
+
+
+class TauIncremental:
+    """
+    tau-b de Kendall de todas las parejas de columnas, acumulado por lotes de
+    filas (p. ej. un año de eventos a la vez) con el mismo resultado que
+    tau_por_pares sobre todas las filas vistas.
+
+    Por pareja se guardan S = sum sgn(dx) sgn(dy), Ax = sum |sgn(dx)| y
+    Ay = sum |sgn(dy)| sobre los pares de filas válidas, y tau-b =
+    S / sqrt(Ax Ay). Agregar m filas a n ya vistas solo compara las m nuevas
+    contra las n anteriores y entre sí (O(m (n + m)) por pareja), sin volver
+    a ordenar lo anterior.
+    """
+
+    def __init__(self, d: int, excluir_ceros: bool = False):
+        self.d = int(d)
+        self.excluir_ceros = excluir_ceros
+        self.idx_i, self.idx_j = np.triu_indices(self.d, k=1)
+        P = self.idx_i.size
+        self.S, self.Ax, self.Ay = np.zeros(P), np.zeros(P), np.zeros(P)
+        self.N = np.zeros(P, dtype=np.int64)
+        self.X = np.empty((0, self.d))
+
+    def _validas(self, X: np.ndarray) -> np.ndarray:
+        xi, xj = X[:, self.idx_i], X[:, self.idx_j]
+        m = np.isfinite(xi) & np.isfinite(xj)
+        if self.excluir_ceros:
+            m &= (xi != 0) | (xj != 0)
+        return m
+
+    def _acumular(
+        self,
+        A: np.ndarray,
+        mA: np.ndarray,
+        B: np.ndarray,
+        mB: np.ndarray,
+        solo_superior: bool,
+    ) -> None:
+        # Pares (a, b) con a en A y b en B; con solo_superior (A es B) a < b
+        lote = max(1, 2_000_000 // max(B.shape[0] * max(self.idx_i.size, 1), 1))
+        for k in range(0, A.shape[0], lote):
+            sg = np.nan_to_num(np.sign(A[k : k + lote, None, :] - B[None, :, :]))
+            w = mA[k : k + lote, None, :] & mB[None, :, :]
+            if solo_superior:
+                a = np.arange(k, min(k + lote, A.shape[0]))
+                w &= (a[:, None] < np.arange(B.shape[0])[None, :])[:, :, None]
+            sx, sy = sg[:, :, self.idx_i], sg[:, :, self.idx_j]
+            self.S += np.einsum("abp,abp->p", w * sx, sy)
+            self.Ax += np.einsum("abp,abp->p", w, np.abs(sx))
+            self.Ay += np.einsum("abp,abp->p", w, np.abs(sy))
+
+    def agregar(self, X_nuevas) -> None:
+        X_nuevas = np.asarray(X_nuevas, dtype=float).reshape(-1, self.d)
+        if X_nuevas.shape[0] == 0:
+            return
+        m_nuevas = self._validas(X_nuevas)
+        if self.X.shape[0]:
+            self._acumular(X_nuevas, m_nuevas, self.X, self._validas(self.X), False)
+        self._acumular(X_nuevas, m_nuevas, X_nuevas, m_nuevas, True)
+        self.N += m_nuevas.sum(axis=0)
+        self.X = np.vstack([self.X, X_nuevas])
+
+    def tau(self, min_pares: int = 3) -> tuple:
+        """(tau, n) como tau_por_pares: matrices d x d, NaN con menos de min_pares."""
+        tau = np.full((self.d, self.d), np.nan)
+        np.fill_diagonal(tau, 1.0)
+        N = np.zeros((self.d, self.d), dtype=int)
+        np.fill_diagonal(N, np.isfinite(self.X).sum(axis=0))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            t = np.where(
+                (self.Ax > 0) & (self.Ay > 0),
+                self.S / np.sqrt(self.Ax * self.Ay),
+                np.nan,
+            )
+        t = np.where(self.N >= min_pares, t, np.nan)
+        tau[self.idx_i, self.idx_j] = tau[self.idx_j, self.idx_i] = t
+        N[self.idx_i, self.idx_j] = N[self.idx_j, self.idx_i] = self.N
+        return tau, N
+
+
+# ============================================================
+# Correlación definida positiva más cercana
+# ============================================================
+
+
+def correlacion_mas_cercana(
+    R, minimo: float = 1e-6, max_iter: int = 200, tol: float = 1e-10
+) -> np.ndarray:
+    """
+    Matriz de correlación más cercana a R en norma de Frobenius (proyecciones
+    alternadas de Higham con corrección de Dykstra), con valores propios
+    >= minimo. Si R ya es definida positiva se devuelve sin cambios.
+    """
+    R = np.asarray(R, dtype=float)
+    R = 0.5 * (R + R.T)
+    np.fill_diagonal(R, 1.0)
+    if np.linalg.eigvalsh(R).min() >= minimo:
+        return R
+
+    Y = R.copy()
+    dS = np.zeros_like(R)
+    for _ in range(max_iter):
+        Rk = Y - dS
+        val, vec = np.linalg.eigh(Rk)
+        X = (vec * np.clip(val, minimo, None)) @ vec.T
+        dS = X - Rk
+        Y_nuevo = X.copy()
+        np.fill_diagonal(Y_nuevo, 1.0)
+        cambio = np.linalg.norm(Y_nuevo - Y) / max(np.linalg.norm(Y), 1.0)
+        Y = Y_nuevo
+        if cambio < tol:
+            break
+
+    # Fijar la diagonal puede dejar valores propios apenas bajo el mínimo
+    val, vec = np.linalg.eigh(0.5 * (Y + Y.T))
+    Y = (vec * np.clip(val, minimo, None)) @ vec.T
+    d = np.sqrt(np.diag(Y))
+    Y = Y / d[:, None] / d[None, :]
+    np.fill_diagonal(Y, 1.0)
+    return Y
+
+
+# ============================================================
+# Dependencia de cola superior
+# ============================================================
+
+
+def rho_desde_tau(tau):
+    return np.sin(np.pi * np.asarray(tau, dtype=float) / 2.0)
+
+
+def lambda_t(rho, nu: float):
+    """lambda_U de la t-cópula: 2 t_{nu+1}(-sqrt((nu+1)(1-rho)/(1+rho)))."""
+    rho = np.clip(np.asarray(rho, dtype=float), -0.9999, 0.9999)
+    z = np.sqrt((nu + 1.0) * (1.0 - rho) / (1.0 + rho))
+    return 2.0 * stdtr(nu + 1.0, -z)
+
+
+def lambda_gumbel(tau):
+    """lambda_U de la Gumbel con theta = 1 / (1 - tau); 0 si tau <= 0."""
+    tau = np.asarray(tau, dtype=float)
+    with np.errstate(invalid="ignore"):
+        return np.where(tau > 0, 2.0 - 2.0 ** (1.0 - np.clip(tau, 0.0, 1.0)), 0.0)
+
+
+def matriz_lambda(
+    tau: np.ndarray, metodo: str = "auto", nu: float = 5.0, tau_switch: float = 0.05
+) -> tuple:
+    """
+    lambda de cola superior implícita por tau, como fit_pair_robusto:
+    "gumbel", "t" (nu fijo) o "auto" (Gumbel si tau >= tau_switch, si no t).
+    Devuelve (lambda, familia) con familia "G", "t" o "" (sin dato).
+    """
+    tau = np.asarray(tau, dtype=float)
+    lam_t = lambda_t(rho_desde_tau(tau), nu)
+    lam_g = lambda_gumbel(tau)
+    if metodo == "t":
+        usar_g = np.zeros(tau.shape, dtype=bool)
+    elif metodo == "gumbel":
+        usar_g = np.ones(tau.shape, dtype=bool)
+    elif metodo == "auto":
+        usar_g = tau >= tau_switch
+    else:
+        raise ValueError("metodo debe ser 'auto', 't' o 'gumbel'")
+    lam = np.where(usar_g, lam_g, lam_t)
+    familia = np.where(usar_g, "G", "t").astype(object)
+    lam = np.where(np.isfinite(tau), lam, np.nan)
+    familia[~np.isfinite(tau)] = ""
+    np.fill_diagonal(lam, np.nan)
+    np.fill_diagonal(familia, "")
+    return lam, familia
+
+
+# ============================================================
+# Dependencia de cola superior empírica
+# ============================================================
+
+ESTIMADORES_LAMBDA = ("cfg", "secante")
+
+# Réplicas por lote dentro de un proceso (acota réplicas x n x parejas)
+LOTE_REPLICAS = 256
+
+
+def pseudo_u_empirica(X) -> np.ndarray:
+    """
+    Rangos promedio / (n + 1) de cada columna sobre sus datos finitos, como
+    pseudo_u_empirica del notebook; NaN se conserva. X es (..., n, d): las
+    dimensiones iniciales son réplicas independientes.
+    """
+    X = np.asarray(X, dtype=float)
+    r = rankdata(X, axis=-2, nan_policy="omit")
+    n = np.isfinite(X).sum(axis=-2, keepdims=True)
+    return r / (n + 1.0)
+
+
+def _k_secante(n: np.ndarray) -> np.ndarray:
+    return np.maximum(np.floor(np.sqrt(n)), 1.0)
+
+
+def _lambda_parejas(
+    U: np.ndarray, idx_i: np.ndarray, idx_j: np.ndarray, estimador: str
+) -> np.ndarray:
+    """lambda de las parejas (idx_i, idx_j) de U (..., n, d) -> (..., parejas)."""
+    u, v = U[..., idx_i], U[..., idx_j]
+    ok = np.isfinite(u) & np.isfinite(v)
+    n = ok.sum(axis=-2)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        if estimador == "cfg":
+            a, b = -np.log(u), -np.log(v)
+            m = -2.0 * np.log(np.maximum(u, v))
+            termino = np.where(ok, 0.5 * (np.log(a) + np.log(b)) - np.log(m), 0.0)
+            lam = 2.0 - 2.0 * np.exp(termino.sum(axis=-2) / n)
+        elif estimador == "secante":
+            t = 1.0 - _k_secante(n) / n
+            fuera = ok & ((u > t[..., None, :]) | (v > t[..., None, :]))
+            lam = 2.0 - fuera.sum(axis=-2) / (n * (1.0 - t))
+        else:
+            raise ValueError(f"estimador debe ser uno de {ESTIMADORES_LAMBDA}")
+    return np.where(n >= 2, np.clip(lam, 0.0, 1.0), np.nan)
+
+
+def nivel_independencia(
+    n: int, estimador: str, n_sim: int = 2000, semilla: int = 0
+) -> float:
+    """
+    Valor esperado del estimador con n observaciones de dos columnas
+    independientes (rangos al azar); con n pequeño ninguno de los dos es 0.
+    """
+    if n < 2:
+        return np.nan
+    rng = np.random.default_rng(semilla)
+    U = (np.argsort(rng.random((n_sim, n, 2)), axis=1) + 1.0) / (n + 1.0)
+    return float(_lambda_parejas(U, np.array([0]), np.array([1]), estimador).mean())
+
+
+def indices_bloques(
+    n: int, tamano_bloque: int, n_rep: int, rng: np.random.Generator
+) -> np.ndarray:
+    """
+    Filas de n_rep réplicas del bootstrap de bloques móviles: bloques de
+    tamano_bloque filas consecutivas con inicio al azar, hasta completar n.
+    """
+    largo = int(min(max(tamano_bloque, 1), n))
+    n_bloques = -(-n // largo)
+    inicio = rng.integers(0, n - largo + 1, size=(n_rep, n_bloques))
+    return (inicio[:, :, None] + np.arange(largo)).reshape(n_rep, -1)[:, :n]
+
+
+def _replicas_lambda(
+    X: np.ndarray,
+    estimador: str,
+    tamano_bloque: int,
+    semillas: Sequence[np.random.SeedSequence],
+) -> np.ndarray:
+    """lambda (réplicas x parejas) de un trozo de réplicas, una semilla por réplica."""
+    n, d = X.shape
+    idx_i, idx_j = np.triu_indices(d, k=1)
+    out = np.empty((len(semillas), idx_i.size))
+    for a in range(0, len(semillas), LOTE_REPLICAS):
+        lote = semillas[a : a + LOTE_REPLICAS]
+        filas = np.vstack(
+            [
+                indices_bloques(n, tamano_bloque, 1, np.random.default_rng(s))
+                for s in lote
+            ]
+        )
+        out[a : a + len(lote)] = _lambda_parejas(
+            pseudo_u_empirica(X[filas]), idx_i, idx_j, estimador
+        )
+    return out
+
+
+def lambda_empirica(
+    X,
+    estimador: str = "cfg",
+    n_boot: int = 1000,
+    tamano_bloque: Optional[int] = None,
+    nivel: float = 0.95,
+    random_state=None,
+    n_workers: int = 1,
+) -> Dict:
+    """
+    lambda de cola superior empírica de todas las parejas de columnas de X
+    (filas = años en orden, p. ej. máximos anuales por provincia; NaN para
+    los años sin dato) con intervalo bootstrap percentil al `nivel`.
+
+    Las réplicas remuestrean bloques de tamano_bloque años consecutivos
+    (por defecto n^(1/3)) y recalculan los rangos. Cada réplica tiene su
+    propia semilla hija de random_state, así que el resultado es el mismo
+    con cualquier n_workers.
+
+    Devuelve n, lambda, inf, sup, independencia (nivel_independencia con el
+    n de cada pareja) y significativa (inf > independencia). Si X es un
+    DataFrame, todas salen como DataFrames con sus columnas.
+    """
+    if estimador not in ESTIMADORES_LAMBDA:
+        raise ValueError(f"estimador debe ser uno de {ESTIMADORES_LAMBDA}")
+    columnas: Optional[list] = list(X.columns) if isinstance(X, pd.DataFrame) else None
+    X = np.asarray(X, dtype=float)
+    n, d = X.shape
+    idx_i, idx_j = np.triu_indices(d, k=1)
+    if tamano_bloque is None:
+        tamano_bloque = max(1, int(round(n ** (1.0 / 3.0))))
+
+    ok = np.isfinite(X).astype(float)
+    N = ok.T @ ok
+    lam = np.full((d, d), np.nan)
+    lam[idx_i, idx_j] = lam[idx_j, idx_i] = _lambda_parejas(
+        pseudo_u_empirica(X), idx_i, idx_j, estimador
+    )
+
+    if not isinstance(random_state, np.random.SeedSequence):
+        random_state = np.random.SeedSequence(random_state)
+    semillas = random_state.spawn(n_boot)
+    n_trozos = max(1, min(n_boot, 4 * max(1, n_workers)))
+    trozos = [t for t in np.array_split(np.arange(n_boot), n_trozos) if t.size]
+    args = [(X, estimador, tamano_bloque, [semillas[i] for i in t]) for t in trozos]
+    if n_workers > 1 and len(args) > 1:
+        with ProcessPoolExecutor(max_workers=n_workers) as ex:
+            partes = list(ex.map(_replicas_lambda, *zip(*args)))
+    else:
+        partes = [_replicas_lambda(*a) for a in args]
+    boot = np.vstack(partes)
+
+    cola = 50.0 * (1.0 - nivel)
+    inf, sup = np.full((d, d), np.nan), np.full((d, d), np.nan)
+    with np.errstate(invalid="ignore"):
+        q = (
+            np.nanpercentile(boot, [cola, 100.0 - cola], axis=0)
+            if idx_i.size
+            else np.empty((2, 0))
+        )
+    inf[idx_i, idx_j] = inf[idx_j, idx_i] = q[0]
+    sup[idx_i, idx_j] = sup[idx_j, idx_i] = q[1]
+
+    niveles = {
+        m: nivel_independencia(int(m), estimador) for m in np.unique(N[idx_i, idx_j])
+    }
+    indep = np.full((d, d), np.nan)
+    indep[idx_i, idx_j] = indep[idx_j, idx_i] = [niveles[m] for m in N[idx_i, idx_j]]
+    with np.errstate(invalid="ignore"):
+        signif = inf > indep
+
+    out = {
+        "n": N.astype(int),
+        "lambda": lam,
+        "inf": inf,
+        "sup": sup,
+        "independencia": indep,
+        "significativa": signif,
+    }
+    if columnas is not None:
+        out = {
+            k: pd.DataFrame(v, index=columnas, columns=columnas) for k, v in out.items()
+        }
+    out.update(
+        estimador=estimador,
+        n_boot=int(n_boot),
+        tamano_bloque=int(tamano_bloque),
+        nivel=float(nivel),
+    )
+    return out
+
+
+def tabla_lambda_empirica(res: Dict) -> pd.DataFrame:
+    """Una fila por pareja (i < j) con n, lambda, intervalo y significancia."""
+    lam = res["lambda"]
+    if not isinstance(lam, pd.DataFrame):
+        raise TypeError("tabla_lambda_empirica necesita el resultado de un DataFrame")
+    cols = list(lam.columns)
+    idx_i, idx_j = np.triu_indices(len(cols), k=1)
+    return pd.DataFrame(
+        {
+            "var1": [cols[i] for i in idx_i],
+            "var2": [cols[j] for j in idx_j],
+            **{
+                k: res[k].to_numpy()[idx_i, idx_j]
+                for k in ("n", "lambda", "inf", "sup", "independencia", "significativa")
+            },
+            "estimador": res["estimador"],
+        }
+    )
+
+
+# ============================================================
+# Todo en una llamada
+# ============================================================
+
+
+def matrices_dependencia(
+    U,
+    min_pares: int = 3,
+    excluir_ceros: bool = False,
+    minimo_valor_propio: float = 1e-6,
+    metodo_lambda: str = "auto",
+    nu: float = 5.0,
+    tau_switch: float = 0.05,
+) -> Dict:
+    """
+    n (observaciones por pareja), tau, rho = sin(pi tau / 2) (0 donde no hay
+    datos suficientes), R (correlación definida positiva más cercana a rho),
+    lambda y familia de la lambda. Si U es un DataFrame, todas salen como
+    DataFrames con sus columnas.
+    """
+    columnas: Optional[list] = list(U.columns) if isinstance(U, pd.DataFrame) else None
+    tau, N = tau_por_pares(U, min_pares=min_pares, excluir_ceros=excluir_ceros)
+    rho = np.where(np.isfinite(tau), rho_desde_tau(tau), 0.0)
+    np.fill_diagonal(rho, 1.0)
+    R = correlacion_mas_cercana(rho, minimo=minimo_valor_propio)
+    lam, familia = matriz_lambda(
+        tau, metodo=metodo_lambda, nu=nu, tau_switch=tau_switch
+    )
+
+    out = {"n": N, "tau": tau, "rho": rho, "R": R, "lambda": lam, "familia": familia}
+    if columnas is not None:
+        out = {
+            k: pd.DataFrame(v, index=columnas, columns=columnas) for k, v in out.items()
+        }
+    return out
@@ -0,0 +1,635 @@
+# Familias de cópulas bivariadas (vectorizadas)
+#
+# Mismos nombres cortos que VineCopula::BiCopName (los que aparecen en
+# res/copulas): N, t, C, G, F, J y las rotaciones SC, SG, SJ (180°),
+# C90, C270, G90, G270, J90, J270. Igual que en VineCopula, las rotaciones
+# de 90° y 270° llevan el parámetro con signo negativo, así que los
+# parámetros de res/copulas se pueden usar directamente.
+#
+# Cada familia tiene logpdf, cdf, h-función h(v | u) = dC(u, v)/du, su
+# inversa (para simular por inversión condicional), simulación y la relación
+# con tau de Kendall. Todos los métodos aceptan parámetros como arreglos que
+# se difunden contra u y v (p. ej. forma (P, 1) contra datos (P, n)), que es
+# lo que usa el ajuste por lotes de src/modelos/ajuste_copula.py.
+
+from __future__ import annotations
+
+from functools import lru_cache
+from typing import Dict, Tuple
+
+import numpy as np
+from scipy.special import gammaln, ndtr, ndtri, owens_t, stdtr, stdtrit
+
+EPS_U = 1e-12
+TAU_MAX = 0.95
+
+# Nodos de Gauss-Legendre en [0, 1] para la cdf de la t (integral de la h)
+_NODOS, _PESOS = np.polynomial.legendre.leggauss(32)
+_NODOS = 0.5 * (_NODOS + 1.0)
+_PESOS = 0.5 * _PESOS
+
+# ... y para la función de Debye de la Frank (integrando suave, error < 1e-14)
+_NODOS_D, _PESOS_D = np.polynomial.legendre.leggauss(64)
+_NODOS_D = 0.5 * (_NODOS_D + 1.0)
+_PESOS_D = 0.5 * _PESOS_D
+
+
+def _recortar(u):
+    return np.clip(np.asarray(u, dtype=float), EPS_U, 1.0 - EPS_U)
+
+
+def _log_suma_menos_uno(a, b):
+    # log(e^a + e^b - 1) sin desbordes (a, b >= 0)
+    m = np.maximum(a, b)
+    return m + np.log(np.exp(a - m) + np.exp(b - m) - np.exp(-m))
+
+
+def _hinv_biseccion(
+    familia: "FamiliaCopula", w, u, par, iteraciones: int = 52
+) -> np.ndarray:
+    # h(v | u) es creciente en v: bisección vectorizada
+    w, u = np.broadcast_arrays(np.asarray(w, float), np.asarray(u, float))
+    lo = np.zeros(w.shape)
+    hi = np.ones(w.shape)
+    for _ in range(iteraciones):
+        medio = 0.5 * (lo + hi)
+        abajo = familia.h(medio, u, par) < w
+        lo = np.where(abajo, medio, lo)
+        hi = np.where(abajo, hi, medio)
+    return 0.5 * (lo + hi)
+
+
+class FamiliaCopula:
+    """
+    Interfaz común; `par` es siempre una tupla de parámetros.
+
+    Para el ajuste, el primer parámetro se optimiza en una escala sin
+    restricciones z (par_desde_z / z_desde_par) dentro de `limites`.
+    """
+
+    nombre = ""
+    n_params = 1
+    limites = (-np.inf, np.inf)
+
+    def logpdf(self, u, v, par) -> np.ndarray:
+        raise NotImplementedError
+
+    def cdf(self, u, v, par) -> np.ndarray:
+        raise NotImplementedError
+
+    def h(self, v, u, par) -> np.ndarray:
+        """h(v | u) = P(V <= v | U = u)."""
+        raise NotImplementedError
+
+    def hinv(self, w, u, par) -> np.ndarray:
+        """Inversa de h en v: h(hinv(w, u), u) = w."""
+        return _hinv_biseccion(self, w, u, par)
+
+    def simular(self, n: int, par, rng: np.random.Generator) -> np.ndarray:
+        # Inversión condicional: U ~ U(0,1), V = h^-1(W | U)
+        u = rng.uniform(size=n)
+        w = rng.uniform(size=n)
+        return np.column_stack([u, self.hinv(w, u, par)])
+
+    def tau(self, par):
+        raise NotImplementedError
+
+    def par_desde_tau(self, tau) -> Tuple:
+        raise NotImplementedError
+
+    def par_desde_z(self, z):
+        raise NotImplementedError
+
+    def z_desde_par(self, p):
+        raise NotImplementedError
+
+    def ajustar(self, u, v, tau: float) -> Tuple[float, ...]:
+        """Estimador usado en la prueba de bondad (inversión de tau)."""
+        return tuple(float(np.asarray(p).ravel()[0]) for p in self.par_desde_tau(tau))
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.nombre!r})"
+
+
+# ============================================================
+# Elípticas
+# ============================================================
+
+RHO_MAX = 0.9999
+
+
+def _tau_eliptica(rho):
+    return 2.0 / np.pi * np.arcsin(rho)
+
+
+def _rho_desde_tau(tau):
+    return np.clip(np.sin(np.pi * np.asarray(tau, float) / 2.0), -RHO_MAX, RHO_MAX)
+
+
+def normal_bivariada_cdf(h, k, rho) -> np.ndarray:
+    """Phi_2(h, k; rho) con la T de Owen (vectorizada)."""
+    h = np.asarray(h, dtype=float)
+    k = np.asarray(k, dtype=float)
+    # h = 0 o k = 0 (u = 0.5 exacto) deja a_h, a_k indefinidos
+    h = np.where(h == 0.0, 1e-12, h)
+    k = np.where(k == 0.0, 1e-12, k)
+    s = np.sqrt(1.0 - rho * rho)
+    a_h = (k - rho * h) / (h * s)
+    a_k = (h - rho * k) / (k * s)
+    beta = np.where(h * k > 0, 0.0, 0.5)
+    return 0.5 * ndtr(h) + 0.5 * ndtr(k) - owens_t(h, a_h) - owens_t(k, a_k) - beta
+
+
+class _Eliptica(FamiliaCopula):
+    limites = (-RHO_MAX, RHO_MAX)
+
+    def tau(self, par):
+        return _tau_eliptica(par[0])
+
+    def par_desde_z(self, z):
+        return np.tanh(z)
+
+    def z_desde_par(self, p):
+        return np.arctanh(np.clip(p, -RHO_MAX, RHO_MAX))
+
+
+class Gaussiana(_Eliptica):
+    nombre = "N"
+
+    def logpdf(self, u, v, par):
+        (rho,) = par
+        x, y = ndtri(_recortar(u)), ndtri(_recortar(v))
+        r2 = 1.0 - rho * rho
+        return -0.5 * np.log(r2) - (rho * rho * (x * x + y * y) - 2.0 * rho * x * y) / (
+            2.0 * r2
+        )
+
+    def cdf(self, u, v, par):
+        (rho,) = par
+        return np.clip(
+            normal_bivariada_cdf(ndtri(_recortar(u)), ndtri(_recortar(v)), rho),
+            0.0,
+            1.0,
+        )
+
+    def h(self, v, u, par):
+        (rho,) = par
+        x, y = ndtri(_recortar(u)), ndtri(_recortar(v))
+        return ndtr((y - rho * x) / np.sqrt(1.0 - rho * rho))
+
+    def hinv(self, w, u, par):
+        (rho,) = par
+        x = ndtri(_recortar(u))
+        return ndtr(rho * x + np.sqrt(1.0 - rho * rho) * ndtri(_recortar(w)))
+
+    def simular(self, n, par, rng):
+        (rho,) = par
+        z1 = rng.standard_normal(n)
+        z2 = rho * z1 + np.sqrt(1.0 - rho * rho) * rng.standard_normal(n)
+        return np.column_stack([ndtr(z1), ndtr(z2)])
+
+    def par_desde_tau(self, tau):
+        return (_rho_desde_tau(tau),)
+
+
+class StudentT(_Eliptica):
+    nombre = "t"
+    n_params = 2
+    limites_nu = (2.0001, 50.0)
+
+    def logpdf_cuantiles(self, x, y, rho, nu) -> np.ndarray:
+        """log c con x = t_nu^-1(u), y = t_nu^-1(v) ya calculados (perfil en nu)."""
+        r2 = 1.0 - rho * rho
+        log_f2 = (
+            gammaln((nu + 2.0) / 2.0)
+            - gammaln(nu / 2.0)
+            - np.log(nu * np.pi)
+            - 0.5 * np.log(r2)
+            - (nu + 2.0)
+            / 2.0
+            * np.log1p((x * x - 2.0 * rho * x * y + y * y) / (nu * r2))
+        )
+        # log f1(x) + log f1(y) de las marginales t_nu
+        log_f1 = 2.0 * (
+            gammaln((nu + 1.0) / 2.0) - gammaln(nu / 2.0) - 0.5 * np.log(nu * np.pi)
+        ) - (nu + 1.0) / 2.0 * (np.log1p(x * x / nu) + np.log1p(y * y / nu))
+        return log_f2 - log_f1
+
+    def logpdf(self, u, v, par):
+        rho, nu = par
+        return self.logpdf_cuantiles(
+            stdtrit(nu, _recortar(u)), stdtrit(nu, _recortar(v)), rho, nu
+        )
+
+    def h(self, v, u, par):
+        rho, nu = par
+        x = stdtrit(nu, _recortar(u))
+        y = stdtrit(nu, _recortar(v))
+        z = (y - rho * x) / np.sqrt((nu + x * x) * (1.0 - rho * rho) / (nu + 1.0))
+        return stdtr(nu + 1.0, z)
+
+    def hinv(self, w, u, par):
+        rho, nu = par
+        x = stdtrit(nu, _recortar(u))
+        z = stdtrit(nu + 1.0, _recortar(w))
+        return stdtr(
+            nu, rho * x + z * np.sqrt((nu + x * x) * (1.0 - rho * rho) / (nu + 1.0))
+        )
+
+    def cdf(self, u, v, par):
+        # C(u, v) = integral_0^u h(v | w) dw, con w = u s^3 para suavizar w -> 0
+        # (error ~1e-11 contra cuadratura adaptativa)
+        u = _recortar(u)
+        v = _recortar(v)
+        forma = (-1,) + (1,) * u.ndim
+        s = _NODOS.reshape(forma)
+        integrando = self.h(v, u * s**3, par) * 3.0 * s * s
+        return np.clip(u * np.sum(_PESOS.reshape(forma) * integrando, axis=0), 0.0, 1.0)
+
+    def simular(self, n, par, rng):
+        rho, nu = par
+        z1 = rng.standard_normal(n)
+        z2 = rho * z1 + np.sqrt(1.0 - rho * rho) * rng.standard_normal(n)
+        w = np.sqrt(rng.chisquare(nu, n) / nu)
+        return np.column_stack([stdtr(nu, z1 / w), stdtr(nu, z2 / w)])
+
+    def par_desde_tau(self, tau, nu: float = 4.0):
+        return (_rho_desde_tau(tau), np.full(np.shape(tau), float(nu)))
+
+    def ajustar(self, u, v, tau):
+        # rho por inversión de tau; nu por verosimilitud perfil con rho fijo
+        from scipy import optimize
+
+        rho = float(_rho_desde_tau(tau))
+        x_u, x_v = _recortar(u), _recortar(v)
+        res = optimize.minimize_scalar(
+            lambda lnu: -np.sum(self.logpdf(x_u, x_v, (rho, np.exp(lnu)))),
+            bounds=(np.log(2.0), np.log(50.0)),
+            method="bounded",
+        )
+        return (rho, float(np.exp(res.x)))
+
+
+# ============================================================
+# Arquimedianas
+# ============================================================
+
+
+class Clayton(FamiliaCopula):
+    nombre = "C"
+    limites = (1e-4, 28.0)
+
+    def _log_a(self, u, v, theta):
+        # log(u^-theta + v^-theta - 1)
+        return _log_suma_menos_uno(-theta * np.log(u), -theta * np.log(v))
+
+    def logpdf(self, u, v, par):
+        (theta,) = par
+        u, v = _recortar(u), _recortar(v)
+        return (
+            np.log1p(theta)
+            - (1.0 + theta) * (np.log(u) + np.log(v))
+            - (2.0 + 1.0 / theta) * self._log_a(u, v, theta)
+        )
+
+    def cdf(self, u, v, par):
+        (theta,) = par
+        u, v = _recortar(u), _recortar(v)
+        return np.exp(-self._log_a(u, v, theta) / theta)
+
+    def h(self, v, u, par):
+        (theta,) = par
+        u, v = _recortar(u), _recortar(v)
+        return np.exp(
+            -(theta + 1.0) * np.log(u) - (1.0 / theta + 1.0) * self._log_a(u, v, theta)
+        )
+
+    def hinv(self, w, u, par):
+        (theta,) = par
+        u, w = _recortar(u), _recortar(w)
+        base = (w * u ** (theta + 1.0)) ** (-theta / (theta + 1.0)) + 1.0 - u**-theta
+        return np.clip(base, 1.0, None) ** (-1.0 / theta)
+
+    def simular(self, n, par, rng):
+        # Marshall-Olkin con fragilidad gamma
+        (theta,) = par
+        V = rng.gamma(1.0 / theta, 1.0, n)
+        E = rng.standard_exponential((n, 2))
+        return (1.0 + E / V[:, None]) ** (-1.0 / theta)
+
+    def tau(self, par):
+        return par[0] / (par[0] + 2.0)
+
+    def par_desde_tau(self, tau):
+        tau = np.clip(np.asarray(tau, float), 1e-4, TAU_MAX)
+        return (2.0 * tau / (1.0 - tau),)
+
+    def par_desde_z(self, z):
+        return np.exp(z)
+
+    def z_desde_par(self, p):
+        return np.log(p)
+
+
+class Gumbel(FamiliaCopula):
+    nombre = "G"
+    limites = (1.0001, 17.0)
+
+    def _xy(self, u, v, theta):
+        x, y = -np.log(_recortar(u)), -np.log(_recortar(v))
+        log_s = np.logaddexp(theta * np.log(x), theta * np.log(y))
+        return x, y, log_s
+
+    def logpdf(self, u, v, par):
+        (theta,) = par
+        u, v = _recortar(u), _recortar(v)
+        x, y, log_s = self._xy(u, v, theta)
+        A = np.exp(log_s / theta)
+        return (
+            -A
+            - np.log(u)
+            - np.log(v)
+            + (theta - 1.0) * (np.log(x) + np.log(y))
+            + (2.0 / theta - 2.0) * log_s
+            + np.log1p((theta - 1.0) / A)
+        )
+
+    def cdf(self, u, v, par):
+        (theta,) = par
+        _, _, log_s = self._xy(u, v, theta)
+        return np.exp(-np.exp(log_s / theta))
+
+    def h(self, v, u, par):
+        (theta,) = par
+        u = _recortar(u)
+        x, _, log_s = self._xy(u, v, theta)
+        return np.exp(
+            -np.exp(log_s / theta)
+            - np.log(u)
+            + (theta - 1.0) * np.log(x)
+            + (1.0 / theta - 1.0) * log_s
+        )
+
+    def simular(self, n, par, rng):
+        # Marshall-Olkin con fragilidad estable positiva (representación de Kanter)
+        (theta,) = par
+        a = 1.0 / theta
+        W = rng.uniform(0.0, np.pi, n)
+        E0 = rng.standard_exponential(n)
+        if a < 1.0:
+            V = (
+                np.sin(a * W)
+                / np.sin(W) ** (1.0 / a)
+                * (np.sin((1.0 - a) * W) / E0) ** ((1.0 - a) / a)
+            )
+        else:
+            V = np.ones(n)
+        E = rng.standard_exponential((n, 2))
+        return np.exp(-((E / V[:, None]) ** a))
+
+    def tau(self, par):
+        return 1.0 - 1.0 / par[0]
+
+    def par_desde_tau(self, tau):
+        tau = np.clip(np.asarray(tau, float), 1e-4, TAU_MAX)
+        return (1.0 / (1.0 - tau),)
+
+    def par_desde_z(self, z):
+        return 1.0 + np.exp(z)
+
+    def z_desde_par(self, p):
+        return np.log(np.maximum(p - 1.0, 1e-12))
+
+
+def _debye1(theta):
+    """D_1(theta) = (1/theta) int_0^theta t / (e^t - 1) dt (vectorizada)."""
+    theta = np.asarray(theta, float)
+    theta = np.where(np.abs(theta) < 1e-8, 1e-8, theta)
+    forma = (-1,) + (1,) * theta.ndim
+    t = theta * _NODOS_D.reshape(forma)
+    return np.sum(_PESOS_D.reshape(forma) * t / np.expm1(t), axis=0)
+
+
+@lru_cache(maxsize=None)
+def _tabla_tau(nombre: str) -> Tuple[np.ndarray, np.ndarray]:
+    # tau(theta) en una malla (monótona) para invertirla con interpolación
+    fam = FAMILIAS[nombre]
+    lo, hi = fam.limites
+    if nombre == "F":
+        theta = np.geomspace(1e-6, hi, 2000)
+    else:
+        theta = 1.0 + np.geomspace(1e-6, hi - 1.0, 2000)
+    return np.asarray(fam.tau((theta,)), float), theta
+
+
+class Frank(FamiliaCopula):
+    nombre = "F"
+    limites = (-35.0, 35.0)
+
+    @staticmethod
+    def _theta(theta):
+        # theta = 0 es la independencia; se evita la división por cero
+        return np.where(np.abs(theta) < 1e-6, np.where(theta < 0, -1e-6, 1e-6), theta)
+
+    def logpdf(self, u, v, par):
+        theta = self._theta(par[0])
+        u, v = _recortar(u), _recortar(v)
+        D = np.expm1(-theta) + np.expm1(-theta * u) * np.expm1(-theta * v)
+        return (
+            np.log(-theta * np.expm1(-theta))
+            - theta * (u + v)
+            - 2.0 * np.log(np.abs(D))
+        )
+
+    def cdf(self, u, v, par):
+        theta = self._theta(par[0])
+        u, v = _recortar(u), _recortar(v)
+        return (
+            -np.log1p(np.expm1(-theta * u) * np.expm1(-theta * v) / np.expm1(-theta))
+            / theta
+        )
+
+    def h(self, v, u, par):
+        theta = self._theta(par[0])
+        u, v = _recortar(u), _recortar(v)
+        D = np.expm1(-theta) + np.expm1(-theta * u) * np.expm1(-theta * v)
+        return np.exp(-theta * u) * np.expm1(-theta * v) / D
+
+    def hinv(self, w, u, par):
+        theta = self._theta(par[0])
+        u, w = _recortar(u), _recortar(w)
+        return (
+            -np.log1p(w * np.expm1(-theta) / (w + (1.0 - w) * np.exp(-theta * u)))
+            / theta
+        )
+
+    def tau(self, par):
+        theta = np.asarray(par[0], float)
+        seguro = np.where(np.abs(theta) < 1e-8, 1.0, theta)
+        return np.where(
+            np.abs(theta) < 1e-8, 0.0, 1.0 - 4.0 / seguro * (1.0 - _debye1(seguro))
+        )
+
+    def par_desde_tau(self, tau):
+        tau = np.clip(np.asarray(tau, float), -TAU_MAX, TAU_MAX)
+        taus, thetas = _tabla_tau("F")
+        return (np.sign(tau) * np.interp(np.abs(tau), taus, thetas),)
+
+    def par_desde_z(self, z):
+        return z
+
+    def z_desde_par(self, p):
+        return p
+
+
+class Joe(FamiliaCopula):
+    nombre = "J"
+    limites = (1.0001, 30.0)
+
+    def _s(self, u, v, theta):
+        a = (1.0 - _recortar(u)) ** theta
+        b = (1.0 - _recortar(v)) ** theta
+        return a, b, a + b - a * b
+
+    def logpdf(self, u, v, par):
+        (theta,) = par
+        u, v = _recortar(u), _recortar(v)
+        _, _, S = self._s(u, v, theta)
+        return (
+            (1.0 / theta - 2.0) * np.log(S)
+            + (theta - 1.0) * (np.log1p(-u) + np.log1p(-v))
+            + np.log(theta - 1.0 + S)
+        )
+
+    def cdf(self, u, v, par):
+        (theta,) = par
+        _, _, S = self._s(u, v, theta)
+        return 1.0 - S ** (1.0 / theta)
+
+    def h(self, v, u, par):
+        (theta,) = par
+        u = _recortar(u)
+        _, b, S = self._s(u, v, theta)
+        return (1.0 - u) ** (theta - 1.0) * (1.0 - b) * S ** (1.0 / theta - 1.0)
+
+    def tau(self, par):
+        theta = np.asarray(par[0], float)
+        K = 1000
+        k = np.arange(1, K + 1, dtype=float).reshape((-1,) + (1,) * theta.ndim)
+        serie = np.sum(
+            1.0 / (k * (theta * k + 2.0) * (theta * (k - 1.0) + 2.0)), axis=0
+        )
+        # Los términos decaen como 1 / (theta^2 k^3): cola aproximada por la integral
+        return 1.0 - 4.0 * (serie + 1.0 / (2.0 * theta * theta * (K + 0.5) ** 2))
+
+    def par_desde_tau(self, tau):
+        tau = np.clip(np.asarray(tau, float), 1e-4, TAU_MAX)
+        taus, thetas = _tabla_tau("J")
+        return (np.interp(tau, taus, thetas),)
+
+    def par_desde_z(self, z):
+        return 1.0 + np.exp(z)
+
+    def z_desde_par(self, p):
+        return np.log(np.maximum(p - 1.0, 1e-12))
+
+
+# ============================================================
+# Rotaciones (convención de VineCopula)
+# ============================================================
+
+
+class Rotada(FamiliaCopula):
+    """
+    Rotación de una arquimediana C0:
+      180: C(u, v) = u + v - 1 + C0(1-u, 1-v)
+       90: C(u, v) = v - C0(1-u, v)        (parámetro negativo)
+      270: C(u, v) = u - C0(u, 1-v)        (parámetro negativo)
+    """
+
+    def __init__(self, base: FamiliaCopula, grados: int, nombre: str):
+        self.base = base
+        self.grados = grados
+        self.nombre = nombre
+        self.n_params = base.n_params
+        lo, hi = base.limites
+        self.limites = (lo, hi) if grados == 180 else (-hi, -lo)
+
+    def _signo(self):
+        return 1.0 if self.grados == 180 else -1.0
+
+    def _par_base(self, par):
+        return tuple(np.abs(p) for p in par) if self.grados in (90, 270) else tuple(par)
+
+    def logpdf(self, u, v, par):
+        u, v = _recortar(u), _recortar(v)
+        pb = self._par_base(par)
+        if self.grados == 180:
+            return self.base.logpdf(1.0 - u, 1.0 - v, pb)
+        if self.grados == 90:
+            return self.base.logpdf(1.0 - u, v, pb)
+        return self.base.logpdf(u, 1.0 - v, pb)
+
+    def cdf(self, u, v, par):
+        u, v = _recortar(u), _recortar(v)
+        pb = self._par_base(par)
+        if self.grados == 180:
+            return u + v - 1.0 + self.base.cdf(1.0 - u, 1.0 - v, pb)
+        if self.grados == 90:
+            return v - self.base.cdf(1.0 - u, v, pb)
+        return u - self.base.cdf(u, 1.0 - v, pb)
+
+    def h(self, v, u, par):
+        u, v = _recortar(u), _recortar(v)
+        pb = self._par_base(par)
+        if self.grados == 180:
+            return 1.0 - self.base.h(1.0 - v, 1.0 - u, pb)
+        if self.grados == 90:
+            return self.base.h(v, 1.0 - u, pb)
+        return 1.0 - self.base.h(1.0 - v, u, pb)
+
+    def hinv(self, w, u, par):
+        u, w = _recortar(u), _recortar(w)
+        pb = self._par_base(par)
+        if self.grados == 180:
+            return 1.0 - self.base.hinv(1.0 - w, 1.0 - u, pb)
+        if self.grados == 90:
+            return self.base.hinv(w, 1.0 - u, pb)
+        return 1.0 - self.base.hinv(1.0 - w, u, pb)
+
+    def simular(self, n, par, rng):
+        U = self.base.simular(n, self._par_base(par), rng)
+        if self.grados == 180:
+            return 1.0 - U
+        if self.grados == 90:
+            return np.column_stack([1.0 - U[:, 0], U[:, 1]])
+        return np.column_stack([U[:, 0], 1.0 - U[:, 1]])
+
+    def tau(self, par):
+        return self._signo() * self.base.tau(self._par_base(par))
+
+    def par_desde_tau(self, tau):
+        s = self._signo()
+        return tuple(s * p for p in self.base.par_desde_tau(s * np.asarray(tau, float)))
+
+    def par_desde_z(self, z):
+        return self._signo() * self.base.par_desde_z(z)
+
+    def z_desde_par(self, p):
+        return self.base.z_desde_par(self._signo() * p)
+
+
+FAMILIAS: Dict[str, FamiliaCopula] = {}
+for _f in (Gaussiana(), StudentT(), Clayton(), Gumbel(), Frank(), Joe()):
+    FAMILIAS[_f.nombre] = _f
+for _b in ("C", "G", "J"):
+    FAMILIAS["S" + _b] = Rotada(FAMILIAS[_b], 180, "S" + _b)
+    FAMILIAS[_b + "90"] = Rotada(FAMILIAS[_b], 90, _b + "90")
+    FAMILIAS[_b + "270"] = Rotada(FAMILIAS[_b], 270, _b + "270")
+
+
+def obtener_familia(nombre: str) -> FamiliaCopula:
+    try:
+        return FAMILIAS[str(nombre).strip()]
+    except KeyError:
+        raise ValueError(f"Familia de cópula no soportada: {nombre}") from None
@@ -0,0 +1,393 @@
+# KDE por binning lineal + FFT para los cuerpos de las marginales
+#
+# Reemplaza el KernelDensity + GridSearchCV de 0_analisis_exploratorio y la
+# CDF np.cumsum(f) / np.sum(f) que cargar_marginal / construir_Q_body
+# armaban con la malla (x, f) de res/kde en cada llamada:
+#   - los datos se reparten en una malla regular con binning lineal y la
+#     densidad sale de una sola convolución por FFT (todas las parejas de
+#     bins, sin aproximar el soporte del núcleo);
+#   - el ancho de banda se elige maximizando la log-verosimilitud dejando
+#     uno fuera sobre los datos agrupados, para todos los candidatos en una
+#     sola FFT por lotes;
+#   - la CDF se obtiene al ajustar convolucionando con la CDF cerrada del
+#     núcleo (no con sumas acumuladas de la densidad);
+#   - la inversa es una tabla monótona uniforme en p: invertir millones de
+#     uniformes es aritmética de índices, y el error queda acotado por
+#     cota_error (ver KDEBinado.ppf).
+#
+# Núcleos con la misma escala que sklearn.neighbors.KernelDensity:
+# gaussian, epanechnikov, tophat y exponential.
+#
+# Uso típico:
+#   kde = KDEBinado.ajustar(x, "epanechnikov")      # ancho por dejar-uno-fuera
+#   kde = kde.truncar(u)                            # cuerpo: masa en x <= u
+#   kde.ppf(rng.uniform(size=10**6)), kde.cota_error
+
+from __future__ import annotations
+
+import os
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+from scipy.special import ndtr
+
+
+@dataclass(frozen=True)
+class Nucleo:
+    nombre: str
+    pdf: Callable[[np.ndarray], np.ndarray]  # densidad en unidades de h
+    cdf: Callable[[np.ndarray], np.ndarray]
+    radio: float  # masa fuera de [-radio, radio] < 1e-15
+
+
+def _cdf_epanechnikov(t):
+    t = np.clip(t, -1.0, 1.0)
+    return 0.5 + 0.75 * t - 0.25 * t**3
+
+
+def _cdf_exponencial(t):
+    e = 0.5 * np.exp(-np.abs(t))
+    return np.where(t < 0, e, 1.0 - e)
+
+
+NUCLEOS: Dict[str, Nucleo] = {
+    "gaussian": Nucleo(
+        "gaussian", lambda t: np.exp(-0.5 * t * t) / np.sqrt(2.0 * np.pi), ndtr, 8.3
+    ),
+    "epanechnikov": Nucleo(
+        "epanechnikov",
+        lambda t: 0.75 * np.maximum(1.0 - t * t, 0.0),
+        _cdf_epanechnikov,
+        1.0,
+    ),
+    "tophat": Nucleo(
+        "tophat",
+        lambda t: 0.5 * (np.abs(t) < 1.0),
+        lambda t: np.clip(0.5 * (t + 1.0), 0.0, 1.0),
+        1.0,
+    ),
+    "exponential": Nucleo(
+        "exponential", lambda t: 0.5 * np.exp(-np.abs(t)), _cdf_exponencial, 35.0
+    ),
+}
+
+
+def obtener_nucleo(nombre: str) -> Nucleo:
+    try:
+        return NUCLEOS[str(nombre).strip().lower()]
+    except KeyError:
+        raise ValueError(f"Núcleo no soportado: {nombre}") from None
+
+
+# ============================================================
+# Binning lineal y convolución
+# ============================================================
+
+
+def binning_lineal(x: np.ndarray, a: float, delta: float, M: int) -> np.ndarray:
+    """Pesos c_j en la malla a + j * delta (j = 0..M-1); suman len(x)."""
+    t = (np.asarray(x, dtype=float) - a) / delta
+    j = np.clip(np.floor(t).astype(np.int64), 0, M - 2)
+    r = np.clip(t - j, 0.0, 1.0)
+    return np.bincount(j, weights=1.0 - r, minlength=M) + np.bincount(
+        j + 1, weights=r, minlength=M
+    )
+
+
+def _convolucionar(c: np.ndarray, K: np.ndarray) -> np.ndarray:
+    """
+    sum_k c_k K[j - k + M - 1] para j = 0..M-1, con K (..., 2M - 1) los
+    valores del núcleo en los desfases -(M-1)..(M-1). Convolución lineal
+    (sin envolver) por FFT; K puede traer varios núcleos en las primeras
+    dimensiones.
+    """
+    M = c.shape[-1]
+    L = 1 << int(np.ceil(np.log2(3 * M - 2)))
+    conv = np.fft.irfft(np.fft.rfft(c, L) * np.fft.rfft(K, L), L)
+    return conv[..., M - 1 : 2 * M - 1]
+
+
+def _desfases(M: int, delta: float) -> np.ndarray:
+    return np.arange(-(M - 1), M) * delta
+
+
+# ============================================================
+# Ancho de banda por dejar-uno-fuera
+# ============================================================
+
+
+def ancho_referencia(x: np.ndarray) -> float:
+    """Regla de referencia normal 0.9 min(sd, IQR / 1.34) n^(-1/5)."""
+    x = np.asarray(x, dtype=float)
+    iqr = np.subtract(*np.quantile(x, [0.75, 0.25]))
+    s = min(x.std(ddof=1), iqr / 1.34) if iqr > 0 else x.std(ddof=1)
+    return 0.9 * max(s, 1e-12) * x.size**-0.2
+
+
+def log_verosimilitud_loo(
+    x: np.ndarray, nucleo: str, anchos: Sequence[float], M: int = 1024
+) -> np.ndarray:
+    """
+    Log-verosimilitud dejando uno fuera de cada ancho en `anchos`, con los
+    datos agrupados en M bins: sum_j c_j log((n f(g_j) - K(0) / h) / (n - 1)).
+    Todos los anchos salen de una sola FFT por lotes.
+    """
+    x = np.asarray(x, dtype=float)
+    nuc = obtener_nucleo(nucleo)
+    n = x.size
+    a, b = x.min(), x.max()
+    delta = (b - a) / (M - 1) if b > a else 1.0
+    c = binning_lineal(x, a, delta, M)
+    h = np.asarray(anchos, dtype=float)[:, None]
+    K = nuc.pdf(_desfases(M, delta)[None, :] / h) / h
+    f = _convolucionar(c, K) / n
+    f_loo = (n * f - nuc.pdf(np.zeros(1)) / h) / (n - 1)
+    return (c * np.log(np.maximum(f_loo, 1e-300))).sum(axis=1)
+
+
+def ancho_loo(
+    x: np.ndarray, nucleo: str, anchos: Optional[Sequence[float]] = None, M: int = 1024
+) -> float:
+    """Ancho que maximiza la log-verosimilitud dejando uno fuera."""
+    if anchos is None:
+        anchos = ancho_referencia(x) * np.logspace(-1.0, 1.0, 121)
+    anchos = np.asarray(anchos, dtype=float)
+    return float(anchos[np.argmax(log_verosimilitud_loo(x, nucleo, anchos, M))])
+
+
+# ============================================================
+# KDE ajustado
+# ============================================================
+
+
+class KDEBinado:
+    """
+    KDE en una malla regular `malla` con densidad `densidad` y CDF `cdf_malla`
+    (CDF exacta del núcleo sobre los datos agrupados). La CDF entre nodos es
+    lineal. ppf usa una tabla uniforme en p de `n_tabla` celdas; como la
+    cuantil Q de esa CDF y la tabla son monótonas y coinciden en los nodos
+    salvo un paso de malla, |ppf(p) - Q(p)| <= cota_error = ancho máximo de
+    celda de la tabla + paso de la malla. Frente al KDE sin agrupar se suma
+    el error del binning, O(paso^2). Las dos celdas extremas, muy anchas por
+    las colas del núcleo, se invierten directo sobre la malla (error <= un
+    paso).
+
+    Con `limite` la masa se restringe a x <= limite (cuerpo de una marginal
+    híbrida): cdf y ppf quedan renormalizadas por F(limite).
+    """
+
+    def __init__(
+        self,
+        malla: np.ndarray,
+        densidad: np.ndarray,
+        cdf_malla: np.ndarray,
+        nucleo: str,
+        ancho: float,
+        n: int,
+        limite: Optional[float] = None,
+        n_tabla: int = 1 << 14,
+    ):
+        self.malla = np.asarray(malla, dtype=float)
+        self.densidad = np.asarray(densidad, dtype=float)
+        F = np.clip(np.asarray(cdf_malla, dtype=float), 0.0, 1.0)
+        self.cdf_malla = np.maximum.accumulate(F)
+        self.nucleo = obtener_nucleo(nucleo).nombre
+        self.ancho = float(ancho)
+        self.n = int(n)
+        self.limite = None if limite is None else float(limite)
+        self.masa = (
+            1.0
+            if limite is None
+            else float(np.interp(limite, self.malla, self.cdf_malla))
+        )
+        self._construir_tabla(n_tabla)
+
+    @classmethod
+    def ajustar(
+        cls,
+        x,
+        nucleo: str = "gaussian",
+        ancho: Optional[float | str] = "loo",
+        M: int = 1 << 12,
+        M_seleccion: int = 1024,
+        **kwargs,
+    ) -> "KDEBinado":
+        """Ajusta en una malla de M nodos que cubre los datos +- radio * h."""
+        x = np.asarray(x, dtype=float)
+        x = x[np.isfinite(x)]
+        if ancho is None or ancho == "loo":
+            h = ancho_loo(x, nucleo, M=M_seleccion)
+        elif ancho == "referencia":
+            h = ancho_referencia(x)
+        else:
+            h = float(ancho)
+        nuc = obtener_nucleo(nucleo)
+        a = x.min() - nuc.radio * h
+        b = x.max() + nuc.radio * h
+        delta = (b - a) / (M - 1)
+        c = binning_lineal(x, a, delta, M)
+        t = _desfases(M, delta) / h
+        dens = _convolucionar(c, nuc.pdf(t) / h) / x.size
+        # CDF exacta del núcleo: sum_k c_k K_cdf((g_j - g_k) / h) / n
+        F = _convolucionar(c, nuc.cdf(t)) / x.size
+        return cls(
+            a + delta * np.arange(M),
+            np.maximum(dens, 0.0),
+            F,
+            nuc.nombre,
+            h,
+            x.size,
+            **kwargs,
+        )
+
+    @classmethod
+    def desde_malla(
+        cls, x, f, nucleo: str, ancho: float, F=None, **kwargs
+    ) -> "KDEBinado":
+        """
+        Desde una malla guardada (CSV de res/kde). Sin la columna F la CDF
+        se integra con trapecios, no con cumsum(f) / sum(f).
+        """
+        x = np.asarray(x, dtype=float)
+        f = np.asarray(f, dtype=float)
+        if F is None:
+            F = np.concatenate([[0.0], np.cumsum(0.5 * (f[1:] + f[:-1]) * np.diff(x))])
+            F = F / F[-1]
+        return cls(x, f, F, nucleo, ancho, n=0, **kwargs)
+
+    def truncar(self, limite: float) -> "KDEBinado":
+        """Mismo KDE con la masa restringida a x <= limite."""
+        return KDEBinado(
+            self.malla,
+            self.densidad,
+            self.cdf_malla,
+            self.nucleo,
+            self.ancho,
+            self.n,
+            limite=limite,
+            n_tabla=self._tabla.size - 1,
+        )
+
+    def __repr__(self) -> str:
+        return (
+            f"KDEBinado(nucleo={self.nucleo!r}, ancho={self.ancho:.4g}, n={self.n}, "
+            f"nodos={self.malla.size}, cota_error={self.cota_error:.2e})"
+        )
+
+    # ------------------------------------------------------------
+    def _construir_tabla(self, n_tabla: int) -> None:
+        # Tabla de la inversa en p_i = i / n_tabla sobre la CDF renormalizada;
+        # los extremos se fijan en la primera y última x con masa.
+        F = self.cdf_malla / self.masa
+        hi = (
+            self.malla.size
+            if self.limite is None
+            else int(np.searchsorted(self.malla, self.limite, side="right"))
+        )
+        x, F = self.malla[:hi], np.minimum(F[:hi], 1.0)
+        if self.limite is not None and (x.size == 0 or x[-1] < self.limite):
+            x, F = np.append(x, self.limite), np.append(F, 1.0)
+        lo = max(0, int(np.searchsorted(F, 0.0, side="right")) - 1)
+        x, F = x[lo:], F[lo:]
+        p = np.linspace(0.0, 1.0, n_tabla + 1)
+        # np.interp necesita F estrictamente creciente: en los tramos sin
+        # masa (F constante) se toma el primer nodo
+        F_u, idx = np.unique(F, return_index=True)
+        self._F, self._x = F_u, x[idx]
+        self._tabla = np.interp(p, self._F, self._x)
+        self.paso = float(self.malla[1] - self.malla[0])
+        # Las celdas extremas (colas del núcleo) se invierten sobre la malla
+        self.cota_error = float(np.diff(self._tabla[1:-1]).max(initial=0.0) + self.paso)
+
+    def pdf(self, x):
+        x = np.asarray(x, dtype=float)
+        f = np.interp(x, self.malla, self.densidad, left=0.0, right=0.0) / self.masa
+        if self.limite is not None:
+            f = np.where(x <= self.limite, f, 0.0)
+        return f
+
+    def cdf(self, x):
+        x = np.asarray(x, dtype=float)
+        F = np.interp(x, self.malla, self.cdf_malla, left=0.0, right=1.0) / self.masa
+        return np.minimum(F, 1.0)
+
+    def ppf(self, p):
+        """Inversa por la tabla: índice de celda y una interpolación lineal.
+        p en la primera o la última celda se invierte con la CDF de la malla."""
+        escalar = np.ndim(p) == 0
+        p = np.clip(np.atleast_1d(np.asarray(p, dtype=float)), 0.0, 1.0)
+        m = self._tabla.size - 1
+        t = p * m
+        i = np.minimum(t.astype(np.int64), m - 1)
+        r = t - i
+        q = self._tabla[i] + r * (self._tabla[i + 1] - self._tabla[i])
+        extremo = (i == 0) | (i == m - 1)
+        if extremo.any():
+            q[extremo] = np.interp(p[extremo], self._F, self._x)
+        return float(q[0]) if escalar else q
+
+    def rvs(
+        self, size, random_state: Optional[int | np.random.Generator] = None
+    ) -> np.ndarray:
+        return self.ppf(np.random.default_rng(random_state).uniform(size=size))
+
+
+# ============================================================
+# CSV de res/kde
+# ============================================================
+
+
+def guardar_kde_csv(
+    kde: KDEBinado,
+    ruta: str,
+    location: str,
+    u_opt: float,
+    p_u: float,
+    model_type: str = "body",
+    nodos: int = 500,
+) -> str:
+    """
+    Escribe la malla en el formato de res/kde (x, f, model_name, model_type,
+    kernel, bandwidth, u_opt, p_u, location) más la columna F con la CDF
+    exacta; la malla se remuestrea a `nodos` puntos entre el cuantil 1e-6 y
+    el límite (o el final de la malla).
+    """
+    b = kde.limite if kde.limite is not None else kde.malla[-1]
+    x = np.linspace(min(float(kde.ppf(1e-6)), b), b, nodos)
+    tabla = pd.DataFrame(
+        {
+            "x": x,
+            "f": kde.pdf(x),
+            "F": kde.cdf(x),
+            "model_name": f"KDE-{kde.nucleo}",
+            "model_type": model_type,
+            "kernel": kde.nucleo,
+            "bandwidth": kde.ancho,
+            "u_opt": u_opt,
+            "p_u": p_u,
+            "location": location,
+        }
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(ruta)), exist_ok=True)
+    tabla.to_csv(ruta, index=False)
+    return ruta
+
+
+def leer_kde_csv(ruta: str, **kwargs) -> KDEBinado:
+    """KDE de un CSV de res/kde; el cuerpo se trunca en u_opt."""
+    tabla = pd.read_csv(ruta)
+    F = tabla["F"].to_numpy(dtype=float) if "F" in tabla.columns else None
+    kde = KDEBinado.desde_malla(
+        tabla["x"],
+        tabla["f"],
+        str(tabla.loc[0, "kernel"]),
+        float(tabla.loc[0, "bandwidth"]),
+        F=F,
+        **kwargs,
+    )
+    if str(tabla.loc[0, "model_type"]).strip() == "body":
+        # Si la malla no llega a u_opt se corta en su último nodo
+        kde = kde.truncar(min(float(tabla.loc[0, "u_opt"]), kde.malla[-1]))
+    return kde
@@ -0,0 +1,197 @@
+# Marginales híbridas (cuerpo empírico + cola EVT) vectorizadas
+#
+# Reemplaza las versiones escalares F_hybrid / Q_hybrid / F_total_hibrida /
+# Q_total_hibrida de los notebooks: el cuerpo se ordena una sola vez y la cola
+# se evalúa con fórmulas cerradas sobre arreglos completos.
+
+from __future__ import annotations
+
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+from scipy.special import ndtr, ndtri
+
+EPS_ALPHA = 1e-12
+
+MODELOS_COLA = ("gpd", "pareto", "burr", "lognormal")
+
+
+def normalizar_modelo(model: str) -> str:
+    """Nombre canónico del modelo de cola ('LN_tail' -> 'lognormal', etc.)."""
+    m = str(model).strip().lower()
+    if m in ("gpd", "pareto", "burr"):
+        return m
+    if m.startswith("ln") or m.startswith("lognormal"):
+        return "lognormal"
+    raise ValueError(f"Modelo de cola no soportado: {model}")
+
+
+def _salida(x, out: np.ndarray):
+    # Mantiene la firma escalar de las funciones originales de los notebooks
+    return float(out) if np.ndim(x) == 0 else out
+
+
+# ============================================================
+# CDF y cuantil de los excesos Y = X - u
+# ============================================================
+
+
+def F_exc(y, model: str, params: Tuple[float, ...]):
+    """CDF de los excesos para GPD (sigma, xi), Pareto (xm, k), Burr (c, k, lam)
+    y lognormal (mu, sig). Acepta escalares o arreglos."""
+    m = normalizar_modelo(model)
+    y_arr = np.asarray(y, dtype=float)
+    out = np.zeros(y_arr.shape, dtype=float)
+    pos = y_arr > 0
+    yp = y_arr[pos]
+
+    if m == "gpd":
+        sigma, xi = params
+        if abs(xi) < 1e-12:
+            F = -np.expm1(-yp / sigma)
+        else:
+            base = 1.0 + xi * yp / sigma
+            # base <= 0 solo ocurre con xi < 0, fuera del soporte -> F = 1
+            F = np.where(base > 0, 1.0 - np.maximum(base, 1e-300) ** (-1.0 / xi), 1.0)
+    elif m == "pareto":
+        xm, k = params
+        F = 1.0 - (xm / (xm + yp)) ** k
+    elif m == "burr":
+        c, k, lam = params
+        F = 1.0 - (1.0 + (yp / lam) ** c) ** (-k)
+    else:
+        mu, sig = params
+        F = ndtr((np.log(yp) - mu) / sig)
+
+    out[pos] = F
+    out[np.isnan(y_arr)] = np.nan
+    return _salida(y, out)
+
+
+def Q_exc(alpha_exc, model: str, params: Tuple[float, ...]):
+    """Inversa cerrada de F_exc (alpha_exc se recorta a (0, 1)).
+
+    Los parámetros pueden ser arreglos que se difunden contra alpha_exc,
+    p. ej. (draws, 1) contra (n,) da la matriz (draws, n)."""
+    m = normalizar_modelo(model)
+    p = np.clip(np.asarray(alpha_exc, dtype=float), EPS_ALPHA, 1.0 - EPS_ALPHA)
+    log_sup = np.log1p(-p)  # log(1 - p) < 0
+
+    if m == "gpd":
+        sigma, xi = params
+        if np.ndim(xi) == 0:
+            if abs(xi) < 1e-12:
+                q = -sigma * log_sup
+            else:
+                q = (sigma / xi) * np.expm1(-xi * log_sup)
+        else:
+            cero = np.abs(xi) < 1e-12
+            xi_s = np.where(cero, 1.0, xi)
+            q = np.where(
+                cero, -sigma * log_sup, (sigma / xi_s) * np.expm1(-xi_s * log_sup)
+            )
+    elif m == "pareto":
+        xm, k = params
+        q = xm * np.expm1(-(1.0 / k) * log_sup)
+    elif m == "burr":
+        c, k, lam = params
+        inner = np.maximum(np.expm1(-(1.0 / k) * log_sup), 1e-18)
+        q = lam * inner ** (1.0 / c)
+    else:
+        mu, sig = params
+        q = np.exp(mu + sig * ndtri(p))
+
+    return _salida(alpha_exc, np.asarray(q, dtype=float))
+
+
+# ============================================================
+# Marginal compilada
+# ============================================================
+
+
+class MarginalHibrida:
+    """
+    Marginal híbrida con cuerpo empírico y cola EVT por encima del umbral u:
+
+        F(x) = (r(x) + a) / (n + b)              si x <= u
+        F(x) = 1 - p_u * (1 - F_exc(x - u))      si x >  u
+
+    donde r(x) es el número de observaciones del cuerpo <= x. El cuerpo se
+    ordena una sola vez al construir el objeto; cdf, ppf y rvs reciben y
+    devuelven arreglos.
+
+    tail es el diccionario que devuelven los cargadores de colas:
+    {"model", "u", "p_u", "params"}.
+    """
+
+    def __init__(
+        self, body_sample: np.ndarray, tail: Dict, a: float = 1.0, b: float = 2.0
+    ):
+        s = np.asarray(body_sample, dtype=float).ravel()
+        self.cuerpo = np.sort(s[~np.isnan(s)])
+        self.tail = tail
+        self.model = normalizar_modelo(tail["model"])
+        self.u = float(tail["u"])
+        self.p_u = float(tail["p_u"])
+        self.params = tuple(float(p) for p in tail["params"])
+        self.a = float(a)
+        self.b = float(b)
+
+    @classmethod
+    def desde_serie(cls, valores, tail: Dict, **kwargs) -> "MarginalHibrida":
+        """Usa como cuerpo las observaciones <= u (como U_variable)."""
+        vals = np.asarray(valores, dtype=float)
+        return cls(vals[vals <= float(tail["u"])], tail, **kwargs)
+
+    @property
+    def n_cuerpo(self) -> int:
+        return int(self.cuerpo.size)
+
+    def __repr__(self) -> str:
+        return (
+            f"MarginalHibrida(model={self.model!r}, u={self.u:.4g}, "
+            f"p_u={self.p_u:.4g}, n_cuerpo={self.n_cuerpo})"
+        )
+
+    def cdf(self, x):
+        x_arr = np.asarray(x, dtype=float)
+        out = np.empty(x_arr.shape, dtype=float)
+
+        en_cuerpo = x_arr <= self.u
+        if self.n_cuerpo == 0:
+            out[en_cuerpo] = np.nan
+        else:
+            r = np.searchsorted(self.cuerpo, x_arr[en_cuerpo], side="right")
+            out[en_cuerpo] = (r + self.a) / (self.n_cuerpo + self.b)
+
+        en_cola = ~en_cuerpo
+        F = F_exc(x_arr[en_cola] - self.u, self.model, self.params)
+        out[en_cola] = 1.0 - self.p_u * (1.0 - F)
+        out[np.isnan(x_arr)] = np.nan
+        return _salida(x, out)
+
+    def ppf(self, alpha, metodo: str = "linear"):
+        """Cuantil híbrido. metodo es el de np.quantile para el cuerpo
+        ('linear' en Q_hybrid, 'nearest' en Q_total_hibrida)."""
+        al = np.clip(np.asarray(alpha, dtype=float), EPS_ALPHA, 1.0 - EPS_ALPHA)
+        out = np.empty(al.shape, dtype=float)
+
+        en_cuerpo = al <= (1.0 - self.p_u)
+        if self.n_cuerpo == 0:
+            out[en_cuerpo] = np.nan
+        elif en_cuerpo.any():
+            out[en_cuerpo] = np.quantile(self.cuerpo, al[en_cuerpo], method=metodo)
+
+        en_cola = ~en_cuerpo
+        alpha_exc = (al[en_cola] - (1.0 - self.p_u)) / self.p_u
+        out[en_cola] = self.u + Q_exc(alpha_exc, self.model, self.params)
+        return _salida(alpha, out)
+
+    def rvs(
+        self,
+        size,
+        random_state: Optional[int | np.random.Generator] = None,
+        metodo: str = "linear",
+    ) -> np.ndarray:
+        rng = np.random.default_rng(random_state)
+        return self.ppf(rng.uniform(size=size), metodo=metodo)
@@ -0,0 +1,562 @@
+# MCMC de las marginales paramétricas (cuerpo y cola) con varias cadenas
+#
+# Reemplaza mcmc_metropolis / ajuste_distribucion de notebooks/tve_colas.qmd
+# (una sola cadena, paso fijo sigma y todas las iteraciones a CSV):
+#
+#   - se corren varias cadenas a la vez; la log-verosimilitud se evalúa para
+#     todas en una sola operación (matriz cadenas x datos, o con estadísticos
+#     suficientes cuando el modelo los tiene);
+#   - la propuesta es un paseo aleatorio en log-parámetros con covarianza
+#     adaptativa (Haario et al., 2001) y escala ajustada hacia una tasa de
+#     aceptación de 0.234; la adaptación se congela al terminar el burn-in;
+#   - se reportan R-hat dividido y ESS (Gelman et al., BDA3, cap. 11) y solo
+#     se guardan las iteraciones después del burn-in, adelgazadas.
+#
+# La previa es la de log_prior_generic en R, Gamma(2, 1) independiente en
+# cada parámetro positivo, salvo xi de la GPD: ahí se deja libre (colas
+# acotadas con xi < 0, como en las cadenas de res/mcmc) con previa N(0, 1) y
+# soporte 1 + xi y / sigma > 0.
+#
+# Parametrizaciones (las mismas columnas <modelo>_param1, 2, 3 de res/):
+#   Weibull (forma, escala)      Gamma (forma, tasa)
+#   Lognormal (mu, sigma)        Fisk (c, escala)
+#   GPD (xi, sigma)              Burr (c, k, lambda)  -> burr12 de scipy
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+import json
+import os
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from scipy.optimize import minimize
+from scipy.special import gammaln
+
+from src.config import RUTA_POSTERIOR_MCMC
+
+LOG_2PI = np.log(2.0 * np.pi)
+
+
+# ============================================================
+# Log-verosimilitudes vectorizadas en las cadenas
+# ============================================================
+#
+# Cada función recibe theta (cadenas x parámetros) y los datos ya
+# preprocesados por `_datos_basicos` y devuelve un arreglo (cadenas,).
+
+
+def _datos_basicos(x: np.ndarray) -> Dict:
+    x = np.asarray(x, dtype=float)
+    lx = np.log(x)
+    return {
+        "x": x,
+        "lx": lx,
+        "n": x.size,
+        "s_lx": lx.sum(),
+        "s_x": x.sum(),
+        "s_lx2": np.sum(lx * lx),
+    }
+
+
+def _ll_weibull(theta, d):
+    k, lam = theta[:, :1], theta[:, 1:2]
+    z = d["lx"][None, :] - np.log(lam)
+    return (
+        d["n"] * (np.log(k[:, 0]) - np.log(lam[:, 0]))
+        + (k[:, 0] - 1.0) * (d["s_lx"] - d["n"] * np.log(lam[:, 0]))
+        - np.exp(k * z).sum(axis=1)
+    )
+
+
+def _ll_gamma(theta, d):
+    a, b = theta[:, 0], theta[:, 1]
+    # Solo depende de sum(log x) y sum(x)
+    return d["n"] * (a * np.log(b) - gammaln(a)) + (a - 1.0) * d["s_lx"] - b * d["s_x"]
+
+
+def _ll_lognormal(theta, d):
+    mu, s = theta[:, 0], theta[:, 1]
+    # sum (log x - mu)^2 a partir de sum(log x) y sum(log x ^ 2)
+    cuad = d["s_lx2"] - 2.0 * mu * d["s_lx"] + d["n"] * mu * mu
+    return -d["s_lx"] - d["n"] * (np.log(s) + 0.5 * LOG_2PI) - cuad / (2.0 * s * s)
+
+
+def _ll_fisk(theta, d):
+    c, s = theta[:, :1], theta[:, 1:2]
+    z = d["lx"][None, :] - np.log(s)
+    return (
+        d["n"] * (np.log(c[:, 0]) - np.log(s[:, 0]))
+        + (c[:, 0] - 1.0) * (d["s_lx"] - d["n"] * np.log(s[:, 0]))
+        - 2.0 * np.logaddexp(0.0, c * z).sum(axis=1)
+    )
+
+
+def _ll_gpd(theta, d):
+    xi, sg = theta[:, :1], theta[:, 1:2]
+    # El soporte solo se rompe con xi < 0 y basta revisar el máximo
+    fuera = 1.0 + xi[:, 0] * d["x"].max() / sg[:, 0] <= 0
+    xi_seguro = np.where(np.abs(xi) < 1e-9, 1e-9, xi)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        suma = np.log1p(np.maximum(xi * d["x"][None, :] / sg, -1.0)).sum(axis=1)
+    ll = -d["n"] * np.log(sg[:, 0]) - (1.0 / xi_seguro[:, 0] + 1.0) * suma
+    return np.where(fuera, -np.inf, ll)
+
+
+def _ll_burr(theta, d):
+    c, k, lam = theta[:, :1], theta[:, 1:2], theta[:, 2:3]
+    z = d["lx"][None, :] - np.log(lam)
+    return (
+        d["n"] * (np.log(c[:, 0]) + np.log(k[:, 0]) - np.log(lam[:, 0]))
+        + (c[:, 0] - 1.0) * (d["s_lx"] - d["n"] * np.log(lam[:, 0]))
+        - (k[:, 0] + 1.0) * np.logaddexp(0.0, c * z).sum(axis=1)
+    )
+
+
+@dataclass(frozen=True)
+class ModeloMarginal:
+    nombre: str
+    componente: str  # "body" o "tail"
+    parametros: Tuple[str, ...]
+    loglik: Callable[[np.ndarray, Dict], np.ndarray]
+    inicial: Callable[[Dict], np.ndarray]  # punto de partida para buscar la moda
+    positivos: Tuple[bool, ...] = ()  # por defecto todos; se muestrean en log
+
+    @property
+    def dim(self) -> int:
+        return len(self.parametros)
+
+    @property
+    def en_log(self) -> np.ndarray:
+        return np.array(self.positivos or (True,) * self.dim)
+
+    def a_theta(self, z: np.ndarray) -> np.ndarray:
+        return np.where(self.en_log, np.exp(z), z)
+
+    def a_z(self, theta: np.ndarray) -> np.ndarray:
+        return np.where(self.en_log, np.log(np.maximum(theta, 1e-300)), theta)
+
+
+def _ini_weibull(d):
+    # Aproximación de Justus: forma ~ (sd / media)^-1.086
+    m, s = d["x"].mean(), d["x"].std() + 1e-9
+    return np.array([min((s / m) ** -1.086, 50.0), m])
+
+
+def _ini_gamma(d):
+    m, v = d["x"].mean(), d["x"].var() + 1e-9
+    return np.array([m * m / v, m / v])
+
+
+def _ini_lognormal(d):
+    return np.array([max(d["lx"].mean(), 1e-3), d["lx"].std() + 1e-3])
+
+
+def _ini_fisk(d):
+    return np.array(
+        [np.pi / (np.sqrt(3.0) * (d["lx"].std() + 1e-3)), np.exp(np.median(d["lx"]))]
+    )
+
+
+def _ini_gpd(d):
+    return np.array([0.1, d["x"].mean()])
+
+
+def _ini_burr(d):
+    return np.array([1.0, 1.0, np.median(d["x"])])
+
+
+MODELOS: Dict[str, ModeloMarginal] = {
+    "Weibull": ModeloMarginal(
+        "Weibull", "body", ("forma", "escala"), _ll_weibull, _ini_weibull
+    ),
+    "Gamma": ModeloMarginal("Gamma", "body", ("forma", "tasa"), _ll_gamma, _ini_gamma),
+    "Lognormal": ModeloMarginal(
+        "Lognormal", "body", ("mu", "sigma"), _ll_lognormal, _ini_lognormal
+    ),
+    "Fisk": ModeloMarginal("Fisk", "body", ("c", "escala"), _ll_fisk, _ini_fisk),
+    "GPD": ModeloMarginal(
+        "GPD", "tail", ("xi", "sigma"), _ll_gpd, _ini_gpd, (False, True)
+    ),
+    "Burr": ModeloMarginal("Burr", "tail", ("c", "k", "lambda"), _ll_burr, _ini_burr),
+}
+
+MODELOS_CUERPO = tuple(m for m, v in MODELOS.items() if v.componente == "body")
+MODELOS_COLA = tuple(m for m, v in MODELOS.items() if v.componente == "tail")
+
+
+def log_previa(theta: np.ndarray, en_log: np.ndarray) -> np.ndarray:
+    """Gamma(2, 1) en los parámetros positivos (log_prior_generic), N(0, 1) en los libres."""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.sum(
+            np.where(en_log, np.log(theta) - theta, -0.5 * theta * theta), axis=1
+        )
+
+
+def log_posterior_z(z: np.ndarray, modelo: ModeloMarginal, datos: Dict) -> np.ndarray:
+    """Log-posterior en z (log de los parámetros positivos), con su jacobiano."""
+    z = np.atleast_2d(z)
+    en_log = modelo.en_log
+    with np.errstate(over="ignore", invalid="ignore", divide="ignore"):
+        theta = modelo.a_theta(z)
+        lp = (
+            modelo.loglik(theta, datos)
+            + log_previa(theta, en_log)
+            + np.sum(np.where(en_log, z, 0.0), axis=1)
+        )
+    return np.where(np.isfinite(lp), lp, -np.inf)
+
+
+# ============================================================
+# Diagnósticos
+# ============================================================
+
+
+def _dividir(cadenas: np.ndarray) -> np.ndarray:
+    # (m, n) -> (2m, n // 2): cada cadena se parte en dos mitades
+    cadenas = np.asarray(cadenas, dtype=float)
+    mitad = cadenas.shape[1] // 2
+    return np.concatenate([cadenas[:, :mitad], cadenas[:, -mitad:]], axis=0)
+
+
+def rhat(cadenas: np.ndarray) -> float:
+    """R-hat dividido de Gelman-Rubin para un escalar (cadenas x iteraciones)."""
+    x = _dividir(cadenas)
+    m, n = x.shape
+    if n < 2:
+        return np.nan
+    B = n * x.mean(axis=1).var(ddof=1)
+    W = x.var(axis=1, ddof=1).mean()
+    if W <= 0:
+        return np.nan
+    var_mas = (n - 1) / n * W + B / n
+    return float(np.sqrt(var_mas / W))
+
+
+def _autocovarianza(x: np.ndarray) -> np.ndarray:
+    # Autocovarianza de cada fila por FFT
+    m, n = x.shape
+    x = x - x.mean(axis=1, keepdims=True)
+    nfft = 1 << (2 * n - 1).bit_length()
+    f = np.fft.rfft(x, n=nfft, axis=1)
+    return np.fft.irfft(f * np.conj(f), n=nfft, axis=1)[:, :n] / n
+
+
+def ess(cadenas: np.ndarray) -> float:
+    """
+    Tamaño efectivo de muestra con varias cadenas (BDA3, 11.5): las
+    autocorrelaciones combinadas se suman por pares hasta el primer par
+    negativo (secuencia inicial positiva de Geyer), forzadas a ser monótonas.
+    """
+    x = _dividir(cadenas)
+    m, n = x.shape
+    if n < 4:
+        return np.nan
+    acov = _autocovarianza(x)
+    W = acov[:, 0].mean() * n / (n - 1.0)
+    var_mas = W * (n - 1.0) / n + (x.mean(axis=1).var(ddof=1) if m > 1 else 0.0)
+    if var_mas <= 0:
+        return np.nan
+    rho = 1.0 - (W - acov.mean(axis=0)) / var_mas
+    rho[0] = 1.0
+
+    pares = rho[:-1:2][: (n - 1) // 2] + rho[1::2][: (n - 1) // 2]
+    negativos = np.flatnonzero(pares < 0)
+    pares = pares[: negativos[0]] if negativos.size else pares
+    pares = np.minimum.accumulate(pares)
+    tau = -1.0 + 2.0 * pares.sum()
+    return float(m * n / max(tau, 1.0 / np.log10(m * n)))
+
+
+# ============================================================
+# Muestreador
+# ============================================================
+
+
+@dataclass
+class ResultadoMCMC:
+    modelo: str
+    parametros: Tuple[str, ...]
+    muestras: np.ndarray  # (cadenas, guardadas, parámetros)
+    log_post: np.ndarray  # (cadenas, guardadas)
+    aceptacion: np.ndarray  # tasa por cadena después del burn-in
+    rhat: np.ndarray  # por parámetro
+    ess: np.ndarray  # por parámetro
+    info: Dict = field(default_factory=dict)
+
+    def resumen(self) -> Dict[str, np.ndarray]:
+        plano = self.muestras.reshape(-1, self.muestras.shape[-1])
+        return {
+            "media": plano.mean(axis=0),
+            "sd": plano.std(axis=0, ddof=1),
+            "q025": np.quantile(plano, 0.025, axis=0),
+            "q500": np.quantile(plano, 0.5, axis=0),
+            "q975": np.quantile(plano, 0.975, axis=0),
+            "rhat": self.rhat,
+            "ess": self.ess,
+        }
+
+
+def _moda(modelo: ModeloMarginal, datos: Dict) -> Tuple[np.ndarray, np.ndarray]:
+    """Moda de la posterior en z e inversa del hessiano (BFGS)."""
+    z0 = modelo.a_z(modelo.inicial(datos))
+
+    def f(z):
+        v = -log_posterior_z(z, modelo, datos)[0]
+        return v if np.isfinite(v) else 1e300
+
+    res = minimize(f, z0, method="BFGS")
+    if not np.isfinite(res.fun) or res.fun >= 1e300:
+        res = minimize(f, z0, method="Nelder-Mead")
+        return res.x, np.eye(modelo.dim) * 0.01
+    H = np.asarray(res.hess_inv, dtype=float)
+    H = 0.5 * (H + H.T)
+    if np.linalg.eigvalsh(H).min() <= 0:
+        H = np.eye(modelo.dim) * 0.01
+    return res.x, H
+
+
+def muestrear(
+    x,
+    modelo: str,
+    n_cadenas: int = 4,
+    n_iter: int = 6000,
+    burn_in: int = 2000,
+    adelgazar: int = 5,
+    random_state=None,
+    intervalo_adaptacion: int = 50,
+) -> ResultadoMCMC:
+    """
+    Metropolis adaptativo con n_cadenas cadenas para los datos x (cuerpo o
+    excesos sobre el umbral). Las cadenas arrancan dispersas alrededor de la
+    moda (dos desviaciones de la aproximación de Laplace) y comparten, durante
+    el burn-in, la covarianza empírica de todas sus iteraciones para la
+    propuesta; cada cadena ajusta además su propia escala.
+    """
+    mod = MODELOS[modelo]
+    rng = np.random.default_rng(random_state)
+    datos = _datos_basicos(x)
+    d, C = mod.dim, int(n_cadenas)
+
+    modo, H = _moda(mod, datos)
+    L0 = np.linalg.cholesky(H)
+    z = modo + 2.0 * rng.standard_normal((C, d)) @ L0.T
+    lp = log_posterior_z(z, mod, datos)
+    # Arranques fuera del soporte vuelven a la moda
+    malos = ~np.isfinite(lp)
+    z[malos] = modo
+    lp[malos] = log_posterior_z(modo, mod, datos)[0]
+
+    cov = H.copy()
+    L = np.linalg.cholesky(cov)
+    log_escala = np.full(C, np.log(2.38 / np.sqrt(d)))
+    objetivo = 0.234
+
+    # Sumas para la covarianza adaptativa (todas las cadenas)
+    s1 = np.zeros(d)
+    s2 = np.zeros((d, d))
+    n_ad = 0
+
+    n_guardar = (n_iter - burn_in) // adelgazar
+    muestras = np.empty((C, n_guardar, d))
+    log_post = np.empty((C, n_guardar))
+    aceptadas = np.zeros(C)
+    k = 0
+
+    for it in range(n_iter):
+        prop = z + np.exp(log_escala)[:, None] * (rng.standard_normal((C, d)) @ L.T)
+        lp_prop = log_posterior_z(prop, mod, datos)
+        with np.errstate(invalid="ignore"):
+            prob = np.exp(np.minimum(lp_prop - lp, 0.0))
+        acepta = rng.random(C) < prob
+        z = np.where(acepta[:, None], prop, z)
+        lp = np.where(acepta, lp_prop, lp)
+
+        if it < burn_in:
+            # Robbins-Monro sobre la escala de cada cadena
+            log_escala += (np.nan_to_num(prob) - objetivo) / np.sqrt(it + 1.0)
+            if it >= burn_in // 4:
+                s1 += z.sum(axis=0)
+                s2 += z.T @ z
+                n_ad += C
+                if (it + 1) % intervalo_adaptacion == 0 and n_ad > 2 * d:
+                    media = s1 / n_ad
+                    emp = s2 / n_ad - np.outer(media, media)
+                    emp = 0.5 * (emp + emp.T) + 1e-8 * np.eye(d)
+                    try:
+                        L = np.linalg.cholesky(emp)
+                        cov = emp
+                    except np.linalg.LinAlgError:
+                        pass
+        else:
+            aceptadas += acepta
+            if (it - burn_in) % adelgazar == adelgazar - 1 and k < n_guardar:
+                muestras[:, k] = z
+                log_post[:, k] = lp
+                k += 1
+
+    theta = mod.a_theta(muestras)
+    r = np.array([rhat(theta[:, :, j]) for j in range(d)])
+    e = np.array([ess(theta[:, :, j]) for j in range(d)])
+    return ResultadoMCMC(
+        modelo=mod.nombre,
+        parametros=mod.parametros,
+        muestras=theta,
+        log_post=log_post,
+        aceptacion=aceptadas / max(n_iter - burn_in, 1),
+        rhat=r,
+        ess=e,
+        info={
+            "n": int(datos["n"]),
+            "moda": mod.a_theta(modo),
+            "cov_propuesta": cov,
+            "escala": np.exp(log_escala),
+            "n_iter": n_iter,
+            "burn_in": burn_in,
+            "adelgazar": adelgazar,
+            "n_cadenas": C,
+        },
+    )
+
+
+# ============================================================
+# Salida columnar
+# ============================================================
+#
+# Un solo .npz por corrida: una columna por arreglo (ajuste, cadena,
+# param1..3, log_post) con una fila por muestra guardada, y un índice JSON
+# con los metadatos de cada ajuste (ubicación, umbral, diagnósticos). Ocupa
+# una fracción de los CSV con todas las iteraciones de res/mcmc; las
+# muestras se guardan en float32 (los resúmenes se calculan antes, en float64).
+
+VERSION_POSTERIOR = 1
+MAX_PARAMETROS = 3
+
+
+def guardar_posterior(
+    ajustes: Sequence[Tuple[Dict, ResultadoMCMC]],
+    ruta: Path | str = RUTA_POSTERIOR_MCMC,
+) -> Path:
+    """Guarda [(metadatos, resultado), ...] en `ruta` (escritura atómica)."""
+    ruta = Path(ruta)
+    indice: List[Dict] = []
+    cols: Dict[str, List[np.ndarray]] = {
+        k: []
+        for k in (
+            "ajuste",
+            "cadena",
+            "log_post",
+            *(f"param{j + 1}" for j in range(MAX_PARAMETROS)),
+        )
+    }
+    for i, (meta, res) in enumerate(ajustes):
+        C, T, d = res.muestras.shape
+        cols["ajuste"].append(np.full(C * T, i, dtype=np.int32))
+        cols["cadena"].append(np.repeat(np.arange(C, dtype=np.uint8), T))
+        cols["log_post"].append(res.log_post.reshape(-1).astype(np.float32))
+        for j in range(MAX_PARAMETROS):
+            cols[f"param{j + 1}"].append(
+                res.muestras[:, :, j].reshape(-1).astype(np.float32)
+                if j < d
+                else np.full(C * T, np.nan, dtype=np.float32)
+            )
+        resumen = res.resumen()
+        indice.append(
+            {
+                **meta,
+                "modelo": res.modelo,
+                "parametros": list(res.parametros),
+                "aceptacion": [float(a) for a in res.aceptacion],
+                **{
+                    k: [float(v) for v in resumen[k]]
+                    for k in ("media", "sd", "q025", "q500", "q975", "rhat", "ess")
+                },
+                **{
+                    k: res.info[k]
+                    for k in ("n", "n_iter", "burn_in", "adelgazar", "n_cadenas")
+                },
+            }
+        )
+
+    arreglos = {k: (np.concatenate(v) if v else np.empty(0)) for k, v in cols.items()}
+    cabecera = {"version": VERSION_POSTERIOR, "ajustes": indice}
+    ruta.parent.mkdir(parents=True, exist_ok=True)
+    tmp = ruta.with_name(ruta.name + ".tmp")
+    with open(tmp, "wb") as f:
+        np.savez_compressed(
+            f, __indice__=np.array(json.dumps(cabecera, ensure_ascii=False)), **arreglos
+        )
+    os.replace(tmp, ruta)
+    return ruta
+
+
+def _leer_posterior(ruta: Path | str) -> Tuple[List[Dict], Dict[str, np.ndarray]]:
+    with np.load(ruta, allow_pickle=False) as npz:
+        cabecera = json.loads(str(npz["__indice__"]))
+        if cabecera.get("version") != VERSION_POSTERIOR:
+            raise ValueError(f"Versión de posterior desactualizada: {ruta}")
+        return cabecera["ajustes"], {k: npz[k] for k in npz.files if k != "__indice__"}
+
+
+def resumen_posterior(ruta: Path | str = RUTA_POSTERIOR_MCMC) -> pd.DataFrame:
+    """Una fila por (ajuste, parámetro) con media, cuantiles, R-hat y ESS."""
+    indice, _ = _leer_posterior(ruta)
+    filas = []
+    for a in indice:
+        for j, nombre in enumerate(a["parametros"]):
+            filas.append(
+                {
+                    "dimension": a["dimension"],
+                    "location": a["location"],
+                    "model_type": a["componente"],
+                    "model_name": a["modelo"],
+                    "parametro": nombre,
+                    "columna": f"{a['modelo']}_param{j + 1}",
+                    "media": a["media"][j],
+                    "sd": a["sd"][j],
+                    "q025": a["q025"][j],
+                    "q500": a["q500"][j],
+                    "q975": a["q975"][j],
+                    "rhat": a["rhat"][j],
+                    "ess": a["ess"][j],
+                    "aceptacion": float(np.mean(a["aceptacion"])),
+                    "n": a["n"],
+                    "u_opt": a["u_opt"],
+                    "p_u": a["p_u"],
+                }
+            )
+    return pd.DataFrame(filas)
+
+
+def muestras_posterior(
+    dimension: str,
+    location: str,
+    componente: str,
+    modelo: Optional[str] = None,
+    ruta: Path | str = RUTA_POSTERIOR_MCMC,
+) -> Tuple[Dict, np.ndarray]:
+    """
+    (metadatos, muestras) de un ajuste guardado; muestras es (draws x
+    parámetros) con todas las cadenas juntas. Sin `modelo` se toma el primero
+    del componente en orden alfabético.
+    """
+    indice, arr = _leer_posterior(ruta)
+    candidatos = sorted(
+        (a["modelo"], i)
+        for i, a in enumerate(indice)
+        if a["dimension"] == dimension
+        and a["location"] == location
+        and a["componente"] == componente
+        and (modelo is None or a["modelo"] == modelo)
+    )
+    if not candidatos:
+        raise KeyError(
+            f"Sin posterior para {dimension}/{location}/{componente}/{modelo}"
+        )
+    i = candidatos[0][1]
+    filas = arr["ajuste"] == i
+    d = len(indice[i]["parametros"])
+    X = np.column_stack([arr[f"param{j + 1}"][filas] for j in range(d)]).astype(float)
+    return indice[i], X
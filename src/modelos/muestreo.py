@@ -0,0 +1,163 @@
+# Muestreo con reducción de varianza para las cópulas t y Gumbel
+#
+# simulate_copula / simular_t_copula usan normales y chi-cuadrado
+# pseudoaleatorias; para que el TVaR al 99% o 99.5% deje de moverse entre
+# semillas hacen falta 200 000 simulaciones o más. Aquí cada cópula se
+# escribe como una función de uniformes en [0, 1]^k:
+#
+#   t(R, nu), dimensión d:  k = d + 1
+#       eps = Phi^-1(u[:, :d]),  z = L eps  (L L' = R)
+#       W   = F_chi2(nu)^-1(u[:, d])            (componente radial común)
+#       U   = t_nu(z / sqrt(W / nu))
+#   Gumbel(theta), dimensión d (Marshall-Olkin, fragilidad estable de Kanter):
+#       k = d + 2: ángulo de Kanter, E0 y una exponencial por coordenada
+#
+# y las uniformes salen de uno de estos modos:
+#   "mc"          pseudoaleatorias (Generator.random)
+#   "sobol"       Sobol aleatorizada (scrambling de Owen, scipy.stats.qmc)
+#   "antitetico"  parejas u, 1 - u
+#   "importancia" pseudoaleatorias con la componente común inclinada hacia la
+#                 cola conjunta; devuelve pesos de razón de verosimilitud f/g
+#                 (media 1):
+#       t:      W ~ chi2(nu_g) con nu_g < nu: los W pequeños (todas las
+#               coordenadas extremas a la vez) son mucho más frecuentes y
+#               eps ~ N(m L^-1 1, I) lleva esas coordenadas hacia la cola
+#               superior. peso = f_nu(W) / f_nu_g(W) * exp(-mu'eps + |mu|^2 / 2),
+#               con f_nu(W) / f_nu_g(W) proporcional a W^((nu - nu_g) / 2)
+#       Gumbel: E0 ~ Gamma(k, 1) con k < 1 en lugar de Exp(1): E0 pequeño es
+#               fragilidad V grande, todas las coordenadas cerca de 1.
+#               peso = Gamma(k) E0^(1 - k) (segundo momento
+#               Gamma(k) Gamma(2 - k), finito)
+#   Ambas inclinaciones dan pesos acotados cerca de la cola (donde importan)
+#   y con todos los momentos finitos.
+#
+# Con los valores por defecto y la pareja más grande, benchmarks/
+# reduccion_varianza.py mide para el VaR al 99% una eficiencia (varianza x n
+# frente a "mc") de ~10x con importancia en la t y ~5x en la Gumbel; Sobol da
+# ~10-20x y las antitéticas no ayudan en los cuantiles de cola. El CVaR de
+# esa pareja no converge con ningún modo: la cola Burr de INFRAESTRUCTURA
+# tiene índice < 1 (media infinita).
+#
+# Los pesos se usan con var_cvar(S, alpha, pesos=...) (src/modelos/riesgo.py).
+
+from __future__ import annotations
+
+from typing import Optional, Tuple
+
+import numpy as np
+from scipy.special import chdtri, gammaincinv, gammaln, ndtri, stdtr
+
+MODOS = ("mc", "sobol", "antitetico", "importancia")
+
+EPS_U = 1e-12
+# Uniformes de entrada lejos de 0 y 1 (ndtri / log finitos)
+EPS_ENTRADA = 1e-15
+
+# Inclinación por defecto (ver benchmarks/reduccion_varianza.py)
+FRACCION_NU = 0.25
+DESPLAZAMIENTO = 1.0
+FORMA_E0 = 0.5
+
+
+def uniformes(n: int, k: int, modo: str, rng: np.random.Generator) -> np.ndarray:
+    """n x k uniformes según el modo ("importancia" usa las pseudoaleatorias)."""
+    if modo in ("mc", "importancia"):
+        u = rng.random((n, k))
+    elif modo == "sobol":
+        from scipy.stats import qmc
+
+        # Potencia de 2 para conservar el balance de la secuencia; se recorta a n
+        m = max(int(np.ceil(np.log2(max(n, 1)))), 0)
+        u = qmc.Sobol(k, scramble=True, seed=rng).random_base2(m)[:n]
+    elif modo == "antitetico":
+        mitad = rng.random(((n + 1) // 2, k))
+        u = np.concatenate([mitad, 1.0 - mitad])[:n]
+    else:
+        raise ValueError(f"modo debe ser uno de {MODOS}")
+    return np.clip(u, EPS_ENTRADA, 1.0 - EPS_ENTRADA)
+
+
+def simular_t_vr(
+    R: np.ndarray,
+    nu: float,
+    n: int,
+    rng: np.random.Generator,
+    modo: str = "mc",
+    fraccion_nu: float = FRACCION_NU,
+    desplazamiento: float = DESPLAZAMIENTO,
+) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """
+    (U, pesos) de la t-cópula d-dimensional. pesos es None salvo en
+    modo="importancia", donde W ~ chi2(fraccion_nu * nu) y la media de z
+    se desplaza desplazamiento desviaciones en cada coordenada.
+    """
+    R = np.asarray(R, float)
+    d = R.shape[0]
+    L = np.linalg.cholesky(R + 1e-12 * np.eye(d))
+    u = uniformes(n, d + 1, modo, rng)
+    eps = ndtri(u[:, :d])
+    pesos = None
+
+    if modo == "importancia":
+        if not 0.0 < fraccion_nu <= 1.0:
+            raise ValueError("fraccion_nu debe estar en (0, 1]")
+        nu_g = fraccion_nu * nu
+        W = chdtri(nu_g, 1.0 - u[:, d])
+        mu = np.linalg.solve(L, np.full(d, float(desplazamiento)))
+        eps = eps + mu
+        # log f_nu(W) - log f_nu_g(W) de las densidades chi-cuadrado
+        log_w = (
+            gammaln(nu_g / 2)
+            - gammaln(nu / 2)
+            + 0.5 * (nu_g - nu) * np.log(2.0)
+            + 0.5 * (nu - nu_g) * np.log(W)
+            - eps @ mu
+            + 0.5 * mu @ mu
+        )
+        pesos = np.exp(log_w)
+    else:
+        W = chdtri(nu, 1.0 - u[:, d])
+
+    z = eps @ L.T
+    U = stdtr(nu, z / np.sqrt(W / nu)[:, None])
+    return np.clip(U, EPS_U, 1.0 - EPS_U), pesos
+
+
+def simular_gumbel_vr(
+    theta: float,
+    n: int,
+    rng: np.random.Generator,
+    d: int = 2,
+    modo: str = "mc",
+    forma_e0: float = FORMA_E0,
+) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """
+    (U, pesos) de la cópula de Gumbel d-dimensional (como Gumbel.simular).
+    En modo="importancia" E0 ~ Gamma(forma_e0, 1).
+    """
+    a = 1.0 / float(theta)
+    u = uniformes(n, d + 2, modo, rng)
+    W = np.pi * u[:, 0]
+    E = -np.log1p(-u[:, 2:])
+    pesos = None
+
+    if modo == "importancia":
+        if not 0.0 < forma_e0 <= 1.0:
+            raise ValueError("forma_e0 debe estar en (0, 1]")
+        E0 = gammaincinv(forma_e0, u[:, 1])
+        pesos = np.exp(gammaln(forma_e0) + (1.0 - forma_e0) * np.log(E0))
+    else:
+        E0 = -np.log1p(-u[:, 1])
+
+    if a < 1.0:
+        # V = inf (E0 diminuto) da U = 1, que el recorte final deja en 1 - EPS_U
+        with np.errstate(over="ignore", divide="ignore"):
+            V = (
+                np.sin(a * W)
+                / np.sin(W) ** (1.0 / a)
+                * (np.sin((1.0 - a) * W) / E0) ** ((1.0 - a) / a)
+            )
+    else:
+        V = np.ones(n)
+    U = np.exp(-((E / V[:, None]) ** a))
+    return np.clip(U, EPS_U, 1.0 - EPS_U), pesos
@@ -0,0 +1,595 @@
+# Dependencia y riesgo por parejas (provincia/sector/categoría)
+#
+# Versión en módulo del pipeline de notebooks/3_copulas_limpio.ipynb para que
+# pueda ejecutarse en procesos separados: cada pareja recibe su propia
+# semilla hija derivada de una semilla maestra y los resultados se guardan
+# pareja por pareja en un archivo de checkpoint (JSON lines).
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from scipy.stats import kstest, t as tdist
+
+from src import traza
+from src.config import RES_DIR, RUTA_DATOS
+from src.data.limpieza_datos import cargar_datos
+from src.modelos.ajuste_copula import ajustar_lote
+from src.modelos.familias_copula import FAMILIAS
+from src.modelos.almacen import cargar_cola
+from src.modelos.marginales import MarginalHibrida
+from src.modelos.muestreo import simular_gumbel_vr, simular_t_vr
+from src.modelos.riesgo import RiesgoStreaming, var_cvar
+
+CARPETAS = {
+    "provincia": str(RES_DIR / "provincias"),
+    "categoria": str(RES_DIR / "categorias"),
+    "sector": str(RES_DIR / "sectores"),
+}
+
+# Orden de los tres bloques de todas_dependencias
+TIPOS_PAR = (
+    ("provincia", "sector"),
+    ("provincia", "categoria"),
+    ("categoria", "sector"),
+)
+
+
+# ============================================================
+# Marginales -> U
+# ============================================================
+
+
+def ks_test_uniform(U: np.ndarray) -> Tuple[float, float]:
+
+    stat, pval = kstest(U, "uniform")
+    return float(stat), float(pval)
+
+
+def U_variable(
+    series: pd.Series,
+    name: str,
+    carpeta_tail: str,
+    clip_eps: float = 1e-6,
+    use_empirical_if_ks_fails: bool = True,
+    alpha_ks: float = 0.05,
+) -> Tuple[np.ndarray, np.ndarray, Dict, float, float]:
+
+    with traza.tramo("U_variable", ubicacion=name, n=len(series)) as t:
+        tail = cargar_cola(name, carpeta_tail)
+
+        vals = series.to_numpy(dtype=float)
+        body_sample = vals[vals <= tail["u"]]
+
+        # --- 1) Transformación híbrida (cuerpo empírico + cola EVT) ---
+        U = MarginalHibrida(body_sample, tail).cdf(vals)
+        U = np.clip(U, clip_eps, 1.0 - clip_eps)
+
+        with traza.tramo("U_variable.ks"):
+            ks_stat, ks_p = ks_test_uniform(U)
+
+        # --- 2) Si el KS "falla", usar distribución empírica ---
+        empirica = use_empirical_if_ks_fails and np.isfinite(ks_p) and ks_p < alpha_ks
+        if empirica:
+            with traza.tramo("U_variable.empirica"):
+                # CDF empírica: \tilde u_j = rank(x_j)/(n+1)
+                s = np.sort(vals[np.isfinite(vals)])
+                ranks = np.searchsorted(s, vals, side="right")
+                U = np.clip(ranks / (len(s) + 1.0), clip_eps, 1.0 - clip_eps)
+                ks_stat, ks_p = ks_test_uniform(U)
+        t.anotar(n_cuerpo=int(body_sample.size), empirica=bool(empirica))
+
+    return U, body_sample, tail, ks_stat, ks_p
+
+
+# ============================================================
+# Cópulas
+# ============================================================
+
+
+@traza.trazado("fit_copulas")
+def fit_copulas(U1: np.ndarray, U2: np.ndarray) -> Dict:
+
+    U1 = np.asarray(U1, float)
+    U2 = np.asarray(U2, float)
+    mask = np.isfinite(U1) & np.isfinite(U2)
+    data = np.column_stack([U1[mask], U2[mask]])
+
+    if data.shape[0] < 5:
+        raise ValueError("Muy pocos datos para ajustar cópulas")
+
+    # MV de ambas familias en una llamada (Gumbel: theta; t: rho y nu por
+    # verosimilitud perfil), arrancando desde la inversión de tau
+    ajuste = ajustar_lote([data], familias=("G", "t")).set_index("familia")
+    tau = float(ajuste.loc["G", "tau_empirico"])
+
+    theta = float(ajuste.loc["G", "par"])
+    ll_g = float(ajuste.loc["G", "loglik"])
+    aic_g = float(ajuste.loc["G", "aic"])
+
+    rho_hat = float(ajuste.loc["t", "par"])
+    nu = float(ajuste.loc["t", "par2"])
+    R = np.array([[1.0, rho_hat], [rho_hat, 1.0]], dtype=float)
+    ll_t = float(ajuste.loc["t", "loglik"])
+    aic_t = float(ajuste.loc["t", "aic"])
+
+    winner = "t-student" if aic_t < aic_g else "gumbel"
+
+    return {
+        "tau": float(tau),
+        "gumbel": {"theta": float(theta), "ll": ll_g, "aic": aic_g},
+        "t": {"R": R, "nu": float(nu), "ll": ll_t, "aic": aic_t},
+        "winner": winner,
+    }
+
+
+@traza.trazado("simulate_copula")
+def simulate_copula(
+    fit: Dict, n_sims: int = 50_000, random_state=None, modo: str = "mc"
+) -> np.ndarray:
+    """
+    random_state: entero, SeedSequence o Generator. modo "sobol" o
+    "antitetico" usa src/modelos/muestreo.py; para "importancia" (que
+    necesita pesos) ver simulate_copula_pesos.
+    """
+    if modo != "mc":
+        U, pesos = simulate_copula_pesos(fit, n_sims, random_state, modo)
+        if pesos is not None:
+            raise ValueError(
+                "modo='importancia' devuelve pesos: usar simulate_copula_pesos"
+            )
+        return U
+    rng = np.random.default_rng(random_state)
+
+    if fit["winner"] == "gumbel":
+        U = FAMILIAS["G"].simular(n_sims, (fit["gumbel"]["theta"],), rng)
+    else:
+        R = np.asarray(fit["t"]["R"], float)
+        nu = float(fit["t"]["nu"])
+        k = R.shape[0]
+        L = np.linalg.cholesky(R + 1e-12 * np.eye(k))
+        z = rng.standard_normal(size=(n_sims, k)) @ L.T
+        w = rng.chisquare(df=nu, size=n_sims) / nu
+        U = tdist.cdf(z / np.sqrt(w[:, None]), df=nu)
+
+    return np.clip(U, 1e-12, 1.0 - 1e-12)
+
+
+@traza.trazado("simulate_copula_pesos")
+def simulate_copula_pesos(
+    fit: Dict,
+    n_sims: int = 50_000,
+    random_state=None,
+    modo: str = "importancia",
+    **opciones,
+) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """
+    (U, pesos) de la cópula ganadora con un modo de src/modelos/muestreo.py.
+    pesos es None salvo con "importancia"; opciones pasa fraccion_nu o
+    desplazamiento (t) y forma_e0 (Gumbel).
+    """
+    rng = np.random.default_rng(random_state)
+    if fit["winner"] == "gumbel":
+        return simular_gumbel_vr(
+            fit["gumbel"]["theta"], n_sims, rng, modo=modo, **opciones
+        )
+    return simular_t_vr(
+        fit["t"]["R"], float(fit["t"]["nu"]), n_sims, rng, modo=modo, **opciones
+    )
+
+
+# ============================================================
+# Pérdidas conjuntas y riesgo
+# ============================================================
+
+
+@traza.trazado("simulate_joint_losses")
+def simulate_joint_losses(
+    U_sim: np.ndarray, body1: np.ndarray, tail1: Dict, body2: np.ndarray, tail2: Dict
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """X1, X2 por cuantil híbrido de cada columna de U_sim y S = X1 + X2."""
+    X1 = MarginalHibrida(body1, tail1).ppf(U_sim[:, 0])
+    X2 = MarginalHibrida(body2, tail2).ppf(U_sim[:, 1])
+    return X1, X2, X1 + X2
+
+
+def dependencia_y_riesgo(
+    df: pd.DataFrame,
+    col1: str,
+    val1: str,
+    carpeta1: str,
+    col2: str,
+    val2: str,
+    carpeta2: str,
+    n_sims: int = 50_000,
+    alphas: Tuple[float, ...] = (0.95, 0.99),
+    random_state=None,
+    tamano_bloque: Optional[int] = None,
+    muestreo: str = "mc",
+) -> Optional[Dict]:
+    """
+    Pipeline completo para una pareja (val1 de col1) vs (val2 de col2):
+    U por marginal híbrida (+KS), cópula ganadora, simulación, cuantiles
+    híbridos y VaR/CVaR de S = X1 + X2. Devuelve None si hay menos de 20
+    observaciones.
+
+    Con tamano_bloque se simula por bloques y VaR/CVaR salen de
+    RiesgoStreaming, sin guardar S completo (memoria independiente de n_sims).
+    muestreo elige el modo de src/modelos/muestreo.py ("mc" es el original);
+    con "importancia" VaR/CVaR son los ponderados por la razón de
+    verosimilitud.
+    """
+    if muestreo != "mc" and tamano_bloque is not None:
+        raise ValueError("tamano_bloque solo está disponible con muestreo='mc'")
+    with traza.tramo(
+        "par", memoria=True, col1=col1, val1=val1, col2=col2, val2=val2, n_sims=n_sims
+    ) as t:
+        df_pair = df[(df[col1] == val1) & (df[col2] == val2)]
+        t.anotar(n_obs=int(df_pair.shape[0]))
+        if df_pair.shape[0] < 20:
+            return None
+
+        U1, body1, tail1, ks1_stat, ks1_p = U_variable(
+            df_pair["total"],
+            name=str(val1),
+            carpeta_tail=carpeta1,
+            use_empirical_if_ks_fails=True,
+            alpha_ks=0.05,
+        )
+        U2, body2, tail2, ks2_stat, ks2_p = U_variable(
+            df_pair["total"],
+            name=str(val2),
+            carpeta_tail=carpeta2,
+            use_empirical_if_ks_fails=True,
+            alpha_ks=0.05,
+        )
+
+        fit = fit_copulas(U1, U2)
+        if tamano_bloque is None:
+            if muestreo == "mc":
+                U_sim, pesos = (
+                    simulate_copula(fit, n_sims=n_sims, random_state=random_state),
+                    None,
+                )
+            else:
+                U_sim, pesos = simulate_copula_pesos(
+                    fit, n_sims=n_sims, random_state=random_state, modo=muestreo
+                )
+            X1, X2, S = simulate_joint_losses(U_sim, body1, tail1, body2, tail2)
+            with traza.tramo("var_cvar", n=S.size):
+                riesgo = {a: var_cvar(S, a, pesos=pesos) for a in alphas}
+        else:
+            rng = np.random.default_rng(random_state)
+            est = RiesgoStreaming(alphas)
+            for inicio in range(0, n_sims, tamano_bloque):
+                n = min(tamano_bloque, n_sims - inicio)
+                U_sim = simulate_copula(fit, n_sims=n, random_state=rng)
+                est.agregar(simulate_joint_losses(U_sim, body1, tail1, body2, tail2)[2])
+            with traza.tramo("var_cvar", n=est.n):
+                riesgo = est.resultado()
+
+    res = {
+        "col1": col1,
+        "val1": val1,
+        "col2": col2,
+        "val2": val2,
+        "n_obs": int(df_pair.shape[0]),
+        "ks1_stat": ks1_stat,
+        "ks1_p": ks1_p,
+        "ks2_stat": ks2_stat,
+        "ks2_p": ks2_p,
+        "tau": fit["tau"],
+        "best_copula": fit["winner"],
+        "gumbel_aic": fit["gumbel"]["aic"],
+        "t_aic": fit["t"]["aic"],
+    }
+    for a in alphas:
+        VaR, CVaR_ = riesgo[a]
+        res[f"VaR({a})"] = VaR
+        res[f"CVaR({a})"] = CVaR_
+
+    return res
+
+
+# ============================================================
+# Ejecución de todas las parejas (paralela y reanudable)
+# ============================================================
+
+
+def planificar_pares(
+    provincias: Iterable[str],
+    categorias: Iterable[str],
+    sectores: Iterable[str],
+    carpetas: Optional[Dict[str, str]] = None,
+    semilla: int = 42,
+) -> List[Dict]:
+    """
+    Lista ordenada de tareas (una por pareja) con su semilla hija.
+
+    Las semillas salen de SeedSequence(semilla).spawn(n) en el orden fijo de
+    TIPOS_PAR, así que cada pareja tiene un flujo independiente y el
+    resultado no depende del número de procesos ni del orden de ejecución.
+    """
+    carpetas = {**CARPETAS, **(carpetas or {})}
+    valores = {
+        "provincia": list(provincias),
+        "categoria": list(categorias),
+        "sector": list(sectores),
+    }
+    tareas = []
+    for col1, col2 in TIPOS_PAR:
+        for v1 in valores[col1]:
+            for v2 in valores[col2]:
+                tareas.append(
+                    {
+                        "tipo_par": f"{col1}-{col2}",
+                        "col1": col1,
+                        "val1": v1,
+                        "carpeta1": carpetas[col1],
+                        "col2": col2,
+                        "val2": v2,
+                        "carpeta2": carpetas[col2],
+                    }
+                )
+    hijos = np.random.SeedSequence(semilla).spawn(len(tareas))
+    for i, (tarea, hijo) in enumerate(zip(tareas, hijos)):
+        tarea["par_id"] = i
+        tarea["semilla"] = [int(semilla), *hijo.spawn_key]
+    return tareas
+
+
+def _clave_tarea(tarea: Dict) -> str:
+    return f"{tarea['tipo_par']}|{tarea['val1']}|{tarea['val2']}"
+
+
+# Cambia cuando cambia el ajuste o la simulación de las cópulas (2: MV nativa
+# de Gumbel y t con nu estimado, en lugar de inversión de tau y nu = 4)
+VERSION_AJUSTE = 2
+
+
+def _huella(
+    n_sims: int,
+    alphas: Tuple[float, ...],
+    semilla: int,
+    tamano_bloque: Optional[int] = None,
+    muestreo: str = "mc",
+) -> str:
+    # Identifica la configuración; un checkpoint de otra corrida no se reutiliza
+    txt = json.dumps(
+        {
+            "n_sims": n_sims,
+            "alphas": list(alphas),
+            "semilla": semilla,
+            "ajuste": VERSION_AJUSTE,
+        }
+    )
+    if tamano_bloque is not None:
+        # Simular por bloques cambia el flujo de números aleatorios
+        txt += f"|bloque={tamano_bloque}"
+    if muestreo != "mc":
+        txt += f"|muestreo={muestreo}"
+    return hashlib.sha1(txt.encode()).hexdigest()[:12]
+
+
+def leer_checkpoint(
+    ruta: Optional[Path | str], huella: str
+) -> Dict[str, Optional[Dict]]:
+    """Parejas ya terminadas en el checkpoint (clave -> resultado o None)."""
+    hechos: Dict[str, Optional[Dict]] = {}
+    if ruta is None or not os.path.exists(ruta):
+        return hechos
+    with open(ruta, encoding="utf-8") as f:
+        for linea in f:
+            try:
+                reg = json.loads(linea)
+            except json.JSONDecodeError:
+                # Línea truncada por una caída a mitad de escritura
+                continue
+            if reg.get("huella") == huella:
+                hechos[reg["clave"]] = reg["resultado"]
+    return hechos
+
+
+_DF_TRABAJADOR: Optional[pd.DataFrame] = None
+
+
+def _iniciar_trabajador(ruta_datos: str) -> None:
+    global _DF_TRABAJADOR
+    # El proceso padre ya regeneró el archivo si hacía falta
+    _DF_TRABAJADOR = cargar_datos(ruta=ruta_datos, origen=None)
+
+
+def _evaluar_tarea(
+    tarea: Dict,
+    n_sims: int,
+    alphas: Tuple[float, ...],
+    tamano_bloque: Optional[int] = None,
+    df: Optional[pd.DataFrame] = None,
+    muestreo: str = "mc",
+) -> Tuple[Dict, Optional[Dict]]:
+    df = _DF_TRABAJADOR if df is None else df
+    semilla, *spawn_key = tarea["semilla"]
+    rng = np.random.default_rng(
+        np.random.SeedSequence(semilla, spawn_key=tuple(spawn_key))
+    )
+    r = dependencia_y_riesgo(
+        df,
+        tarea["col1"],
+        tarea["val1"],
+        tarea["carpeta1"],
+        tarea["col2"],
+        tarea["val2"],
+        tarea["carpeta2"],
+        n_sims=n_sims,
+        alphas=alphas,
+        random_state=rng,
+        tamano_bloque=tamano_bloque,
+        muestreo=muestreo,
+    )
+    if r is not None:
+        r["tipo_par"] = tarea["tipo_par"]
+        r["par_id"] = tarea["par_id"]
+    return tarea, r
+
+
+def ejecutar_pares(
+    tareas: List[Dict],
+    ruta_datos: Path | str = RUTA_DATOS,
+    n_sims: int = 200_000,
+    alphas: Tuple[float, ...] = (0.95, 0.99),
+    semilla: int = 42,
+    n_workers: int = 1,
+    checkpoint: Optional[Path | str] = None,
+    df: Optional[pd.DataFrame] = None,
+    tamano_bloque: Optional[int] = None,
+    muestreo: str = "mc",
+    verbose: bool = False,
+) -> pd.DataFrame:
+    """
+    Evalúa dependencia_y_riesgo para cada tarea de planificar_pares.
+
+    Con n_workers > 1 las parejas se reparten en un ProcessPoolExecutor
+    (cada proceso lee los datos una sola vez). Cada pareja terminada se
+    agrega al checkpoint, y al volver a correr se saltan las que ya están.
+    """
+    huella = _huella(n_sims, alphas, semilla, tamano_bloque, muestreo)
+    hechos = leer_checkpoint(checkpoint, huella)
+    pendientes = [t for t in tareas if _clave_tarea(t) not in hechos]
+    if verbose:
+        print(
+            f"{len(tareas) - len(pendientes)} parejas en checkpoint, "
+            f"{len(pendientes)} pendientes"
+        )
+
+    def _guardar(tarea: Dict, r: Optional[Dict]) -> None:
+        hechos[_clave_tarea(tarea)] = r
+        if checkpoint is not None:
+            with open(checkpoint, "a", encoding="utf-8") as f:
+                reg = {"huella": huella, "clave": _clave_tarea(tarea), "resultado": r}
+                f.write(json.dumps(reg, ensure_ascii=False, default=float) + "\n")
+        if verbose:
+            print(f"[{len(hechos)}/{len(tareas)}] {_clave_tarea(tarea)}")
+
+    if n_workers <= 1 or len(pendientes) <= 1:
+        if df is None:
+            df = cargar_datos(ruta=ruta_datos)
+        for tarea in pendientes:
+            _guardar(
+                *_evaluar_tarea(
+                    tarea, n_sims, alphas, tamano_bloque, df=df, muestreo=muestreo
+                )
+            )
+    else:
+        with ProcessPoolExecutor(
+            max_workers=n_workers,
+            initializer=_iniciar_trabajador,
+            initargs=(str(ruta_datos),),
+        ) as ex:
+            futuros = [
+                ex.submit(
+                    _evaluar_tarea, t, n_sims, alphas, tamano_bloque, None, muestreo
+                )
+                for t in pendientes
+            ]
+            for fut in as_completed(futuros):
+                _guardar(*fut.result())
+
+    filas = [hechos[_clave_tarea(t)] for t in tareas]
+    filas = [r for r in filas if r is not None]
+    if not filas:
+        return pd.DataFrame()
+    return pd.DataFrame(filas).sort_values("par_id").reset_index(drop=True)
+
+
+def todas_dependencias(
+    df: pd.DataFrame,
+    provincias: List[str],
+    categorias: List[str],
+    sectores: List[str],
+    carpeta_prov: str = CARPETAS["provincia"],
+    carpeta_cat: str = CARPETAS["categoria"],
+    carpeta_sec: str = CARPETAS["sector"],
+    n_sims: int = 50_000,
+    alphas: Tuple[float, ...] = (0.95, 0.99),
+    random_state: Optional[int] = 42,
+    n_workers: int = 1,
+    checkpoint: Optional[str] = None,
+    ruta_datos: Optional[str] = None,
+    tamano_bloque: Optional[int] = None,
+    muestreo: str = "mc",
+) -> pd.DataFrame:
+    """
+    Ejecuta dependencia_y_riesgo para provincia-sector, provincia-categoria y
+    categoria-sector. Cada pareja usa su propia semilla derivada de
+    random_state. Con n_workers > 1 cada proceso lee los datos de ruta_datos
+    (por defecto data/clean/datos.npz); df solo se usa en modo serial.
+    """
+    tareas = planificar_pares(
+        provincias,
+        categorias,
+        sectores,
+        carpetas={
+            "provincia": carpeta_prov,
+            "categoria": carpeta_cat,
+            "sector": carpeta_sec,
+        },
+        semilla=0 if random_state is None else int(random_state),
+    )
+    return ejecutar_pares(
+        tareas,
+        ruta_datos=ruta_datos or RUTA_DATOS,
+        n_sims=n_sims,
+        alphas=alphas,
+        semilla=0 if random_state is None else int(random_state),
+        n_workers=n_workers,
+        checkpoint=checkpoint,
+        df=df if n_workers <= 1 else None,
+        tamano_bloque=tamano_bloque,
+        muestreo=muestreo,
+    )
+
+
+# ============================================================
+# Parejas por evento (como construir_par en notebooks/copulas_en_R.qmd)
+# ============================================================
+
+
+def tabla_por_evento(
+    df: pd.DataFrame, col: str, col_total: str = "total"
+) -> pd.DataFrame:
+    """Total por evento (año, evento) con una columna por valor de col."""
+    return (
+        df.groupby(["ano", "evento", col], observed=True)[col_total].sum().unstack(col)
+    )
+
+
+def par_por_evento(
+    tabla_A: pd.DataFrame,
+    tabla_B: pd.DataFrame,
+    varA: str,
+    varB: str,
+    min_n: int = 20,
+    quitar_todo_cero: bool = True,
+) -> Optional[pd.DataFrame]:
+    """
+    Pérdidas (X, Y) de varA y varB en los eventos comunes, con 0 donde una
+    no tuvo pérdidas; None si quedan menos de min_n eventos. Son los pares a
+    los que se ajustaron las cópulas de res/copulas.
+    """
+    if varA not in tabla_A.columns or varB not in tabla_B.columns:
+        return None
+    par = pd.concat(
+        [tabla_A[varA].rename("X"), tabla_B[varB].rename("Y")], axis=1, join="inner"
+    ).fillna(0.0)
+    if quitar_todo_cero:
+        par = par[(par["X"] != 0) | (par["Y"] != 0)]
+    if len(par) < min_n:
+        return None
+    return par
@@ -0,0 +1,473 @@
+# VaR / TVaR predictivos con la incertidumbre del posterior de res/mcmc
+#
+# Las tablas de res/copulas usan una sola estimación puntual de cada
+# marginal. Aquí la cola de la marginal híbrida se evalúa en D draws del
+# posterior (res/mcmc/posterior.npz) a la vez: el cuantil híbrido sale como
+# una matriz (draws x alphas) en una sola pasada, con el cuerpo empírico
+# calculado una sola vez porque no depende del draw.
+#
+# Todos los draws usan los mismos uniformes (números aleatorios comunes):
+#   - para una ubicación X_d = Q_d(U) es monótona en U, así que basta
+#     ordenar U una vez y evaluar cada Q_d solo en las K simulaciones más
+#     altas, que son las únicas que entran en VaR/TVaR;
+#   - para una pareja, cada Q_d se acota entre la menor y la mayor de las
+#     curvas de todos los draws, evaluadas en una malla de la cola; solo las
+#     simulaciones cuya cota superior alcanza la K-ésima mayor cota inferior
+#     pueden quedar entre las K mayores de algún draw, y solo en ellas se
+#     evalúan los D draws.
+# Cada draw da su VaR/TVaR (media e intervalo de credibilidad a través de
+# los draws). La muestra predictiva usa el draw i mod D en la simulación i,
+# es decir, la mezcla sobre el posterior, y de ella sale el VaR/TVaR
+# predictivo.
+#
+# Uso típico:
+#   m = MarginalPosterior.desde_posterior(vals, "provincias", "Limón", n_draws=1000)
+#   m.ppf_lote([0.95, 0.99])                    # (draws, 2)
+#   riesgo_marginal(m, alphas=(0.95, 0.99), n_sims=50_000, random_state=1)
+
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src.config import RES_DIR, RUTA_POSTERIOR_MCMC
+from src.modelos.almacen import obtener_almacen
+from src.modelos.familias_copula import obtener_familia
+from src.modelos.marginales import EPS_ALPHA, MarginalHibrida, Q_exc, normalizar_modelo
+from src.modelos.mcmc import _leer_posterior, muestras_posterior
+from src.modelos.pares import CARPETAS
+from src.modelos.riesgo import METODOS_VAR, var_cvar
+
+# Modelo de cola de res/mcmc -> (modelo de marginales.py, orden de sus
+# parámetros); la GPD se guarda como (xi, sigma) y Q_exc la recibe (sigma, xi)
+MODELOS_COLA_POSTERIOR = {
+    "GPD": ("gpd", (1, 0)),
+    "Burr": ("burr", (0, 1, 2)),
+}
+
+# Carpeta de res/ (dimensión del posterior) -> columna de los datos limpios
+COLUMNA_DIMENSION = {Path(c).name: col for col, c in CARPETAS.items()}
+
+
+def modelo_cola(dimension: str, location: str) -> str:
+    """Modelo de cola de res/<dimension> si tiene posterior; si no, GPD."""
+    try:
+        nombre = str(obtener_almacen().cola(dimension, str(location))["model"])
+    except FileNotFoundError:
+        return "GPD"
+    for modelo in MODELOS_COLA_POSTERIOR:
+        if nombre.strip().lower() == modelo.lower():
+            return modelo
+    return "GPD"
+
+
+class MarginalPosterior:
+    """
+    Marginal híbrida (cuerpo empírico + cola) con D juegos de parámetros de
+    cola, uno por draw del posterior. u y p_u son los del ajuste MCMC.
+
+    draws es (D, k) en el orden de F_exc / Q_exc de marginales.py.
+    """
+
+    def __init__(
+        self,
+        body_sample: np.ndarray,
+        model: str,
+        u: float,
+        p_u: float,
+        draws: np.ndarray,
+        metodo: str = "linear",
+        info: Optional[Dict] = None,
+    ):
+        s = np.asarray(body_sample, dtype=float).ravel()
+        self.cuerpo = np.sort(s[~np.isnan(s)])
+        self.model = normalizar_modelo(model)
+        self.u = float(u)
+        self.p_u = float(p_u)
+        self.draws = np.atleast_2d(np.asarray(draws, dtype=float))
+        self.metodo = metodo
+        self.info = info or {}
+
+    @classmethod
+    def desde_posterior(
+        cls,
+        valores,
+        dimension: str,
+        location: str,
+        modelo: Optional[str] = None,
+        n_draws: Optional[int] = None,
+        random_state: Optional[int | np.random.Generator] = None,
+        ruta: Path | str = RUTA_POSTERIOR_MCMC,
+        **kwargs,
+    ) -> "MarginalPosterior":
+        """Cola de res/mcmc y cuerpo con las observaciones <= u (como desde_serie).
+        Con n_draws se toma una submuestra sin reemplazo de las cadenas."""
+        modelo = modelo or modelo_cola(dimension, location)
+        meta, X = muestras_posterior(dimension, str(location), "tail", modelo, ruta)
+        nombre, orden = MODELOS_COLA_POSTERIOR[meta["modelo"]]
+        if n_draws is not None and n_draws < X.shape[0]:
+            rng = np.random.default_rng(random_state)
+            X = X[np.sort(rng.choice(X.shape[0], n_draws, replace=False))]
+        vals = np.asarray(valores, dtype=float)
+        u = float(meta["u_opt"])
+        return cls(
+            vals[vals <= u],
+            nombre,
+            u,
+            meta["p_u"],
+            X[:, list(orden)],
+            info=meta,
+            **kwargs,
+        )
+
+    @property
+    def n_draws(self) -> int:
+        return int(self.draws.shape[0])
+
+    def __repr__(self) -> str:
+        return (
+            f"MarginalPosterior(model={self.model!r}, u={self.u:.4g}, "
+            f"p_u={self.p_u:.4g}, n_draws={self.n_draws})"
+        )
+
+    def puntual(self) -> MarginalHibrida:
+        """Marginal híbrida con la media posterior de los parámetros de cola."""
+        tail = {
+            "model": self.model,
+            "u": self.u,
+            "p_u": self.p_u,
+            "params": tuple(self.draws.mean(axis=0)),
+        }
+        return MarginalHibrida(self.cuerpo, tail)
+
+    def _cuerpo_y_cola(self, alpha):
+        al = np.clip(np.asarray(alpha, dtype=float).ravel(), EPS_ALPHA, 1.0 - EPS_ALPHA)
+        en_cuerpo = al <= (1.0 - self.p_u)
+        q_cuerpo = np.full(int(en_cuerpo.sum()), np.nan)
+        if self.cuerpo.size and q_cuerpo.size:
+            q_cuerpo = np.quantile(self.cuerpo, al[en_cuerpo], method=self.metodo)
+        alpha_exc = (al[~en_cuerpo] - (1.0 - self.p_u)) / self.p_u
+        return en_cuerpo, q_cuerpo, alpha_exc
+
+    def ppf_lote(self, alpha, draws=None) -> np.ndarray:
+        """Cuantil híbrido de cada draw en cada alpha: (D, n). `draws`
+        (índices o slice) restringe las filas."""
+        P = self.draws if draws is None else self.draws[draws]
+        en_cuerpo, q_cuerpo, alpha_exc = self._cuerpo_y_cola(alpha)
+        out = np.empty((P.shape[0], en_cuerpo.size), dtype=float)
+        out[:, en_cuerpo] = q_cuerpo
+        params = tuple(P[:, j, None] for j in range(P.shape[1]))
+        out[:, ~en_cuerpo] = self.u + Q_exc(alpha_exc, self.model, params)
+        return out
+
+    def envolvente(
+        self, alpha, draws=None, puntos: int = 256
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Cotas (inf, sup) de Q_d(alpha) válidas para todos los draws. Cada Q_d
+        se evalúa solo en una malla geométrica de 1 - alpha sobre la cola
+        (puntos x D evaluaciones); como Q_d es creciente, alpha entre dos
+        nodos queda acotado por la mínima en el nodo de abajo y la máxima en
+        el de arriba.
+        """
+        al = np.clip(np.asarray(alpha, dtype=float).ravel(), EPS_ALPHA, 1.0 - EPS_ALPHA)
+        en_cuerpo, q_cuerpo, _ = self._cuerpo_y_cola(al)
+        inf = np.empty(al.size)
+        sup = np.empty(al.size)
+        inf[en_cuerpo] = sup[en_cuerpo] = q_cuerpo
+        if en_cuerpo.all():
+            return inf, sup
+
+        a_cola = al[~en_cuerpo]
+        r_min = max(EPS_ALPHA, float((1.0 - a_cola).min()))
+        malla = 1.0 - self.p_u * np.geomspace(1.0, min(1.0, r_min / self.p_u), puntos)
+        Q = self.ppf_lote(malla, draws=draws)
+        bajo = np.minimum.accumulate(Q.min(axis=0)[::-1])[::-1]
+        alto = np.maximum.accumulate(Q.max(axis=0))
+        k = np.clip(np.searchsorted(malla, a_cola, side="right") - 1, 0, puntos - 1)
+        # Margen relativo por si el redondeo rompe la monotonía en un ulp
+        inf[~en_cuerpo] = bajo[k] * (1.0 - 1e-9)
+        sup[~en_cuerpo] = alto[np.minimum(k + 1, puntos - 1)] * (1.0 + 1e-9)
+        return inf, sup
+
+    def ppf_mezcla(self, alpha, draw: np.ndarray) -> np.ndarray:
+        """Cuantil híbrido de alpha[i] con el draw draw[i] (una muestra de la
+        predictiva si alpha es uniforme y draw recorre el posterior)."""
+        en_cuerpo, q_cuerpo, alpha_exc = self._cuerpo_y_cola(alpha)
+        out = np.empty(en_cuerpo.size, dtype=float)
+        out[en_cuerpo] = q_cuerpo
+        P = self.draws[np.asarray(draw)[~en_cuerpo]]
+        out[~en_cuerpo] = self.u + Q_exc(
+            alpha_exc, self.model, tuple(P[:, j] for j in range(P.shape[1]))
+        )
+        return out
+
+
+# ============================================================
+# VaR / TVaR de cada draw desde las K mayores simulaciones
+# ============================================================
+
+
+def filas_cola(n: int, alphas: Sequence[float], metodo: str = "lineal") -> int:
+    """Cuántas de las n simulaciones más altas necesitan VaR y TVaR en alphas."""
+    if metodo not in METODOS_VAR:
+        raise ValueError(f"metodo debe ser uno de {METODOS_VAR}")
+    K = 1
+    for a in alphas:
+        if metodo == "lineal":
+            K = max(K, n - int(np.floor(a * (n - 1))))
+        else:
+            K = max(K, n - max(0, int(np.floor(a * n)) - 1))
+    return min(K, n)
+
+
+def riesgo_desde_cola(
+    cola: np.ndarray, n: int, alphas: Sequence[float], metodo: str = "lineal"
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    VaR y TVaR (D, len(alphas)) con las mismas convenciones que var_cvar;
+    cola es (D, K) con las K mayores de cada una de las D muestras de tamaño
+    n, en orden ascendente (posiciones n-K .. n-1 de la muestra ordenada).
+    """
+    cola = np.atleast_2d(cola)
+    D, K = cola.shape
+    base = n - K
+    VaR = np.empty((D, len(alphas)))
+    TVaR = np.empty((D, len(alphas)))
+    for j, a in enumerate(alphas):
+        if metodo == "lineal":
+            # Interpolación lineal de np.quantile (misma fórmula que numpy)
+            h = a * (n - 1)
+            lo = int(np.floor(h))
+            t = h - lo
+            x_lo = cola[:, lo - base]
+            x_hi = cola[:, min(lo + 1, n - 1) - base]
+            dif = x_hi - x_lo
+            q = x_lo + dif * t if t < 0.5 else x_hi - dif * (1.0 - t)
+            en_cola = cola > q[:, None]
+            m = en_cola.sum(axis=1)
+            suma = np.where(en_cola, cola, 0.0).sum(axis=1)
+            tv = np.where(m > 0, suma / np.maximum(m, 1), q)
+        else:
+            idx = max(0, int(np.floor(a * n)) - 1)
+            q = cola[:, idx - base]
+            resto = cola[:, idx + 1 - base :]
+            tv = resto.mean(axis=1) if resto.shape[1] > 0 else q
+        VaR[:, j] = q
+        TVaR[:, j] = tv
+    return VaR, TVaR
+
+
+def _mayores(M: np.ndarray, K: int) -> np.ndarray:
+    # Las K mayores de cada fila, en orden ascendente
+    m = M.shape[1]
+    if m > K:
+        M = np.partition(M, m - K, axis=1)[:, m - K :]
+    return np.sort(M, axis=1)
+
+
+def _resumir(
+    VaR: np.ndarray,
+    TVaR: np.ndarray,
+    S_pred: np.ndarray,
+    S_punto: np.ndarray,
+    alphas: Sequence[float],
+    metodo: str,
+    nivel: float,
+) -> List[Dict]:
+    lo, hi = (1.0 - nivel) / 2.0, 1.0 - (1.0 - nivel) / 2.0
+    filas = []
+    for j, a in enumerate(alphas):
+        v_pred, t_pred = var_cvar(S_pred, a, metodo)
+        v_pun, t_pun = var_cvar(S_punto, a, metodo)
+        filas.append(
+            {
+                "alpha": a,
+                "VaR_puntual": v_pun,
+                "TVaR_puntual": t_pun,
+                "VaR_pred": v_pred,
+                "TVaR_pred": t_pred,
+                "VaR_media": float(VaR[:, j].mean()),
+                "VaR_inf": float(np.quantile(VaR[:, j], lo)),
+                "VaR_sup": float(np.quantile(VaR[:, j], hi)),
+                "TVaR_media": float(TVaR[:, j].mean()),
+                "TVaR_inf": float(np.quantile(TVaR[:, j], lo)),
+                "TVaR_sup": float(np.quantile(TVaR[:, j], hi)),
+            }
+        )
+    return filas
+
+
+def riesgo_marginal(
+    marg: MarginalPosterior,
+    alphas: Sequence[float] = (0.95, 0.99),
+    n_sims: int = 50_000,
+    random_state: Optional[int | np.random.Generator] = None,
+    metodo: str = "lineal",
+    nivel: float = 0.95,
+    detalle: bool = False,
+):
+    """
+    VaR/TVaR de una ubicación: puntual (media posterior), predictivo y media
+    e intervalo de credibilidad `nivel` de los VaR/TVaR por draw. Con
+    detalle=True devuelve también las matrices (D, len(alphas)).
+    """
+    rng = np.random.default_rng(random_state)
+    U = rng.uniform(size=n_sims)
+    K = filas_cola(n_sims, alphas, metodo)
+    # Q_d es creciente: las K mayores de X_d son Q_d de los K mayores uniformes
+    cola = marg.ppf_lote(np.sort(U)[n_sims - K :])
+    VaR, TVaR = riesgo_desde_cola(cola, n_sims, alphas, metodo)
+
+    S_pred = marg.ppf_mezcla(U, np.arange(n_sims) % marg.n_draws)
+    S_punto = marg.puntual().ppf(U)
+    filas = _resumir(VaR, TVaR, S_pred, S_punto, alphas, metodo, nivel)
+    return (filas, VaR, TVaR) if detalle else filas
+
+
+def riesgo_par(
+    m1: MarginalPosterior,
+    m2: MarginalPosterior,
+    U: np.ndarray,
+    alphas: Sequence[float] = (0.95, 0.99),
+    metodo: str = "lineal",
+    nivel: float = 0.95,
+    bloque_draws: int = 256,
+    detalle: bool = False,
+):
+    """
+    VaR/TVaR de S = X1 + X2 con los uniformes U (n, 2) de la cópula
+    compartidos por todos los draws. El draw d de m1 va con el draw d de m2
+    (posteriores independientes); se usan min(D1, D2) draws.
+    """
+    U = np.asarray(U, dtype=float)
+    n = U.shape[0]
+    D = min(m1.n_draws, m2.n_draws)
+    K = filas_cola(n, alphas, metodo)
+
+    # Poda con las envolventes: S_d >= inf en todas las filas, así que la
+    # K-ésima mayor de S_d es >= tau y las filas con sup < tau no entran
+    inf1, sup1 = m1.envolvente(U[:, 0], draws=slice(0, D))
+    inf2, sup2 = m2.envolvente(U[:, 1], draws=slice(0, D))
+    inf = inf1 + inf2
+    tau = np.partition(inf, n - K)[n - K]
+    filas = np.flatnonzero(sup1 + sup2 >= tau)
+
+    VaR = np.empty((D, len(alphas)))
+    TVaR = np.empty((D, len(alphas)))
+    for ini in range(0, D, bloque_draws):
+        fin = min(D, ini + bloque_draws)
+        S = m1.ppf_lote(U[filas, 0], draws=slice(ini, fin)) + m2.ppf_lote(
+            U[filas, 1], draws=slice(ini, fin)
+        )
+        VaR[ini:fin], TVaR[ini:fin] = riesgo_desde_cola(
+            _mayores(S, K), n, alphas, metodo
+        )
+
+    d = np.arange(n) % D
+    S_pred = m1.ppf_mezcla(U[:, 0], d) + m2.ppf_mezcla(U[:, 1], d)
+    S_punto = m1.puntual().ppf(U[:, 0]) + m2.puntual().ppf(U[:, 1])
+    filas = _resumir(VaR, TVaR, S_pred, S_punto, alphas, metodo, nivel)
+    return (filas, VaR, TVaR) if detalle else filas
+
+
+# ============================================================
+# Tablas para todas las ubicaciones y las parejas de seleccion_mv.csv
+# ============================================================
+
+
+def _marginales_posterior(df, claves, n_draws, semillas, ruta, col_total="total"):
+    out = {}
+    for (dim, loc), s in zip(claves, semillas.spawn(len(claves))):
+        vals = df.loc[df[COLUMNA_DIMENSION[dim]] == loc, col_total].to_numpy(
+            dtype=float
+        )
+        try:
+            out[(dim, loc)] = MarginalPosterior.desde_posterior(
+                vals,
+                dim,
+                loc,
+                n_draws=n_draws,
+                random_state=np.random.default_rng(s),
+                ruta=ruta,
+            )
+        except KeyError:
+            print(f"[Aviso] Sin posterior de cola para {dim}/{loc}")
+    return out
+
+
+def tablas_predictivas(
+    df: pd.DataFrame,
+    seleccion: Optional[pd.DataFrame] = None,
+    n_draws: int = 1000,
+    n_sims: int = 50_000,
+    alphas: Sequence[float] = (0.95, 0.99),
+    metodo: str = "lineal",
+    nivel: float = 0.95,
+    random_state: int = 123,
+    ruta: Path | str = RUTA_POSTERIOR_MCMC,
+) -> Dict[str, pd.DataFrame]:
+    """
+    {"marginales", "pares"}: VaR/TVaR predictivos por ubicación con
+    posterior de cola y por pareja de `seleccion` (por defecto
+    res/copulas/seleccion_mv.csv, con su familia y parámetros).
+    """
+    if seleccion is None:
+        seleccion = pd.read_csv(RES_DIR / "copulas" / "seleccion_mv.csv")
+    indice, _ = _leer_posterior(ruta)
+    claves = sorted(
+        {
+            (a["dimension"], a["location"])
+            for a in indice
+            if a["componente"] == "tail" and a["dimension"] in COLUMNA_DIMENSION
+        }
+    )
+
+    s_marg, s_sim, s_par = np.random.SeedSequence(random_state).spawn(3)
+    margs = _marginales_posterior(df, claves, n_draws, s_marg, ruta)
+
+    filas_m = []
+    for (dim, loc), s in zip(margs, s_sim.spawn(len(margs))):
+        m = margs[(dim, loc)]
+        info = {
+            "dimension": dim,
+            "location": loc,
+            "modelo": m.info.get("modelo"),
+            "u_opt": m.u,
+            "p_u": m.p_u,
+            "n_draws": m.n_draws,
+            "n_sims": n_sims,
+        }
+        for f in riesgo_marginal(
+            m, alphas, n_sims, np.random.default_rng(s), metodo, nivel
+        ):
+            filas_m.append({**info, **f})
+
+    filas_p = []
+    for fila, s in zip(seleccion.itertuples(index=False), s_par.spawn(len(seleccion))):
+        mA, mB = margs.get((fila.tipoA, fila.varA)), margs.get((fila.tipoB, fila.varB))
+        if mA is None or mB is None:
+            continue
+        fam = obtener_familia(fila.familia)
+        par = (fila.par, fila.par2) if fam.n_params > 1 else (fila.par,)
+        U = fam.simular(n_sims, par, np.random.default_rng(s))
+        info = {
+            "tipoA": fila.tipoA,
+            "tipoB": fila.tipoB,
+            "varA": fila.varA,
+            "varB": fila.varB,
+            "familia": fila.familia,
+            "par": fila.par,
+            "par2": fila.par2,
+            "modeloA": mA.info.get("modelo"),
+            "modeloB": mB.info.get("modelo"),
+            "n_draws": min(mA.n_draws, mB.n_draws),
+            "n_sims": n_sims,
+        }
+        for f in riesgo_par(mA, mB, U, alphas, metodo, nivel):
+            filas_p.append({**info, **f})
+
+    return {"marginales": pd.DataFrame(filas_m), "pares": pd.DataFrame(filas_p)}
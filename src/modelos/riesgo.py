@@ -0,0 +1,346 @@
+# VaR / CVaR por bloques con memoria acotada
+#
+# Para n_sims de decenas de millones no se puede guardar S completo. Aquí S se
+# recibe en bloques y se resume en:
+#   - un sketch de cuantiles con bins logarítmicos (error relativo fijo, se
+#     puede fusionar entre procesos) que guarda conteo y suma por bin, y
+#   - un buffer exacto con los `max_buffer` valores más grandes vistos.
+# Si la cola pedida (1 - alpha) * n cabe en el buffer, VaR y CVaR salen
+# exactos e iguales a los de la versión en memoria; si no, salen del sketch.
+
+from __future__ import annotations
+
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+import numpy as np
+
+# Convenciones de VaR/CVaR usadas en los notebooks:
+#   "lineal": VaR = np.quantile(S, a), CVaR = media de S > VaR   (var_cvar)
+#   "orden":  idx = max(0, floor(a*n) - 1), VaR = S_(idx),
+#             TVaR = media de S_(idx+1:)                          (portafolios)
+METODOS_VAR = ("lineal", "orden")
+
+
+def var_cvar(
+    S: np.ndarray,
+    alpha: float,
+    metodo: str = "lineal",
+    pesos: Optional[np.ndarray] = None,
+) -> Tuple[float, float]:
+    """
+    VaR y CVaR en memoria (referencia para la versión por bloques).
+
+    Con pesos (razones de verosimilitud f/g del muestreo por importancia,
+    src/modelos/muestreo.py, de media 1) la cola se estima directamente:
+    P(S > x) ~ (1/n) sum w_i 1{S_i > x}. VaR es el menor S_(i) con esa
+    probabilidad <= 1 - alpha y CVaR la media ponderada de S > VaR, con los
+    dos métodos. Con pesos iguales a 1 es el cuantil de la ECDF.
+    """
+    if pesos is not None:
+        return _var_cvar_ponderado(S, pesos, alpha, metodo)
+    S = np.asarray(S, float)
+    S = S[np.isfinite(S)]
+    if S.size == 0:
+        return np.nan, np.nan
+
+    if metodo == "lineal":
+        q = float(np.quantile(S, alpha))
+        tail = S[S > q]
+        return q, float(tail.mean()) if tail.size > 0 else q
+    if metodo == "orden":
+        s = np.sort(S)
+        idx = max(0, int(np.floor(alpha * s.size)) - 1)
+        q = float(s[idx])
+        tail = s[idx + 1 :]
+        return q, float(tail.mean()) if tail.size > 0 else q
+    raise ValueError(f"metodo debe ser uno de {METODOS_VAR}")
+
+
+def _var_cvar_ponderado(S, pesos, alpha: float, metodo: str) -> Tuple[float, float]:
+    if metodo not in METODOS_VAR:
+        raise ValueError(f"metodo debe ser uno de {METODOS_VAR}")
+    S = np.asarray(S, float)
+    w = np.asarray(pesos, float)
+    if w.shape != S.shape:
+        raise ValueError(f"{w.size} pesos para {S.size} valores")
+    ok = np.isfinite(S) & np.isfinite(w)
+    S, w = S[ok], w[ok]
+    if S.size == 0 or w.sum() <= 0:
+        return np.nan, np.nan
+
+    # Peso de cola acumulado desde arriba: cola[i] = sum_{j >= i} w_(j)
+    orden = np.argsort(S, kind="stable")
+    s, w = S[orden], w[orden]
+    cola = np.cumsum(w[::-1])[::-1] / s.size
+    # Menor índice cuya cola estrictamente superior (j > i) es <= 1 - alpha
+    superior = np.append(cola[1:], 0.0)
+    idx = int(np.argmax(superior <= 1.0 - alpha))
+    q = float(s[idx])
+    mayores = s > q
+    if not mayores.any():
+        return q, q
+    return q, float(np.dot(s[mayores], w[mayores]) / w[mayores].sum())
+
+
+def tamano_efectivo(pesos: np.ndarray) -> float:
+    """Tamaño de muestra efectivo de Kish, (sum w)^2 / sum w^2."""
+    w = np.asarray(pesos, float)
+    return float(w.sum() ** 2 / np.dot(w, w))
+
+
+# ============================================================
+# Sketch de cuantiles (bins logarítmicos con conteo y suma)
+# ============================================================
+
+
+class _BinsLog:
+    """Conteos y sumas en bins i = ceil(log(x) / log(gamma)) para x > 0."""
+
+    def __init__(self, log_gamma: float):
+        self.log_gamma = log_gamma
+        self.offset = 0
+        self.conteos = np.zeros(0, dtype=np.int64)
+        self.sumas = np.zeros(0, dtype=float)
+
+    def _extender(self, i_min: int, i_max: int) -> None:
+        if self.conteos.size == 0:
+            self.offset = i_min
+            self.conteos = np.zeros(i_max - i_min + 1, dtype=np.int64)
+            self.sumas = np.zeros(i_max - i_min + 1, dtype=float)
+            return
+        izq = max(0, self.offset - i_min)
+        der = max(0, i_max - (self.offset + self.conteos.size - 1))
+        if izq or der:
+            self.conteos = np.pad(self.conteos, (izq, der))
+            self.sumas = np.pad(self.sumas, (izq, der))
+            self.offset -= izq
+
+    def agregar(self, x: np.ndarray) -> None:
+        if x.size == 0:
+            return
+        i = np.ceil(np.log(x) / self.log_gamma).astype(np.int64)
+        i_min, i_max = int(i.min()), int(i.max())
+        self._extender(i_min, i_max)
+        pos = i - self.offset
+        n_bins = self.conteos.size
+        self.conteos += np.bincount(pos, minlength=n_bins)
+        self.sumas += np.bincount(pos, weights=x, minlength=n_bins)
+
+    def fusionar(self, otro: "_BinsLog") -> None:
+        if otro.conteos.size == 0:
+            return
+        self._extender(otro.offset, otro.offset + otro.conteos.size - 1)
+        a = otro.offset - self.offset
+        self.conteos[a : a + otro.conteos.size] += otro.conteos
+        self.sumas[a : a + otro.sumas.size] += otro.sumas
+
+
+class SketchCuantiles:
+    """
+    Sketch de cuantiles con error relativo `precision` (estilo DDSketch).
+
+    Los valores positivos y negativos van en bins logarítmicos separados y
+    los |x| < x_min se cuentan como cero. Cada bin guarda además la suma de
+    sus valores, lo que permite estimar medias de cola (CVaR). La memoria
+    depende del rango de los datos, no de cuántos se agregan.
+    """
+
+    def __init__(self, precision: float = 1e-3, x_min: float = 1e-9):
+        self.precision = float(precision)
+        self.gamma = (1.0 + precision) / (1.0 - precision)
+        self.x_min = float(x_min)
+        lg = np.log(self.gamma)
+        self.pos = _BinsLog(lg)
+        self.neg = _BinsLog(lg)
+        self.n_cero = 0
+        self.n = 0
+
+    def agregar(self, x) -> None:
+        x = np.asarray(x, dtype=float).ravel()
+        x = x[np.isfinite(x)]
+        self.n += x.size
+        cero = np.abs(x) < self.x_min
+        self.n_cero += int(cero.sum())
+        self.pos.agregar(x[(x > 0) & ~cero])
+        self.neg.agregar(-x[(x < 0) & ~cero])
+
+    def fusionar(self, otro: "SketchCuantiles") -> None:
+        if otro.gamma != self.gamma:
+            raise ValueError("Solo se pueden fusionar sketches con la misma precisión")
+        self.pos.fusionar(otro.pos)
+        self.neg.fusionar(otro.neg)
+        self.n_cero += otro.n_cero
+        self.n += otro.n
+
+    def _tabla(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        # Bins en orden ascendente de valor: negativos (de mayor a menor |x|), cero, positivos
+        g = self.gamma
+        rep_neg = (
+            -2.0
+            * g ** np.arange(self.neg.offset, self.neg.offset + self.neg.conteos.size)
+            / (g + 1.0)
+        )
+        rep_pos = (
+            2.0
+            * g ** np.arange(self.pos.offset, self.pos.offset + self.pos.conteos.size)
+            / (g + 1.0)
+        )
+        rep = np.concatenate([rep_neg[::-1], [0.0], rep_pos])
+        conteos = np.concatenate(
+            [self.neg.conteos[::-1], [self.n_cero], self.pos.conteos]
+        )
+        sumas = np.concatenate([-self.neg.sumas[::-1], [0.0], self.pos.sumas])
+        return rep, conteos, sumas
+
+    def valor_en_rango(self, r: int) -> float:
+        """Valor aproximado del estadístico de orden r (0 = mínimo)."""
+        rep, conteos, _ = self._tabla()
+        k = int(np.searchsorted(np.cumsum(conteos), r, side="right"))
+        return float(rep[min(k, rep.size - 1)])
+
+    def cuantil(self, alpha: float) -> float:
+        if self.n == 0:
+            return np.nan
+        return self.valor_en_rango(int(np.floor(alpha * (self.n - 1))))
+
+    def media_mayores(self, m: int) -> float:
+        """Media aproximada de los m valores más grandes."""
+        rep, conteos, sumas = self._tabla()
+        suma, faltan = 0.0, int(m)
+        for k in range(rep.size - 1, -1, -1):
+            if faltan <= 0:
+                break
+            c = int(conteos[k])
+            if c == 0:
+                continue
+            tomar = min(c, faltan)
+            suma += sumas[k] * (tomar / c)
+            faltan -= tomar
+        return suma / m
+
+
+# ============================================================
+# Estimador por bloques
+# ============================================================
+
+
+def _interpolar(a: float, b: float, w: float) -> float:
+    # Misma interpolación que np.quantile(method="linear"), para que el VaR
+    # exacto coincida bit a bit con la versión en memoria
+    d = b - a
+    return float(b - d * (1.0 - w) if w >= 0.5 else a + d * w)
+
+
+class RiesgoStreaming:
+    """
+    Acumula S por bloques y devuelve VaR/CVaR para cada alpha.
+
+    max_buffer fija la memoria del buffer exacto de la cola (los valores más
+    grandes vistos). Dos estimadores con la misma configuración se pueden
+    fusionar, por ejemplo al juntar los bloques de varios procesos.
+    """
+
+    def __init__(
+        self,
+        alphas: Iterable[float] = (0.95, 0.99),
+        metodo: str = "lineal",
+        max_buffer: int = 1_000_000,
+        precision: float = 1e-3,
+    ):
+        if metodo not in METODOS_VAR:
+            raise ValueError(f"metodo debe ser uno de {METODOS_VAR}")
+        self.alphas = tuple(float(a) for a in alphas)
+        self.metodo = metodo
+        self.max_buffer = int(max_buffer)
+        self.sketch = SketchCuantiles(precision=precision)
+        self.buffer = np.zeros(0, dtype=float)
+
+    @property
+    def n(self) -> int:
+        return self.sketch.n
+
+    def _recortar(self, x: np.ndarray) -> None:
+        if self.max_buffer <= 0:
+            x = x[:0]
+        elif x.size > self.max_buffer:
+            x = np.partition(x, x.size - self.max_buffer)[x.size - self.max_buffer :]
+        self.buffer = x
+
+    def agregar(self, S) -> None:
+        S = np.asarray(S, dtype=float).ravel()
+        S = S[np.isfinite(S)]
+        self.sketch.agregar(S)
+        self._recortar(np.concatenate([self.buffer, S]))
+
+    def fusionar(self, otro: "RiesgoStreaming") -> None:
+        self.sketch.fusionar(otro.sketch)
+        self._recortar(np.concatenate([self.buffer, otro.buffer]))
+
+    def _rangos(self, alpha: float) -> Tuple[int, int, float, int]:
+        # (rango bajo, rango alto, peso de interpolación, m = tamaño de la cola)
+        n = self.n
+        if self.metodo == "lineal":
+            h = alpha * (n - 1)
+            lo = int(np.floor(h))
+            return lo, min(lo + 1, n - 1), h - lo, n - 1 - lo
+        idx = max(0, int(np.floor(alpha * n)) - 1)
+        return idx, idx, 0.0, n - 1 - idx
+
+    def es_exacto(self, alpha: float) -> bool:
+        lo, _, _, _ = self._rangos(alpha)
+        return self.n - lo <= self.buffer.size
+
+    def var_cvar(self, alpha: float) -> Tuple[float, float]:
+        n = self.n
+        if n == 0:
+            return np.nan, np.nan
+        lo, hi, w, m = self._rangos(alpha)
+
+        if self.es_exacto(alpha):
+            # Cola completa en el buffer: mismos valores que la versión en memoria
+            cola = np.sort(self.buffer)
+            base = n - cola.size  # rango del primer valor del buffer
+            q_lo, q_hi = cola[lo - base], cola[hi - base]
+            if self.metodo == "lineal":
+                q = _interpolar(q_lo, q_hi, w)
+                tail = cola[cola > q]
+            else:
+                q = float(q_lo)
+                tail = cola[lo - base + 1 :]
+            return q, float(tail.mean()) if tail.size > 0 else q
+
+        # Cola más grande que el buffer: sketch
+        q_lo = self.sketch.valor_en_rango(lo)
+        q = _interpolar(q_lo, self.sketch.valor_en_rango(hi), w)
+        cvar = self.sketch.media_mayores(m) if m > 0 else q
+        return float(q), float(cvar)
+
+    def resultado(self) -> Dict[float, Tuple[float, float]]:
+        return {a: self.var_cvar(a) for a in self.alphas}
+
+
+def var_cvar_por_bloques(
+    simular_bloque: Callable[[int, np.random.Generator], np.ndarray],
+    n_sims: int,
+    alphas: Iterable[float] = (0.95, 0.99),
+    tamano_bloque: int = 1_000_000,
+    random_state=None,
+    metodo: str = "lineal",
+    max_buffer: int = 1_000_000,
+    precision: float = 1e-3,
+) -> RiesgoStreaming:
+    """
+    Simula S en bloques de tamano_bloque con simular_bloque(n, rng) y los
+    acumula en un RiesgoStreaming. Todos los bloques comparten el mismo
+    Generator, así que la corrida es reproducible con random_state.
+    """
+    rng = np.random.default_rng(random_state)
+    est = RiesgoStreaming(
+        alphas, metodo=metodo, max_buffer=max_buffer, precision=precision
+    )
+    hechos = 0
+    while hechos < n_sims:
+        n = min(int(tamano_bloque), n_sims - hechos)
+        est.agregar(simular_bloque(n, rng))
+        hechos += n
+    return est
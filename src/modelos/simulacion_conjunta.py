@@ -0,0 +1,483 @@
+# Simulación conjunta única para todas las provincias, categorías y sectores
+#
+# En lugar de simular una cópula por pareja (todas_dependencias) o por
+# categoría (var_cvar_joint_prov_cat / var_cvar_portafolio_categoria de
+# notebooks/3_dependencias_tve.ipynb), aquí se simula una sola t-cópula de
+# dimensión d = provincias + categorías + sectores:
+#
+#   1. tau de Kendall por pares con las pérdidas por evento (las mismas
+#      parejas que par_por_evento) -> rho = sin(pi tau / 2), reparada con
+#      dependencia.correlacion_mas_cercana para que sea definida positiva;
+#   2. U ~ t-cópula(R, nu), n_sims x d, una sola vez por corrida;
+#   3. X[:, j] = F_j^-1(U[:, j]) con la marginal híbrida de cada dimensión,
+#      una sola vez por marginal;
+#   4. cada tabla se obtiene sumando columnas de X: parejas (X_i + X_j),
+#      provincia-categoría (provincia escalada por la severidad de la
+#      categoría) y portafolios (suma de provincias).
+#
+# Como todo sale de las mismas simulaciones, los VaR marginales que aparecen
+# en las distintas tablas coinciden exactamente entre sí.
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from scipy.special import stdtr
+from scipy.stats import rankdata
+
+from src.modelos.almacen import cargar_cola
+from src.modelos.dependencia import correlacion_mas_cercana, tau_por_pares
+from src.modelos.familias_copula import FAMILIAS
+from src.modelos.marginales import MarginalHibrida
+from src.modelos.pares import CARPETAS, TIPOS_PAR, tabla_por_evento
+from src.modelos.riesgo import METODOS_VAR, RiesgoStreaming
+
+COLUMNAS = ("provincia", "categoria", "sector")
+MALLA_NU = (3.0, 4.0, 5.0, 7.0, 10.0, 15.0, 25.0, 50.0)
+
+
+# ============================================================
+# Correlación a partir de tau de Kendall
+# ============================================================
+
+
+def tabla_conjunta(
+    df: pd.DataFrame, columnas: Sequence[str] = COLUMNAS, col_total: str = "total"
+) -> pd.DataFrame:
+    """
+    Pérdida por evento (año, evento) de cada dimensión, con columnas
+    (columna, valor) y 0 donde un valor no tuvo pérdidas en el evento.
+    """
+    tablas = {col: tabla_por_evento(df, col, col_total=col_total) for col in columnas}
+    return pd.concat(tablas, axis=1, names=["columna", "valor"]).fillna(0.0)
+
+
+def matriz_tau(
+    tabla: pd.DataFrame, min_n: int = 20, quitar_todo_cero: bool = True
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    tau de Kendall y número de eventos por pareja de columnas. Igual que en
+    par_por_evento se quitan los eventos donde ambas valen 0; las parejas con
+    menos de min_n eventos quedan con tau = 0.
+    """
+    X = tabla.to_numpy(dtype=float)
+    T, N = tau_por_pares(X, min_pares=min_n, excluir_ceros=quitar_todo_cero)
+    T = np.nan_to_num(T, nan=0.0)
+    np.fill_diagonal(N, (X != 0).sum(axis=0) if quitar_todo_cero else X.shape[0])
+    return T, N
+
+
+def correlacion_desde_tau(T: np.ndarray, minimo: float = 1e-6) -> np.ndarray:
+    return correlacion_mas_cercana(
+        np.sin(np.pi * np.asarray(T, float) / 2.0), minimo=minimo
+    )
+
+
+def estimar_nu(
+    tabla: pd.DataFrame,
+    R: np.ndarray,
+    N: np.ndarray,
+    min_n: int = 20,
+    malla: Sequence[float] = MALLA_NU,
+) -> Tuple[float, np.ndarray]:
+    """
+    nu de la t-cópula por verosimilitud compuesta: suma de las log-densidades
+    bivariadas t(R_ij, nu) de todas las parejas con al menos min_n eventos,
+    con R fija. Devuelve el mejor nu de la malla y la curva de
+    log-verosimilitud.
+    """
+    X = tabla.to_numpy(dtype=float)
+    t_cop = FAMILIAS["t"]
+    d = X.shape[1]
+    muestras = []
+    for i in range(d):
+        for j in range(i + 1, d):
+            if N[i, j] < min_n:
+                continue
+            m = (X[:, i] != 0) | (X[:, j] != 0)
+            u = rankdata(X[m, i]) / (m.sum() + 1.0)
+            v = rankdata(X[m, j]) / (m.sum() + 1.0)
+            muestras.append((u, v, R[i, j]))
+    ll = np.array(
+        [
+            sum(np.sum(t_cop.logpdf(u, v, (rho, nu))) for u, v, rho in muestras)
+            for nu in malla
+        ]
+    )
+    return float(np.asarray(malla)[np.argmax(ll)]), ll
+
+
+# ============================================================
+# Pool de simulaciones
+# ============================================================
+
+
+def simular_t_copula(
+    R: np.ndarray, nu: float, n_sims: int, rng: np.random.Generator
+) -> np.ndarray:
+    """U de la t-cópula d-dimensional (como simulate_t_copula en los notebooks)."""
+    L = np.linalg.cholesky(R + 1e-12 * np.eye(R.shape[0]))
+    z = rng.standard_normal(size=(n_sims, R.shape[0])) @ L.T
+    w = np.sqrt(rng.chisquare(df=nu, size=n_sims) / nu)
+    return np.clip(stdtr(nu, z / w[:, None]), 1e-12, 1.0 - 1e-12)
+
+
+def marginales_pool(
+    df: pd.DataFrame,
+    dimensiones: Sequence[Tuple[str, str]],
+    carpetas: Optional[Dict[str, str]] = None,
+    col_total: str = "total",
+) -> List[MarginalHibrida]:
+    """
+    Marginal híbrida de cada dimensión (columna, valor): cola de
+    res/<carpeta> y cuerpo con todas las observaciones de ese valor <= u.
+    """
+    carpetas = {**CARPETAS, **(carpetas or {})}
+    out = []
+    for col, val in dimensiones:
+        tail = cargar_cola(str(val), carpetas[col])
+        vals = df.loc[df[col] == val, col_total].to_numpy(dtype=float)
+        out.append(MarginalHibrida.desde_serie(vals, tail))
+    return out
+
+
+@dataclass
+class Combinacion:
+    """Suma ponderada de columnas del pool: S = X[:, columnas] @ pesos."""
+
+    clave: Tuple
+    columnas: np.ndarray
+    pesos: np.ndarray
+    metodo: str = "lineal"
+    info: Dict = field(default_factory=dict)
+
+
+def _var_cvar_columnas(
+    S: np.ndarray, alpha: float, metodo: str
+) -> Tuple[np.ndarray, np.ndarray]:
+    # var_cvar para cada columna de S a la vez (mismas convenciones)
+    n = S.shape[0]
+    if metodo == "lineal":
+        q = np.quantile(S, alpha, axis=0)
+        en_cola = S > q
+        m = en_cola.sum(axis=0)
+        suma = np.where(en_cola, S, 0.0).sum(axis=0)
+        return q, np.where(m > 0, suma / np.maximum(m, 1), q)
+    idx = max(0, int(np.floor(alpha * n)) - 1)
+    parte = np.partition(S, idx, axis=0)
+    q = parte[idx]
+    cola = parte[idx + 1 :]
+    return q, cola.mean(axis=0) if cola.shape[0] > 0 else q
+
+
+def evaluar_combinaciones(
+    X: np.ndarray, combinaciones: Sequence[Combinacion], alphas: Sequence[float]
+) -> Dict[Tuple, Dict[float, Tuple[float, float]]]:
+    """VaR/CVaR de cada combinación sobre el pool X (en memoria)."""
+    res = {c.clave: {} for c in combinaciones}
+    for metodo in METODOS_VAR:
+        grupo = [c for c in combinaciones if c.metodo == metodo]
+        # Se agrupan por número de columnas para armar S como una matriz
+        for k in sorted({len(c.columnas) for c in grupo}):
+            sub = [c for c in grupo if len(c.columnas) == k]
+            idx = np.array([c.columnas for c in sub])  # (m, k)
+            pesos = np.array([c.pesos for c in sub])  # (m, k)
+            for trozo in range(0, len(sub), 16):
+                sl = slice(trozo, trozo + 16)
+                S = np.einsum("nmk,mk->nm", X[:, idx[sl]], pesos[sl])
+                for a in alphas:
+                    q, cv = _var_cvar_columnas(S, a, metodo)
+                    for c, qi, ci in zip(sub[sl], q, cv):
+                        res[c.clave][a] = (float(qi), float(ci))
+    return res
+
+
+class PoolConjunto:
+    """
+    Una t-cópula sobre todas las dimensiones y sus pérdidas simuladas.
+
+    dimensiones: lista de (columna, valor), en el orden de R.
+    """
+
+    def __init__(
+        self,
+        dimensiones: Sequence[Tuple[str, str]],
+        R: np.ndarray,
+        nu: float,
+        marginales: Sequence[MarginalHibrida],
+    ):
+        self.dimensiones = [tuple(d) for d in dimensiones]
+        self.indice = {d: j for j, d in enumerate(self.dimensiones)}
+        self.R = np.asarray(R, float)
+        self.nu = float(nu)
+        self.marginales = list(marginales)
+
+    @classmethod
+    def desde_datos(
+        cls,
+        df: pd.DataFrame,
+        nu: Optional[float] = None,
+        min_n: int = 20,
+        carpetas: Optional[Dict[str, str]] = None,
+        columnas: Sequence[str] = COLUMNAS,
+        col_total: str = "total",
+    ) -> "PoolConjunto":
+        """R por tau de Kendall por evento; nu fijo o (None) por verosimilitud compuesta."""
+        tabla = tabla_conjunta(df, columnas, col_total)
+        T, N = matriz_tau(tabla, min_n=min_n)
+        R = correlacion_desde_tau(T)
+        if nu is None:
+            nu, _ = estimar_nu(tabla, R, N, min_n=min_n)
+        dims = [(str(c), str(v)) for c, v in tabla.columns]
+        pool = cls(dims, R, nu, marginales_pool(df, dims, carpetas, col_total))
+        pool.tau, pool.n_pares = T, N
+        return pool
+
+    def simular(self, n_sims: int, rng: np.random.Generator) -> np.ndarray:
+        """Pérdidas X (n_sims x d): una inversión por marginal."""
+        U = simular_t_copula(self.R, self.nu, n_sims, rng)
+        X = np.empty_like(U)
+        for j, marg in enumerate(self.marginales):
+            X[:, j] = marg.ppf(U[:, j])
+        return X
+
+    def riesgo(
+        self,
+        combinaciones: Sequence[Combinacion],
+        n_sims: int = 200_000,
+        alphas: Sequence[float] = (0.95, 0.99),
+        random_state=None,
+        tamano_bloque: Optional[int] = None,
+    ) -> Dict[Tuple, Dict[float, Tuple[float, float]]]:
+        """
+        VaR/CVaR de todas las combinaciones con un solo pool. Con tamano_bloque
+        el pool se genera por bloques y cada combinación se acumula en un
+        RiesgoStreaming (memoria acotada).
+        """
+        rng = np.random.default_rng(random_state)
+        if tamano_bloque is None:
+            return evaluar_combinaciones(
+                self.simular(n_sims, rng), combinaciones, alphas
+            )
+
+        est = {c.clave: RiesgoStreaming(alphas, metodo=c.metodo) for c in combinaciones}
+        for inicio in range(0, n_sims, tamano_bloque):
+            X = self.simular(min(tamano_bloque, n_sims - inicio), rng)
+            for c in combinaciones:
+                est[c.clave].agregar(X[:, c.columnas] @ c.pesos)
+        return {clave: e.resultado() for clave, e in est.items()}
+
+
+# ============================================================
+# Tablas de res/copulas
+# ============================================================
+
+
+def combinaciones_estandar(
+    pool: PoolConjunto, df: pd.DataFrame, col_total: str = "total"
+) -> List[Combinacion]:
+    """
+    - ("marginal", col, val): cada dimensión sola
+    - ("par", col1, val1, col2, val2): X_1 + X_2 para los bloques de TIPOS_PAR
+    - ("prov_cat", "provincia", val): cada provincia con la convención
+      "orden" de var_cvar_joint_prov_cat, base de la tabla provincia-categoría
+    - ("portafolio", categoria): suma de provincias escaladas por la categoría
+      (como var_cvar_portafolio_categoria), y ("portafolio", "TOTAL"): suma
+      de todas las provincias
+    """
+    combs = []
+    for d, j in pool.indice.items():
+        combs.append(Combinacion(("marginal",) + d, np.array([j]), np.ones(1)))
+
+    for col1, col2 in TIPOS_PAR:
+        dims1 = [d for d in pool.dimensiones if d[0] == col1]
+        dims2 = [d for d in pool.dimensiones if d[0] == col2]
+        for d1 in dims1:
+            for d2 in dims2:
+                combs.append(
+                    Combinacion(
+                        ("par",) + d1 + d2,
+                        np.array([pool.indice[d1], pool.indice[d2]]),
+                        np.ones(2),
+                    )
+                )
+
+    provincias = [d for d in pool.dimensiones if d[0] == "provincia"]
+    for d in provincias:
+        combs.append(
+            Combinacion(
+                ("prov_cat",) + d, np.array([pool.indice[d]]), np.ones(1), "orden"
+            )
+        )
+    escalas = escalas_provincia_categoria(df, col_total)
+    for cat, esc in escalas.groupby("categoria", observed=True):
+        esc = esc[esc["provincia"].isin([p[1] for p in provincias])]
+        if esc.empty:
+            continue
+        combs.append(
+            Combinacion(
+                ("portafolio", cat),
+                np.array([pool.indice[("provincia", p)] for p in esc["provincia"]]),
+                esc["escala"].to_numpy(dtype=float),
+                metodo="orden",
+                info={"provincias": list(esc["provincia"])},
+            )
+        )
+    combs.append(
+        Combinacion(
+            ("portafolio", "TOTAL"),
+            np.array([pool.indice[p] for p in provincias]),
+            np.ones(len(provincias)),
+            metodo="orden",
+            info={"provincias": [p[1] for p in provincias]},
+        )
+    )
+    return combs
+
+
+def escalas_provincia_categoria(
+    df: pd.DataFrame, col_total: str = "total"
+) -> pd.DataFrame:
+    """
+    Escala de la pérdida provincial dentro de cada categoría, como en
+    var_cvar_joint_prov_cat: media de la categoría / media de la provincia,
+    para las provincias con observaciones en la categoría.
+    """
+    d = df.dropna(subset=["provincia", "categoria", col_total])
+    media_cat = d.groupby("categoria", observed=True)[col_total].mean()
+    media_prov = d.groupby("provincia", observed=True)[col_total].mean()
+    pares = (
+        d.groupby(["provincia", "categoria"], observed=True)
+        .size()
+        .rename("n_obs")
+        .reset_index()
+    )
+    pares["escala"] = (
+        media_cat.loc[pares["categoria"]].to_numpy()
+        / media_prov.loc[pares["provincia"]].to_numpy()
+    )
+    return pares
+
+
+def tablas_pool(
+    pool: PoolConjunto,
+    df: pd.DataFrame,
+    n_sims: int = 200_000,
+    alphas: Sequence[float] = (0.95, 0.99),
+    random_state=None,
+    tamano_bloque: Optional[int] = None,
+    col_total: str = "total",
+    simulaciones=None,
+) -> Dict[str, pd.DataFrame]:
+    """
+    Todas las tablas de riesgo a partir de un único pool. Con simulaciones
+    (un AlmacenSimulaciones del mismo pool) no se vuelve a simular y n_sims,
+    random_state y tamano_bloque se ignoran.
+    """
+    combs = combinaciones_estandar(pool, df, col_total)
+    if simulaciones is None:
+        res = pool.riesgo(
+            combs,
+            n_sims=n_sims,
+            alphas=alphas,
+            random_state=random_state,
+            tamano_bloque=tamano_bloque,
+        )
+    else:
+        if simulaciones.dimensiones != pool.dimensiones:
+            raise ValueError(
+                "Las simulaciones guardadas no tienen las dimensiones del pool"
+            )
+        res = simulaciones.riesgo(combs, alphas=alphas)
+        n_sims = simulaciones.n_sims
+    base = {"nu": pool.nu, "n_sims": int(n_sims)}
+
+    def _riesgo(clave, var="VaR", cvar="CVaR"):
+        return {
+            k: v
+            for a in alphas
+            for k, v in (
+                (f"{var}({a})", res[clave][a][0]),
+                (f"{cvar}({a})", res[clave][a][1]),
+            )
+        }
+
+    marginales = pd.DataFrame(
+        [
+            {"columna": col, "valor": val, **_riesgo(("marginal", col, val))}
+            for col, val in pool.dimensiones
+        ]
+    )
+
+    filas = []
+    for c in combs:
+        if c.clave[0] != "par":
+            continue
+        _, col1, val1, col2, val2 = c.clave
+        i, j = c.columnas
+        fila = {
+            "tipo_par": f"{col1}-{col2}",
+            "col1": col1,
+            "val1": val1,
+            "col2": col2,
+            "val2": val2,
+            "n_eventos": int(pool.n_pares[i, j]),
+            "tau": float(pool.tau[i, j]),
+            "rho": float(pool.R[i, j]),
+            **base,
+        }
+        for a in alphas:
+            fila[f"VaR1({a})"] = res[("marginal", col1, val1)][a][0]
+            fila[f"VaR2({a})"] = res[("marginal", col2, val2)][a][0]
+        fila.update(_riesgo(c.clave))
+        filas.append(fila)
+    pares = pd.DataFrame(filas)
+
+    # provincia-categoría: la escala es positiva, así que VaR y TVaR son los
+    # de la provincia multiplicados por la escala (mismas simulaciones, con la
+    # convención "orden" del notebook en lugar de la "lineal" de marginales)
+    escalas = escalas_provincia_categoria(df, col_total)
+    filas = []
+    for e in escalas.itertuples(index=False):
+        clave = ("prov_cat", "provincia", e.provincia)
+        if clave not in res:
+            continue
+        for a in alphas:
+            var_a, cvar_a = res[clave][a]
+            filas.append(
+                {
+                    "provincia": e.provincia,
+                    "categoria": e.categoria,
+                    "VaR": e.escala * var_a,
+                    "TVaR": e.escala * cvar_a,
+                    "alpha": a,
+                }
+            )
+    prov_cat = pd.DataFrame(filas)
+
+    portafolios = pd.DataFrame(
+        [
+            {
+                "portafolio": c.clave[1],
+                "n_provincias": len(c.columnas),
+                "provincias": ";".join(c.info["provincias"]),
+                **base,
+                **_riesgo(c.clave, cvar="TVaR"),
+            }
+            for c in combs
+            if c.clave[0] == "portafolio"
+        ]
+    )
+
+    etiquetas = [f"{col}:{val}" for col, val in pool.dimensiones]
+    correlacion = pd.DataFrame(pool.R, index=etiquetas, columns=etiquetas)
+    return {
+        "marginales": marginales,
+        "pares": pares,
+        "prov_cat": prov_cat,
+        "portafolios": portafolios,
+        "correlacion": correlacion,
+    }
@@ -0,0 +1,352 @@
+# Selección automática del umbral u de la cola (u_opt, p_u)
+#
+# Misma regla que encontrar_umbral_optimo en notebooks/tve_colas.qmd:
+#
+#   1. malla de umbrales: cuantiles u_min..u_max de los datos (puntos);
+#   2. función de exceso medio MRL(u) = media(x - u | x > u) y su varianza
+#      local en una ventana de +-2 umbrales;
+#   3. GPD por máxima verosimilitud a los excesos de cada umbral con al menos
+#      min_excesos datos y p-valor de Anderson-Darling con esos parámetros;
+#   4. u_opt: el de mayor p-valor entre los umbrales con varianza local
+#      <= 1.5 veces la mínima (más una tolerancia de redondeo) y p-valor
+#      >= 0.05; si no hay, el de menor varianza local.
+#
+# Pero sin volver a filtrar los datos por cada umbral: se ordenan una vez y
+# los excesos de cualquier umbral son la cola de ese arreglo, así que el MRL
+# sale de sumas acumuladas. La GPD se ajusta con la verosimilitud perfil en
+# theta = xi / sigma (Grimshaw, 1993), un problema de una dimensión que se
+# resuelve con Newton arrancando en la solución del umbral vecino. Las
+# ubicaciones se reparten en un pool de procesos.
+#
+# Diferencia con la referencia en R: allí gpd.fit(excesos, threshold = 0)
+# recibe los valores x > u sin restarles u, así que la GPD queda anclada en 0
+# y no en el umbral. Aquí la GPD (y la prueba de Anderson-Darling) se ajusta
+# a los excesos x - u, que es la forma usual de picos sobre umbral y la que
+# usan las colas de las marginales (F_exc). Por eso xi, sigma, el p-valor y,
+# en algunos casos, u_opt no coinciden con los de tve_colas.qmd.
+
+from __future__ import annotations
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Mapping, Optional
+
+import numpy as np
+import pandas as pd
+
+
+# ============================================================
+# Exceso medio
+# ============================================================
+
+
+def malla_umbrales(
+    xs: np.ndarray, u_min: float = 0.7, u_max: float = 0.99, puntos: int = 250
+) -> np.ndarray:
+    """Cuantiles (tipo 7, como quantile() de R) de los datos ordenados xs."""
+    return np.quantile(xs, np.linspace(u_min, u_max, puntos))
+
+
+def exceso_medio(xs: np.ndarray, umbrales: np.ndarray):
+    """
+    (MRL, número de excesos) para cada umbral con los datos ya ordenados xs.
+    Los excesos sobre u son xs[n - k:], con k = #{x > u}, y su suma sale de
+    la suma acumulada desde arriba.
+    """
+    n = xs.size
+    desde_arriba = np.r_[0.0, np.cumsum(xs[::-1])]  # suma de los k mayores
+    k = n - np.searchsorted(xs, umbrales, side="right")
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mrl = np.where(k > 0, (desde_arriba[k] - k * umbrales) / k, np.nan)
+    return mrl, k
+
+
+def varianza_local(v: np.ndarray, ancho: int = 2) -> np.ndarray:
+    """var(v[i - ancho : i + ancho + 1]) ignorando NaN (ddof = 1, como var() de R)."""
+    m = v.size
+    ok = np.isfinite(v)
+    z = np.where(ok, v, 0.0)
+    c0 = np.r_[0, np.cumsum(ok)]
+    c1 = np.r_[0.0, np.cumsum(z)]
+    c2 = np.r_[0.0, np.cumsum(z * z)]
+    i = np.arange(m)
+    lo, hi = np.maximum(i - ancho, 0), np.minimum(i + ancho + 1, m)
+    cnt = c0[hi] - c0[lo]
+    s1, s2 = c1[hi] - c1[lo], c2[hi] - c2[lo]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        var = (s2 - s1 * s1 / cnt) / (cnt - 1)
+    return np.where(cnt > 1, np.maximum(var, 0.0), np.nan)
+
+
+# ============================================================
+# GPD por máxima verosimilitud (perfil en theta)
+# ============================================================
+#
+# Con theta = xi / sigma, para theta fijo el MLE es xi = mean(log1p(theta y))
+# y la log-verosimilitud perfil es
+#     l(theta) = -n (log(xi / theta) + 1 + xi),    theta > -1 / max(y)
+# (theta -> 0 es la exponencial, sigma = mean(y)). Con xi < -1 la
+# verosimilitud no es acotada en el borde del soporte y no hay MLE (Smith,
+# 1985); en ese caso se devuelve el borde xi = -1, sigma = max(y) (uniforme).
+
+THETA_CERO = 1e-10
+
+
+def _perfil(theta: float, y: np.ndarray):
+    # l, l' y l'' (divididas entre n) del perfil en theta
+    if abs(theta) < THETA_CERO:
+        theta = THETA_CERO
+    w = 1.0 + theta * y
+    q = y / w
+    k = np.mean(np.log1p(theta * y))
+    k1 = np.mean(q)
+    k2 = -np.mean(q * q)
+    # k tiene el signo de theta, así que k / theta > 0 en todo el soporte
+    lv = -(np.log(k / theta) + 1.0 + k)
+    d1 = -(k1 / k - 1.0 / theta + k1)
+    d2 = -((k2 * k - k1 * k1) / (k * k) + 1.0 / (theta * theta) + k2)
+    return lv, d1, d2, k
+
+
+def ajustar_gpd(
+    y: np.ndarray,
+    theta0: Optional[float] = None,
+    max_iter: int = 50,
+    tol: float = 1e-10,
+):
+    """
+    MLE de la GPD para los excesos y > 0. Devuelve (xi, sigma, theta, loglik);
+    theta sirve para arrancar el ajuste del umbral vecino.
+    """
+    y = np.asarray(y, dtype=float)
+    n, ymax, media = y.size, float(y.max()), float(y.mean())
+    lim = -1.0 / ymax
+    if theta0 is None or not np.isfinite(theta0) or theta0 <= lim:
+        # Arranque de momentos: xi = (1 - media^2 / var) / 2
+        var = float(y.var()) if n > 1 else media * media
+        xi0 = 0.5 * (1.0 - media * media / max(var, 1e-12))
+        theta0 = xi0 / (0.5 * media * (media * media / max(var, 1e-12) + 1.0))
+        theta0 = max(theta0, 0.5 * lim)
+
+    theta = float(theta0)
+    lv, d1, d2, k = _perfil(theta, y)
+    for _ in range(max_iter):
+        paso = -d1 / d2 if d2 < 0 else np.sign(d1) * max(abs(theta), 0.1 / media)
+        # Retroceso: quedarse en el soporte y subir la verosimilitud
+        for _ in range(40):
+            nuevo = theta + paso
+            if nuevo > lim * (1.0 - 1e-9):
+                lv_n, d1_n, d2_n, k_n = _perfil(nuevo, y)
+                if lv_n >= lv - 1e-14:
+                    break
+            paso *= 0.5
+        else:
+            break
+        cambio = abs(nuevo - theta)
+        theta, lv, d1, d2, k = nuevo, lv_n, d1_n, d2_n, k_n
+        if cambio <= tol * max(1.0, abs(theta)):
+            break
+
+    # La exponencial (theta = 0) como caso límite
+    lv_exp = -(np.log(media) + 1.0)
+    if lv_exp > lv:
+        return 0.0, media, 0.0, n * lv_exp
+    xi = k
+    if xi < -1.0:
+        return -1.0, ymax, -1.0 / ymax, -n * np.log(ymax)
+    return float(xi), float(xi / theta), float(theta), float(n * lv)
+
+
+def cdf_gpd(y, xi: float, sigma: float) -> np.ndarray:
+    y = np.asarray(y, dtype=float)
+    if abs(xi) < 1e-12:
+        return -np.expm1(-y / sigma)
+    base = np.maximum(1.0 + xi * y / sigma, 0.0)
+    with np.errstate(divide="ignore"):
+        return np.where(base > 0, -np.expm1(-np.log(base) / xi), 1.0)
+
+
+# ============================================================
+# Anderson-Darling
+# ============================================================
+
+
+def _adinf(z: np.ndarray) -> np.ndarray:
+    # P(A^2 <= z) asintótica (Marsaglia y Marsaglia, 2004)
+    z = np.asarray(z, dtype=float)
+    out = np.empty_like(z)
+    bajo = z < 2.0
+    zb = np.maximum(z[bajo], 1e-12)
+    out[bajo] = (
+        np.exp(-1.2337141 / zb)
+        / np.sqrt(zb)
+        * (
+            2.00012
+            + (
+                0.247105
+                - (0.0649821 - (0.0347962 - (0.011672 - 0.00168691 * zb) * zb) * zb)
+                * zb
+            )
+            * zb
+        )
+    )
+    za = z[~bajo]
+    out[~bajo] = np.exp(
+        -np.exp(
+            1.0776
+            - (
+                2.30695
+                - (0.43424 - (0.082433 - (0.008056 - 0.0003146 * za) * za) * za) * za
+            )
+            * za
+        )
+    )
+    return np.clip(out, 0.0, 1.0)
+
+
+def anderson_darling(F_ordenada: np.ndarray):
+    """(A^2, p-valor) para los valores de la CDF en los datos ordenados."""
+    F = np.clip(np.asarray(F_ordenada, dtype=float), 1e-15, 1.0 - 1e-15)
+    n = F.size
+    i = np.arange(1, n + 1)
+    A2 = -n - np.mean((2 * i - 1) * (np.log(F) + np.log1p(-F[::-1])))
+    return float(A2), float(1.0 - _adinf(np.array([A2]))[0])
+
+
+# ============================================================
+# Selección por ubicación
+# ============================================================
+
+
+def umbrales_estables(
+    mrl: np.ndarray, var_loc: np.ndarray, p_ad: np.ndarray
+) -> np.ndarray:
+    """
+    Índices con varianza local <= 1.5 veces la mínima y p-valor >= 0.05. Se
+    agrega una tolerancia de redondeo: con empates en los datos hay tramos
+    de MRL constante, la mínima es 0 y sin tolerancia la regla dependería de
+    errores del orden de 1e-16.
+    """
+    tol = 1e-10 * np.nanmax(mrl) ** 2
+    with np.errstate(invalid="ignore"):
+        return np.flatnonzero(
+            (var_loc <= 1.5 * np.nanmin(var_loc) + tol) & (p_ad >= 0.05)
+        )
+
+
+def seleccionar_umbral(
+    datos,
+    u_min: float = 0.7,
+    u_max: float = 0.99,
+    puntos: int = 250,
+    min_excesos: int = 50,
+    detalle: bool = False,
+) -> Dict:
+    """
+    u_opt y p_u = #{x > u_opt} / n para una serie. Con detalle=True se
+    agrega la tabla por umbral (u, k, mrl, var_local, xi, sigma, ad, p_ad).
+    """
+    xs = np.sort(np.asarray(datos, dtype=float)[np.isfinite(datos)])
+    n = xs.size
+    u = malla_umbrales(xs, u_min, u_max, puntos)
+    mrl, k = exceso_medio(xs, u)
+    var_loc = varianza_local(mrl)
+
+    xi = np.full(u.size, np.nan)
+    sg = np.full(u.size, np.nan)
+    A2 = np.full(u.size, np.nan)
+    p_ad = np.full(u.size, np.nan)
+    theta = None
+    # De arriba hacia abajo: el umbral vecino deja el arranque de Newton
+    for j in np.flatnonzero(k >= max(min_excesos, 2))[::-1]:
+        if (
+            j + 1 < u.size
+            and k[j] == k[j + 1]
+            and np.isfinite(xi[j + 1])
+            and u[j] == u[j + 1]
+        ):
+            xi[j], sg[j], A2[j], p_ad[j] = xi[j + 1], sg[j + 1], A2[j + 1], p_ad[j + 1]
+            continue
+        y = xs[n - k[j] :] - u[j]
+        y = y[y > 0]
+        if y.size < 2:
+            continue
+        xi[j], sg[j], theta, _ = ajustar_gpd(y, theta)
+        A2[j], p_ad[j] = anderson_darling(cdf_gpd(y, xi[j], sg[j]))
+
+    estables = umbrales_estables(mrl, var_loc, p_ad)
+    if estables.size:
+        j = estables[np.argmax(p_ad[estables])]
+        regla = "estable_ad"
+    else:
+        j = int(np.nanargmin(var_loc))
+        regla = "min_var_local"
+
+    res = {
+        "u_opt": float(u[j]),
+        "p_u": float(np.mean(xs > u[j])),
+        "n": int(n),
+        "n_excesos": int(np.sum(xs > u[j])),
+        "xi": float(xi[j]),
+        "sigma": float(sg[j]),
+        "p_ad": float(p_ad[j]),
+        "regla": regla,
+    }
+    if detalle:
+        res["tabla"] = pd.DataFrame(
+            {
+                "u": u,
+                "k": k,
+                "mrl": mrl,
+                "var_local": var_loc,
+                "xi": xi,
+                "sigma": sg,
+                "ad": A2,
+                "p_ad": p_ad,
+            }
+        )
+    return res
+
+
+def _seleccionar_lote(items, opciones):
+    # Se ejecuta en los procesos hijos
+    return [(clave, seleccionar_umbral(datos, **opciones)) for clave, datos in items]
+
+
+def seleccionar_umbrales(
+    series: Mapping, n_workers: Optional[int] = None, min_datos: int = 10, **opciones
+) -> pd.DataFrame:
+    """
+    seleccionar_umbral para muchas series {clave: datos} en paralelo. La
+    clave puede ser una tupla (p. ej. (dimension, location)). Devuelve una
+    fila por serie con al menos min_datos datos.
+    """
+    n_workers = n_workers or os.cpu_count() or 1
+    items = [
+        (c, np.asarray(v, dtype=float))
+        for c, v in series.items()
+        if np.isfinite(np.asarray(v, dtype=float)).sum() >= min_datos
+    ]
+    if n_workers > 1 and len(items) > 1:
+        trozos = [
+            t
+            for t in np.array_split(
+                np.arange(len(items)), min(len(items), 4 * n_workers)
+            )
+            if t.size
+        ]
+        with ProcessPoolExecutor(max_workers=n_workers) as ex:
+            partes = ex.map(
+                _seleccionar_lote,
+                [[items[i] for i in t] for t in trozos],
+                [opciones] * len(trozos),
+            )
+            resultados = [r for p in partes for r in p]
+    else:
+        resultados = _seleccionar_lote(items, opciones)
+
+    filas = []
+    for clave, res in resultados:
+        clave = clave if isinstance(clave, tuple) else (clave,)
+        filas.append({**{f"clave{i}": c for i, c in enumerate(clave)}, **res})
+    return pd.DataFrame(filas)
@@ -0,0 +1,984 @@
+# Pipeline por etapas con dependencias y memoización por contenido
+#
+# Los pasos de src/scripts (2_modelo.py y 3_analisis_copulas.py), el almacén
+# de marginales y las figuras de res/figures se declaran aquí como etapas con
+# sus entradas y salidas (archivos o patrones glob relativos a la raíz):
+#
+#   Etapa("pool", _correr_main, entradas=(datos.npz, colas...),
+#         salidas=("res/copulas/pool_*.csv",), modulos=(...))
+#
+# Una etapa depende de las que producen alguna de sus entradas. Su clave es
+# el sha1 de:
+#   - el contenido de cada archivo de entrada (incluido el script que corre),
+#   - las filas de los datos limpios que usa (`filtro`; p. ej. provincia =
+#     Alajuela y sector = SOCIAL para esa pareja),
+#   - los parámetros y
+#   - el código: las fuentes de `modulos` y de todo lo que importan de src/.
+# Si la clave coincide con la de la última corrida (res/pipeline/estado.json)
+# y las salidas no se tocaron, la etapa se salta. La clave usa contenido y no
+# fechas: una etapa que se vuelve a correr y produce los mismos archivos no
+# invalida a las siguientes.
+#
+# Cada pareja de cópulas y cada figura de cola / cuerpo es una etapa aparte.
+# Si cambia la cola ajustada de Alajuela (res/provincias/Alajuela_tail_*.csv)
+# solo se recalculan las parejas con Alajuela y sus figuras, más lo que usa
+# todas las marginales (almacén, MCMC, pool, predictiva y el manifiesto de la
+# galería). Un año nuevo en los datos cambia las filas de las parejas y
+# ubicaciones con eventos ese año y todo lo que usa los datos completos.
+#
+# La etapa "kde" es opcional: reescribe los cuerpos KDE versionados de
+# res/kde, así que solo corre si se pide por nombre (--etapas kde) y las que
+# leen esos archivos no la arrastran. Corre con el ancho guardado en cada CSV.
+#
+# Las etapas listas se reparten en un ProcessPoolExecutor (--workers) y cada
+# script corre con --workers 1 dentro de su etapa. El grafo se arma después
+# de cargar los datos, así que data/clean/datos.npz ya está al día con el
+# libro crudo (cargar_datos reingiere si cambió). 0_descriptivo.py y
+# 1_inferencia.py todavía no calculan nada y no tienen etapas.
+#
+#   python src/pipeline.py estado
+#   python src/pipeline.py correr --workers 4
+#   python src/pipeline.py correr --etapas "par:*Alajuela*" "figura:*:Alajuela"
+#   python src/pipeline.py correr --etapas pool --forzar pool
+#   python src/pipeline.py correr --etapas kde
+
+from __future__ import annotations
+
+import argparse
+import ast
+import fnmatch
+import hashlib
+import importlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import dataclass, field
+from functools import lru_cache
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+if __name__ == "__main__":
+    sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from src import traza
+from src.config import RAIZ, RUTA_ALMACEN_MARGINALES, RUTA_DATOS, RUTA_PIPELINE
+from src.data.limpieza_datos import cargar_datos, sha1_archivo
+
+# Subir cuando cambie la forma de correr alguna etapa (las funciones de este
+# archivo no entran en la clave de código)
+VERSION = 1
+
+RUTA_ESTADO = RUTA_PIPELINE / "estado.json"
+SEMILLA = 123
+
+# Carpeta de marginales -> columna de los datos (como COLUMNAS de la galería)
+COLUMNA_CARPETA = {
+    "provincias": "provincia",
+    "categorias": "categoria",
+    "sectores": "sector",
+    "cantones": "canton",
+}
+CARPETA_COLUMNA = {
+    "provincia": "provincias",
+    "categoria": "categorias",
+    "sector": "sectores",
+}
+# Figuras por ubicación: clase de galeria.CLASES -> componente de la marginal
+COMPONENTE_FIGURA = {"cola": "tail", "cuerpo": "body"}
+
+
+@dataclass
+class Etapa:
+    """
+    Una etapa del grafo: funcion(**parametros) lee `entradas` y escribe
+    `salidas`. `filtro` ({columna: valor}) son las filas de los datos limpios
+    que entran en la clave; `despues` ordena sin agregar dependencia de
+    contenido (las etapas que leen el almacén de marginales esperan a que se
+    compile, pero no se invalidan cuando cambia una marginal ajena).
+    Una etapa `opcional` solo se elige si un patrón la nombra directamente.
+    """
+
+    nombre: str
+    funcion: Callable[..., None]
+    entradas: Tuple[str, ...] = ()
+    salidas: Tuple[str, ...] = ()
+    parametros: Dict = field(default_factory=dict)
+    modulos: Tuple[str, ...] = ()
+    filtro: Optional[Dict[str, str]] = None
+    despues: Tuple[str, ...] = ()
+    opcional: bool = False
+
+
+def _rel(ruta: Path | str) -> str:
+    return Path(ruta).resolve().relative_to(RAIZ).as_posix()
+
+
+def _es_patron(ruta: str) -> bool:
+    return any(c in ruta for c in "*?[")
+
+
+def _coincide(a: str, b: str) -> bool:
+    return a == b or fnmatch.fnmatchcase(a, b) or fnmatch.fnmatchcase(b, a)
+
+
+def _sha1(obj) -> str:
+    texto = json.dumps(obj, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(texto.encode("utf-8")).hexdigest()
+
+
+# ============================================================
+# Funciones de las etapas (se ejecutan en los procesos hijos)
+# ============================================================
+
+
+@lru_cache(maxsize=1)
+def _datos() -> pd.DataFrame:
+    # El proceso padre ya reingirió el libro si hacía falta
+    return cargar_datos(ruta=RUTA_DATOS, origen=None)
+
+
+def _correr_main(modulo: str, argv: List[str]) -> None:
+    """main(argv) de un script o módulo con interfaz de línea de comandos."""
+    importlib.import_module(modulo).main(argv)
+
+
+def _compilar_almacen() -> None:
+    from src.modelos.almacen import AlmacenMarginales
+
+    AlmacenMarginales().construir()
+
+
+def _correr_par(tarea: Dict, salida: str) -> None:
+    from src.modelos.pares import ejecutar_pares
+
+    # Mismo plan y semilla hija que "3_analisis_copulas.py pares"; las
+    # carpetas van relativas a la raíz en los parámetros (parte de la clave)
+    tarea = {
+        **tarea,
+        "carpeta1": str(RAIZ / tarea["carpeta1"]),
+        "carpeta2": str(RAIZ / tarea["carpeta2"]),
+    }
+    tabla = ejecutar_pares([tarea], df=_datos(), semilla=SEMILLA)
+    resultado = json.loads(tabla.to_json(orient="records"))[0] if len(tabla) else None
+    ruta = RAIZ / salida
+    ruta.parent.mkdir(parents=True, exist_ok=True)
+    ruta.write_text(
+        json.dumps({"resultado": resultado}, ensure_ascii=False) + "\n",
+        encoding="utf-8",
+    )
+
+
+def _unir_pares(archivos: List[str], salida: str) -> None:
+    filas = [
+        json.loads((RAIZ / a).read_text(encoding="utf-8"))["resultado"]
+        for a in archivos
+    ]
+    filas = [r for r in filas if r is not None]
+    tabla = pd.DataFrame(filas)
+    if len(tabla):
+        tabla = tabla.sort_values("par_id").reset_index(drop=True)
+    tabla.to_csv(RAIZ / salida, index=False)
+    print(f"{len(tabla)} parejas guardadas en {salida}")
+
+
+def _dibujar(clase: str, dimension: str, nombre: str, salida: str) -> None:
+    from src.dashboard.galeria import dibujar_figura
+
+    dibujar_figura(
+        {"clase": clase, "dimension": dimension, "nombre": nombre}, RAIZ / salida
+    )
+
+
+# ============================================================
+# Grafo
+# ============================================================
+
+
+def construir_grafo(df: pd.DataFrame, almacen=None) -> List[Etapa]:
+    """Todas las etapas de los scripts 2 y 3, las parejas y las figuras."""
+    from src.modelos.pares import planificar_pares
+
+    if almacen is None:
+        from src.modelos.almacen import obtener_almacen
+
+        almacen = obtener_almacen()
+
+    datos = _rel(RUTA_DATOS)
+    modelo = "src.scripts.2_modelo"
+    copulas = "src.scripts.3_analisis_copulas"
+    script2 = "src/scripts/2_modelo.py"
+    script3 = "src/scripts/3_analisis_copulas.py"
+    umbrales = "res/umbrales.csv"
+    posterior = "res/mcmc/posterior.npz"
+    kde = "res/kde/*_body_KDE-*.csv"
+    ajustes_r = tuple(
+        f"res/copulas/{n}"
+        for n in (
+            "provincia_sector.csv",
+            "provincia_categoria.csv",
+            "sector_categoria.csv",
+        )
+    )
+    colas = tuple(f"res/{c}/*_tail_*.csv" for c in CARPETA_COLUMNA.values())
+    marginales = tuple(f"res/{c}/*.csv" for c in (*COLUMNA_CARPETA, "kde"))
+    almacen_npz = _rel(RUTA_ALMACEN_MARGINALES)
+
+    etapas = [
+        Etapa(
+            "umbral",
+            _correr_main,
+            entradas=(datos, script2),
+            salidas=(umbrales,),
+            parametros={
+                "modulo": modelo,
+                "argv": [
+                    "umbral",
+                    "--datos",
+                    datos,
+                    "--salida",
+                    umbrales,
+                    "--workers",
+                    "1",
+                ],
+            },
+            modulos=("src.modelos.umbral",),
+        ),
+        Etapa(
+            "kde",
+            _correr_main,
+            entradas=(datos, script2, kde),
+            salidas=(kde,),
+            parametros={
+                "modulo": modelo,
+                "argv": [
+                    "kde",
+                    "--datos",
+                    datos,
+                    "--entrada",
+                    "res/kde",
+                    "--salida",
+                    "res/kde",
+                    "--ancho",
+                    "guardado",
+                ],
+            },
+            modulos=("src.modelos.kde",),
+            opcional=True,
+        ),
+        Etapa(
+            "almacen",
+            _compilar_almacen,
+            entradas=marginales,
+            salidas=(almacen_npz,),
+            modulos=("src.modelos.almacen",),
+        ),
+        Etapa(
+            "mcmc",
+            _correr_main,
+            entradas=(datos, script2, umbrales, *colas),
+            salidas=(posterior, "res/mcmc/resumen.csv"),
+            parametros={
+                "modulo": modelo,
+                "argv": [
+                    "mcmc",
+                    "--datos",
+                    datos,
+                    "--salida",
+                    posterior,
+                    "--umbrales",
+                    umbrales,
+                    "--workers",
+                    "1",
+                ],
+            },
+            modulos=("src.modelos.mcmc", "src.modelos.almacen"),
+            despues=("almacen",),
+        ),
+        Etapa(
+            "bondad",
+            _correr_main,
+            entradas=(datos, script3, *ajustes_r),
+            salidas=("res/copulas/bondad_ajuste.csv",),
+            parametros={
+                "modulo": copulas,
+                "argv": [
+                    "bondad",
+                    "--datos",
+                    datos,
+                    "--copulas",
+                    "res/copulas",
+                    "--salida",
+                    "res/copulas/bondad_ajuste.csv",
+                    "--workers",
+                    "1",
+                ],
+            },
+            modulos=("src.modelos.bondad_copula", "src.modelos.pares"),
+        ),
+        Etapa(
+            "seleccion",
+            _correr_main,
+            entradas=(datos, script3, *ajustes_r),
+            salidas=("res/copulas/seleccion_mv.csv",),
+            parametros={
+                "modulo": copulas,
+                "argv": [
+                    "seleccion",
+                    "--datos",
+                    datos,
+                    "--copulas",
+                    "res/copulas",
+                    "--salida",
+                    "res/copulas/seleccion_mv.csv",
+                ],
+            },
+            modulos=("src.modelos.ajuste_copula", "src.modelos.pares"),
+        ),
+        Etapa(
+            "pool",
+            _correr_main,
+            entradas=(datos, script3, *colas),
+            salidas=("res/copulas/pool_*.csv",),
+            parametros={
+                "modulo": copulas,
+                "argv": ["pool", "--datos", datos, "--salida", "res/copulas"],
+            },
+            modulos=(
+                "src.modelos.simulacion_conjunta",
+                "src.modelos.almacen_simulaciones",
+            ),
+            despues=("almacen",),
+        ),
+        Etapa(
+            "predictiva",
+            _correr_main,
+            entradas=(
+                datos,
+                script3,
+                "res/copulas/seleccion_mv.csv",
+                posterior,
+                *colas,
+            ),
+            salidas=("res/copulas/predictiva_*.csv",),
+            parametros={
+                "modulo": copulas,
+                "argv": [
+                    "predictiva",
+                    "--datos",
+                    datos,
+                    "--seleccion",
+                    "res/copulas/seleccion_mv.csv",
+                    "--posterior",
+                    posterior,
+                    "--salida",
+                    "res/copulas",
+                ],
+            },
+            modulos=("src.modelos.predictiva",),
+            despues=("almacen",),
+        ),
+        Etapa(
+            "colas",
+            _correr_main,
+            entradas=(datos, script3),
+            salidas=("res/copulas/lambda_empirica_*.csv",),
+            parametros={
+                "modulo": copulas,
+                "argv": [
+                    "colas",
+                    "--datos",
+                    datos,
+                    "--salida",
+                    "res/copulas",
+                    "--workers",
+                    "1",
+                ],
+            },
+            modulos=("src.modelos.dependencia",),
+        ),
+        Etapa(
+            "backtest",
+            _correr_main,
+            entradas=(datos, script3),
+            salidas=("res/copulas/backtest_*.csv",),
+            parametros={
+                "modulo": copulas,
+                "argv": ["backtest", "--datos", datos, "--salida", "res/copulas"],
+            },
+            modulos=("src.modelos.backtest",),
+        ),
+    ]
+
+    # Una etapa por pareja: sus filas de los datos y las colas de sus dos valores
+    valores = {c: sorted(df[c].dropna().astype(str).unique()) for c in CARPETA_COLUMNA}
+    tareas = planificar_pares(
+        valores["provincia"], valores["categoria"], valores["sector"], semilla=SEMILLA
+    )
+    archivos_par = []
+    for tarea in tareas:
+        tarea = {
+            **tarea,
+            "carpeta1": _rel(tarea["carpeta1"]),
+            "carpeta2": _rel(tarea["carpeta2"]),
+        }
+        salida = _rel(
+            RUTA_PIPELINE
+            / "pares"
+            / tarea["tipo_par"]
+            / f"{tarea['val1']}__{tarea['val2']}.json"
+        )
+        archivos_par.append(salida)
+        etapas.append(
+            Etapa(
+                f"par:{tarea['tipo_par']}:{tarea['val1']}:{tarea['val2']}",
+                _correr_par,
+                entradas=(
+                    f"{tarea['carpeta1']}/{tarea['val1']}_tail_*.csv",
+                    f"{tarea['carpeta2']}/{tarea['val2']}_tail_*.csv",
+                ),
+                salidas=(salida,),
+                parametros={"tarea": tarea, "salida": salida},
+                modulos=("src.modelos.pares",),
+                filtro={tarea["col1"]: tarea["val1"], tarea["col2"]: tarea["val2"]},
+                despues=("almacen",),
+            )
+        )
+    salida_pares = "res/copulas/dependencias_pares.csv"
+    etapas.append(
+        Etapa(
+            "pares",
+            _unir_pares,
+            entradas=tuple(archivos_par),
+            salidas=(salida_pares,),
+            parametros={"archivos": archivos_par, "salida": salida_pares},
+        )
+    )
+
+    # Figuras de cola y cuerpo de cada ubicación con esa marginal ajustada
+    tabla = almacen.tabla()
+    tabla = tabla[tabla["dimension"].isin(list(COLUMNA_CARPETA))]
+    figuras = []
+    for (dimension, nombre), grupo in tabla.groupby(["dimension", "nombre"], sort=True):
+        for clase, componente in COMPONENTE_FIGURA.items():
+            if not (grupo["componente"] == componente).any():
+                continue
+            prefijo = "cola_" if clase == "cola" else "cuerpo_"
+            salida = f"res/figures/{prefijo}{nombre}.png"
+            figuras.append(salida)
+            etapas.append(
+                Etapa(
+                    f"figura:{clase}:{nombre}",
+                    _dibujar,
+                    entradas=(f"res/{dimension}/{nombre}_{componente}_*.csv",),
+                    salidas=(salida,),
+                    parametros={
+                        "clase": clase,
+                        "dimension": str(dimension),
+                        "nombre": str(nombre),
+                        "salida": salida,
+                    },
+                    modulos=("src.dashboard.galeria",),
+                    filtro={COLUMNA_CARPETA[dimension]: str(nombre)},
+                    despues=("almacen",),
+                )
+            )
+    etapas.append(
+        Etapa(
+            "manifiesto",
+            _correr_main,
+            entradas=("res/figures/*.png", *marginales),
+            salidas=("res/figures/manifiesto.json",),
+            parametros={
+                "modulo": "src.dashboard.galeria",
+                "argv": [
+                    "--figuras",
+                    "res/figures",
+                    "--salida",
+                    "res/figures/manifiesto.json",
+                ],
+            },
+            modulos=("src.dashboard.galeria",),
+            despues=("almacen",),
+        )
+    )
+    return etapas
+
+
+def dependencias(
+    etapas: Sequence[Etapa], incluir_despues: bool = True
+) -> Dict[str, List[str]]:
+    """Etapa -> etapas que deben terminar antes (por archivos y por `despues`)."""
+    nombres = {e.nombre for e in etapas}
+    deps = {}
+    for e in etapas:
+        previas = {
+            p.nombre
+            for p in etapas
+            if p is not e
+            and any(_coincide(a, b) for a in e.entradas for b in p.salidas)
+        }
+        if incluir_despues:
+            previas.update(d for d in e.despues if d in nombres)
+        deps[e.nombre] = sorted(previas)
+    return deps
+
+
+def orden_topologico(etapas: Sequence[Etapa], deps: Dict[str, List[str]]) -> List[str]:
+    faltan = {n: len(d) for n, d in deps.items()}
+    siguientes: Dict[str, List[str]] = {n: [] for n in deps}
+    for n, d in deps.items():
+        for p in d:
+            siguientes[p].append(n)
+    listas = [e.nombre for e in etapas if faltan[e.nombre] == 0]
+    orden = []
+    while listas:
+        n = listas.pop(0)
+        orden.append(n)
+        for s in siguientes[n]:
+            faltan[s] -= 1
+            if faltan[s] == 0:
+                listas.append(s)
+    if len(orden) != len(deps):
+        ciclo = sorted(n for n, k in faltan.items() if k > 0)
+        raise ValueError(f"El grafo de etapas tiene un ciclo entre {ciclo}")
+    return orden
+
+
+def seleccionar(
+    etapas: Sequence[Etapa],
+    deps: Dict[str, List[str]],
+    patrones: Optional[Sequence[str]],
+) -> set:
+    """
+    Etapas que calzan con los patrones y todas las anteriores a ellas, salvo
+    las opcionales que no calzan (sin patrones: todas las no opcionales).
+    """
+    opcionales = {e.nombre for e in etapas if e.opcional}
+    if not patrones:
+        return {e.nombre for e in etapas} - opcionales
+    pendientes = [
+        e.nombre
+        for e in etapas
+        if any(fnmatch.fnmatchcase(e.nombre, p) for p in patrones)
+    ]
+    if not pendientes:
+        raise ValueError(f"Ninguna etapa calza con {list(patrones)}")
+    pedidas = set(pendientes)
+    elegidas = set()
+    while pendientes:
+        n = pendientes.pop()
+        if n not in elegidas and (n in pedidas or n not in opcionales):
+            elegidas.add(n)
+            pendientes.extend(deps[n])
+    return elegidas
+
+
+# ============================================================
+# Claves de contenido
+# ============================================================
+
+
+@lru_cache(maxsize=None)
+def _fuentes(modulo: str) -> Tuple[str, ...]:
+    """Archivos de `modulo` y de todo lo que importa de src/ (por el AST)."""
+    vistos, pendientes = set(), [modulo]
+    while pendientes:
+        m = pendientes.pop()
+        ruta = RAIZ / (m.replace(".", "/") + ".py")
+        if m in vistos or not ruta.exists():
+            continue
+        vistos.add(m)
+        for nodo in ast.walk(ast.parse(ruta.read_text(encoding="utf-8"))):
+            if (
+                isinstance(nodo, ast.ImportFrom)
+                and nodo.level == 0
+                and nodo.module
+                and nodo.module.split(".")[0] == "src"
+            ):
+                # "from src import traza" importa el módulo src.traza
+                pendientes.append(nodo.module)
+                pendientes.extend(f"{nodo.module}.{a.name}" for a in nodo.names)
+            elif isinstance(nodo, ast.Import):
+                pendientes.extend(
+                    a.name for a in nodo.names if a.name.split(".")[0] == "src"
+                )
+    return tuple(sorted(m.replace(".", "/") + ".py" for m in vistos))
+
+
+class EstadoPipeline:
+    """
+    res/pipeline/estado.json: la última corrida exitosa de cada etapa (clave,
+    hashes de entradas y salidas, duración) y la firma (tamaño, mtime, sha1)
+    de cada archivo leído, para no volver a leer los que no cambiaron.
+    """
+
+    def __init__(self, ruta: Path | str = RUTA_ESTADO):
+        self.ruta = Path(ruta)
+        self.etapas: Dict[str, Dict] = {}
+        self.archivos: Dict[str, List] = {}
+        if self.ruta.exists():
+            try:
+                estado = json.loads(self.ruta.read_text(encoding="utf-8"))
+            except json.JSONDecodeError:
+                estado = {}
+            if estado.get("version") == VERSION:
+                self.etapas = estado.get("etapas", {})
+                self.archivos = estado.get("archivos", {})
+
+    def guardar(self) -> None:
+        self.ruta.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.ruta.with_name(self.ruta.name + ".tmp")
+        tmp.write_text(
+            json.dumps(
+                {"version": VERSION, "etapas": self.etapas, "archivos": self.archivos},
+                ensure_ascii=False,
+                indent=1,
+            )
+            + "\n",
+            encoding="utf-8",
+        )
+        os.replace(tmp, self.ruta)
+
+    def hash_archivo(self, rel: str) -> Optional[str]:
+        try:
+            st = (RAIZ / rel).stat()
+        except FileNotFoundError:
+            return None
+        firma = [st.st_size, st.st_mtime_ns]
+        previo = self.archivos.get(rel)
+        if previo is not None and previo[:2] == firma:
+            return previo[2]
+        h = sha1_archivo(RAIZ / rel)
+        self.archivos[rel] = firma + [h]
+        return h
+
+    def hashes(self, patrones: Sequence[str]) -> Dict[str, Optional[str]]:
+        """Hash de cada archivo de los patrones (None si un archivo fijo no existe)."""
+        out = {}
+        for p in patrones:
+            rutas = sorted(_rel(r) for r in RAIZ.glob(p)) if _es_patron(p) else [p]
+            for r in rutas:
+                out[r] = self.hash_archivo(r)
+        return out
+
+
+class _Filas:
+    """Hash de las filas de los datos limpios que usa cada etapa."""
+
+    def __init__(self, df: pd.DataFrame):
+        self.df = df
+        self._columnas: Dict[str, np.ndarray] = {}
+
+    def hash(self, filtro: Dict[str, str]) -> str:
+        mascara = np.ones(len(self.df), dtype=bool)
+        for col, val in sorted(filtro.items()):
+            if col not in self._columnas:
+                self._columnas[col] = self.df[col].astype(str).to_numpy()
+            mascara &= self._columnas[col] == str(val)
+        filas = pd.util.hash_pandas_object(self.df.loc[mascara], index=False).to_numpy()
+        return hashlib.sha1(filas.tobytes()).hexdigest()
+
+
+def firma(etapa: Etapa, estado: EstadoPipeline, filas: _Filas) -> Dict:
+    """Clave de la etapa y sus componentes (para explicar por qué se corre)."""
+    codigo = {f: estado.hash_archivo(f) for m in etapa.modulos for f in _fuentes(m)}
+    partes = {
+        "entradas": estado.hashes(etapa.entradas),
+        "datos": None if etapa.filtro is None else filas.hash(etapa.filtro),
+        "parametros": _sha1(etapa.parametros),
+        "codigo": _sha1(codigo),
+    }
+    partes["clave"] = _sha1(
+        {"version": VERSION, "funcion": etapa.funcion.__name__, **partes}
+    )
+    return partes
+
+
+def motivo(
+    etapa: Etapa, actual: Dict, previo: Optional[Dict], estado: EstadoPipeline
+) -> Optional[str]:
+    """None si la etapa está al día; si no, la razón para correrla."""
+    if previo is None:
+        return "sin corridas previas"
+    if previo["clave"] != actual["clave"]:
+        for parte, texto in (
+            ("codigo", "código"),
+            ("parametros", "parámetros"),
+            ("datos", "datos"),
+        ):
+            if previo[parte] != actual[parte]:
+                return texto
+        cambios = sorted(
+            r
+            for r in set(previo["entradas"]) | set(actual["entradas"])
+            if previo["entradas"].get(r) != actual["entradas"].get(r)
+        )
+        extra = f" y {len(cambios) - 2} más" if len(cambios) > 2 else ""
+        return "entradas: " + ", ".join(cambios[:2]) + extra
+    salidas = estado.hashes(etapa.salidas)
+    if not salidas or any(h is None for h in salidas.values()):
+        return "faltan salidas"
+    if salidas != previo["salidas"]:
+        return "salidas modificadas"
+    return None
+
+
+# ============================================================
+# Ejecución
+# ============================================================
+
+
+def _ejecutar(etapa: Etapa) -> float:
+    # En el proceso hijo (o en el padre con workers = 1)
+    t0 = time.perf_counter()
+    with traza.tramo("pipeline.etapa", etapa=etapa.nombre):
+        etapa.funcion(**etapa.parametros)
+    return time.perf_counter() - t0
+
+
+def _registrar(
+    etapa: Etapa, actual: Dict, duracion: float, estado: EstadoPipeline, filas: _Filas
+) -> None:
+    salidas = estado.hashes(etapa.salidas)
+    faltan = [
+        s
+        for s in etapa.salidas
+        if not any(_coincide(r, s) for r, h in salidas.items() if h is not None)
+    ]
+    if faltan:
+        raise FileNotFoundError(f"La etapa {etapa.nombre} no produjo {faltan}")
+    if any(_coincide(a, b) for a in etapa.entradas for b in etapa.salidas):
+        # Etapa que reescribe sus entradas (kde): la clave es la de después
+        actual = firma(etapa, estado, filas)
+    estado.etapas[etapa.nombre] = {
+        **actual,
+        "salidas": salidas,
+        "duracion_s": round(duracion, 3),
+        "fecha": time.strftime("%Y-%m-%d %H:%M:%S"),
+    }
+    estado.guardar()
+
+
+def correr(
+    etapas: Sequence[Etapa],
+    df: pd.DataFrame,
+    patrones: Optional[Sequence[str]] = None,
+    forzar: Sequence[str] = (),
+    n_workers: int = 1,
+    estado: Optional[EstadoPipeline] = None,
+    verbose: bool = False,
+) -> pd.DataFrame:
+    """
+    Corre las etapas elegidas (y las anteriores a ellas) que no estén al día.
+    Una etapa se evalúa cuando terminaron todas sus dependencias, así que su
+    clave ya ve las salidas nuevas. Si una etapa falla, las que dependen de
+    ella se omiten y el resto sigue. Devuelve una fila por etapa: resultado
+    ("al día", "corrida", "error" u "omitida"), motivo y duración.
+    """
+    estado = estado or EstadoPipeline()
+    filas = _Filas(df)
+    por_nombre = {e.nombre: e for e in etapas}
+    deps = dependencias(etapas)
+    orden = orden_topologico(etapas, deps)
+    elegidas = seleccionar(etapas, deps, patrones)
+    pendientes = [n for n in orden if n in elegidas]
+    resultado: Dict[str, Dict] = {}
+    en_curso: Dict = {}
+
+    def _terminar(
+        nombre: str, res: str, razon: Optional[str], dur: float = 0.0
+    ) -> None:
+        resultado[nombre] = {
+            "etapa": nombre,
+            "resultado": res,
+            "motivo": razon,
+            "duracion_s": dur,
+        }
+        if verbose and res != "al día":
+            print(
+                f"[{len(resultado)}/{len(elegidas)}] {nombre}: {res}"
+                + (f" ({razon})" if razon else "")
+                + (f" {dur:.1f} s" if dur else "")
+            )
+
+    def _lanzar(ex) -> None:
+        for nombre in list(pendientes):
+            previas = [
+                resultado.get(d, {}).get("resultado")
+                for d in deps[nombre]
+                if d in elegidas
+            ]
+            if any(r is None for r in previas):
+                continue
+            pendientes.remove(nombre)
+            if any(r in ("error", "omitida") for r in previas):
+                _terminar(nombre, "omitida", "falló una etapa anterior")
+                continue
+            etapa = por_nombre[nombre]
+            actual = firma(etapa, estado, filas)
+            razon = motivo(etapa, actual, estado.etapas.get(nombre), estado)
+            if any(fnmatch.fnmatchcase(nombre, p) for p in forzar):
+                razon = "forzada"
+            if razon is None:
+                _terminar(nombre, "al día", None)
+            elif ex is None:
+                try:
+                    dur = _ejecutar(etapa)
+                    _registrar(etapa, actual, dur, estado, filas)
+                    _terminar(nombre, "corrida", razon, dur)
+                except (Exception, SystemExit) as err:
+                    _terminar(nombre, "error", f"{razon}; {type(err).__name__}: {err}")
+            else:
+                en_curso[ex.submit(_ejecutar, etapa)] = (etapa, actual, razon)
+
+    if n_workers <= 1:
+        while pendientes:
+            _lanzar(None)
+    else:
+        with ProcessPoolExecutor(max_workers=n_workers) as ex:
+            _lanzar(ex)
+            while en_curso:
+                hechos, _ = wait(list(en_curso), return_when=FIRST_COMPLETED)
+                for fut in hechos:
+                    etapa, actual, razon = en_curso.pop(fut)
+                    try:
+                        dur = fut.result()
+                        _registrar(etapa, actual, dur, estado, filas)
+                        _terminar(etapa.nombre, "corrida", razon, dur)
+                    except (Exception, SystemExit) as err:
+                        _terminar(
+                            etapa.nombre,
+                            "error",
+                            f"{razon}; {type(err).__name__}: {err}",
+                        )
+                _lanzar(ex)
+
+    return pd.DataFrame([resultado[n] for n in orden if n in resultado])
+
+
+def revisar(
+    etapas: Sequence[Etapa],
+    df: pd.DataFrame,
+    patrones: Optional[Sequence[str]] = None,
+    estado: Optional[EstadoPipeline] = None,
+) -> pd.DataFrame:
+    """
+    Qué correría `correr` sin correr nada: "al día", "pendiente" (con el
+    motivo) o "aguas arriba" (al día con las entradas actuales, pero depende
+    de una etapa pendiente que podría cambiarlas).
+    """
+    estado = estado or EstadoPipeline()
+    filas = _Filas(df)
+    deps = dependencias(etapas)
+    contenido = dependencias(etapas, incluir_despues=False)
+    elegidas = seleccionar(etapas, deps, patrones)
+    por_nombre = {e.nombre: e for e in etapas}
+    situacion: Dict[str, str] = {}
+    registros = []
+    for nombre in orden_topologico(etapas, deps):
+        if nombre not in elegidas:
+            continue
+        etapa = por_nombre[nombre]
+        previo = estado.etapas.get(nombre)
+        razon = motivo(etapa, firma(etapa, estado, filas), previo, estado)
+        arriba = [
+            d for d in contenido[nombre] if situacion.get(d, "al día") != "al día"
+        ]
+        if razon is not None:
+            situacion[nombre] = "pendiente"
+        elif arriba:
+            situacion[nombre] = "aguas arriba"
+            razon = ", ".join(arriba[:2]) + (
+                f" y {len(arriba) - 2} más" if len(arriba) > 2 else ""
+            )
+        else:
+            situacion[nombre] = "al día"
+        registros.append(
+            {
+                "etapa": nombre,
+                "estado": situacion[nombre],
+                "motivo": razon,
+                "ultima_s": None if previo is None else previo["duracion_s"],
+            }
+        )
+    return pd.DataFrame(registros)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Pipeline por etapas con memoización por contenido"
+    )
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    e = sub.add_parser(
+        "estado", help="qué etapas están al día y por qué se correrían las demás"
+    )
+    e.add_argument(
+        "--etapas",
+        nargs="+",
+        default=None,
+        metavar="PATRON",
+        help="solo estas etapas (patrones como 'par:*Alajuela*') y sus anteriores",
+    )
+    e.add_argument(
+        "--todas", action="store_true", help="listar también las que están al día"
+    )
+
+    c = sub.add_parser("correr", help="correr las etapas que no estén al día")
+    c.add_argument("--etapas", nargs="+", default=None, metavar="PATRON")
+    c.add_argument(
+        "--forzar",
+        nargs="+",
+        default=[],
+        metavar="PATRON",
+        help="correr estas etapas aunque estén al día",
+    )
+    c.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    c.add_argument(
+        "--traza", default=None, help="JSON lines con un tramo por etapa (src/traza.py)"
+    )
+    args = parser.parse_args(argv)
+
+    df = cargar_datos()
+    etapas = construir_grafo(df)
+    with pd.option_context(
+        "display.width", 200, "display.max_rows", None, "display.max_colwidth", 80
+    ):
+        if args.comando == "estado":
+            tabla = revisar(etapas, df, args.etapas)
+            conteo = tabla["estado"].value_counts()
+            print(
+                f"{len(tabla)} etapas: "
+                + ", ".join(f"{k} {v}" for k, v in conteo.items())
+            )
+            if not args.todas:
+                tabla = tabla[tabla["estado"] != "al día"]
+            if len(tabla):
+                print(tabla.to_string(index=False))
+            return 0
+
+        if args.traza:
+            traza.activar(args.traza)
+        t0 = time.perf_counter()
+        tabla = correr(
+            etapas, df, args.etapas, args.forzar, n_workers=args.workers, verbose=True
+        )
+        conteo = tabla["resultado"].value_counts()
+        print(
+            f"{len(tabla)} etapas en {time.perf_counter() - t0:.1f} s: "
+            + ", ".join(f"{k} {v}" for k, v in conteo.items())
+        )
+        errores = tabla[tabla["resultado"] == "error"]
+        if len(errores):
+            print(errores[["etapa", "motivo"]].to_string(index=False))
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1 +1,338 @@
 # Entrenamiento y validación de modelos usados
+#
+# Uso:
+#   python src/scripts/2_modelo.py umbral --workers 4
+#   python src/scripts/2_modelo.py mcmc --workers 4 --semilla 123
+#   python src/scripts/2_modelo.py mcmc --dimensiones provincias cantones --cadenas 4
+#   python src/scripts/2_modelo.py kde --ancho loo
+#
+# El subcomando "umbral" elige u_opt y p_u para todas las provincias,
+# categorías, sectores y cantones (src/modelos/umbral.py, misma regla que
+# encontrar_umbral_optimo) y los guarda en res/umbrales.csv.
+#
+# El subcomando "mcmc" ajusta por MCMC (src/modelos/mcmc.py) los modelos
+# paramétricos de cuerpo (Weibull, Gamma, Lognormal, Fisk) y de cola (GPD,
+# Burr, sobre los excesos x - u) de cada provincia, categoría, sector o
+# cantón. Cada ajuste corre varias cadenas con propuesta adaptativa; los
+# ajustes se reparten en un pool de procesos y cada uno usa una semilla hija
+# de --semilla, así que el resultado no depende de --workers.
+#
+# El umbral u y p_u se toman de la cola ya ajustada en res/<dimension>, o
+# de res/umbrales.csv si no la hay (o primero, con --umbral seleccion); si
+# tampoco está ahí se usa el cuantil --cuantil-umbral de los datos.
+#
+# Salida: res/mcmc/posterior.npz (muestras después del burn-in, adelgazadas,
+# en columnas) y res/mcmc/resumen.csv (media, cuantiles, R-hat y ESS).
+#
+# El subcomando "kde" reajusta los cuerpos KDE de res/kde con el mismo
+# núcleo, u_opt y p_u (src/modelos/kde.py: binning lineal + FFT, ancho por
+# dejar-uno-fuera o el guardado) y reescribe cada CSV con la columna F de la
+# CDF exacta del núcleo.
+#
+# src/pipeline.py corre estos subcomandos como etapas de un grafo, en
+# paralelo y solo cuando cambiaron sus entradas, parámetros o código.
+
+import argparse
+import glob
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from src.config import RES_DIR, RUTA_DATOS, RUTA_POSTERIOR_MCMC, RUTA_UMBRALES
+from src.data.limpieza_datos import cargar_datos
+from src.modelos.almacen import obtener_almacen
+from src.modelos.kde import KDEBinado, guardar_kde_csv
+from src.modelos.mcmc import (
+    MODELOS,
+    MODELOS_COLA,
+    MODELOS_CUERPO,
+    guardar_posterior,
+    muestrear,
+    resumen_posterior,
+)
+from src.modelos.umbral import seleccionar_umbrales
+
+# Carpeta de res/ -> columna de los datos limpios
+COLUMNA_DIMENSION = {
+    "provincias": "provincia",
+    "categorias": "categoria",
+    "sectores": "sector",
+    "cantones": "canton",
+}
+
+
+def cargar_umbrales(ruta=RUTA_UMBRALES):
+    """{(dimension, location): (u_opt, p_u)} de res/umbrales.csv (vacío si no existe)."""
+    if not os.path.exists(ruta):
+        return {}
+    tabla = pd.read_csv(ruta)
+    return {
+        (f.dimension, str(f.location)): (float(f.u_opt), float(f.p_u))
+        for f in tabla.itertuples(index=False)
+    }
+
+
+def umbral_ubicacion(dimension, nombre, x, cuantil=0.8, umbrales=None, preferir="res"):
+    """
+    (u, p_u, origen) para una ubicación: la cola guardada en res/<dimension>,
+    el umbral seleccionado en `umbrales` o, si no hay ninguno, el cuantil.
+    """
+    umbrales = umbrales or {}
+    seleccion = umbrales.get((dimension, str(nombre)))
+    if preferir == "seleccion" and seleccion is not None:
+        return seleccion[0], seleccion[1], "seleccion"
+    try:
+        cola = obtener_almacen().cola(dimension, str(nombre))
+        return float(cola["u"]), float(cola["p_u"]), "res"
+    except FileNotFoundError:
+        pass
+    if seleccion is not None:
+        return seleccion[0], seleccion[1], "seleccion"
+    u = float(np.quantile(x, cuantil))
+    return u, float(np.mean(x > u)), "cuantil"
+
+
+def planificar_ajustes(
+    df, dimensiones, modelos, cuantil=0.8, min_datos=10, umbrales=None, preferir="res"
+):
+    """Una tarea por (dimensión, ubicación, modelo) con los datos que le tocan."""
+    tareas = []
+    for dim in dimensiones:
+        col = COLUMNA_DIMENSION[dim]
+        for nombre, grupo in df.groupby(col, sort=True, observed=True):
+            x = grupo["total"].dropna().to_numpy(dtype=float)
+            if x.size < min_datos:
+                continue
+            u, p_u, origen = umbral_ubicacion(
+                dim, nombre, x, cuantil, umbrales, preferir
+            )
+            partes = {"body": x[x <= u], "tail": x[x > u] - u}
+            for modelo in modelos:
+                comp = MODELOS[modelo].componente
+                datos = partes[comp]
+                if datos.size < min_datos:
+                    continue
+                meta = {
+                    "dimension": dim,
+                    "location": str(nombre),
+                    "componente": comp,
+                    "u_opt": u,
+                    "p_u": p_u,
+                    "origen_umbral": origen,
+                }
+                tareas.append((meta, datos, modelo))
+    return tareas
+
+
+def _ajustar(meta, datos, modelo, semilla, opciones):
+    # Se ejecuta en los procesos hijos
+    res = muestrear(datos, modelo, random_state=semilla, **opciones)
+    return meta, res
+
+
+def correr_mcmc(args):
+    df = cargar_datos(ruta=args.datos)
+    modelos = args.modelos or (MODELOS_CUERPO + MODELOS_COLA)
+    tareas = planificar_ajustes(
+        df,
+        args.dimensiones,
+        modelos,
+        cuantil=args.cuantil_umbral,
+        min_datos=args.min_datos,
+        umbrales=cargar_umbrales(args.umbrales),
+        preferir=args.umbral,
+    )
+    semillas = np.random.SeedSequence(args.semilla).spawn(len(tareas))
+    opciones = {
+        "n_cadenas": args.cadenas,
+        "n_iter": args.iteraciones,
+        "burn_in": args.burn_in,
+        "adelgazar": args.adelgazar,
+    }
+    print(f"{len(tareas)} ajustes, {args.cadenas} cadenas cada uno")
+
+    args_ = [
+        (meta, datos, m, s, opciones) for (meta, datos, m), s in zip(tareas, semillas)
+    ]
+    if args.workers > 1:
+        with ProcessPoolExecutor(max_workers=args.workers) as ex:
+            ajustes = list(ex.map(_ajustar, *zip(*args_), chunksize=4))
+    else:
+        ajustes = [_ajustar(*a) for a in args_]
+
+    ruta = guardar_posterior(ajustes, args.salida)
+    resumen = resumen_posterior(ruta)
+    ruta_resumen = Path(args.salida).with_name("resumen.csv")
+    resumen.to_csv(ruta_resumen, index=False)
+
+    malos = resumen[(resumen["rhat"] > 1.01) | (resumen["ess"] < 400)]
+    print(
+        f"{len(ajustes)} ajustes -> {ruta} ({os.path.getsize(ruta) / 1e6:.1f} MB), "
+        f"resumen -> {ruta_resumen}"
+    )
+    if len(malos):
+        print(f"[Aviso] {len(malos)} parámetros con R-hat > 1.01 o ESS < 400:")
+        print(
+            malos[
+                ["dimension", "location", "model_name", "parametro", "rhat", "ess"]
+            ].to_string(index=False)
+        )
+
+
+def correr_umbral(args):
+    df = cargar_datos(ruta=args.datos)
+    series = {
+        (dim, str(nombre)): grupo["total"].to_numpy(dtype=float)
+        for dim in args.dimensiones
+        for nombre, grupo in df.groupby(
+            COLUMNA_DIMENSION[dim], sort=True, observed=True
+        )
+    }
+    tabla = seleccionar_umbrales(
+        series,
+        n_workers=args.workers,
+        min_datos=args.min_datos,
+        u_min=args.u_min,
+        u_max=args.u_max,
+        puntos=args.puntos,
+        min_excesos=args.min_excesos,
+    )
+    tabla = tabla.rename(columns={"clave0": "dimension", "clave1": "location"})
+    tabla.to_csv(args.salida, index=False)
+    print(
+        f"{len(tabla)} ubicaciones -> {args.salida}; "
+        f"{int((tabla['regla'] == 'estable_ad').sum())} con la regla MRL + Anderson-Darling"
+    )
+
+
+def correr_kde(args):
+    df = cargar_datos(ruta=args.datos)
+    archivos = sorted(glob.glob(os.path.join(args.entrada, "*_body_KDE-*.csv")))
+    t0 = time.perf_counter()
+    for ruta in archivos:
+        meta = pd.read_csv(ruta, nrows=1).iloc[0]
+        loc = str(meta["location"])
+        col = next(
+            (c for c in COLUMNA_DIMENSION.values() if (df[c] == loc).any()), None
+        )
+        if col is None:
+            print(f"[Aviso] {loc} no aparece en los datos; se deja {ruta}")
+            continue
+        x = df.loc[df[col] == loc, "total"].dropna().to_numpy(dtype=float)
+        u = float(meta["u_opt"])
+        ancho = float(meta["bandwidth"]) if args.ancho == "guardado" else args.ancho
+        kde = KDEBinado.ajustar(
+            x[x <= u], str(meta["kernel"]), ancho=ancho, M=args.nodos
+        ).truncar(u)
+        salida = os.path.join(args.salida, os.path.basename(ruta))
+        guardar_kde_csv(kde, salida, loc, u, float(meta["p_u"]))
+        print(
+            f"{loc:20s} {kde.nucleo:12s} h = {kde.ancho:.4f} "
+            f"(antes {float(meta['bandwidth']):.4f}), cota del cuantil {kde.cota_error:.1e}"
+        )
+    print(
+        f"{len(archivos)} cuerpos KDE en {time.perf_counter() - t0:.2f} s -> {args.salida}"
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Ajuste de las marginales paramétricas"
+    )
+    sub = parser.add_subparsers(dest="comando")
+
+    u = sub.add_parser("umbral", help="u_opt y p_u de todas las ubicaciones (paralelo)")
+    u.add_argument("--datos", default=str(RUTA_DATOS))
+    u.add_argument("--salida", default=str(RUTA_UMBRALES))
+    u.add_argument(
+        "--dimensiones",
+        nargs="+",
+        choices=tuple(COLUMNA_DIMENSION),
+        default=list(COLUMNA_DIMENSION),
+    )
+    u.add_argument("--u-min", type=float, default=0.7)
+    u.add_argument("--u-max", type=float, default=0.99)
+    u.add_argument("--puntos", type=int, default=250)
+    u.add_argument(
+        "--min-excesos",
+        type=int,
+        default=25,
+        help="mínimo de excesos para ajustar la GPD en un umbral",
+    )
+    u.add_argument("--min-datos", type=int, default=10)
+    u.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+
+    m = sub.add_parser(
+        "mcmc", help="MCMC adaptativo con varias cadenas para cuerpo y cola"
+    )
+    m.add_argument("--datos", default=str(RUTA_DATOS))
+    m.add_argument("--salida", default=str(RUTA_POSTERIOR_MCMC))
+    m.add_argument(
+        "--dimensiones",
+        nargs="+",
+        choices=tuple(COLUMNA_DIMENSION),
+        default=["provincias", "categorias", "sectores"],
+    )
+    m.add_argument("--modelos", nargs="+", choices=tuple(MODELOS), default=None)
+    m.add_argument("--cadenas", type=int, default=4)
+    m.add_argument("--iteraciones", type=int, default=6000)
+    m.add_argument("--burn-in", type=int, default=2000)
+    m.add_argument("--adelgazar", type=int, default=5)
+    m.add_argument(
+        "--umbrales", default=str(RUTA_UMBRALES), help="CSV del subcomando umbral"
+    )
+    m.add_argument(
+        "--umbral",
+        choices=("res", "seleccion"),
+        default="res",
+        help="preferir la cola de res/<dimension> o el umbral seleccionado",
+    )
+    m.add_argument(
+        "--cuantil-umbral",
+        type=float,
+        default=0.8,
+        help="umbral para ubicaciones sin cola ni umbral seleccionado",
+    )
+    m.add_argument(
+        "--min-datos",
+        type=int,
+        default=10,
+        help="mínimo de datos en el cuerpo o en la cola para ajustar",
+    )
+    m.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    m.add_argument("--semilla", type=int, default=123)
+
+    k = sub.add_parser(
+        "kde", help="Reajusta los cuerpos KDE de res/kde (binning + FFT)"
+    )
+    k.add_argument("--datos", default=str(RUTA_DATOS))
+    k.add_argument("--entrada", default=str(RES_DIR / "kde"))
+    k.add_argument("--salida", default=str(RES_DIR / "kde"))
+    k.add_argument(
+        "--ancho",
+        default="loo",
+        help="loo (dejar-uno-fuera), referencia, guardado (el del CSV) o un número",
+    )
+    k.add_argument(
+        "--nodos", type=int, default=1 << 12, help="nodos de la malla de ajuste"
+    )
+
+    args = parser.parse_args(argv)
+    if args.comando == "umbral":
+        correr_umbral(args)
+    elif args.comando == "mcmc":
+        correr_mcmc(args)
+    elif args.comando == "kde":
+        correr_kde(args)
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
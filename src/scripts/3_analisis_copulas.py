@@ -1,254 +1,838 @@
 # copulas_borrador.py
 # Borrador para ajuste de cópulas a la base datos_crudos.xlsx
 # Autor: Dixon Montero Hernández
-# Requisitos: pandas, numpy, scipy, matplotlib, statsmodels, copulas
+# Requisitos: pandas, numpy, scipy, matplotlib
+#
+# Uso:
+#   python src/scripts/3_analisis_copulas.py pares --workers 4 --semilla 123
+#   python src/scripts/3_analisis_copulas.py pares --traza res/trazas/pares.jsonl
+#   python src/scripts/3_analisis_copulas.py bondad --n-boot 1000 --workers 4
+#   python src/scripts/3_analisis_copulas.py seleccion
+#   python src/scripts/3_analisis_copulas.py pool --n-sims 200000 --guardar res/simulaciones/pool
+#   python src/scripts/3_analisis_copulas.py consulta --suma provincia:Alajuela sector:SOCIAL
+#   python src/scripts/3_analisis_copulas.py predictiva --n-draws 1000 --n-sims 50000
+#   python src/scripts/3_analisis_copulas.py colas --n-boot 2000 --workers 4
+#   python src/scripts/3_analisis_copulas.py backtest --n-sims 50000
+#   python src/scripts/3_analisis_copulas.py borrador --archivo datos_crudos.xlsx
+#
+# El subcomando "pares" corre dependencia_y_riesgo para todas las parejas
+# provincia-sector, provincia-categoria y categoria-sector en paralelo.
+# Cada pareja usa una semilla hija de --semilla y se guarda en el checkpoint
+# al terminar; si la corrida se interrumpe, volver a lanzarla solo calcula
+# las parejas que faltan. El resultado es el mismo con cualquier --workers.
+# Con --muestreo sobol|antitetico|importancia las cópulas se simulan con
+# reducción de varianza (src/modelos/muestreo.py) y alcanza un --n-sims menor.
+# Con --traza cada etapa de cada pareja queda como un tramo en ese archivo
+# (src/traza.py; resumen con "python src/traza.py resumen <archivo>").
+#
+# El subcomando "bondad" revisa la cópula ganadora de cada pareja en
+# res/copulas con la prueba Cramér-von Mises / Kolmogorov-Smirnov y p-valores
+# por bootstrap paramétrico (src/modelos/bondad_copula.py).
+#
+# El subcomando "seleccion" ajusta por máxima verosimilitud todas las
+# familias candidatas (src/modelos/ajuste_copula.py) a todas las parejas de
+# res/copulas en una sola llamada por lotes y elige la de menor AIC.
+#
+# El subcomando "pool" simula una sola t-cópula sobre todas las provincias,
+# categorías y sectores (src/modelos/simulacion_conjunta.py) y de ese mismo
+# pool salen los VaR/CVaR marginales, por parejas, provincia-categoría y de
+# los portafolios (res/copulas/pool_*.csv). Con --guardar las simulaciones
+# U y X quedan en disco (src/modelos/almacen_simulaciones.py) y con
+# --simulaciones las tablas se recalculan desde ahí sin volver a simular.
+#
+# El subcomando "consulta" responde sobre esas simulaciones guardadas:
+# VaR/CVaR de cualquier suma ponderada de dimensiones ("columna:valor") a
+# cualquier alpha y, con --condicion, la media de la suma dado que la
+# condición supera su VaR (CVaR_cond).
+#
+# El subcomando "predictiva" propaga la incertidumbre de las colas ajustadas
+# por MCMC (res/mcmc/posterior.npz) a los VaR/TVaR de cada ubicación y de
+# cada pareja de seleccion_mv.csv (src/modelos/predictiva.py): VaR/TVaR
+# predictivos, media e intervalo de credibilidad a través de los draws.
+#
+# El subcomando "colas" estima la lambda de cola superior empírica (CFG y
+# secante, src/modelos/dependencia.py) entre los máximos anuales de cada
+# provincia, categoría y sector, con intervalos por bootstrap de bloques de
+# años; res/copulas/lambda_empirica_<columna>.csv marca las parejas
+# significativas (las aristas del grafo de dependencia extrema).
+#
+# El subcomando "backtest" reajusta el modelo del pool año por año con los
+# años anteriores y compara el VaR de cada dimensión y pareja con las
+# pérdidas del año siguiente (src/modelos/backtest.py): violaciones y
+# pruebas de Kupiec y Christoffersen en res/copulas/backtest_*.csv.
+#
+# src/pipeline.py corre estos subcomandos como etapas de un grafo, en
+# paralelo y solo cuando cambiaron sus entradas, parámetros o código.
+
+import argparse
+import os
+import sys
+from pathlib import Path
 
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
 from scipy import stats
-from copulas.bivariate import (
-    GaussianCopula,
-    StudentTCopula,
-    ClaytonCopula,
-    GumbelCopula,
-    FrankCopula,
-)
 import warnings
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from src import traza
+from src.config import RES_DIR, RUTA_DATOS, RUTA_POSTERIOR_MCMC, RUTA_SIMULACIONES
+from src.data.limpieza_datos import cargar_datos
+from src.modelos.ajuste_copula import ajustar_lote, seleccionar_copulas
+from src.modelos.backtest import backtest_var
+from src.modelos.almacen_simulaciones import AlmacenSimulaciones, guardar_simulaciones
+from src.modelos.bondad_copula import (
+    bondad_pares,
+    copula_empirica_malla,
+    pseudo_observaciones,
+)
+from src.modelos.dependencia import (
+    ESTIMADORES_LAMBDA,
+    lambda_empirica,
+    tabla_lambda_empirica,
+)
+from src.modelos.familias_copula import obtener_familia
+from src.modelos.muestreo import MODOS
+from src.modelos.pares import (
+    ejecutar_pares,
+    par_por_evento,
+    planificar_pares,
+    tabla_por_evento,
+)
+from src.modelos.predictiva import tablas_predictivas
+from src.modelos.simulacion_conjunta import PoolConjunto, tablas_pool
+
 warnings.filterwarnings("ignore")
 
+
 # ---------------------------
-# 1) Cargar datos
+# Transformar marginals a U(0,1) (ranks / empírica)
+#    - esto produce variables uniformes empíricas U1 y U2 (PIT vía ECDF)
 # ---------------------------
-file_path = "datos_crudos.xlsx"
-df = pd.read_excel(file_path)
 
-# Mostrar info básica
-print("Filas totales:", len(df))
-print("Columnas disponibles:", df.columns.tolist())
-print("Nulos por columna:\n", df.isnull().sum())
+
+def ecdf_transform(x):
+    ranks = stats.rankdata(x, method="average")  # rangos
+    u = (ranks - 0.5) / len(x)  # transform to (0,1)
+    return u
+
 
 # ---------------------------
-# 2) Selección y limpieza
+# CDF empírica bivariada en una malla (para el Cramer-von Mises aproximado)
 # ---------------------------
-# Columnas de interés según lo indicado
-cols = ["CATEGORÍA", "PROVINCIA", "TOTAL POR TIPOLOGÍA"]
-for c in cols:
-    if c not in df.columns:
-        raise ValueError(f"No se encontró la columna {c} en el archivo.")
+def empirical_cdf_2d(u, v, grid_u, grid_v):
+    # calcula la CDF empírica en una malla (grid) con histograma + sumas acumuladas
+    return copula_empirica_malla(u, v, grid_u, grid_v)
+
+
+def analisis_borrador(file_path="datos_crudos.xlsx"):
+    # matplotlib solo se necesita para este borrador
+    import matplotlib.pyplot as plt
+
+    # ---------------------------
+    # 1) Cargar datos
+    # ---------------------------
+    df = pd.read_excel(file_path)
+
+    # Mostrar info básica
+    print("Filas totales:", len(df))
+    print("Columnas disponibles:", df.columns.tolist())
+    print("Nulos por columna:\n", df.isnull().sum())
+
+    # ---------------------------
+    # 2) Selección y limpieza
+    # ---------------------------
+    # Columnas de interés según lo indicado
+    cols = ["CATEGORÍA", "PROVINCIA", "TOTAL POR TIPOLOGÍA"]
+    for c in cols:
+        if c not in df.columns:
+            raise ValueError(f"No se encontró la columna {c} en el archivo.")
+
+    df_sel = df[cols].copy()
+    # Convertir total a numérico y eliminar filas sin total o sin provincia/categoría
+    df_sel["TOTAL POR TIPOLOGÍA"] = pd.to_numeric(
+        df_sel["TOTAL POR TIPOLOGÍA"], errors="coerce"
+    )
+    df_sel = df_sel.dropna(
+        subset=["CATEGORÍA", "PROVINCIA", "TOTAL POR TIPOLOGÍA"]
+    ).reset_index(drop=True)
+    print("Filas luego de limpieza:", len(df_sel))
+
+    # ---------------------------
+    # 3) Agregación para obtener variables continuas
+    #    (sumamos total por cada par CATEGORÍA-PROVINCIA)
+    # ---------------------------
+    df_agg = (
+        df_sel.groupby(["CATEGORÍA", "PROVINCIA"], dropna=False)["TOTAL POR TIPOLOGÍA"]
+        .sum()
+        .reset_index()
+        .rename(columns={"TOTAL POR TIPOLOGÍA": "total_agr"})
+    )
+
+    print("Filas luego de agregación (pares CATEGORÍA-PROVINCIA):", len(df_agg))
+    print(df_agg.head())
+
+    # ---------------------------
+    # 4) Construir pares para modelar con cópulas
+    #    Aquí podemos: (a) estudiar dependencia entre `total_agr` y
+    #    un codificador ordinal de la CATEGORÍA o PROVINCIA, o
+    #    (b) elegir dos categorías/provincias específicas y comparar sus totals.
+    #
+    #    Estrategia por defecto: crear dos variables continuas usando:
+    #      - total_agr (como una dimensión)
+    #      - total_agr_padronizada por categoría (ejemplo) o construir
+    #        variable 'categoria_code' y 'provincia_code' como ordinales.
+    #    Para cópulas bivariantes clásicas preferimos dos contínuas:
+    #      -> GENERAR un conjunto (X,Y) tomando:
+    #         X = total_agr,
+    #         Y = total por misma categoría en otra partición (ejemplo: normalizado)
+    #    Para simplificar: generaremos un par (total_agr, log(total_agr)+ruido)
+    #    como ejemplo de dos continuas dependientes, además de permitir
+    #    usar 'categoria_code' para análisis complementario.
+    # ---------------------------
+
+    # Creamos codes ordinales (por si se desean usar como marginals discretas)
+    df_agg["categoria_code"] = pd.factorize(df_agg["CATEGORÍA"])[0] + 1
+    df_agg["provincia_code"] = pd.factorize(df_agg["PROVINCIA"])[0] + 1
+
+    # Creamos una segunda variable continua relacionada (ejemplo práctico):
+    # Usaremos la transformación log para la segunda dimensión más un pequeño ruido.
+    df_agg["total_log"] = np.log1p(df_agg["total_agr"])
+    df_agg["y_sim"] = df_agg["total_log"] + np.random.normal(
+        scale=df_agg["total_log"].std() * 0.1, size=len(df_agg)
+    )
+
+    # Seleccionamos el par (X, Y) para las cópulas
+    data_for_copula = df_agg[["total_agr", "y_sim"]].copy()
+
+    # ---------------------------
+    # 5) Transformar marginals a U(0,1) (ranks / empírica)
+    #    - esto produce variables uniformes empíricas U1 y U2 (PIT vía ECDF)
+    # ---------------------------
+
+    U1 = ecdf_transform(data_for_copula["total_agr"].values)
+    U2 = ecdf_transform(data_for_copula["y_sim"].values)
+
+    U = np.vstack([U1, U2]).T  # matriz Nx2 de uniformes empíricos
+
+    # ---------------------------
+    # 6) Medidas de dependencia
+    # ---------------------------
+    kendall_tau = stats.kendalltau(
+        data_for_copula["total_agr"], data_for_copula["y_sim"]
+    ).correlation
+    spearman_rho = stats.spearmanr(
+        data_for_copula["total_agr"], data_for_copula["y_sim"]
+    ).correlation
+    pearson_r = np.corrcoef(data_for_copula["total_agr"], data_for_copula["y_sim"])[
+        0, 1
+    ]
+
+    print("\nMedidas de dependencia:")
+    print("Kendall's tau:", kendall_tau)
+    print("Spearman's rho:", spearman_rho)
+    print("Pearson r:", pearson_r)
+
+    # ---------------------------
+    # 7) Ajuste de cópulas bivariantes: probamos varias familias
+    # ---------------------------
+    # Máxima verosimilitud con src/modelos/ajuste_copula.py (todas las
+    # familias en una llamada; la t estima también nu)
+    models = {
+        "Gaussian": "N",
+        "StudentT": "t",
+        "Clayton": "C",
+        "Gumbel": "G",
+        "Frank": "F",
+    }
+    ajuste = ajustar_lote([U], familias=list(models.values())).set_index("familia")
+
+    results = {}
+    for name, fam in models.items():
+        fila = ajuste.loc[fam]
+        params = (fila["par"], fila["par2"])[: obtener_familia(fam).n_params]
+        results[name] = {
+            "familia": fam,
+            "loglik": fila["loglik"],
+            "aic": fila["aic"],
+            "params": params,
+        }
+        print(
+            f"{name}: ll={fila['loglik']:.3f}, aic={fila['aic']:.3f}, params={params}"
+        )
+
+    # ---------------------------
+    # 8) Comparación básica por AIC (menor mejor)
+    # ---------------------------
+    ranking = sorted(
+        [(name, v["aic"]) for name, v in results.items()],
+        key=lambda x: x[1] if x[1] is not None else np.inf,
+    )
+    print("\nRanking por AIC (menor = mejor):")
+    for r in ranking:
+        print(r)
+
+    # ---------------------------
+    # 9) Gráficos:
+    #    - Scatter de U1 vs U2 (empírico)
+    #    - Simulación desde la cópula mejor por AIC y scatter comparativo
+    #    - Densidad / contorno aproximado (malla) por simulación
+    # ---------------------------
+
+    # Scatter empírico (U)
+    plt.figure(figsize=(6, 6))
+    plt.scatter(U1, U2, s=10)
+    plt.title("Scatter empírico (U1 vs U2) — variables transformadas (ECDF)")
+    plt.xlabel("U1 (total_agr)")
+    plt.ylabel("U2 (y_sim)")
+    plt.grid(True)
+    plt.tight_layout()
+    plt.savefig("scatter_empirico_u.png")
+    print("Guardado: scatter_empirico_u.png")
+    plt.show()
+
+    # Simular desde la mejor cópula (según AIC)
+    best_name = ranking[0][0]
+    best = results[best_name]
+    n_samp = len(U1)
+    sim = obtener_familia(best["familia"]).simular(
+        n_samp, best["params"], np.random.default_rng()
+    )
+
+    # Scatter de simulación vs empírico
+    plt.figure(figsize=(12, 5))
+    plt.subplot(1, 2, 1)
+    plt.scatter(U1, U2, s=10)
+    plt.title("Observado (U)")
+    plt.xlabel("U1")
+    plt.ylabel("U2")
+    plt.grid(True)
+
+    plt.subplot(1, 2, 2)
+    plt.scatter(sim[:, 0], sim[:, 1], s=10)
+    plt.title(f"Simulado desde {best_name}")
+    plt.xlabel("U1 sim")
+    plt.ylabel("U2 sim")
+    plt.grid(True)
+
+    plt.tight_layout()
+    plt.savefig("comparacion_empirico_simulado.png")
+    print("Guardado: comparacion_empirico_simulado.png")
+    plt.show()
+
+    # ---------------------------
+    # 10) Prueba de bondad de ajuste sencilla:
+    #     - Comparamos distribuciones marg. conjuntas con la simulada (en U)
+    #     - Estadístico Cramer-von Mises entre la CDF empírica y la simulada (aprox).
+    # ---------------------------
+
+    # malla 20x20 en (0,1)
+    grid_u = np.linspace(0, 1, 21)
+    grid_v = np.linspace(0, 1, 21)
+    G_emp = empirical_cdf_2d(U1, U2, grid_u, grid_v)
+    G_sim = empirical_cdf_2d(sim[:, 0], sim[:, 1], grid_u, grid_v)
+
+    cv_stat = np.mean((G_emp - G_sim) ** 2)  # aproximación cuadrática
+    print(
+        f"\nEstadístico aproximado Cramer-von Mises (empírica vs simulada desde {best_name}): {cv_stat:.6f}"
+    )
+
+    # ---------------------------
+    # 11) Resultados y recomendaciones
+    # ---------------------------
+    print("\nMejor modelo según AIC:", best_name)
+    print("Parámetros del mejor modelo:", results[best_name]["params"])
+    print("C-V-M aproximado:", cv_stat)
+
+    # Guardar data agregada por si quieres inspeccionarla fuera
+    df_agg.to_csv("datos_agrupados_categoria_provincia.csv", index=False)
+    print("Datos agregados guardados en datos_agrupados_categoria_provincia.csv")
 
-df_sel = df[cols].copy()
-# Convertir total a numérico y eliminar filas sin total o sin provincia/categoría
-df_sel["TOTAL POR TIPOLOGÍA"] = pd.to_numeric(
-    df_sel["TOTAL POR TIPOLOGÍA"], errors="coerce"
-)
-df_sel = df_sel.dropna(
-    subset=["CATEGORÍA", "PROVINCIA", "TOTAL POR TIPOLOGÍA"]
-).reset_index(drop=True)
-print("Filas luego de limpieza:", len(df_sel))
 
 # ---------------------------
-# 3) Agregación para obtener variables continuas
-#    (sumamos total por cada par CATEGORÍA-PROVINCIA)
+# Todas las parejas en paralelo
 # ---------------------------
-df_agg = (
-    df_sel.groupby(["CATEGORÍA", "PROVINCIA"], dropna=False)["TOTAL POR TIPOLOGÍA"]
-    .sum()
-    .reset_index()
-    .rename(columns={"TOTAL POR TIPOLOGÍA": "total_agr"})
-)
+def correr_pares(args):
+    if args.traza:
+        traza.activar(args.traza, memoria=args.traza_memoria)
+    df = cargar_datos(ruta=args.datos)
+    provincias = sorted(df["provincia"].dropna().unique())
+    categorias = sorted(df["categoria"].dropna().unique())
+    sectores = sorted(df["sector"].dropna().unique())
+
+    tareas = planificar_pares(provincias, categorias, sectores, semilla=args.semilla)
+    os.makedirs(os.path.dirname(os.path.abspath(args.salida)), exist_ok=True)
+    checkpoint = (
+        args.checkpoint or os.path.splitext(args.salida)[0] + ".checkpoint.jsonl"
+    )
+
+    tabla = ejecutar_pares(
+        tareas,
+        ruta_datos=args.datos,
+        n_sims=args.n_sims,
+        alphas=tuple(args.alphas),
+        semilla=args.semilla,
+        n_workers=args.workers,
+        checkpoint=checkpoint,
+        df=df,
+        tamano_bloque=args.tamano_bloque,
+        muestreo=args.muestreo,
+        verbose=True,
+    )
+    tabla.to_csv(args.salida, index=False)
+    print(f"{len(tabla)} parejas guardadas en {args.salida}")
 
-print("Filas luego de agregación (pares CATEGORÍA-PROVINCIA):", len(df_agg))
-print(df_agg.head())
 
 # ---------------------------
-# 4) Construir pares para modelar con cópulas
-#    Aquí podemos: (a) estudiar dependencia entre `total_agr` y
-#    un codificador ordinal de la CATEGORÍA o PROVINCIA, o
-#    (b) elegir dos categorías/provincias específicas y comparar sus totals.
-#
-#    Estrategia por defecto: crear dos variables continuas usando:
-#      - total_agr (como una dimensión)
-#      - total_agr_padronizada por categoría (ejemplo) o construir
-#        variable 'categoria_code' y 'provincia_code' como ordinales.
-#    Para cópulas bivariantes clásicas preferimos dos contínuas:
-#      -> GENERAR un conjunto (X,Y) tomando:
-#         X = total_agr,
-#         Y = total por misma categoría en otra partición (ejemplo: normalizado)
-#    Para simplificar: generaremos un par (total_agr, log(total_agr)+ruido)
-#    como ejemplo de dos continuas dependientes, además de permitir
-#    usar 'categoria_code' para análisis complementario.
-# ---------------------------
-
-# Creamos codes ordinales (por si se desean usar como marginals discretas)
-df_agg["categoria_code"] = pd.factorize(df_agg["CATEGORÍA"])[0] + 1
-df_agg["provincia_code"] = pd.factorize(df_agg["PROVINCIA"])[0] + 1
-
-# Creamos una segunda variable continua relacionada (ejemplo práctico):
-# Usaremos la transformación log para la segunda dimensión más un pequeño ruido.
-df_agg["total_log"] = np.log1p(df_agg["total_agr"])
-df_agg["y_sim"] = df_agg["total_log"] + np.random.normal(
-    scale=df_agg["total_log"].std() * 0.1, size=len(df_agg)
+# Bondad de ajuste de las cópulas de res/copulas
+# ---------------------------
+COLUMNA_TIPO = {
+    "provincias": "provincia",
+    "sectores": "sector",
+    "categorias": "categoria",
+}
+ARCHIVOS_COPULAS = (
+    "provincia_sector.csv",
+    "provincia_categoria.csv",
+    "sector_categoria.csv",
 )
 
-# Seleccionamos el par (X, Y) para las cópulas
-data_for_copula = df_agg[["total_agr", "y_sim"]].copy()
+
+def pares_res_copulas(df, carpeta):
+    """Muestras (X, Y) por evento de las parejas de res/copulas, con sus datos de R."""
+    tablas = {tipo: tabla_por_evento(df, col) for tipo, col in COLUMNA_TIPO.items()}
+
+    pares = []
+    for nombre in ARCHIVOS_COPULAS:
+        ajustes = pd.read_csv(os.path.join(carpeta, nombre))
+        for fila in ajustes.itertuples(index=False):
+            par = par_por_evento(
+                tablas[fila.tipoA], tablas[fila.tipoB], fila.varA, fila.varB
+            )
+            if par is None:
+                print(f"[Aviso] Sin datos suficientes para {fila.varA} - {fila.varB}")
+                continue
+            pares.append(
+                {
+                    "x": par["X"].to_numpy(),
+                    "y": par["Y"].to_numpy(),
+                    "familia": fila.copula,
+                    "tipoA": fila.tipoA,
+                    "tipoB": fila.tipoB,
+                    "varA": fila.varA,
+                    "varB": fila.varB,
+                    "par_R": fila.par,
+                    "tau_R": fila.tau,
+                }
+            )
+    return pares
+
+
+def correr_bondad(args):
+    pares = pares_res_copulas(cargar_datos(ruta=args.datos), args.copulas)
+
+    resultados = bondad_pares(
+        pares,
+        n_boot=args.n_boot,
+        semilla=args.semilla,
+        n_workers=args.workers,
+        verbose=True,
+    )
+    tabla = pd.DataFrame(resultados)
+    tabla["par"] = tabla["par"].map(lambda p: ";".join(f"{v:.6g}" for v in p))
+    tabla.to_csv(args.salida, index=False)
+    print(
+        f"{len(tabla)} parejas guardadas en {args.salida}; "
+        f"{int((tabla['p_cvm'] < 0.05).sum())} rechazadas al 5% (CvM)"
+    )
 
 
 # ---------------------------
-# 5) Transformar marginals a U(0,1) (ranks / empírica)
-#    - esto produce variables uniformes empíricas U1 y U2 (PIT vía ECDF)
+# Selección por AIC con MV de todas las familias
 # ---------------------------
-def ecdf_transform(x):
-    ranks = stats.rankdata(x, method="average")  # rangos
-    u = (ranks - 0.5) / len(x)  # transform to (0,1)
-    return u
-
-
-U1 = ecdf_transform(data_for_copula["total_agr"].values)
-U2 = ecdf_transform(data_for_copula["y_sim"].values)
+def correr_seleccion(args):
+    pares = pares_res_copulas(cargar_datos(ruta=args.datos), args.copulas)
+    # Rangos promedio en los empates, como pobs() en VineCopula
+    muestras = [pseudo_observaciones(np.column_stack([p["x"], p["y"]])) for p in pares]
+
+    sel = seleccionar_copulas(muestras, criterio=args.criterio)
+    info = pd.DataFrame(
+        [{k: v for k, v in p.items() if k not in ("x", "y")} for p in pares]
+    )
+    info = info.rename(columns={"familia": "copula_R"})
+    tabla = pd.concat([info, sel.drop(columns="id")], axis=1)
+    tabla.to_csv(args.salida, index=False)
+    iguales = int((tabla["familia"] == tabla["copula_R"]).sum())
+    print(
+        f"{len(tabla)} parejas guardadas en {args.salida}; "
+        f"{iguales} con la misma familia que res/copulas"
+    )
+    if args.todas:
+        ajustar_lote(muestras, ids=range(len(muestras))).to_csv(args.todas, index=False)
 
-U = np.vstack([U1, U2]).T  # matriz Nx2 de uniformes empíricos
 
 # ---------------------------
-# 6) Medidas de dependencia
+# Pool conjunto: todas las tablas con una sola simulación
 # ---------------------------
-kendall_tau = stats.kendalltau(
-    data_for_copula["total_agr"], data_for_copula["y_sim"]
-).correlation
-spearman_rho = stats.spearmanr(
-    data_for_copula["total_agr"], data_for_copula["y_sim"]
-).correlation
-pearson_r = np.corrcoef(data_for_copula["total_agr"], data_for_copula["y_sim"])[0, 1]
+def correr_pool(args):
+    df = cargar_datos(ruta=args.datos)
+    sims = None
+    if args.simulaciones:
+        sims = AlmacenSimulaciones(args.simulaciones)
+        pool = PoolConjunto.desde_datos(df, nu=sims.meta["copula"]["nu"])
+        if not np.allclose(pool.R, np.asarray(sims.meta["copula"]["R"])):
+            raise SystemExit(
+                f"{args.simulaciones} se simuló con otra correlación; "
+                "vuelva a generarlo con --guardar"
+            )
+        print(f"{sims}: se reutilizan las simulaciones guardadas")
+    else:
+        pool = PoolConjunto.desde_datos(df, nu=args.nu)
+    print(f"{len(pool.dimensiones)} dimensiones, nu = {pool.nu:g}")
+    if args.guardar and sims is None:
+        sims = guardar_simulaciones(
+            pool,
+            args.guardar,
+            n_sims=args.n_sims,
+            random_state=args.semilla,
+            tamano_bloque=args.tamano_bloque,
+        )
+        print(f"U y X ({sims.n_sims} x {len(sims.dimensiones)}) -> {args.guardar}")
+    tablas = tablas_pool(
+        pool,
+        df,
+        n_sims=args.n_sims,
+        alphas=tuple(args.alphas),
+        random_state=args.semilla,
+        tamano_bloque=args.tamano_bloque,
+        simulaciones=sims,
+    )
+    os.makedirs(args.salida, exist_ok=True)
+    for nombre, tabla in tablas.items():
+        ruta = os.path.join(args.salida, f"pool_{nombre}.csv")
+        tabla.to_csv(ruta, index=(nombre == "correlacion"))
+        print(f"{nombre}: {len(tabla)} filas -> {ruta}")
 
-print("\nMedidas de dependencia:")
-print("Kendall's tau:", kendall_tau)
-print("Spearman's rho:", spearman_rho)
-print("Pearson r:", pearson_r)
 
 # ---------------------------
-# 7) Ajuste de cópulas bivariantes: probamos varias familias
+# Consultas sobre simulaciones guardadas
 # ---------------------------
-# Utilizamos las implementaciones de 'copulas.bivariate' que trabajan con U(0,1) u,v
-models = {
-    "Gaussian": GaussianCopula(),
-    "StudentT": StudentTCopula(),
-    "Clayton": ClaytonCopula(),
-    "Gumbel": GumbelCopula(),
-    "Frank": FrankCopula(),
-}
+def correr_consulta(args):
+    sims = AlmacenSimulaciones(args.simulaciones)
+    print(f"{sims}, semilla {sims.meta['semilla']}, nu = {sims.meta['copula']['nu']:g}")
+    if not args.suma:
+        for col, val in sims.dimensiones:
+            print(f"  {col}:{val}")
+        return
+    res = sims.var_cvar(args.suma, args.alphas, pesos=args.pesos, metodo=args.metodo)
+    filas = [{"alpha": a, "VaR": v, "CVaR": c} for a, (v, c) in res.items()]
+    if args.condicion:
+        cond = sims.cvar_condicional(
+            args.suma,
+            args.condicion,
+            args.alphas,
+            pesos_objetivo=args.pesos,
+            metodo=args.metodo,
+        )
+        for f in filas:
+            f["CVaR_cond"] = cond[f["alpha"]]
+    print(
+        f"S = {' + '.join(args.suma)}"
+        + (f" | {' + '.join(args.condicion)} >= VaR" if args.condicion else "")
+    )
+    print(pd.DataFrame(filas).to_string(index=False))
 
-# Ajustar cada cópula usando (u,v) (nota: las clases aceptan datos en [0,1])
-results = {}
-for name, model in models.items():
-    try:
-        model.fit(np.column_stack((U1, U2)))
-        ll = model.log_likelihood(np.column_stack((U1, U2)))
-        # número de parámetros aproximado (usamos 1 o 2 según cópula)
-        k = len(model.get_parameters())
-        aic = -2 * ll + 2 * k
-        results[name] = {
-            "model": model,
-            "loglik": ll,
-            "aic": aic,
-            "params": model.get_parameters(),
-        }
-        print(f"{name}: ll={ll:.3f}, aic={aic:.3f}, params={model.get_parameters()}")
-    except Exception as e:
-        print(f"Error ajustando {name}: {e}")
 
 # ---------------------------
-# 8) Comparación básica por AIC (menor mejor)
+# VaR/TVaR predictivos con el posterior de las colas
 # ---------------------------
-ranking = sorted(
-    [(name, v["aic"]) for name, v in results.items()],
-    key=lambda x: x[1] if x[1] is not None else np.inf,
-)
-print("\nRanking por AIC (menor = mejor):")
-for r in ranking:
-    print(r)
-
-# ---------------------------
-# 9) Gráficos:
-#    - Scatter de U1 vs U2 (empírico)
-#    - Simulación desde la cópula mejor por AIC y scatter comparativo
-#    - Densidad / contorno aproximado (malla) por simulación
-# ---------------------------
-
-# Scatter empírico (U)
-plt.figure(figsize=(6, 6))
-plt.scatter(U1, U2, s=10)
-plt.title("Scatter empírico (U1 vs U2) — variables transformadas (ECDF)")
-plt.xlabel("U1 (total_agr)")
-plt.ylabel("U2 (y_sim)")
-plt.grid(True)
-plt.tight_layout()
-plt.savefig("scatter_empirico_u.png")
-print("Guardado: scatter_empirico_u.png")
-plt.show()
-
-# Simular desde la mejor cópula (según AIC)
-best_name = ranking[0][0]
-best_model = results[best_name]["model"]
-n_samp = len(U1)
-sim = best_model.sample(n_samp)  # devuelve Nx2 en (0,1)
-
-# Scatter de simulación vs empírico
-plt.figure(figsize=(12, 5))
-plt.subplot(1, 2, 1)
-plt.scatter(U1, U2, s=10)
-plt.title("Observado (U)")
-plt.xlabel("U1")
-plt.ylabel("U2")
-plt.grid(True)
-
-plt.subplot(1, 2, 2)
-plt.scatter(sim[:, 0], sim[:, 1], s=10)
-plt.title(f"Simulado desde {best_name}")
-plt.xlabel("U1 sim")
-plt.ylabel("U2 sim")
-plt.grid(True)
-
-plt.tight_layout()
-plt.savefig("comparacion_empirico_simulado.png")
-print("Guardado: comparacion_empirico_simulado.png")
-plt.show()
-
-
-# ---------------------------
-# 10) Prueba de bondad de ajuste sencilla:
-#     - Comparamos distribuciones marg. conjuntas con la simulada (en U)
-#     - Estadístico Cramer-von Mises entre la CDF empírica y la simulada (aprox).
-# ---------------------------
-def empirical_cdf_2d(u, v, grid_u, grid_v):
-    # calcula la CDF empírica en una malla (grid)
-    UU = np.column_stack((u, v))
-    G = np.zeros((len(grid_u), len(grid_v)))
-    for i, gu in enumerate(grid_u):
-        for j, gv in enumerate(grid_v):
-            G[i, j] = np.mean((UU[:, 0] <= gu) & (UU[:, 1] <= gv))
-    return G
-
-
-# malla 20x20 en (0,1)
-grid_u = np.linspace(0, 1, 21)
-grid_v = np.linspace(0, 1, 21)
-G_emp = empirical_cdf_2d(U1, U2, grid_u, grid_v)
-G_sim = empirical_cdf_2d(sim[:, 0], sim[:, 1], grid_u, grid_v)
-
-cv_stat = np.mean((G_emp - G_sim) ** 2)  # aproximación cuadrática
-print(
-    f"\nEstadístico aproximado Cramer-von Mises (empírica vs simulada desde {best_name}): {cv_stat:.6f}"
-)
+def correr_predictiva(args):
+    df = cargar_datos(ruta=args.datos)
+    tablas = tablas_predictivas(
+        df,
+        pd.read_csv(args.seleccion),
+        n_draws=args.n_draws,
+        n_sims=args.n_sims,
+        alphas=tuple(args.alphas),
+        nivel=args.nivel,
+        random_state=args.semilla,
+        ruta=args.posterior,
+    )
+    os.makedirs(args.salida, exist_ok=True)
+    for nombre, tabla in tablas.items():
+        ruta = os.path.join(args.salida, f"predictiva_{nombre}.csv")
+        tabla.to_csv(ruta, index=False)
+        print(f"{nombre}: {len(tabla)} filas -> {ruta}")
+
 
 # ---------------------------
-# 11) Resultados y recomendaciones
+# lambda de cola empírica con intervalos bootstrap
 # ---------------------------
-print("\nMejor modelo según AIC:", best_name)
-print("Parámetros del mejor modelo:", results[best_name]["params"])
-print("C-V-M aproximado:", cv_stat)
-
-# Guardar data agregada por si quieres inspeccionarla fuera
-df_agg.to_csv("datos_agrupados_categoria_provincia.csv", index=False)
-print("Datos agregados guardados en datos_agrupados_categoria_provincia.csv")
+def correr_colas(args):
+    df = cargar_datos(ruta=args.datos)
+    os.makedirs(args.salida, exist_ok=True)
+    for columna in args.columnas:
+        maximos = df.pivot_table(
+            index="ano", columns=columna, values="total", aggfunc="max", observed=True
+        ).sort_index()
+        tablas = []
+        for estimador in args.estimadores:
+            res = lambda_empirica(
+                maximos,
+                estimador=estimador,
+                n_boot=args.n_boot,
+                tamano_bloque=args.tamano_bloque,
+                nivel=args.nivel,
+                random_state=args.semilla,
+                n_workers=args.workers,
+            )
+            tablas.append(tabla_lambda_empirica(res))
+        tabla = pd.concat(tablas, ignore_index=True)
+        ruta = os.path.join(args.salida, f"lambda_empirica_{columna}.csv")
+        tabla.to_csv(ruta, index=False)
+        signif = tabla.groupby("estimador")["significativa"].sum()
+        print(
+            f"{columna}: {maximos.shape[0]} años x {maximos.shape[1]}, "
+            + ", ".join(f"{e} {int(k)} significativas" for e, k in signif.items())
+            + f" -> {ruta}"
+        )
+
+
+def correr_backtest(args):
+    df = cargar_datos(ruta=args.datos)
+    res = backtest_var(
+        df,
+        alphas=tuple(args.alphas),
+        min_anos=args.min_anos,
+        n_sims=args.n_sims,
+        random_state=args.semilla,
+    )
+    os.makedirs(args.salida, exist_ok=True)
+    for nombre, tabla in res.items():
+        ruta = os.path.join(args.salida, f"backtest_{nombre}.csv")
+        tabla.to_csv(ruta, index=False)
+        print(f"{nombre}: {len(tabla)} filas -> {ruta}")
+    resumen = res["resumen"]
+    for (tipo, alpha), g in resumen.groupby(["tipo", "alpha"]):
+        print(
+            f"{tipo} {alpha:g}: {int(g['violaciones'].sum())} violaciones "
+            f"({g['esperadas'].sum():.1f} esperadas), "
+            f"{int((g['p_cc'] < 0.05).sum())} de {len(g)} rechazadas al 5% (cobertura condicional)"
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Análisis de dependencia con cópulas")
+    sub = parser.add_subparsers(dest="comando")
+
+    p = sub.add_parser(
+        "pares", help="VaR/CVaR de todas las parejas (paralelo, reanudable)"
+    )
+    p.add_argument("--datos", default=str(RUTA_DATOS))
+    p.add_argument(
+        "--salida", default=str(RES_DIR / "copulas" / "dependencias_pares.csv")
+    )
+    p.add_argument(
+        "--checkpoint",
+        default=None,
+        help="JSON lines con las parejas terminadas (por defecto junto a --salida)",
+    )
+    p.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    p.add_argument("--semilla", type=int, default=123)
+    p.add_argument("--n-sims", type=int, default=200_000)
+    p.add_argument("--alphas", type=float, nargs="+", default=[0.95, 0.99])
+    p.add_argument(
+        "--tamano-bloque",
+        type=int,
+        default=None,
+        help="simular por bloques (VaR/CVaR con memoria acotada, para n-sims grandes)",
+    )
+    p.add_argument(
+        "--muestreo",
+        choices=MODOS,
+        default="mc",
+        help="sobol / antitetico / importancia (pesos de razón de verosimilitud) "
+        "para reducir la varianza de VaR/CVaR (src/modelos/muestreo.py)",
+    )
+    p.add_argument(
+        "--traza",
+        default=None,
+        help="JSON lines con los tramos de tiempo de cada etapa (src/traza.py)",
+    )
+    p.add_argument(
+        "--traza-memoria",
+        action="store_true",
+        help="pico de memoria por pareja con tracemalloc (más lento)",
+    )
+
+    g = sub.add_parser(
+        "bondad",
+        help="Bondad de ajuste (CvM/KS, bootstrap) de las cópulas de res/copulas",
+    )
+    g.add_argument("--datos", default=str(RUTA_DATOS))
+    g.add_argument(
+        "--copulas",
+        default=str(RES_DIR / "copulas"),
+        help="carpeta con provincia_sector.csv, provincia_categoria.csv y sector_categoria.csv",
+    )
+    g.add_argument("--salida", default=str(RES_DIR / "copulas" / "bondad_ajuste.csv"))
+    g.add_argument("--n-boot", type=int, default=1000)
+    g.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    g.add_argument("--semilla", type=int, default=123)
+
+    s = sub.add_parser(
+        "seleccion", help="MV de todas las familias y selección por AIC (por lotes)"
+    )
+    s.add_argument("--datos", default=str(RUTA_DATOS))
+    s.add_argument("--copulas", default=str(RES_DIR / "copulas"))
+    s.add_argument("--salida", default=str(RES_DIR / "copulas" / "seleccion_mv.csv"))
+    s.add_argument(
+        "--todas",
+        default=None,
+        help="CSV opcional con el ajuste de todas las familias para todas las parejas",
+    )
+    s.add_argument("--criterio", choices=("aic", "bic"), default="aic")
+
+    q = sub.add_parser(
+        "pool", help="Una sola t-cópula para todas las dimensiones y todas las tablas"
+    )
+    q.add_argument("--datos", default=str(RUTA_DATOS))
+    q.add_argument("--salida", default=str(RES_DIR / "copulas"))
+    q.add_argument("--semilla", type=int, default=123)
+    q.add_argument("--n-sims", type=int, default=200_000)
+    q.add_argument("--alphas", type=float, nargs="+", default=[0.95, 0.99])
+    q.add_argument(
+        "--nu",
+        type=float,
+        default=None,
+        help="grados de libertad de la t-cópula (por defecto, verosimilitud compuesta)",
+    )
+    q.add_argument(
+        "--tamano-bloque",
+        type=int,
+        default=None,
+        help="generar el pool por bloques (memoria acotada)",
+    )
+    q.add_argument(
+        "--guardar",
+        default=None,
+        help=f"carpeta donde guardar U y X (p. ej. {RUTA_SIMULACIONES / 'pool'})",
+    )
+    q.add_argument(
+        "--simulaciones",
+        default=None,
+        help="carpeta de simulaciones guardadas a reutilizar en vez de simular",
+    )
+
+    c = sub.add_parser(
+        "consulta", help="VaR/CVaR y CVaR condicional sobre simulaciones guardadas"
+    )
+    c.add_argument("--simulaciones", default=str(RUTA_SIMULACIONES / "pool"))
+    c.add_argument(
+        "--suma",
+        nargs="+",
+        default=[],
+        metavar="COLUMNA:VALOR",
+        help="dimensiones que se suman (sin --suma se listan las guardadas)",
+    )
+    c.add_argument("--pesos", type=float, nargs="+", default=None)
+    c.add_argument(
+        "--condicion",
+        nargs="+",
+        default=None,
+        metavar="COLUMNA:VALOR",
+        help="media de la suma dado que la suma de estas dimensiones supera su VaR",
+    )
+    c.add_argument("--alphas", type=float, nargs="+", default=[0.95, 0.99])
+    c.add_argument("--metodo", choices=("lineal", "orden"), default="lineal")
+
+    r = sub.add_parser(
+        "predictiva",
+        help="VaR/TVaR predictivos con intervalos de credibilidad (res/mcmc)",
+    )
+    r.add_argument("--datos", default=str(RUTA_DATOS))
+    r.add_argument(
+        "--seleccion",
+        default=str(RES_DIR / "copulas" / "seleccion_mv.csv"),
+        help="parejas con su familia y parámetros (subcomando seleccion)",
+    )
+    r.add_argument("--posterior", default=str(RUTA_POSTERIOR_MCMC))
+    r.add_argument("--salida", default=str(RES_DIR / "copulas"))
+    r.add_argument("--semilla", type=int, default=123)
+    r.add_argument("--n-draws", type=int, default=1000)
+    r.add_argument("--n-sims", type=int, default=50_000)
+    r.add_argument("--alphas", type=float, nargs="+", default=[0.95, 0.99])
+    r.add_argument(
+        "--nivel",
+        type=float,
+        default=0.95,
+        help="nivel de los intervalos de credibilidad",
+    )
+
+    k = sub.add_parser(
+        "colas",
+        help="lambda de cola empírica (CFG / secante) con IC bootstrap por años",
+    )
+    k.add_argument("--datos", default=str(RUTA_DATOS))
+    k.add_argument("--salida", default=str(RES_DIR / "copulas"))
+    k.add_argument(
+        "--columnas", nargs="+", default=["provincia", "categoria", "sector"]
+    )
+    k.add_argument(
+        "--estimadores",
+        nargs="+",
+        choices=ESTIMADORES_LAMBDA,
+        default=list(ESTIMADORES_LAMBDA),
+    )
+    k.add_argument("--n-boot", type=int, default=2000)
+    k.add_argument(
+        "--tamano-bloque",
+        type=int,
+        default=None,
+        help="años consecutivos por bloque (por defecto n^(1/3))",
+    )
+    k.add_argument("--nivel", type=float, default=0.95)
+    k.add_argument("--semilla", type=int, default=123)
+    k.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+
+    t = sub.add_parser(
+        "backtest",
+        help="VaR con origen móvil por año y pruebas de Kupiec / Christoffersen",
+    )
+    t.add_argument("--datos", default=str(RUTA_DATOS))
+    t.add_argument("--salida", default=str(RES_DIR / "copulas"))
+    t.add_argument("--alphas", type=float, nargs="+", default=[0.95, 0.99])
+    t.add_argument(
+        "--min-anos", type=int, default=5, help="años con datos en el primer origen"
+    )
+    t.add_argument("--n-sims", type=int, default=50_000)
+    t.add_argument("--semilla", type=int, default=123)
+
+    b = sub.add_parser("borrador", help="Borrador original sobre datos_crudos.xlsx")
+    b.add_argument("--archivo", default="datos_crudos.xlsx")
+
+    args = parser.parse_args(argv)
+    if args.comando == "borrador":
+        analisis_borrador(args.archivo)
+    elif args.comando == "pares":
+        correr_pares(args)
+    elif args.comando == "bondad":
+        correr_bondad(args)
+    elif args.comando == "seleccion":
+        correr_seleccion(args)
+    elif args.comando == "pool":
+        correr_pool(args)
+    elif args.comando == "consulta":
+        correr_consulta(args)
+    elif args.comando == "predictiva":
+        correr_predictiva(args)
+    elif args.comando == "colas":
+        correr_colas(args)
+    elif args.comando == "backtest":
+        correr_backtest(args)
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,299 @@
+# Tramos de tiempo (trazas) del pipeline de riesgo y del dashboard
+#
+# Las etapas instrumentadas se envuelven en tramos con nombre:
+#
+#   with traza.tramo("fit_copulas", n=len(U1)):
+#       ...
+#
+#   @traza.trazado("simulate_copula")
+#   def simulate_copula(...): ...
+#
+# Con las trazas apagadas (lo normal) tramo() devuelve un contexto vacío
+# compartido y trazado() llama a la función directamente: el costo es una
+# comparación por llamada. Se encienden con la variable de entorno
+# GRUPO2_TRAZA=<archivo.jsonl> (la heredan los procesos de
+# ProcessPoolExecutor) o con activar(ruta).
+#
+# Cada tramo terminado es una línea JSON: nombre, inicio y duración (µs),
+# proceso, hilo, id del tramo padre, atributos (n de muestras, pareja, ...) y
+# la memoria máxima del proceso (ru_maxrss; None fuera de POSIX). Los tramos con memoria=True
+# registran además el pico de memoria asignada durante el tramo si
+# GRUPO2_TRAZA_MEMORIA=1 (tracemalloc, bastante más lento). Las líneas se
+# escriben al cerrar cada tramo raíz, así que los procesos hijos no pierden
+# nada aunque terminen sin pasar por atexit.
+#
+# Resumen por nombre de tramo, o conversión al formato de Chrome
+# (chrome://tracing o ui.perfetto.dev):
+#   python src/traza.py resumen res/trazas/pares.jsonl
+#   python src/traza.py chrome res/trazas/pares.jsonl res/trazas/pares.json
+
+from __future__ import annotations
+
+import argparse
+import atexit
+import functools
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Dict, List, Optional
+
+try:
+    import resource  # solo POSIX
+except ImportError:
+    resource = None
+
+VARIABLE_TRAZA = "GRUPO2_TRAZA"
+VARIABLE_MEMORIA = "GRUPO2_TRAZA_MEMORIA"
+
+# Líneas acumuladas antes de escribir aunque no se haya cerrado un tramo raíz
+MAX_PENDIENTES = 1000
+
+_ruta: Optional[Path] = None
+_memoria = False
+_pendientes: List[str] = []
+_lock = threading.Lock()
+_local = threading.local()
+_ids = itertools.count(1)
+
+
+def activar(ruta: Path | str, memoria: bool = False) -> None:
+    """Enciende las trazas en este proceso y en los procesos hijos."""
+    global _ruta, _memoria
+    _ruta = Path(ruta)
+    _ruta.parent.mkdir(parents=True, exist_ok=True)
+    _memoria = memoria
+    os.environ[VARIABLE_TRAZA] = str(_ruta)
+    if memoria:
+        os.environ[VARIABLE_MEMORIA] = "1"
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+
+def desactivar() -> None:
+    global _ruta
+    vaciar()
+    _ruta = None
+    os.environ.pop(VARIABLE_TRAZA, None)
+
+
+def activa() -> bool:
+    return _ruta is not None
+
+
+def vaciar() -> None:
+    """Escribe las líneas pendientes (una sola escritura en modo append)."""
+    global _pendientes
+    with _lock:
+        lineas, _pendientes = _pendientes, []
+    if lineas and _ruta is not None:
+        with open(_ruta, "a", encoding="utf-8") as f:
+            f.write("".join(lineas))
+
+
+def _rss_max_mb() -> Optional[float]:
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class _Tramo:
+    __slots__ = ("nombre", "attrs", "memoria", "id", "padre", "t0", "inicio")
+
+    def __init__(self, nombre: str, attrs: Dict, memoria: bool):
+        self.nombre = nombre
+        self.attrs = attrs
+        self.memoria = memoria and _memoria
+
+    def __enter__(self) -> "_Tramo":
+        pila = getattr(_local, "pila", None)
+        if pila is None:
+            pila = _local.pila = []
+        self.id = next(_ids)
+        self.padre = pila[-1].id if pila else None
+        pila.append(self)
+        if self.memoria:
+            tracemalloc.reset_peak()
+        self.inicio = time.time_ns() // 1000
+        self.t0 = time.perf_counter_ns()
+        return self
+
+    def anotar(self, **attrs) -> None:
+        """Agrega atributos que solo se conocen dentro del tramo."""
+        self.attrs.update(attrs)
+
+    def __exit__(self, tipo, valor, tb) -> None:
+        dur = (time.perf_counter_ns() - self.t0) // 1000
+        pila = _local.pila
+        pila.pop()
+        reg = {
+            "nombre": self.nombre,
+            "inicio_us": self.inicio,
+            "dur_us": dur,
+            "pid": os.getpid(),
+            "hilo": threading.get_ident(),
+            "id": f"{os.getpid()}-{self.id}",
+            "padre": None if self.padre is None else f"{os.getpid()}-{self.padre}",
+            "rss_max_mb": _rss_max_mb(),
+        }
+        if self.memoria:
+            reg["pico_mb"] = tracemalloc.get_traced_memory()[1] / 2**20
+        if tipo is not None:
+            reg["error"] = tipo.__name__
+        if self.attrs:
+            reg["attrs"] = self.attrs
+        linea = json.dumps(reg, ensure_ascii=False, default=str) + "\n"
+        with _lock:
+            _pendientes.append(linea)
+            lleno = len(_pendientes) >= MAX_PENDIENTES
+        if not pila or lleno:
+            vaciar()
+
+
+class _TramoNulo:
+    """Lo que devuelve tramo() apagado: anotar() no hace nada."""
+
+    __slots__ = ()
+
+    def __enter__(self) -> "_TramoNulo":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        return None
+
+    def anotar(self, **attrs) -> None:
+        return None
+
+
+_TRAMO_NULO = _TramoNulo()
+
+
+def tramo(nombre: str, memoria: bool = False, **attrs):
+    """Contexto con el tiempo de un bloque; nulo si las trazas están apagadas."""
+    if _ruta is None:
+        return _TRAMO_NULO
+    return _Tramo(nombre, attrs, memoria)
+
+
+def trazado(nombre: Optional[str] = None, memoria: bool = False):
+    """Decorador: la función completa como un tramo."""
+
+    def decorador(f):
+        etiqueta = nombre or f.__qualname__
+
+        @functools.wraps(f)
+        def envuelta(*args, **kwargs):
+            if _ruta is None:
+                return f(*args, **kwargs)
+            with _Tramo(etiqueta, {}, memoria):
+                return f(*args, **kwargs)
+
+        return envuelta
+
+    return decorador
+
+
+atexit.register(vaciar)
+if os.environ.get(VARIABLE_TRAZA):
+    activar(os.environ[VARIABLE_TRAZA], memoria=os.environ.get(VARIABLE_MEMORIA) == "1")
+
+
+# ============================================================
+# Lectura de trazas
+# ============================================================
+
+
+def leer_traza(ruta: Path | str) -> List[Dict]:
+    with open(ruta, encoding="utf-8") as f:
+        return [json.loads(linea) for linea in f if linea.strip()]
+
+
+def resumen(registros: List[Dict]):
+    """
+    Tabla por nombre de tramo: llamadas, tiempo total y propio (sin los
+    tramos hijos), media, p50/p95/máximo y memoria máxima.
+    """
+    import numpy as np
+    import pandas as pd
+
+    df = pd.DataFrame(registros)
+    hijos = df.dropna(subset=["padre"]).groupby("padre")["dur_us"].sum()
+    df["propio_us"] = df["dur_us"] - df["id"].map(hijos).fillna(0)
+    total_raiz = df.loc[df["padre"].isna(), "dur_us"].sum()
+    g = df.groupby("nombre")
+    tabla = pd.DataFrame(
+        {
+            "llamadas": g.size(),
+            "total_s": g["dur_us"].sum() / 1e6,
+            "propio_s": g["propio_us"].sum() / 1e6,
+            "media_ms": g["dur_us"].mean() / 1e3,
+            "p50_ms": g["dur_us"].median() / 1e3,
+            "p95_ms": g["dur_us"].quantile(0.95) / 1e3,
+            "max_ms": g["dur_us"].max() / 1e3,
+        }
+    )
+    # rss_max_mb es None donde no hay `resource` (Windows)
+    tabla["rss_max_mb"] = pd.to_numeric(df["rss_max_mb"]).groupby(df["nombre"]).max()
+    if "pico_mb" in df:
+        tabla["pico_mb"] = g["pico_mb"].max()
+    tabla["%_propio"] = (
+        100 * tabla["propio_s"] * 1e6 / total_raiz if total_raiz else np.nan
+    )
+    return tabla.sort_values("propio_s", ascending=False)
+
+
+def a_chrome(registros: List[Dict]) -> Dict:
+    """Eventos "X" del formato de trazas de Chrome."""
+    eventos = [
+        {
+            "name": r["nombre"],
+            "ph": "X",
+            "ts": r["inicio_us"],
+            "dur": r["dur_us"],
+            "pid": r["pid"],
+            "tid": r["hilo"],
+            "args": r.get("attrs", {}),
+        }
+        for r in registros
+    ]
+    return {"traceEvents": eventos, "displayTimeUnit": "ms"}
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Resumen o conversión de una traza")
+    sub = parser.add_subparsers(dest="comando", required=True)
+    p = sub.add_parser("resumen", help="tabla por nombre de tramo")
+    p.add_argument("traza")
+    p = sub.add_parser("chrome", help="convertir al formato de chrome://tracing")
+    p.add_argument("traza")
+    p.add_argument("salida")
+    args = parser.parse_args(argv)
+
+    registros = leer_traza(args.traza)
+    if args.comando == "resumen":
+        import pandas as pd
+
+        with pd.option_context(
+            "display.width",
+            200,
+            "display.max_rows",
+            None,
+            "display.max_columns",
+            None,
+            "display.float_format",
+            "{:.3f}".format,
+        ):
+            print(resumen(registros))
+    else:
+        with open(args.salida, "w", encoding="utf-8") as f:
+            json.dump(a_chrome(registros), f)
+        print(f"{len(registros)} tramos -> {args.salida}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())